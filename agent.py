@@ -3,11 +3,20 @@ import os
 from dotenv import load_dotenv
 from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.prebuilt import create_react_agent
+from langgraph.store.memory import InMemoryStore
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain.chat_models import init_chat_model
 from typing import Dict, List, Any
 
+# react_agent 來自 python/grafana-llm-agent（已列於 requirements.txt）
+# 消息解析與 transcript 共用同一個格式化器
+from react_agent.tools import parse_messages
+# 保存狀態圖的可視化表示（按圖結構快取，可離線渲染）
+from react_agent.visualization import start_graph_visualization
+# 停放等待人工確認的執行緒，逾時後刪除其檢查點
+from react_agent.parking import InterruptParking
+
 # 載入 .env 文件
 load_dotenv()
 
@@ -48,97 +57,6 @@ llm = init_chat_model(
 # )
 
 
-# 解析消息列表
-def parse_messages(messages: List[Any]) -> None:
-    """
-    解析消息列表，打印 HumanMessage、AIMessage 和 ToolMessage 的詳細信息
-
-    Args:
-        messages: 包含消息的列表，每個消息是一個對象
-    """
-    print("\n🔍 === 詳細消息解析 ===")
-    for idx, msg in enumerate(messages, 1):
-        print(f"\n📝 消息 {idx}: {msg.__class__.__name__}")
-        print("-" * 40)
-        
-        # 獲取消息類型
-        msg_type = msg.__class__.__name__
-        
-        # 提取消息內容
-        content = getattr(msg, 'content', '')
-        if content:
-            print(f"💬 內容: {content}")
-        
-        # 處理 HumanMessage
-        if msg_type == 'HumanMessage':
-            print("👤 用戶輸入")
-            
-        # 處理 AIMessage 的工具調用
-        elif msg_type == 'AIMessage':
-            print("🤖 AI 回應")
-            tool_calls = getattr(msg, 'tool_calls', [])
-            if tool_calls:
-                print("🔧 工具調用:")
-                for i, tool_call in enumerate(tool_calls, 1):
-                    print(f"  {i}. 工具名稱: {tool_call.get('name', 'Unknown')}")
-                    print(f"     工具參數: {tool_call.get('args', {})}")
-                    print(f"     調用 ID: {tool_call.get('id', 'Unknown')}")
-            
-            # 處理 additional_kwargs 中的工具調用（舊格式）
-            additional_kwargs = getattr(msg, 'additional_kwargs', {})
-            if additional_kwargs.get('tool_calls'):
-                print("🔧 工具調用 (舊格式):")
-                for i, tool_call in enumerate(additional_kwargs['tool_calls'], 1):
-                    print(f"  {i}. 函數名稱: {tool_call.get('function', {}).get('name', 'Unknown')}")
-                    print(f"     函數參數: {tool_call.get('function', {}).get('arguments', '{}')}")
-                    print(f"     調用 ID: {tool_call.get('id', 'Unknown')}")
-        
-        # 處理 ToolMessage
-        elif msg_type == 'ToolMessage':
-            print("🛠️ 工具執行結果")
-            tool_name = getattr(msg, 'name', 'Unknown')
-            tool_call_id = getattr(msg, 'tool_call_id', 'Unknown')
-            print(f"🔧 工具名稱: {tool_name}")
-            print(f"🆔 工具調用 ID: {tool_call_id}")
-            
-            # 嘗試解析 JSON 格式的工具結果
-            try:
-                import json
-                if content:
-                    parsed_content = json.loads(content)
-                    if isinstance(parsed_content, list) and len(parsed_content) > 0:
-                        print(f"📊 結果數量: {len(parsed_content)} 項")
-                        print(f"📋 結果預覽: {str(parsed_content)[:200]}...")
-                    else:
-                        print(f"📊 結果: {str(parsed_content)[:200]}...")
-            except:
-                print(f"📊 原始結果: {content[:200]}...")
-        
-        print()  # 空行分隔
-
-
-# 保存狀態圖的可視化表示
-def save_graph_visualization(graph, filename: str = "grafana_agent_graph.png") -> None:
-    """保存狀態圖的可視化表示。
-
-    Args:
-        graph: 狀態圖實例。
-        filename: 保存文件路徑。
-    """
-    # 嘗試執行以下代碼塊
-    try:
-        # 以二進制寫模式打開文件
-        with open(filename, "wb") as f:
-            # 將狀態圖轉換為 Mermaid 格式的 PNG 並寫入文件
-            f.write(graph.get_graph().draw_mermaid_png())
-        # 記錄保存成功的日誌
-        print(f"Grafana Agent 圖形可視化已保存為 {filename}")
-    # 捕獲 IO 錯誤
-    except IOError as e:
-        # 記錄警告日誌
-        print(f"保存圖形可視化失敗: {e}")
-
-
 # 定義並運行 Grafana 可觀測性診斷專家 Agent
 async def run_grafana_agent():
     # 實例化 MCP Server 客戶端
@@ -179,7 +97,7 @@ async def run_grafana_agent():
     print(f"🎯 已選擇的工具: {[tool.name for tool in tools]}")
     print(f"📊 工具數量: {len(tools)}/{len(all_tools)}\n")
 
-    # 基於內存存儲的 short-term
+    # 基於內存存儲的 short-term；由下面的 InterruptParking 控制保留哪些執行緒
     checkpointer = InMemorySaver()
 
     # 定義系統消息，指導如何使用工具
@@ -235,8 +153,14 @@ async def run_grafana_agent():
         checkpointer=checkpointer
     )
 
-    # 將定義的 agent 的 graph 進行可視化輸出保存至本地
-    save_graph_visualization(agent)
+    # 將定義的 agent 的 graph 進行可視化輸出保存至本地（在背景執行緒進行，不阻塞查詢）
+    # 使用 SVG 在本地渲染，不依賴遠端渲染服務
+    start_graph_visualization(agent, "grafana_agent_graph.svg")
+
+    # 執行緒結束後刪除其檢查點，只保留停放中（等待人工確認）的執行緒，
+    # 並每分鐘清除逾時（interrupt_expiry_seconds）未確認的，InMemorySaver 不會無限成長
+    parking = InterruptParking(agent, InMemoryStore(), forget_finished=True)
+    parking.start(60)
 
     # 定義 short-term 需使用的 thread_id
     config = {"configurable": {"thread_id": "1"}}
@@ -251,11 +175,13 @@ async def run_grafana_agent():
     print("=" * 60)
     
     try:
-        # 1、非流式處理查詢
-        agent_response = await agent.ainvoke(
+        # 1、非流式處理查詢；遇到人工確認時執行緒會被停放
+        agent_response = await parking.run(
             {"messages": [HumanMessage(content=test_query)]}, 
             config
         )
+        for pending in agent_response.get("__interrupt__", []):
+            print(f"⏸️ 等待人工確認: {pending.value}")
         
         # 解析並顯示所有消息（包括工具調用和回應）
         parse_messages(agent_response['messages'])
@@ -268,6 +194,8 @@ async def run_grafana_agent():
     except Exception as e:
         print(f"❌ 查詢過程中發生錯誤: {e}")
         print("請檢查 Grafana MCP 服務是否正常運行")
+    finally:
+        await parking.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+"""Measure dashboard catalog sync cost and search latency.
+
+Builds `--dashboards` synthetic dashboards (8 panels each) served by an
+in-process fake of the Grafana MCP tools with `--latency-ms` per call, then
+times a full sync, an incremental sync after `--changed` percent of the
+dashboards got a new version, and local searches.
+
+Usage:
+    python benchmarks/bench_dashboard_catalog.py --dashboards 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import resource
+import statistics
+import time
+from typing import Any, Dict, List
+
+from react_agent.dashboard_catalog import DashboardCatalog, DashboardCatalogSyncer
+
+_SERVICES = [
+    "checkout",
+    "payments",
+    "search",
+    "gateway",
+    "auth",
+    "catalog",
+    "cart",
+    "ledger",
+]
+_METRICS = [
+    "http_requests_total",
+    "http_request_duration_seconds_bucket",
+    "process_cpu_seconds_total",
+    "go_memstats_heap_inuse_bytes",
+    "kafka_consumergroup_lag",
+]
+
+
+def _dashboard(i: int, version: int) -> Dict[str, Any]:
+    rng = random.Random(i)
+    service = _SERVICES[i % len(_SERVICES)]
+    panels = []
+    for p in range(8):
+        metric = rng.choice(_METRICS)
+        panels.append(
+            {
+                "id": p + 1,
+                "type": "timeseries",
+                "title": f"{service} {metric.replace('_', ' ')} panel {p}",
+                "targets": [
+                    {
+                        "refId": "A",
+                        "expr": f'sum(rate({metric}{{service="{service}-{i % 97}"}}[5m]))',
+                        "datasource": {"uid": "prom"},
+                    },
+                    {
+                        "refId": "B",
+                        "expr": f'{{service_name="{service}-{i % 97}"}} |= "error"',
+                        "datasource": {"uid": "loki"},
+                    },
+                ],
+            }
+        )
+    return {
+        "dashboard": {
+            "uid": f"d{i}",
+            "title": f"{service.title()} service {i}",
+            "version": version,
+            "tags": [service, f"team-{i % 13}"],
+            "panels": panels,
+        },
+        "meta": {"folderTitle": f"Folder {i % 50}"},
+    }
+
+
+async def _run(dashboards: int, changed: float, latency: float, queries: int) -> None:
+    versions = {f"d{i}": 1 for i in range(dashboards)}
+    calls = {"search_dashboards": 0, "get_dashboard_by_uid": 0}
+
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> Any:
+        calls[name] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if name == "search_dashboards":
+            uids = list(versions)[(arguments["page"] - 1) * arguments["limit"] :][
+                : arguments["limit"]
+            ]
+            return [{"uid": uid, "title": uid, "type": "dash-db"} for uid in uids]
+        uid = arguments["uid"]
+        return _dashboard(int(uid[1:]), versions[uid])
+
+    catalog = DashboardCatalog()
+    syncer = DashboardCatalogSyncer(
+        catalog, call_tool, revalidate_batch=dashboards, max_concurrency=32
+    )
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    stats = await syncer.sync_once()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(
+        f"full sync of {dashboards} dashboards: {stats['seconds']:.2f} s,"
+        f" {calls['get_dashboard_by_uid']} fetches,"
+        f" max RSS +{(rss_after - rss_before) / 1024:.0f} MiB"
+    )
+
+    rng = random.Random(0)
+    for uid in rng.sample(sorted(versions), int(dashboards * changed / 100)):
+        versions[uid] += 1
+    calls["get_dashboard_by_uid"] = 0
+    syncer.revalidate_batch = max(1, dashboards // 10)
+    stats = await syncer.sync_once()
+    print(
+        f"incremental sync ({changed}% changed, revalidating {syncer.revalidate_batch}):"
+        f" {stats['seconds']:.2f} s, {calls['get_dashboard_by_uid']} fetches,"
+        f" {stats['updated']} re-indexed"
+    )
+
+    words = [
+        "checkout errors",
+        "http requests total",
+        "kafka lag",
+        "payments latency",
+        "heap inuse",
+        "team-7",
+        "gateway panel 3",
+        "process cpu",
+    ]
+    latencies: List[float] = []
+    for q in range(queries):
+        start = time.perf_counter()
+        catalog.search(words[q % len(words)], limit=10)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{queries} searches: p50 {statistics.median(latencies) * 1e3:.2f} ms"
+        f"   p99 {p99 * 1e3:.2f} ms"
+    )
+
+
+def main() -> None:
+    """Run the benchmark and print sync cost and search latency."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dashboards", type=int, default=10_000)
+    parser.add_argument("--changed", type=float, default=1.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(
+        _run(args.dashboards, args.changed, args.latency_ms / 1e3, args.queries)
+    )
+
+
+if __name__ == "__main__":
+    main()
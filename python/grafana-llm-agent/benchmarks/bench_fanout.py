@@ -0,0 +1,147 @@
+"""Compare a multi-target health check in one thread vs the fan-out graph.
+
+A scripted chat model (`--model-ms` per call) investigates `--targets`
+targets with `--steps` tool calls each (`--tool-ms` per call):
+
+- sequential: the main ReAct graph works through all targets in one thread;
+- fan-out: `fanout.build_fanout_graph` runs one sub-investigation per target,
+  at most `--concurrency` at once, then one reduce call merges them.
+
+Usage:
+    python benchmarks/bench_fanout.py --targets 8 --concurrency 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import time
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.tools import tool
+
+from react_agent import fanout, prompts
+from react_agent.fanout import build_fanout_graph, parse_fanout_targets
+
+# `react_agent.graph` 被套件匯出的同名圖物件遮蔽，直接取模組
+graph = importlib.import_module("react_agent.graph")
+
+_COUNTRIES = ["zm", "ng", "ke", "gh", "tz", "ug", "cm", "mw", "rw", "sn", "ci", "bj"]
+
+
+class ScriptedModel:
+    """Runs `steps` tool calls per target named in the question, then answers."""
+
+    def __init__(self, steps: int, latency: float) -> None:
+        """Make `steps` tool calls per target, each reply after `latency` seconds."""
+        self.steps = steps
+        self.latency = latency
+        self.calls = 0
+
+    def bind_tools(self, tools: Sequence[Any]) -> ScriptedModel:
+        """Ignore the tools; the script already knows which to call."""
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        """Call the next tool, or answer once every target got its calls."""
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if any(
+            isinstance(m, SystemMessage) and m.content == prompts.FANOUT_REDUCE_PROMPT
+            for m in messages
+        ):
+            return AIMessage(content="合併報告")
+        question = next(str(m.content) for m in messages if isinstance(m, HumanMessage))
+        targets = (
+            1
+            if "本次只調查這一個目標" in question
+            else len(parse_fanout_targets(question))
+        )
+        done = sum(1 for m in messages if isinstance(m, ToolMessage))
+        if done >= self.steps * max(1, targets):
+            return AIMessage(content="調查完成")
+        call = {
+            "name": "query_prometheus",
+            "args": {"expr": f"q{done}"},
+            "id": f"c{done}",
+        }
+        return AIMessage(content="", tool_calls=[call])
+
+
+async def _run(
+    targets: int,
+    steps: int,
+    concurrency: int,
+    model_latency: float,
+    tool_latency: float,
+) -> None:
+    @tool
+    async def query_prometheus(expr: str) -> str:
+        """Run a PromQL query."""
+        await asyncio.sleep(tool_latency)
+        return "[]"
+
+    tools = [query_prometheus]
+    graph._dynamic_tools = tools
+    config: Dict[str, Any] = {
+        "configurable": {
+            "metadata_preresolve": False,
+            "fanout_max_concurrency": concurrency,
+        },
+        "recursion_limit": 10 * targets * steps,
+    }
+    countries = ", ".join(_COUNTRIES[:targets])
+    question = f"檢查 checkout 在 service_country: {countries} 的健康狀況"
+
+    results: List[tuple] = []
+    for name, compiled in (
+        ("sequential", graph.build_react_graph(tools).compile()),
+        ("fan-out", build_fanout_graph(tools).compile()),
+    ):
+        model = ScriptedModel(steps, model_latency)
+        graph.load_chat_model = lambda _name: model  # type: ignore[assignment]
+        fanout.load_chat_model = lambda _name: model  # type: ignore[assignment]
+        started = time.perf_counter()
+        await compiled.ainvoke({"messages": [HumanMessage(content=question)]}, config)
+        results.append((name, time.perf_counter() - started, model.calls))
+
+    print(
+        f"{targets} targets x {steps} tool steps, model {model_latency * 1e3:.0f} ms, "
+        f"tool {tool_latency * 1e3:.0f} ms, concurrency {concurrency}"
+    )
+    print(f"{'mode':<12}{'wall (s)':>10}{'llm calls':>11}")
+    for name, seconds, calls in results:
+        print(f"{name:<12}{seconds:>10.2f}{calls:>11}")
+    print(f"speedup: {results[0][1] / results[1][1]:.1f}x")
+
+
+def main() -> None:
+    """Run both modes and print their wall time."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--targets", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model-ms", type=float, default=100.0)
+    parser.add_argument("--tool-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    asyncio.run(
+        _run(
+            args.targets,
+            args.steps,
+            args.concurrency,
+            args.model_ms / 1e3,
+            args.tool_ms / 1e3,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Profile the import time of the agent's modules against a budget.
+
+Each module is imported in a fresh interpreter with `python -X importtime`;
+the report shows its cumulative import time (median of `--runs`), the
+packages that cost the most, and whether modules that must stay off the
+startup path (MCP adapters, provider SDKs, Tavily) were imported. The exit
+status is 1 when a module is over its budget or imports one of them, so the
+profile can gate CI.
+
+Usage:
+    python benchmarks/bench_import_time.py --runs 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+from collections import Counter
+from typing import Dict, List, Tuple
+
+# 各模組的 import 時間上限（毫秒）
+BUDGETS_MS = {
+    "react_agent": 50,
+    "react_agent.configuration": 1500,
+    "react_agent.graph": 2000,
+}
+
+# 只應在第一次使用時才載入的模組
+DEFERRED = (
+    "mcp",
+    "langchain_mcp_adapters",
+    "langchain_tavily",
+    "langchain.chat_models",
+    "langchain_openai",
+)
+
+
+def profile(module: str) -> Tuple[float, Dict[str, int]]:
+    """Import `module` in a new interpreter; get its import seconds and per-module self times."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = 0
+    self_times: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:") :].split("|")
+        self_us, cumulative_us, name = (field.strip() for field in fields)
+        if not self_us.isdigit():
+            continue  # 表頭
+        self_times[name] = int(self_us)
+        if name == module:
+            cumulative = int(cumulative_us)
+    return cumulative / 1e6, self_times
+
+
+def _deferred_imported(imported: Dict[str, int]) -> List[str]:
+    return sorted(d for d in DEFERRED if d in imported)
+
+
+def main() -> None:
+    """Print the import profile and exit with 1 if a budget is exceeded."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    failed = False
+    print(
+        f"{'module':<28}{'import (ms)':>12}{'budget (ms)':>13}  deferred modules imported"
+    )
+    heaviest: Counter[str] = Counter()
+    for module, budget in BUDGETS_MS.items():
+        runs = [profile(module) for _ in range(args.runs)]
+        seconds = statistics.median(r[0] for r in runs)
+        deferred = _deferred_imported(runs[0][1])
+        over = seconds * 1e3 > budget or bool(deferred)
+        failed |= over
+        status = "OVER" if over else "ok"
+        print(
+            f"{module:<28}{seconds * 1e3:>12.0f}{budget:>13}  {', '.join(deferred) or '-'}  {status}"
+        )
+        if module == "react_agent.graph":
+            for name, self_us in runs[0][1].items():
+                heaviest[name.split(".")[0]] += self_us
+
+    print("\nheaviest packages under react_agent.graph (self time, ms):")
+    for package, self_us in heaviest.most_common(args.top):
+        print(f"  {package:<26}{self_us / 1e3:>8.0f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
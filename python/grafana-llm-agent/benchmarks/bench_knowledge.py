@@ -0,0 +1,207 @@
+"""Measure the model steps per investigation with and without the knowledge store.
+
+Each investigation runs on a new thread and asks about one service. The
+scripted model follows the usual discovery workflow (list the datasources,
+the Loki label names, the `service_name` values, find the service's
+dashboard), skipping each step whose answer is already in its context, then
+queries the logs and answers. Without the knowledge store every thread
+repeats the discovery; with it, later threads start from the facts earlier
+ones found.
+
+Usage:
+    python benchmarks/bench_knowledge.py --investigations 12
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.utils import get_message_text
+
+graph = importlib.import_module("react_agent.graph")
+
+SERVICES = ["checkout", "cart", "payments", "inventory", "shipping", "search"]
+DATASOURCES = [
+    {
+        "id": 1,
+        "uid": "loki-prod",
+        "name": "Loki Prod",
+        "type": "loki",
+        "isDefault": False,
+    },
+    {
+        "id": 2,
+        "uid": "prom-prod",
+        "name": "Prometheus Prod",
+        "type": "prometheus",
+        "isDefault": True,
+    },
+    {
+        "id": 3,
+        "uid": "tempo-prod",
+        "name": "Tempo",
+        "type": "tempo",
+        "isDefault": False,
+    },
+]
+LABELS = [
+    "app",
+    "cluster",
+    "container",
+    "detected_level",
+    "namespace",
+    "pod",
+    "service_name",
+]
+
+
+@tool
+def list_datasources() -> str:
+    """List datasources."""
+    return json.dumps(DATASOURCES)
+
+
+@tool
+def list_loki_label_names(datasourceUid: str) -> str:
+    """List Loki label names."""
+    return json.dumps(LABELS)
+
+
+@tool
+def list_loki_label_values(datasourceUid: str, labelName: str) -> str:
+    """List Loki label values."""
+    return json.dumps(SERVICES)
+
+
+@tool
+def search_dashboards(query: str) -> str:
+    """Search dashboards."""
+    hit = {
+        "uid": f"dash-{query}",
+        "title": f"{query} overview",
+        "type": "dash-db",
+        "folderTitle": "Prod",
+    }
+    return json.dumps([hit])
+
+
+@tool
+def query_loki_logs(datasourceUid: str, logql: str) -> str:
+    """Query Loki logs."""
+    return json.dumps(
+        [{"line": "level=error msg=timeout", "timestamp": "1700000000000000000"}]
+    )
+
+
+TOOLS = [
+    list_datasources,
+    list_loki_label_names,
+    list_loki_label_values,
+    search_dashboards,
+    query_loki_logs,
+]
+
+
+class Investigator:
+    """Runs the discovery workflow, skipping the steps its context already answers."""
+
+    def __init__(self) -> None:
+        """Start with no model calls made."""
+        self.calls = 0
+
+    def bind_tools(self, tools: Sequence[Any]) -> Investigator:
+        """Ignore the tools; the workflow already knows which to call."""
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        """Call the first workflow tool whose answer is not in `messages` yet."""
+        self.calls += 1
+        question = next(m for m in reversed(messages) if isinstance(m, HumanMessage))
+        service = next(s for s in SERVICES if s in get_message_text(question))
+        known = "\n".join(
+            get_message_text(m) for m in messages if not isinstance(m, HumanMessage)
+        )
+        loki = {"datasourceUid": "loki-prod"}
+        # (出現在上下文中就代表已知的字串, 不知道時要呼叫的工具, 參數)
+        steps: List[tuple] = [
+            ("loki-prod", "list_datasources", {}),
+            ("service_name", "list_loki_label_names", loki),
+            (
+                "inventory",
+                "list_loki_label_values",
+                {**loki, "labelName": "service_name"},
+            ),
+            (f"dash-{service}", "search_dashboards", {"query": service}),
+            (
+                "level=error",
+                "query_loki_logs",
+                {**loki, "logql": f'{{service_name="{service}"}}'},
+            ),
+        ]
+        for marker, name, args in steps:
+            if marker not in known:
+                call = {"name": name, "args": args, "id": f"call-{self.calls}"}
+                return AIMessage(content="", tool_calls=[call])
+        return AIMessage(content=f"{service} 有逾時錯誤")
+
+
+async def _run(investigations: int, knowledge_db: Optional[str]) -> Dict[str, Any]:
+    model = Investigator()
+    graph.load_chat_model = lambda _name: model
+    graph._dynamic_tools = TOOLS
+    compiled = graph.build_react_graph(TOOLS).compile(checkpointer=InMemorySaver())
+    steps = []
+    started = time.perf_counter()
+    for i in range(investigations):
+        service = SERVICES[i % len(SERVICES)]
+        configurable: Dict[str, Any] = {
+            "thread_id": f"t{i}",
+            "metadata_preresolve": False,
+        }
+        if knowledge_db is None:
+            configurable["knowledge_max_facts"] = 0
+        else:
+            configurable["knowledge_db"] = knowledge_db
+        before = model.calls
+        question = HumanMessage(content=f"{service} 服務的 loki 日誌最近有錯誤嗎？")
+        await compiled.ainvoke({"messages": [question]}, {"configurable": configurable})
+        steps.append(model.calls - before)
+    return {"steps": steps, "seconds": time.perf_counter() - started}
+
+
+def main() -> None:
+    """Print the model steps of each investigation with and without knowledge."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--investigations", type=int, default=12)
+    args = parser.parse_args()
+
+    cold = asyncio.run(_run(args.investigations, None))
+    with tempfile.TemporaryDirectory() as directory:
+        warm = asyncio.run(
+            _run(args.investigations, str(Path(directory) / "knowledge.db"))
+        )
+
+    print(
+        f"{args.investigations} investigations over {len(SERVICES)} services, one thread each"
+    )
+    print(f"{'':<12}{'steps per investigation':<40}{'mean':>6}{'time (s)':>10}")
+    for name, run in (("no store", cold), ("knowledge", warm)):
+        mean = sum(run["steps"]) / len(run["steps"])
+        print(
+            f"{name:<12}{' '.join(map(str, run['steps'])):<40}{mean:>6.2f}{run['seconds']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
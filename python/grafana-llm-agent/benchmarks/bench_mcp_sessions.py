@@ -0,0 +1,91 @@
+"""Compare MCP tool call latency: a session per call vs. a shared session.
+
+Starts a local stub MCP server and calls one tool repeatedly through tools from
+`MultiServerMCPClient.get_tools()` (new connection + `initialize` per call)
+and through `MCPSessionManager` (one long-lived session).
+
+Usage:
+    python benchmarks/bench_mcp_sessions.py --calls 50 --transport sse
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List
+
+from langchain_mcp_adapters.client import MultiServerMCPClient
+
+from react_agent.mcp_sessions import MCPSessionManager
+from react_agent.mcp_stub import serve_stub
+
+
+def list_loki_label_names(datasourceUid: str) -> List[str]:
+    """Return a fixed set of label names."""
+    return ["service_name", "service_country", "level", "namespace"]
+
+
+async def _time_calls(tool: Any, calls: int) -> List[float]:
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await tool.ainvoke({"datasourceUid": "loki"})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def _run(
+    url: str, transport: str, calls: int, concurrency: int
+) -> Dict[str, Any]:
+    connections: Dict[str, Any] = {"grafana-mcp": {"url": url, "transport": transport}}
+
+    per_call = (await MultiServerMCPClient(connections).get_tools())[0]
+    manager = MCPSessionManager(connections)
+    shared = (await manager.get_tools())[0]
+
+    results = {
+        "session per call": await _time_calls(per_call, calls),
+        "shared session": await _time_calls(shared, calls),
+    }
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(shared.ainvoke({"datasourceUid": "loki"}) for _ in range(concurrency))
+    )
+    concurrent = time.perf_counter() - start
+    await manager.aclose()
+    return {"latencies": results, "concurrent": concurrent}
+
+
+def main() -> None:
+    """Run the benchmark and print per-call latency percentiles."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--transport", choices=["sse", "streamable_http"], default="sse"
+    )
+    args = parser.parse_args()
+
+    with serve_stub(
+        {"list_loki_label_names": list_loki_label_names}, args.transport
+    ) as url:
+        report = asyncio.run(_run(url, args.transport, args.calls, args.concurrency))
+
+    print(f"{args.calls} sequential calls over {args.transport}")
+    for name, latencies in report["latencies"].items():
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(
+            f"  {name:<18} p50 {statistics.median(latencies) * 1e3:7.2f} ms"
+            f"   p95 {p95 * 1e3:7.2f} ms"
+        )
+    print(
+        f"{args.concurrency} concurrent calls on the shared session:"
+        f" {report['concurrent'] * 1e3:.1f} ms total"
+    )
+
+
+if __name__ == "__main__":
+    main()
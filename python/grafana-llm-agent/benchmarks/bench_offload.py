@@ -0,0 +1,84 @@
+"""Measure event-loop lag while large Loki results are summarized.
+
+`--sessions` concurrent sessions each summarize `--lines` log lines (the
+CPU-bound tail of `analyze_loki_logs`) while `LoopLagMonitor` samples the
+lag of the shared event loop:
+
+- inline: `offload_threshold_bytes=0`, everything runs on the loop;
+- offloaded: summaries run in the worker process pool.
+
+Usage:
+    python benchmarks/bench_offload.py --sessions 4 --lines 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from langchain_core.runnables import RunnableLambda
+
+from react_agent.loki_analysis import summarize_logs
+from react_agent.metrics import MetricsRegistry
+from react_agent.offload import LoopLagMonitor, offload, shutdown_offload_pool
+
+
+def _entries(lines: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "timestamp": str(1_700_000_000_000_000_000 + i * 10**8),
+            "line": f"level=error msg=timeout upstream=10.0.0.{i % 200}:8080 id={i}",
+            "labels": {"service_name": "checkout", "pod": f"checkout-{i % 50}"},
+        }
+        for i in range(lines)
+    ]
+
+
+def _session(entries: List[Dict[str, Any]]) -> RunnableLambda:
+    async def summarize(_: Any) -> None:
+        size = sum(len(e["line"]) for e in entries)
+        await offload(summarize_logs, entries, size=size, bucket_seconds=60)
+
+    return RunnableLambda(summarize)
+
+
+async def _run(sessions: int, lines: int) -> None:
+    entries = _entries(lines)
+    # 先啟動工作進程，避免把啟動時間算進延遲
+    warm = {"configurable": {"offload_threshold_bytes": 1}}
+    await _session(entries[:10]).ainvoke(None, config=warm)
+
+    print(f"{sessions} sessions x {lines} log lines")
+    print(f"{'mode':<12}{'wall (s)':>10}{'max lag (ms)':>14}{'mean lag (ms)':>15}")
+    for name, threshold in (("inline", 0), ("offloaded", 1)):
+        metrics = MetricsRegistry()
+        monitor = LoopLagMonitor(metrics=metrics)
+        monitor.start(0.01)
+        await asyncio.sleep(0.05)
+        config = {"configurable": {"offload_threshold_bytes": threshold}}
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(_session(entries).ainvoke(None, config=config) for _ in range(sessions))
+        )
+        wall = time.perf_counter() - started
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        [lag] = metrics.snapshot()["summaries"]["event_loop_lag_seconds"]
+        mean = lag["sum"] / lag["count"]
+        print(f"{name:<12}{wall:>10.2f}{lag['max'] * 1e3:>14.0f}{mean * 1e3:>15.1f}")
+    shutdown_offload_pool()
+
+
+def main() -> None:
+    """Run both modes and print the loop lag."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--lines", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(_run(args.sessions, args.lines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Count LLM calls per investigation with the think tool vs the scratchpad.
+
+Drives `call_model` with a scripted chat model through an investigation of
+`--steps` tool calls. When the `think` tool is bound, the model thinks through
+it before every step (one extra LLM call and tools round-trip each). When it
+is not bound, the model writes its reasoning inline in `<thinking>` next to
+the tool call. Tool results come back instantly, so the numbers only count
+model calls and prompt size.
+
+Usage:
+    python benchmarks/bench_scratchpad.py --steps 6
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from react_agent.scratchpad import THINK_TOOL, add_thoughts
+from react_agent.state import State
+from react_agent.tools import think
+
+# `react_agent.graph` 被套件匯出的同名圖物件遮蔽，直接取模組
+graph = importlib.import_module("react_agent.graph")
+
+
+class ScriptedModel:
+    """A chat model that runs `steps` tool calls, then answers."""
+
+    def __init__(self, steps: int) -> None:
+        """Answer after `steps` tool calls."""
+        self.steps = steps
+        self.calls = 0
+        self.prompt_chars = 0
+        self.bound: List[str] = []
+
+    def bind_tools(self, tools: Sequence[Any]) -> ScriptedModel:
+        """Record the names of the bound tools; thinking goes through `think` if bound."""
+        self.bound = [getattr(t, "__name__", getattr(t, "name", "")) for t in tools]
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        """Think about the next step and call it, or answer after `steps` calls."""
+        self.calls += 1
+        self.prompt_chars += sum(len(str(m.content)) for m in messages)
+        done = sum(
+            1 for m in messages if isinstance(m, ToolMessage) and m.name != THINK_TOOL
+        )
+        if done >= self.steps:
+            return AIMessage(content="根因是 checkout 的資料庫連線池耗盡。")
+        call = {
+            "name": "query_prometheus",
+            "args": {"expr": f"q{done}"},
+            "id": f"q{done}",
+        }
+        thought = f"第 {done + 1} 步：檢查下一個指標"
+        if THINK_TOOL not in self.bound:
+            return AIMessage(
+                content=f"<thinking>{thought}</thinking>", tool_calls=[call]
+            )
+        last = messages[-1]
+        if isinstance(last, ToolMessage) and last.name == THINK_TOOL:
+            return AIMessage(content="", tool_calls=[call])
+        think_id = f"t{done}"
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {"name": THINK_TOOL, "args": {"thought": thought}, "id": think_id}
+            ],
+        )
+
+
+async def _investigate(steps: int, scratchpad: bool) -> Dict[str, int]:
+    model = ScriptedModel(steps)
+    graph.load_chat_model = lambda _name: model  # type: ignore[assignment]
+    graph._dynamic_tools = [think]
+    config = {"configurable": {"scratchpad": scratchpad, "metadata_preresolve": False}}
+    node = RunnableLambda(graph.call_model)
+    state = State(messages=[HumanMessage(content="checkout 為什麼變慢？")])
+    super_steps = 0
+    while True:
+        update = await node.ainvoke(state, config=config)
+        super_steps += 1
+        state.scratchpad = add_thoughts(state.scratchpad, update.get("scratchpad", []))
+        response = update["messages"][-1]
+        messages: List[Any] = [*state.messages, response]
+        if not response.tool_calls:
+            state.messages = messages
+            break
+        for call in response.tool_calls:
+            content = call["args"].get("thought", "ok")
+            messages.append(
+                ToolMessage(content=content, tool_call_id=call["id"], name=call["name"])
+            )
+        super_steps += 1
+        state.messages = messages
+    return {
+        "llm_calls": model.calls,
+        "super_steps": super_steps,
+        "prompt_chars": model.prompt_chars,
+        "thoughts": len(state.scratchpad),
+    }
+
+
+async def _run(steps: int) -> None:
+    baseline = await _investigate(steps, scratchpad=False)
+    scratchpad = await _investigate(steps, scratchpad=True)
+    print(f"investigation with {steps} tool steps")
+    print(
+        f"{'mode':<12}{'llm calls':>12}{'super-steps':>14}{'prompt chars':>15}{'thoughts':>10}"
+    )
+    for name, result in (("think tool", baseline), ("scratchpad", scratchpad)):
+        print(
+            f"{name:<12}{result['llm_calls']:>12}{result['super_steps']:>14}"
+            f"{result['prompt_chars']:>15}{result['thoughts']:>10}"
+        )
+    saved = 1 - scratchpad["llm_calls"] / baseline["llm_calls"]
+    print(
+        f"LLM calls saved: {baseline['llm_calls'] - scratchpad['llm_calls']} ({saved:.0%})"
+    )
+
+
+def main() -> None:
+    """Run both modes and print the LLM call counts."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--steps", type=int, default=6)
+    args = parser.parse_args()
+    asyncio.run(_run(args.steps))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Compare the request build time of `CachedChatOpenAI` and stock `ChatOpenAI`.
+
+Builds a thread of `--messages` messages where every third message is a tool
+result of about `--kb` KB, then times `_get_request_payload` (the part of a
+model call that turns the history into the request body) for `--steps`
+steps, each adding one message, like consecutive `call_model` steps do.
+
+`--expanded` tool results are rebuilt before every call, the way
+`tool_compression.expand_messages` restores compressed results, so the cache
+cannot reuse them.
+
+Usage:
+    python benchmarks/bench_serialization.py --messages 61 --kb 280
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from typing import Any, Callable, Dict, List
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_openai import ChatOpenAI
+
+from react_agent.serialization import CachedChatOpenAI, drop_thread_cache
+
+
+def _history(messages: int, kb: int) -> List[BaseMessage]:
+    history: List[BaseMessage] = [SystemMessage(content="system " * 500)]
+    for i in range(1, messages):
+        if i % 3 == 1:
+            call = {
+                "name": "query_loki_logs",
+                "args": {"logql": f"{{n={i}}}"},
+                "id": f"c{i}",
+            }
+            history.append(AIMessage(content="", tool_calls=[call], id=f"a{i}"))
+        elif i % 3 == 2:
+            line = f'{{"line": "level=error msg=timeout n={i}"}},'
+            content = "[" + line * (kb * 1024 // len(line)) + "{}]"
+            history.append(
+                ToolMessage(content=content, tool_call_id=f"c{i - 1}", id=f"t{i}")
+            )
+        else:
+            history.append(HumanMessage(content=f"繼續調查 {i}", id=f"h{i}"))
+    return history
+
+
+def _rebuild(history: List[BaseMessage], expanded: int) -> List[BaseMessage]:
+    # 最前面的 `expanded` 個工具結果每次呼叫都是新的副本（如同解壓縮後的結果）
+    rebuilt: List[BaseMessage] = []
+    for message in history:
+        if isinstance(message, ToolMessage) and expanded > 0:
+            expanded -= 1
+            content = str(message.content).encode().decode()
+            message = message.model_copy(update={"content": content})
+        rebuilt.append(message)
+    return rebuilt
+
+
+def _bench(
+    build: Callable[[List[BaseMessage]], Dict[str, Any]],
+    history: List[BaseMessage],
+    steps: int,
+    expanded: int,
+) -> float:
+    total = 0.0
+    for step in range(steps):
+        messages = _rebuild(history[: len(history) - steps + step + 1], expanded)
+        start = time.perf_counter()
+        build(messages)
+        total += time.perf_counter() - start
+    return total / steps
+
+
+def main() -> None:
+    """Run the benchmark and print the per-request build time."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=61)
+    parser.add_argument("--kb", type=int, default=280, help="Size of each tool result.")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--expanded", type=int, default=2)
+    args = parser.parse_args()
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+    history = _history(args.messages, args.kb)
+    size = sum(len(str(m.content)) for m in history)
+    stock = ChatOpenAI(model="gpt-4o-mini")
+    cached = CachedChatOpenAI(model="gpt-4o-mini")
+    print(f"{args.messages} messages, {size / 2**20:.1f} MB of content")
+    for expanded in (0, args.expanded):
+        drop_thread_cache(None)
+        results = {
+            "ChatOpenAI": _bench(
+                stock._get_request_payload, history, args.steps, expanded
+            ),
+            "CachedChatOpenAI": _bench(
+                cached._get_request_payload, history, args.steps, expanded
+            ),
+        }
+        baseline = results["ChatOpenAI"]
+        print(f"request build time per step ({expanded} tool results rebuilt per call)")
+        for name, seconds in results.items():
+            print(
+                f"  {name:<18} {seconds * 1e3:>8.3f} ms  ({baseline / seconds:>5.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
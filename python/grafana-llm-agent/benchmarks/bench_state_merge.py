@@ -0,0 +1,72 @@
+"""Compare message merge cost of `add_messages_fast` and stock `add_messages`.
+
+Simulates a thread growing to `--messages` messages one update at a time and
+times the last updates, where stock `add_messages` pays for the whole history.
+
+Usage:
+    python benchmarks/bench_state_merge.py --messages 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Any, Callable, List
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph import add_messages
+
+from react_agent.message_log import add_messages_fast, bounded_add_messages
+
+
+def _history(n: int) -> List[Any]:
+    messages: List[Any] = []
+    for i in range(n):
+        if i % 3 == 0:
+            messages.append(HumanMessage(content=f"question {i}", id=f"m{i}"))
+        elif i % 3 == 1:
+            messages.append(
+                AIMessage(
+                    content="",
+                    id=f"m{i}",
+                    tool_calls=[{"name": "query_loki_logs", "args": {}, "id": f"c{i}"}],
+                )
+            )
+        else:
+            messages.append(
+                ToolMessage(content="x" * 200, tool_call_id=f"c{i - 1}", id=f"m{i}")
+            )
+    return messages
+
+
+def _bench(reducer: Callable[[Any, Any], Any], history: List[Any], tail: int) -> float:
+    state: Any = reducer([], history[:-tail])
+    start = time.perf_counter()
+    for message in history[-tail:]:
+        state = reducer(state, [message])
+    return (time.perf_counter() - start) / tail
+
+
+def main() -> None:
+    """Run the benchmark and print the per-update merge cost."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--tail", type=int, default=200, help="Updates to time.")
+    args = parser.parse_args()
+
+    history = _history(args.messages)
+    results = {
+        "add_messages": _bench(add_messages, history, args.tail),
+        "add_messages_fast": _bench(add_messages_fast, history, args.tail),
+        "bounded_add_messages(1000)": _bench(
+            bounded_add_messages(1000), history, args.tail
+        ),
+    }
+    baseline = results["add_messages"]
+    print(f"merge cost per single-message update at {args.messages} messages")
+    for name, seconds in results.items():
+        print(f"  {name:<28} {seconds * 1e6:>10.1f} us  ({baseline / seconds:>6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Measure memory per thread and CPU cost of compressed tool results.
+
+Each thread holds `--results` tool results of about `--kb` KB (Loki log lines
+and Prometheus range series). For every codec this reports:
+
+- memory: bytes the thread's messages take in the process (tracemalloc);
+- checkpoint: size of the thread's messages as serialized by the checkpointer;
+- compress: CPU time to compress one result when the tool returns;
+- expand: CPU time to restore the whole history before each model call.
+
+Usage:
+    python benchmarks/bench_tool_compression.py --results 10 --kb 256
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, List, Optional
+
+from langchain_core.messages import BaseMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from react_agent.tool_compression import (
+    BUILTIN_DICTIONARY_ID,
+    ZLIB,
+    ZSTD,
+    compress_message,
+    default_codec,
+    expand_messages,
+)
+
+
+def _loki(rng: random.Random, lines: int) -> str:
+    return json.dumps(
+        [
+            {
+                "timestamp": str(1_700_000_000_000_000_000 + i * rng.randint(1, 10**9)),
+                "line": f'level={rng.choice(["info", "warn", "error"])} msg="request done" '
+                f"trace_id={rng.getrandbits(64):016x} duration={rng.randint(1, 5000)}ms "
+                f"status={rng.choice([200, 200, 200, 404, 500])}",
+                "labels": {
+                    "service_name": rng.choice(["checkout", "payments", "cart"]),
+                    "pod": f"checkout-{rng.getrandbits(20):05x}",
+                    "level": "info",
+                },
+            }
+            for i in range(lines)
+        ]
+    )
+
+
+def _prometheus(rng: random.Random, points: int) -> str:
+    series = [
+        {
+            "metric": {
+                "__name__": "http_requests_total",
+                "pod": f"api-{s}",
+                "code": "200",
+            },
+            "values": [
+                [1_700_000_000 + 15 * i, f"{rng.random() * 100:.3f}"]
+                for i in range(points)
+            ],
+        }
+        for s in range(20)
+    ]
+    return json.dumps({"resultType": "matrix", "result": series})
+
+
+def _results(count: int, kb: int) -> List[str]:
+    rng = random.Random(7)
+    results = []
+    for i in range(count):
+        text = _loki(rng, kb * 5) if i % 2 == 0 else _prometheus(rng, kb * 3)
+        results.append(text[: kb * 1024])
+    return results
+
+
+def _thread(results: List[str]) -> List[ToolMessage]:
+    # 每個執行緒有自己的一份結果字串（如同剛從 MCP 收到）
+    return [
+        ToolMessage(
+            content=text.encode().decode(),
+            tool_call_id=f"c{i}",
+            name="query_loki_logs",
+            id=f"t{i}",
+        )
+        for i, text in enumerate(results)
+    ]
+
+
+def _measure(build: Callable[[], List[BaseMessage]]) -> tuple:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = build()
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return messages, memory
+
+
+def main() -> None:
+    """Print the memory and CPU cost of each codec."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--results", type=int, default=10)
+    parser.add_argument("--kb", type=int, default=256)
+    args = parser.parse_args()
+
+    results = _results(args.results, args.kb)
+    raw_bytes = sum(len(r) for r in results)
+    serde = JsonPlusSerializer()
+    codecs: List[tuple] = [("none", None, None)]
+    if default_codec() == ZSTD:
+        codecs += [("zstd", ZSTD, None), ("zstd+dict", ZSTD, BUILTIN_DICTIONARY_ID)]
+    codecs += [("zlib", ZLIB, None), ("zlib+dict", ZLIB, BUILTIN_DICTIONARY_ID)]
+
+    print(
+        f"{args.results} tool results of {args.kb} KB per thread ({raw_bytes / 1e6:.1f} MB)"
+    )
+    print(
+        f"{'codec':<11}{'memory (MB)':>12}{'checkpoint (MB)':>17}"
+        f"{'compress (ms/MB)':>18}{'expand (ms/step)':>18}"
+    )
+    for name, codec, dictionary in codecs:
+
+        def build(
+            codec: Optional[str] = codec, dictionary: Any = dictionary
+        ) -> List[BaseMessage]:
+            messages = _thread(results)
+            if codec is None:
+                return list(messages)
+            return [
+                compress_message(m, min_size=1, codec=codec, dictionary_id=dictionary)
+                for m in messages
+            ]
+
+        started = time.process_time()
+        messages, memory = _measure(build)
+        compress_seconds = time.process_time() - started
+        checkpoint = len(serde.dumps_typed(messages)[1])
+        started = time.process_time()
+        for _ in range(5):
+            expand_messages(messages)
+        expand_seconds = (time.process_time() - started) / 5
+        per_mb = compress_seconds / (raw_bytes / 1e6) * 1e3 if codec else 0.0
+        print(
+            f"{name:<11}{memory / 1e6:>12.2f}{checkpoint / 1e6:>17.2f}"
+            f"{per_mb:>18.1f}{expand_seconds * 1e3:>18.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
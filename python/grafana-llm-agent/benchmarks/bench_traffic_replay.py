@@ -0,0 +1,184 @@
+"""Capture a run's MCP and LLM traffic, then replay it at several speeds.
+
+The capture runs the graph against a stub MCP server whose tools take
+`--tool-latency` seconds and return `--log-lines` log lines, with a scripted
+model taking `--model-latency` seconds per step. The replays serve the
+capture from `react_agent.replay` (stand-in MCP server and replay model) at
+1x, 10x and with no wait, and report the wall time of each and how it splits
+between `call_model` and the tool node, plus the payloads replayed.
+
+Usage:
+    python benchmarks/bench_traffic_replay.py --investigations 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent import tools as agent_tools
+from react_agent.mcp_sessions import MCPSessionManager
+from react_agent.mcp_stub import serve_stub
+from react_agent.metrics import METRICS
+from react_agent.replay import ReplayChatModel, serve_replay
+from react_agent.traffic import get_traffic_recorder, read_traffic
+
+graph = importlib.import_module("react_agent.graph")
+
+SERVICES = ["checkout", "cart", "payments", "inventory"]
+
+
+def _stub_tools(latency: float, lines: int) -> Dict[str, Any]:
+    async def list_datasources() -> List[Dict[str, Any]]:
+        await asyncio.sleep(latency)
+        return [
+            {"uid": "loki-prod", "type": "loki"},
+            {"uid": "prom-prod", "type": "prometheus"},
+        ]
+
+    async def query_loki_logs(datasourceUid: str, logql: str) -> List[Dict[str, Any]]:
+        await asyncio.sleep(latency)
+        return [
+            {
+                "line": f'level=error msg="upstream timeout" trace_id={i:032x}',
+                "timestamp": str(i),
+            }
+            for i in range(lines)
+        ]
+
+    return {"list_datasources": list_datasources, "query_loki_logs": query_loki_logs}
+
+
+class Investigator:
+    """Lists the datasources, queries the service's logs, then answers."""
+
+    def __init__(self, latency: float) -> None:
+        """Answer each call after `latency` seconds."""
+        self.latency = latency
+
+    def bind_tools(self, tools: Sequence[Any]) -> Investigator:
+        """Ignore the tools; the script already knows which to call."""
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        """Call the next tool in the script, or answer once both have run."""
+        await asyncio.sleep(self.latency)
+        question = next(m for m in reversed(messages) if isinstance(m, HumanMessage))
+        service = str(question.content).split()[0]
+        done = {m.name for m in messages if m.type == "tool"}
+        if "list_datasources" not in done:
+            call = {"name": "list_datasources", "args": {}, "id": "c1"}
+        elif "query_loki_logs" not in done:
+            args = {
+                "datasourceUid": "loki-prod",
+                "logql": f'{{service_name="{service}"}} |= "error"',
+            }
+            call = {"name": "query_loki_logs", "args": args, "id": "c2"}
+        else:
+            return AIMessage(content=f"{service} 的上游逾時錯誤持續增加")
+        return AIMessage(content="", tool_calls=[call])
+
+
+async def _investigate(
+    url: str, model: Any, investigations: int, configurable: Dict[str, Any]
+) -> Dict[str, Any]:
+    manager = MCPSessionManager({"grafana-mcp": {"url": url, "transport": "sse"}})
+    mcp_tools = await manager.get_tools(interceptors=agent_tools.MCP_TOOL_INTERCEPTORS)
+    graph.load_chat_model = lambda _name: model
+    graph._dynamic_tools = mcp_tools
+    compiled = graph.build_react_graph(mcp_tools).compile(checkpointer=InMemorySaver())
+    nodes: Counter[str] = Counter()
+    started = time.perf_counter()
+    for i in range(investigations):
+        config = {
+            "configurable": {
+                "thread_id": f"t{i}",
+                "metadata_preresolve": False,
+                "knowledge_max_facts": 0,
+                "range_query_cache": False,
+                **configurable,
+            }
+        }
+        question = HumanMessage(content=f"{SERVICES[i % len(SERVICES)]} 最近有錯誤嗎？")
+        step = time.perf_counter()
+        async for update in compiled.astream(
+            {"messages": [question]}, config, stream_mode="updates"
+        ):
+            now = time.perf_counter()
+            for node in update:
+                nodes[node] += now - step
+            step = now
+    seconds = time.perf_counter() - started
+    await manager.aclose()
+    return {"seconds": seconds, "nodes": nodes}
+
+
+async def _capture(args: argparse.Namespace, path: Path) -> Dict[str, Any]:
+    with serve_stub(_stub_tools(args.tool_latency, args.log_lines)) as url:
+        run = await _investigate(
+            url,
+            Investigator(args.model_latency),
+            args.investigations,
+            {"traffic_capture_path": str(path), "loki_guard_max_bytes": 0},
+        )
+    recorder = get_traffic_recorder(str(path))
+    assert recorder is not None
+    recorder.close()
+    return run
+
+
+async def _replay(args: argparse.Namespace, path: Path, speed: float) -> Dict[str, Any]:
+    with serve_replay(path, speed) as url:
+        model = ReplayChatModel.from_file(path, speed=speed)
+        return await _investigate(
+            url, model, args.investigations, {"loki_guard_max_bytes": 0}
+        )
+
+
+def main() -> None:
+    """Print the wall time of the live run and of the replays."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--investigations", type=int, default=3)
+    parser.add_argument("--model-latency", type=float, default=0.5)
+    parser.add_argument("--tool-latency", type=float, default=0.2)
+    parser.add_argument("--log-lines", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "capture.jsonl.gz"
+        runs = {"live (capture)": asyncio.run(_capture(args, path))}
+        records = list(read_traffic(path))
+        for speed in (1.0, 10.0, 0.0):
+            METRICS.reset()
+            runs[f"replay {speed:g}x" if speed else "replay no wait"] = asyncio.run(
+                _replay(args, path, speed)
+            )
+        misses = METRICS.counter("traffic_replay_calls", kind="mcp", match="missing")
+        size = path.stat().st_size
+
+    kinds = Counter(r["kind"] for r in records)
+    payload = sum(len(str(r.get("result", ""))) for r in records if r["kind"] == "mcp")
+    print(
+        f"capture: {kinds['llm']} LLM calls, {kinds['mcp']} MCP calls, "
+        f"{payload / 1e6:.2f} MB of tool results, {size / 1e3:.0f} KB on disk (gzip)"
+    )
+    print(f"{'run':<18}{'wall (s)':>10}{'call_model (s)':>16}{'tools (s)':>11}")
+    for name, run in runs.items():
+        nodes = run["nodes"]
+        print(
+            f"{name:<18}{run['seconds']:>10.2f}{nodes['call_model']:>16.2f}{nodes['tools']:>11.2f}"
+        )
+    print(f"tool calls without a captured result in the last replay: {misses:g}")
+
+
+if __name__ == "__main__":
+    main()
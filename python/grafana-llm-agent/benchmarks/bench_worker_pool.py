@@ -0,0 +1,105 @@
+"""Measure run throughput of the worker pool as the number of processes grows.
+
+Each run parses a large JSON payload (like a big MCP query result) and
+re-serializes it, then waits `--io-ms` for a simulated provider call. With one
+process the CPU-bound part of every concurrent run shares one event loop;
+the pool spreads runs over processes by `thread_id`.
+
+Usage:
+    python benchmarks/bench_worker_pool.py --workers 1,2,4 --runs 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from langgraph.graph import StateGraph
+from typing_extensions import TypedDict
+
+from react_agent.worker_pool import WorkerPool
+
+# 模擬 Loki 查詢結果：約 2 MB 的日誌行
+_PAYLOAD = json.dumps(
+    [
+        {
+            "timestamp": str(1_700_000_000_000_000_000 + i),
+            "line": f"level=error msg=timeout id={i}",
+            "labels": {"service_name": "checkout", "pod": f"checkout-{i % 50}"},
+        }
+        for i in range(15_000)
+    ]
+)
+_IO_SECONDS = float(os.environ.get("BENCH_IO_SECONDS", "0.05"))
+
+
+class RunState(TypedDict):
+    """State of a benchmark run: the number of log lines it parsed."""
+
+    lines: int
+
+
+async def _investigate(state: RunState) -> Dict[str, Any]:
+    await asyncio.sleep(_IO_SECONDS)
+    logs = json.loads(_PAYLOAD)
+    errors = [entry for entry in logs if "error" in entry["line"]]
+    json.dumps(errors)
+    return {"lines": len(errors)}
+
+
+def build_graph() -> Any:
+    """Build the benchmark graph; imported by the workers."""
+    builder = StateGraph(RunState)
+    builder.add_node("investigate", _investigate)
+    builder.add_edge("__start__", "investigate")
+    return builder.compile()
+
+
+async def _throughput(pool: WorkerPool, runs: int) -> float:
+    # 先讓每個工作進程建好圖
+    await asyncio.gather(
+        *(
+            pool.ainvoke({"lines": 0}, {"configurable": {"thread_id": f"warm-{i}"}})
+            for i in range(16)
+        )
+    )
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            pool.ainvoke({"lines": 0}, {"configurable": {"thread_id": f"t{i}"}})
+            for i in range(runs)
+        )
+    )
+    return runs / (time.perf_counter() - started)
+
+
+async def _run(workers: List[int], runs: int) -> None:
+    target = f"{Path(__file__).stem}:build_graph"
+    print(
+        f"{runs} concurrent runs, ~{len(_PAYLOAD) / 1e6:.1f} MB JSON each, {os.cpu_count()} CPUs"
+    )
+    print(f"{'processes':>10}{'runs/s':>10}{'speedup':>10}")
+    baseline = None
+    for count in workers:
+        with WorkerPool(target, processes=count) as pool:
+            rate = await _throughput(pool, runs)
+        baseline = baseline or rate
+        print(f"{count:>10}{rate:>10.1f}{rate / baseline:>9.1f}x")
+
+
+def main() -> None:
+    """Run the benchmark for each worker count."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--runs", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(_run([int(n) for n in args.workers.split(",")], args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""Soak test: drive thousands of threads through the graph and watch memory.
+
+The graph is built the way the agent builds it (`graph.create_graph()`, so
+the module-level MCP client, tool lists and compiled graph are the real
+ones) against a stub Grafana MCP server, with a scripted model that lists
+the datasources, queries a service's logs and metrics and answers. Every
+thread has a new thread ID and asks about one of `--services` services, so
+the shared caches see both repeated and new keys.
+
+After `--warmup` threads, allocations start being traced and RSS and the
+`tracemalloc` total are sampled every `--sample-every` threads. The exit
+status is 1 when either grows steadily by more than its budget per thread
+(see `react_agent.memory_watch`); the report lists the call sites whose
+allocations grew most since the warm-up. Tracing slows the run down a few
+times, more so with more `--frames`.
+
+`--checkpointer memory` compiles the graph with an `InMemorySaver`, which
+keeps every thread's checkpoints. `--checkpointer memory-evict` does the same
+but deletes each thread when it finishes, like `agent.py` does through
+`InterruptParking(forget_finished=True)`.
+
+Usage:
+    python benchmarks/soak.py --threads 2000 --concurrency 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.mcp_stub import serve_stub
+from react_agent.memory_watch import MemoryWatcher, detect_growth
+
+graph = importlib.import_module("react_agent.graph")
+
+
+def _stub_tools(log_lines: int) -> Dict[str, Any]:
+    def list_datasources(type: str = "") -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": 1,
+                "uid": "loki-prod",
+                "name": "Loki",
+                "type": "loki",
+                "isDefault": False,
+            },
+            {
+                "id": 2,
+                "uid": "prom-prod",
+                "name": "Prom",
+                "type": "prometheus",
+                "isDefault": True,
+            },
+        ]
+
+    def list_loki_label_names(
+        datasourceUid: str, startRfc3339: str = "", endRfc3339: str = ""
+    ) -> List[str]:
+        return ["app", "namespace", "pod", "service_name"]
+
+    def list_loki_label_values(
+        datasourceUid: str, labelName: str, startRfc3339: str = "", endRfc3339: str = ""
+    ) -> List[str]:
+        return [f"svc-{i}" for i in range(50)]
+
+    def list_prometheus_label_names(datasourceUid: str) -> List[str]:
+        return ["__name__", "job", "instance", "service"]
+
+    def list_prometheus_label_values(datasourceUid: str, labelName: str) -> List[str]:
+        return [f"svc-{i}" for i in range(50)]
+
+    def list_prometheus_metric_names(
+        datasourceUid: str, regex: str = "", limit: int = 0, page: int = 0
+    ) -> List[str]:
+        return ["http_requests_total", "http_request_duration_seconds_bucket"]
+
+    def query_loki_stats(
+        datasourceUid: str, logql: str, startRfc3339: str = "", endRfc3339: str = ""
+    ) -> Dict[str, int]:
+        return {
+            "streams": 3,
+            "chunks": 12,
+            "entries": log_lines,
+            "bytes": log_lines * 120,
+        }
+
+    def query_loki_logs(
+        datasourceUid: str,
+        logql: str,
+        startRfc3339: str = "",
+        endRfc3339: str = "",
+        limit: int = 100,
+        direction: str = "",
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "line": f'level=error msg="upstream timeout" n={i} {logql}',
+                "timestamp": str(i),
+            }
+            for i in range(log_lines)
+        ]
+
+    def query_prometheus(
+        datasourceUid: str,
+        expr: str,
+        startTime: str = "",
+        endTime: str = "",
+        stepSeconds: int = 60,
+        queryType: str = "range",
+    ) -> List[Dict[str, Any]]:
+        values = [[1700000000 + 60 * i, str(i % 7)] for i in range(60)]
+        return [{"metric": {"__name__": "http_requests_total"}, "values": values}]
+
+    def search_dashboards(query: str) -> List[Dict[str, Any]]:
+        return [
+            {"uid": f"dash-{query}", "title": f"{query} overview", "type": "dash-db"}
+        ]
+
+    tools = (
+        list_datasources,
+        list_loki_label_names,
+        list_loki_label_values,
+        list_prometheus_label_names,
+        list_prometheus_label_values,
+        list_prometheus_metric_names,
+        query_loki_stats,
+        query_loki_logs,
+        query_prometheus,
+        search_dashboards,
+    )
+    return {fn.__name__: fn for fn in tools}
+
+
+class ScriptedModel:
+    """Lists the datasources, queries the service's logs and metrics, then answers."""
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> ScriptedModel:
+        """Ignore the tools; the script already knows which to call."""
+        return self
+
+    def bind(self, **kwargs: Any) -> ScriptedModel:
+        """Ignore the call options, such as `max_tokens`."""
+        return self
+
+    async def ainvoke(
+        self, messages: Sequence[BaseMessage], **kwargs: Any
+    ) -> AIMessage:
+        """Call the next tool in the script, or answer once all have run."""
+        question = next(m for m in reversed(messages) if isinstance(m, HumanMessage))
+        service = str(question.content).split()[0]
+        done = {m.name for m in messages if m.type == "tool"}
+        logql = f'{{service_name="{service}"}} |= "error"'
+        expr = f'rate(http_requests_total{{service="{service}"}}[5m])'
+        steps = [
+            ("list_datasources", {}),
+            ("query_loki_logs", {"datasourceUid": "loki-prod", "logql": logql}),
+            ("query_prometheus", {"datasourceUid": "prom-prod", "expr": expr}),
+        ]
+        for name, args in steps:
+            if name not in done:
+                call = {"name": name, "args": args, "id": f"{name}-{len(messages)}"}
+                usage = {
+                    "input_tokens": 1000,
+                    "output_tokens": 20,
+                    "total_tokens": 1020,
+                }
+                return AIMessage(content="", tool_calls=[call], usage_metadata=usage)
+        return AIMessage(content=f"{service} 的上游逾時錯誤增加，請求量正常")
+
+
+async def _build(checkpointer: str) -> Any:
+    compiled = await graph.create_graph()
+    if checkpointer == "none":
+        return compiled
+    tools = await graph.get_dynamic_tools()
+    return graph.build_react_graph(tools).compile(checkpointer=InMemorySaver())
+
+
+async def _soak(args: argparse.Namespace, watcher: MemoryWatcher) -> None:
+    model = ScriptedModel()
+    graph.load_chat_model = lambda _name: model
+    compiled = await _build(args.checkpointer)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def investigate(number: int) -> None:
+        async with semaphore:
+            thread_id = f"soak-{number}"
+            question = f"svc-{number % args.services} 最近有錯誤嗎？（第 {number} 次）"
+            config = {
+                "configurable": {"thread_id": thread_id, "metadata_preresolve": False}
+            }
+            await compiled.ainvoke(
+                {"messages": [HumanMessage(content=question)]}, config
+            )
+            if args.checkpointer == "memory-evict":
+                await compiled.checkpointer.adelete_thread(thread_id)
+
+    done = 0
+    while done < args.threads:
+        batch = min(args.sample_every, args.threads - done)
+        await asyncio.gather(*(investigate(done + i) for i in range(batch)))
+        done += batch
+        if done == args.warmup:
+            # 暖機不追蹤配置（tracemalloc 會讓執行慢好幾倍），只追蹤之後仍存活的配置
+            watcher.start()
+            watcher.mark_baseline()
+        if done >= args.warmup:
+            sample = watcher.sample(done)
+            print(
+                f"{done:>8}{sample.seconds:>10.1f}{sample.rss / 2**20:>11.1f}"
+                f"{sample.traced / 2**20:>13.2f}",
+                flush=True,
+            )
+
+
+def main() -> None:
+    """Run the soak test and exit with 1 on sustained memory growth."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--services", type=int, default=50)
+    parser.add_argument("--log-lines", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument(
+        "--checkpointer", choices=["none", "memory", "memory-evict"], default="none"
+    )
+    parser.add_argument(
+        "--traced-budget", type=float, default=512, help="bytes per thread"
+    )
+    parser.add_argument(
+        "--rss-budget",
+        type=float,
+        default=8192,
+        help="bytes per thread (includes fragmentation)",
+    )
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=3)
+    args = parser.parse_args()
+    if args.warmup % args.sample_every or args.warmup >= args.threads:
+        parser.error(
+            "--warmup must be a multiple of --sample-every and below --threads"
+        )
+    logging.basicConfig(level=logging.ERROR)
+
+    watcher = MemoryWatcher(frames=args.frames)
+    print(f"{'threads':>8}{'time (s)':>10}{'RSS (MiB)':>11}{'traced (MiB)':>13}")
+    started = time.perf_counter()
+    with serve_stub(_stub_tools(args.log_lines)) as url:
+        # 讓 tools 模組的全域 MCP 客戶端連到本地替身
+        os.environ["GRAFANA_MCP_URL"] = url
+        asyncio.run(_soak(args, watcher))
+    elapsed = time.perf_counter() - started
+
+    budgets = {"traced": args.traced_budget, "rss": args.rss_budget}
+    growths = [
+        detect_growth(watcher.samples, m, budget) for m, budget in budgets.items()
+    ]
+    print(
+        f"\n{args.threads} threads in {elapsed:.0f} s ({args.threads / elapsed:.1f} threads/s)"
+    )
+    failed = False
+    for growth, budget in zip(growths, budgets.values()):
+        if growth is None:
+            print("too few samples after warm-up to judge growth")
+            continue
+        verdict = "SUSTAINED GROWTH" if growth.sustained else "ok"
+        failed |= growth.sustained
+        print(
+            f"{growth.measure:<7}{growth.bytes_per_unit:>10.0f} B/thread (budget {budget:.0f})"
+            f"{growth.total / 2**20:>+10.2f} MiB since warm-up  {verdict}"
+        )
+    print(
+        f"\ntop allocation growth since warm-up (threads {args.warmup} to {args.threads}):"
+    )
+    for line in watcher.top_growth(args.top):
+        print(f"  {line}")
+    watcher.stop()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,8 +9,12 @@ import os
 import logging
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.store.memory import InMemoryStore
 
-from react_agent.graph import get_graph, save_graph_visualization
+from react_agent.graph import build_react_graph, get_dynamic_tools
+from react_agent.parking import InterruptParking
+from react_agent.visualization import start_graph_visualization
 from react_agent.tools import parse_messages
 
 # 載入環境變數
@@ -23,6 +27,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 多久清除一次逾時未確認的執行緒（秒）
+PARKING_SWEEP_INTERVAL = 60
+
+
+async def create_parking(forget_finished: bool) -> InterruptParking:
+    """編譯帶檢查點的圖，並用 InterruptParking 執行
+
+    等待人工確認的執行緒停放在索引中，逾時（interrupt_expiry_seconds）後連同檢查點刪除；
+    forget_finished 時結束的執行緒也不保留檢查點，InMemorySaver 不會隨執行緒數成長。
+    檢查點只存在本程序中，停放索引也用同樣生命週期的 InMemoryStore。
+    """
+    tools = await get_dynamic_tools()
+    graph = build_react_graph(tools).compile(
+        checkpointer=InMemorySaver(), name="Grafana LLM Agent"
+    )
+    parking = InterruptParking(graph, InMemoryStore(), forget_finished=forget_finished)
+    parking.start(PARKING_SWEEP_INTERVAL)
+    return parking
+
+
+def _print_interrupts(result):
+    for pending in result.get("__interrupt__", []):
+        print(f"⏸️ 等待人工確認: {pending.value}")
+
 
 async def run_grafana_agent():
     """運行 Grafana 可觀測性診斷專家 Agent"""
@@ -30,12 +58,13 @@ async def run_grafana_agent():
     print("🚀 正在初始化 Grafana LLM Agent...")
     print("=" * 60)
     
+    parking = None
     try:
-        # 獲取編譯後的圖
-        graph = await get_graph()
+        # 獲取編譯後的圖（單次查詢，結束後不保留檢查點）
+        parking = await create_parking(forget_finished=True)
         
-        # 保存圖形可視化
-        save_graph_visualization(graph)
+        # 在背景執行緒以本地 SVG 保存圖形可視化，圖結構沒變時直接沿用已保存的文件
+        start_graph_visualization(parking.graph, "grafana_agent_graph.svg")
         
         print("✅ Grafana 可觀測性診斷專家已成功啟動！")
         print("=" * 60)
@@ -56,11 +85,12 @@ async def run_grafana_agent():
         print(f"🔍 正在處理查詢: {selected_query}")
         print("=" * 60)
         
-        # 執行查詢
-        agent_response = await graph.ainvoke(
+        # 執行查詢；遇到人工確認時執行緒會被停放
+        agent_response = await parking.run(
             {"messages": [HumanMessage(content=selected_query)]}, 
             config
         )
+        _print_interrupts(agent_response)
         
         # 解析並顯示所有消息
         print("\n📋 完整對話記錄:")
@@ -82,6 +112,9 @@ async def run_grafana_agent():
         print("1. 確保 Grafana MCP 服務正在運行")
         print("2. 檢查 .env 文件中的 API 金鑰")
         print("3. 確認 GRAFANA_MCP_URL 設定正確")
+    finally:
+        if parking is not None:
+            await parking.stop()
 
 
 async def interactive_mode():
@@ -90,8 +123,10 @@ async def interactive_mode():
     print("輸入 'quit' 或 'exit' 退出")
     print("=" * 60)
     
+    parking = None
     try:
-        graph = await get_graph()
+        # 互動模式延續同一段對話，保留結束的執行緒
+        parking = await create_parking(forget_finished=False)
         config = {"configurable": {"thread_id": "interactive"}}
         
         while True:
@@ -108,10 +143,14 @@ async def interactive_mode():
                 print(f"\n⏳ 正在處理: {user_input}")
                 print("-" * 40)
                 
-                result = await graph.ainvoke(
+                result = await parking.run(
                     {"messages": [HumanMessage(content=user_input)]},
                     config
                 )
+                while result.get("__interrupt__"):
+                    _print_interrupts(result)
+                    answer = input("✅ 是否確認？(y/n): ").strip().lower()
+                    result = await parking.resume("interactive", answer in ("y", "yes", "是"))
                 
                 # 顯示最終回應
                 final_message = result['messages'][-1]
@@ -125,6 +164,9 @@ async def interactive_mode():
     except Exception as e:
         logger.error(f"❌ 初始化失敗: {e}")
         print(f"❌ 無法啟動互動模式: {e}")
+    finally:
+        if parking is not None:
+            await parking.stop()
 
 
 def main():
@@ -2,8 +2,22 @@
 
 This module defines a custom reasoning and action agent graph.
 It invokes tools in a simple loop.
+
+`graph` is built on first access, so importing the package (or any of its
+modules) does not build the graph or connect to the MCP server.
 """
 
-from react_agent.graph import graph
+from typing import Any
 
 __all__ = ["graph"]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "graph":
+        import importlib
+
+        # import 子模組時會把 react_agent.graph 設成模組本身，這裡換回編譯好的圖
+        compiled = importlib.import_module("react_agent.graph").graph
+        globals()["graph"] = compiled
+        return compiled
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,159 @@
+"""Per-run wall-clock deadlines and token budgets.
+
+`State.is_last_step` only stops a run at `recursion_limit - 1` steps, however
+long they take and however many tokens they burn. A run budget adds two more
+limits, both from `Configuration`:
+
+- `run_timeout_seconds`: a deadline, fixed when the run starts;
+- `run_token_budget`: the tokens (prompt plus completion) all model calls of
+  the run may use.
+
+`call_model` caps each LLM call by the time and tokens left, and the
+`enforce_deadline` interceptor caps every MCP tool call by the deadline. Once
+less than the configured reserve is left, the graph routes to a final
+synthesis step, which answers from the evidence already gathered.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+
+from react_agent.configuration import Configuration
+from react_agent.metrics import METRICS
+from react_agent.range_cache import Handler
+
+if TYPE_CHECKING:
+    from langchain_mcp_adapters.interceptors import (
+        MCPToolCallRequest,
+        MCPToolCallResult,
+    )
+    from mcp.types import CallToolResult
+
+DEADLINE = "deadline"
+TOKENS = "tokens"
+
+
+@dataclass(frozen=True)
+class RunBudget:
+    """What one run may still spend."""
+
+    deadline: Optional[float] = None
+    """Epoch seconds the run must finish by, or None for no deadline."""
+    token_budget: Optional[int] = None
+    """Tokens the run may use in total, or None for no limit."""
+    tokens_used: int = 0
+    """Tokens used by the run's model calls so far."""
+
+    @classmethod
+    def start(cls, configuration: Configuration, now: float) -> RunBudget:
+        """Create the budget of a run starting at `now`."""
+        timeout = configuration.run_timeout_seconds
+        return cls(
+            deadline=now + timeout if timeout > 0 else None,
+            token_budget=configuration.run_token_budget or None,
+        )
+
+    def remaining_seconds(self, now: float) -> Optional[float]:
+        """Seconds left until the deadline (may be negative), or None."""
+        return None if self.deadline is None else self.deadline - now
+
+    def remaining_tokens(self) -> Optional[int]:
+        """Tokens left in the budget (may be negative), or None."""
+        return (
+            None if self.token_budget is None else self.token_budget - self.tokens_used
+        )
+
+    def exhausted(self, configuration: Configuration, now: float) -> Optional[str]:
+        """Which budget (`DEADLINE` or `TOKENS`) is down to its reserve, if any."""
+        seconds = self.remaining_seconds(now)
+        if seconds is not None and seconds <= configuration.budget_reserve_seconds:
+            return DEADLINE
+        tokens = self.remaining_tokens()
+        if tokens is not None and tokens <= configuration.budget_reserve_tokens:
+            return TOKENS
+        return None
+
+    def spend(self, tokens: int) -> RunBudget:
+        """Get the budget after using `tokens` more."""
+        return RunBudget(self.deadline, self.token_budget, self.tokens_used + tokens)
+
+
+def run_started(messages: Sequence[AnyMessage]) -> bool:
+    """Whether `messages` end with the user's message, i.e. a new run begins."""
+    return bool(messages) and isinstance(messages[-1], HumanMessage)
+
+
+def token_usage(message: AIMessage) -> int:
+    """Get the total tokens a model call reported, 0 if it reported none."""
+    usage = message.usage_metadata
+    return int(usage.get("total_tokens", 0)) if usage else 0
+
+
+def pending_tool_results(
+    messages: Sequence[AnyMessage], reason: str
+) -> List[ToolMessage]:
+    """Answer the unanswered tool calls of the last AI message as skipped.
+
+    Chat APIs reject a history with tool calls lacking results, so they must be
+    closed before the synthesis call.
+    """
+    if not messages or not isinstance(messages[-1], AIMessage):
+        return []
+    return [
+        ToolMessage(
+            content=f"未執行：執行預算（{reason}）即將用盡。",
+            tool_call_id=call["id"],
+            name=call["name"],
+            status="error",
+        )
+        for call in messages[-1].tool_calls
+    ]
+
+
+def _state_value(state: Any, key: str) -> Any:
+    if isinstance(state, dict):
+        return state.get(key)
+    return getattr(state, key, None)
+
+
+def _deadline_error(name: str) -> CallToolResult:
+    from mcp.types import CallToolResult, TextContent
+
+    payload = {
+        "error": "deadline_exceeded",
+        "message": f"執行期限已到，工具 {name} 未完成。",
+    }
+    return CallToolResult(
+        content=[
+            TextContent(type="text", text=json.dumps(payload, ensure_ascii=False))
+        ],
+        isError=True,
+    )
+
+
+async def enforce_deadline(
+    request: MCPToolCallRequest, handler: Handler
+) -> MCPToolCallResult:
+    """Cut an MCP tool call off at the deadline of the run that made it.
+
+    The deadline is read from the graph state of the calling tool node; calls
+    made outside a run (e.g. background syncs) are not limited.
+    """
+    deadline = _state_value(getattr(request.runtime, "state", None), "run_deadline")
+    if deadline is None:
+        return await handler(request)
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        METRICS.incr("run_deadline_tool_calls", outcome="skipped")
+        return _deadline_error(request.name)
+    try:
+        return await asyncio.wait_for(handler(request), remaining)
+    except TimeoutError:
+        METRICS.incr("run_deadline_tool_calls", outcome="timed_out")
+        return _deadline_error(request.name)
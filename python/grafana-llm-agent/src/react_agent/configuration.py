@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field, fields
-from typing import Annotated, List
+from typing import Annotated, List, Literal, Optional
 import os
 
 from langchain_core.runnables import ensure_config
@@ -24,6 +24,13 @@ class Configuration:
         },
     )
 
+    tenant_id: Optional[str] = field(
+        default=None,
+        metadata={
+            "description": "Tenant identifier used to look up a registered system prompt override."
+        },
+    )
+
     model: Annotated[str, {"__template_metadata__": {"kind": "llm"}}] = field(
         default="openai/gpt-4o-mini",
         metadata={
@@ -39,6 +46,21 @@ class Configuration:
         },
     )
 
+    search_cache_ttl: float = field(
+        default=300.0,
+        metadata={
+            "description": "Seconds to keep search results cached per normalized query. "
+            "Set to 0 to disable caching."
+        },
+    )
+
+    search_max_concurrency: int = field(
+        default=4,
+        metadata={
+            "description": "The maximum number of concurrent requests to the search API."
+        },
+    )
+
     # Grafana MCP 相關配置
     grafana_mcp_url: str = field(
         default_factory=lambda: os.getenv("GRAFANA_MCP_URL", "http://localhost:8001/sse"),
@@ -47,6 +69,14 @@ class Configuration:
         },
     )
 
+    grafana_mcp_transport: str = field(
+        default_factory=lambda: os.getenv("GRAFANA_MCP_TRANSPORT", "sse"),
+        metadata={
+            "description": "Transport used to reach the Grafana MCP server: "
+            "'sse' or 'streamable_http'."
+        },
+    )
+
     grafana_tools: List[str] = field(
         default_factory=lambda: [
             'list_loki_label_names',
@@ -71,6 +101,318 @@ class Configuration:
         },
     )
 
+    metadata_sync_interval: float = field(
+        default=600.0,
+        metadata={
+            "description": "Seconds between background syncs of the local label/metric "
+            "metadata index. Set to 0 to sync only on demand."
+        },
+    )
+
+    dashboard_sync_interval: float = field(
+        default=900.0,
+        metadata={
+            "description": "Seconds between incremental syncs of the local dashboard "
+            "catalog. Set to 0 to sync only on demand."
+        },
+    )
+
+    dashboard_revalidate_max_age: float = field(
+        default=6 * 3600.0,
+        metadata={
+            "description": "Seconds within which every catalog dashboard's version is "
+            "re-checked against Grafana; edits that only change panels or queries show up "
+            "within about this long. Lower values fetch more dashboards per sync. "
+            "0 re-checks only dashboard_revalidate_batch dashboards per sync."
+        },
+    )
+
+    dashboard_revalidate_batch: int = field(
+        default=50,
+        metadata={
+            "description": "Minimum number of unchanged dashboards re-checked per catalog sync."
+        },
+    )
+
+    local_index_sync_timeout: float = field(
+        default=10.0,
+        metadata={
+            "description": "Seconds the local lookup tools wait for the first background "
+            "sync of their index."
+        },
+    )
+
+    metadata_preresolve: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to resolve key:value targets in the user's message "
+            "against the metadata index before calling the model."
+        },
+    )
+
+    range_query_cache: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether to serve query_prometheus range queries and "
+            "query_loki_stats from a cache of time-bucket-aligned results."
+        },
+    )
+
+    loki_guard_max_bytes: int = field(
+        default=2 * 1024**3,
+        metadata={
+            "description": "Estimated bytes a query_loki_logs call may scan before its "
+            "time range is narrowed. Set to 0 to disable the cost guard."
+        },
+    )
+
+    loki_guard_max_streams: int = field(
+        default=5000,
+        metadata={
+            "description": "Estimated streams a query_loki_logs call may touch before "
+            "its line limit is capped."
+        },
+    )
+
+    loki_guard_min_window_seconds: float = field(
+        default=60.0,
+        metadata={
+            "description": "Smallest window the cost guard narrows to; queries too "
+            "expensive even then are refused with suggestions to refine them."
+        },
+    )
+
+    speculative_prefetch: bool = field(
+        default=False,
+        metadata={
+            "description": "Whether to prefetch likely follow-up read-only tool calls "
+            "while the model is thinking."
+        },
+    )
+
+    prefetch_max_calls: int = field(
+        default=4,
+        metadata={
+            "description": "Maximum number of speculative tool calls launched after each tool step."
+        },
+    )
+
+    scratchpad: bool = field(
+        default=True,
+        metadata={
+            "description": "Whether the model records its thoughts inline in a scratchpad "
+            "state field instead of calling the think tool."
+        },
+    )
+
+    scratchpad_max_thoughts: int = field(
+        default=5,
+        metadata={
+            "description": "How many of the most recent thoughts are shown to the model."
+        },
+    )
+
+    interrupt_expiry_seconds: int = field(
+        default=86400,
+        metadata={
+            "description": "How long a run parked on a human confirmation may wait "
+            "before its interrupt is abandoned and its checkpoints are deleted."
+        },
+    )
+
+    run_timeout_seconds: float = field(
+        default=0,
+        metadata={
+            "description": "Wall-clock budget of one run in seconds; model and MCP tool "
+            "calls are cut off at the deadline. 0 disables the deadline."
+        },
+    )
+
+    run_token_budget: int = field(
+        default=0,
+        metadata={
+            "description": "Tokens (prompt plus completion) all model calls of one run "
+            "may use. 0 disables the budget."
+        },
+    )
+
+    budget_reserve_seconds: float = field(
+        default=20,
+        metadata={
+            "description": "Once this little time is left before the deadline, the agent "
+            "stops investigating and writes its final answer."
+        },
+    )
+
+    budget_reserve_tokens: int = field(
+        default=4000,
+        metadata={
+            "description": "Once this few tokens are left in the budget, the agent stops "
+            "investigating and writes its final answer."
+        },
+    )
+
+    fanout_max_concurrency: int = field(
+        default=4,
+        metadata={
+            "description": "How many per-target sub-investigations the fan-out graph "
+            "runs at once."
+        },
+    )
+
+    llm_max_concurrency: int = field(
+        default=16,
+        metadata={
+            "description": "Upper bound of the adaptive number of concurrent LLM calls in "
+            "this process. 0 disables the LLM scheduler."
+        },
+    )
+
+    llm_requests_per_minute: int = field(
+        default=0,
+        metadata={
+            "description": "LLM provider request rate limit shared by all runs. 0 means "
+            "unlimited."
+        },
+    )
+
+    llm_tokens_per_minute: int = field(
+        default=0,
+        metadata={
+            "description": "LLM provider token rate limit shared by all runs. 0 means "
+            "unlimited."
+        },
+    )
+
+    llm_rate_limit_db: str = field(
+        default="",
+        metadata={
+            "description": "Path of a SQLite file to share the LLM rate limits between "
+            "processes. Empty keeps them per process."
+        },
+    )
+
+    llm_priority: Literal["interactive", "batch"] = field(
+        default="interactive",
+        metadata={
+            "description": "Scheduling class of this run's LLM calls; interactive calls "
+            "go ahead of batch sweeps."
+        },
+    )
+
+    offload_threshold_bytes: int = field(
+        default=256 * 1024,
+        metadata={
+            "description": "Tool results at least this large are processed in a worker "
+            "process instead of on the event loop. 0 disables offloading."
+        },
+    )
+
+    offload_max_workers: int = field(
+        default=2,
+        metadata={
+            "description": "Number of worker processes for offloaded tool-result processing."
+        },
+    )
+
+    loop_lag_interval_seconds: float = field(
+        default=0.5,
+        metadata={
+            "description": "How often to sample event-loop lag (event_loop_lag_seconds). "
+            "0 disables the monitor."
+        },
+    )
+
+    tool_result_compress_bytes: int = field(
+        default=64 * 1024,
+        metadata={
+            "description": "Tool results at least this many characters are kept compressed "
+            "in the state and checkpoints. 0 disables compression."
+        },
+    )
+
+    tool_result_dictionary_path: str = field(
+        default="",
+        metadata={
+            "description": "Compression dictionary trained on Grafana results "
+            "(tool_compression.train_dictionary). Empty uses the built-in one."
+        },
+    )
+
+    knowledge_db: str = field(
+        default="",
+        metadata={
+            "description": "SQLite file of environment facts (datasources, labels, dashboards) "
+            "learned from tool results and shared by all threads. Empty keeps them in memory."
+        },
+    )
+
+    knowledge_max_facts: int = field(
+        default=8,
+        metadata={
+            "description": "How many relevant known facts are shown to the model at the "
+            "start of each turn. 0 disables the knowledge store."
+        },
+    )
+
+    knowledge_min_score: float = field(
+        default=0.15,
+        metadata={
+            "description": "Minimum similarity between the user's message and a fact for "
+            "the fact to be shown."
+        },
+    )
+
+    knowledge_embed: str = field(
+        default="",
+        metadata={
+            "description": "Embedding model of the knowledge store, as provider:model "
+            "(e.g. openai:text-embedding-3-small). Empty uses local token hashing."
+        },
+    )
+
+    transcript_path: str = field(
+        default="",
+        metadata={
+            "description": "JSONL file the conversation is appended to, a few messages per "
+            "step. Empty disables the transcript."
+        },
+    )
+
+    transcript_compress: bool = field(
+        default=False,
+        metadata={"description": "Write the transcript gzip-compressed."},
+    )
+
+    transcript_max_bytes: int = field(
+        default=64 * 1024 * 1024,
+        metadata={
+            "description": "Rotate the transcript file once it is this large. 0 never rotates."
+        },
+    )
+
+    transcript_backups: int = field(
+        default=5,
+        metadata={"description": "How many rotated transcript files to keep."},
+    )
+
+    traffic_capture_path: str = field(
+        default_factory=lambda: os.getenv("TRAFFIC_CAPTURE_PATH", ""),
+        metadata={
+            "description": "JSONL file (gzip-compressed if it ends in .gz) every MCP tool call "
+            "and LLM call is recorded to, with its latency, for replay with "
+            "`react_agent.replay`. Empty disables the capture."
+        },
+    )
+
+    traffic_replay_speed: float = field(
+        default_factory=lambda: float(os.getenv("TRAFFIC_REPLAY_SPEED", "1")),
+        metadata={
+            "description": "How many times faster than captured a `replay/<capture file>` "
+            "model answers: 1 keeps the captured latency, 0 answers immediately."
+        },
+    )
+
     @classmethod
     def from_context(cls) -> Configuration:
         """Create a Configuration instance from a RunnableConfig object."""
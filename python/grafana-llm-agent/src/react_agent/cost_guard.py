@@ -0,0 +1,243 @@
+"""Estimate the cost of Loki log queries before running them.
+
+A broad `query_loki_logs` can scan gigabytes. `LokiCostGuard` intercepts it,
+asks `query_loki_stats` how many bytes and streams the stream selector covers
+over exactly the requested window (one call, below the range cache), and
+then:
+
+- lets cheap queries through unchanged;
+- narrows expensive ones to the most recent part of the window that fits the
+  byte budget (assuming volume is spread evenly) and caps the line limit; a
+  `cost_guard` note block tells the model what changed;
+- refuses queries that would stay over budget even on a minimal window. It
+  returns a structured "too expensive, refine" result instead.
+
+Every decision and the estimated bytes avoided are recorded in `METRICS`.
+
+This module imports the MCP types; `react_agent.tools` loads it on the first
+guarded call, so importing the graph does not load `mcp`.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest, MCPToolCallResult
+from mcp.types import CallToolResult, TextContent
+
+from react_agent.loki_analysis import format_rfc3339_nano
+from react_agent.metrics import METRICS, MetricsRegistry
+from react_agent.range_cache import Handler, parse_time
+from react_agent.utils import decode_tool_result
+
+logger = logging.getLogger(__name__)
+
+# Grafana MCP 在未指定時間範圍時查詢最近一小時
+_DEFAULT_WINDOW = 3600.0
+
+
+@dataclass
+class CostLimits:
+    """Thresholds of the Loki cost guard."""
+
+    max_bytes: int = 2 * 1024**3
+    """Bytes a single query may scan before it is narrowed."""
+    max_streams: int = 5000
+    """Streams a single query may touch before its line limit is capped."""
+    min_window_seconds: float = 60.0
+    """Narrowing never goes below this window; beyond it the query is refused."""
+    capped_limit: int = 50
+    """Line limit applied to queries over `max_streams`."""
+
+
+def stream_selector(logql: str) -> Optional[str]:
+    """Get the leading `{...}` stream selector of a LogQL log query."""
+    text = logql.strip()
+    if not text.startswith("{"):
+        return None
+    quote: Optional[str] = None
+    escaped = False
+    for position, char in enumerate(text):
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\" and quote == '"':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in '"`':
+            quote = char
+        elif char == "}":
+            return text[: position + 1]
+    return None
+
+
+def _result(payload: Dict[str, Any]) -> CallToolResult:
+    return CallToolResult(
+        content=[TextContent(type="text", text=json.dumps(payload, ensure_ascii=False))]
+    )
+
+
+def guard_rejection(result: Any) -> Optional[Dict[str, Any]]:
+    """Get the guard's refusal from a `query_loki_logs` result, if it was refused."""
+    decoded = decode_tool_result(result)
+    if isinstance(decoded, dict):
+        guard = decoded.get("cost_guard")
+        if isinstance(guard, dict) and guard.get("status") == "too_expensive":
+            return decoded
+    return None
+
+
+class LokiCostGuard:
+    """Intercept `query_loki_logs` and keep its scan volume under budget."""
+
+    def __init__(
+        self,
+        limits: Optional[CostLimits] = None,
+        *,
+        metrics: MetricsRegistry = METRICS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Guard with `limits` (or the defaults), recording into `metrics`."""
+        self.limits = limits or CostLimits()
+        self.metrics = metrics
+        self.clock = clock
+
+    async def _estimate(
+        self,
+        request: MCPToolCallRequest,
+        handler: Handler,
+        selector: str,
+        start: float,
+        end: float,
+    ) -> Optional[Dict[str, Any]]:
+        stats_request = MCPToolCallRequest(
+            name="query_loki_stats",
+            args={
+                "datasourceUid": request.args.get("datasourceUid"),
+                "logql": selector,
+                "startRfc3339": format_rfc3339_nano(int(start * 1e9)),
+                "endRfc3339": format_rfc3339_nano(int(end * 1e9)),
+            },
+            server_name=request.server_name,
+            headers=request.headers,
+            runtime=request.runtime,
+        )
+        try:
+            result = await handler(stats_request)
+        except Exception as e:
+            logger.warning(f"無法估算 Loki 查詢成本: {e!r}")
+            return None
+        if not isinstance(result, CallToolResult) or result.isError:
+            return None
+        stats = decode_tool_result([block.model_dump() for block in result.content])
+        return stats if isinstance(stats, dict) and "bytes" in stats else None
+
+    async def interceptor(
+        self, request: MCPToolCallRequest, handler: Handler
+    ) -> MCPToolCallResult:
+        """Check `query_loki_logs` calls against the limits; pass others through."""
+        return await self.guard(request, handler)
+
+    async def guard(
+        self,
+        request: MCPToolCallRequest,
+        handler: Handler,
+        limits: Optional[CostLimits] = None,
+    ) -> MCPToolCallResult:
+        """Like `interceptor`, but with per-call `limits` overriding `self.limits`."""
+        if request.name != "query_loki_logs":
+            return await handler(request)
+
+        args = request.args
+        now = self.clock()
+        end = parse_time(args.get("endRfc3339") or "now", now)
+        start = parse_time(args.get("startRfc3339"), now)
+        if end is not None and start is None:
+            start = end - _DEFAULT_WINDOW
+        selector = stream_selector(str(args.get("logql", "")))
+        if selector is None or start is None or end is None or end <= start:
+            self.metrics.incr("loki_guard_decisions", decision="unchecked")
+            return await handler(request)
+
+        stats = await self._estimate(request, handler, selector, start, end)
+        if stats is None:
+            # 估算失敗時放行，避免守衛本身成為故障點
+            self.metrics.incr("loki_guard_decisions", decision="unchecked")
+            return await handler(request)
+
+        limits = limits or self.limits
+        estimated_bytes = float(stats.get("bytes") or 0)
+        streams = int(stats.get("streams") or 0)
+        self.metrics.observe("loki_guard_estimated_bytes", estimated_bytes)
+        window = end - start
+        new_args = dict(args)
+        changes: Dict[str, Any] = {}
+
+        if estimated_bytes > limits.max_bytes:
+            narrowed = window * limits.max_bytes / estimated_bytes
+            if narrowed < limits.min_window_seconds:
+                self.metrics.incr("loki_guard_decisions", decision="rejected")
+                self.metrics.incr("loki_guard_bytes_avoided", estimated_bytes)
+                return _result(
+                    {
+                        "cost_guard": {
+                            "status": "too_expensive",
+                            "estimated_bytes": int(estimated_bytes),
+                            "estimated_streams": streams,
+                            "window_seconds": round(window),
+                            "max_bytes": limits.max_bytes,
+                        },
+                        "message": "查詢範圍過大，已拒絕執行。請縮小範圍後重試。",
+                        "suggestions": [
+                            "在 stream selector 中加入更多標籤條件（例如 service_name、namespace、level）",
+                            '加入行過濾條件，例如 |= "error"',
+                            f"把時間範圍縮短到約 {max(1, round(narrowed))} 秒以內",
+                            "先用 query_loki_stats 或 analyze_loki_logs 了解日誌量與分佈",
+                        ],
+                    }
+                )
+            new_start = end - narrowed
+            new_args["startRfc3339"] = format_rfc3339_nano(int(new_start * 1e9))
+            new_args.setdefault("endRfc3339", format_rfc3339_nano(int(end * 1e9)))
+            changes["startRfc3339"] = new_args["startRfc3339"]
+            self.metrics.incr(
+                "loki_guard_bytes_avoided", estimated_bytes - limits.max_bytes
+            )
+
+        if streams > limits.max_streams:
+            limit = int(args.get("limit") or limits.capped_limit)
+            if limit > limits.capped_limit:
+                new_args["limit"] = limits.capped_limit
+                changes["limit"] = limits.capped_limit
+
+        if not changes:
+            self.metrics.incr("loki_guard_decisions", decision="allowed")
+            return await handler(request)
+
+        self.metrics.incr("loki_guard_decisions", decision="narrowed")
+        result = await handler(request.override(args=new_args))
+        if isinstance(result, CallToolResult) and not result.isError:
+            note = {
+                "cost_guard": {
+                    "status": "narrowed",
+                    "estimated_bytes": int(estimated_bytes),
+                    "estimated_streams": streams,
+                    "changes": changes,
+                },
+            }
+            result = result.model_copy(
+                update={
+                    "content": [
+                        TextContent(
+                            type="text", text=json.dumps(note, ensure_ascii=False)
+                        ),
+                        *result.content,
+                    ]
+                }
+            )
+        return result
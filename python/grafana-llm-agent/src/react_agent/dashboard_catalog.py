@@ -0,0 +1,507 @@
+"""A local, full-text searchable catalog of Grafana dashboards.
+
+Finding "the panel that shows X" otherwise means `search_dashboards` followed
+by several `get_dashboard_by_uid` calls whose full JSON the LLM has to read.
+`DashboardCatalog` keeps every dashboard's title, tags, folder and panels
+(with their PromQL/LogQL/SQL queries) in an inverted index and answers with
+the matching panels and queries directly. `DashboardCatalogSyncer` keeps it
+up to date, re-indexing a dashboard only when its version changes. Every
+result says how long ago its dashboard was last verified against Grafana,
+since edits that only touch panels can take a while to show up (see
+`DashboardCatalogSyncer`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from react_agent.metadata_index import ToolCaller
+from react_agent.periodic import PeriodicSync
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[0-9a-z]+(?:[_:][0-9a-z]+)*")
+# 各欄位的權重：標題 > 面板標題、標籤 > 資料夾 > 查詢表達式
+_WEIGHTS = {"title": 3.0, "tag": 2.0, "panel": 2.0, "folder": 1.0, "expr": 1.0}
+# 面板查詢裡可能存放表達式的欄位（Prometheus/Loki 用 expr，其他數據源各有不同）
+_QUERY_FIELDS = ("expr", "query", "rawSql", "rawQuery", "logql", "promql")
+_MAX_EXPR = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """Split `text` into lower-case search tokens.
+
+    Identifiers such as `http_requests_total` yield the whole identifier and
+    each of its parts, so both `http_requests_total` and `requests` match.
+    """
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        word = match.group(0)
+        tokens.append(word)
+        if "_" in word or ":" in word:
+            tokens.extend(part for part in re.split(r"[_:]", word) if part)
+    return tokens
+
+
+@dataclass
+class PanelQuery:
+    """One query of a panel."""
+
+    ref_id: str
+    expr: str
+    datasource: Optional[str] = None
+
+
+@dataclass
+class PanelDoc:
+    """A panel and its queries."""
+
+    id: Optional[int]
+    title: str
+    type: str
+    queries: List[PanelQuery] = field(default_factory=list)
+
+
+@dataclass
+class DashboardDoc:
+    """The searchable parts of one dashboard."""
+
+    uid: str
+    title: str
+    version: int
+    tags: List[str] = field(default_factory=list)
+    folder: str = ""
+    url: str = ""
+    panels: List[PanelDoc] = field(default_factory=list)
+    # 上次向 Grafana 確認這個版本的時間（epoch 秒）；0 表示未確認
+    verified_at: float = 0.0
+
+
+def _datasource_ref(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        return value.get("uid") or value.get("type")
+    return str(value) if value else None
+
+
+def _iter_panels(panels: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+    for panel in panels:
+        if not isinstance(panel, dict):
+            continue
+        yield panel
+        # Collapsed rows keep their children inside the row panel.
+        yield from _iter_panels(panel.get("panels") or [])
+
+
+def parse_dashboard(data: Dict[str, Any]) -> DashboardDoc:
+    """Build a `DashboardDoc` from a `get_dashboard_by_uid` result.
+
+    Accepts both `{"dashboard": {...}, "meta": {...}}` and the bare dashboard
+    JSON; legacy `rows[].panels` layouts and collapsed rows are flattened.
+    """
+    dashboard = data.get("dashboard", data)
+    meta = data.get("meta") or {}
+    raw_panels = list(dashboard.get("panels") or [])
+    for row in dashboard.get("rows") or []:
+        raw_panels.extend(row.get("panels") or [])
+    panels = []
+    for panel in _iter_panels(raw_panels):
+        if panel.get("type") == "row":
+            continue
+        panel_ds = _datasource_ref(panel.get("datasource"))
+        queries = []
+        for target in panel.get("targets") or []:
+            expr = next((target[f] for f in _QUERY_FIELDS if target.get(f)), None)
+            if isinstance(expr, str):
+                queries.append(
+                    PanelQuery(
+                        ref_id=str(target.get("refId", "")),
+                        expr=expr[:_MAX_EXPR],
+                        datasource=_datasource_ref(target.get("datasource"))
+                        or panel_ds,
+                    )
+                )
+        panels.append(
+            PanelDoc(
+                id=panel.get("id"),
+                title=str(panel.get("title") or ""),
+                type=str(panel.get("type") or ""),
+                queries=queries,
+            )
+        )
+    return DashboardDoc(
+        uid=str(dashboard.get("uid") or meta.get("uid") or ""),
+        title=str(dashboard.get("title") or ""),
+        version=int(dashboard.get("version") or meta.get("version") or 0),
+        tags=[str(t) for t in dashboard.get("tags") or []],
+        folder=str(meta.get("folderTitle") or ""),
+        url=str(meta.get("url") or ""),
+        panels=panels,
+    )
+
+
+# 倒排索引的文件：(dashboard uid, 面板在 panels 中的位置；-1 代表整個儀表板)
+_DocKey = Tuple[str, int]
+# 出現在超過這個比例文件中的詞只用來給已命中的文件加分
+_COMMON_TOKEN_RATIO = 0.02
+
+
+class DashboardCatalog:
+    """An inverted index over dashboards and their panels.
+
+    Every dashboard contributes one document for itself (title, tags, folder)
+    and one per panel (panel title and query expressions, plus the dashboard
+    title at a lower weight). Scores are TF-IDF-like sums over the query
+    tokens.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty catalog."""
+        self.dashboards: Dict[str, DashboardDoc] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._keys: Dict[int, _DocKey] = {}
+        # 每個儀表板的文件 ID 範圍與出現過的詞，用於移除
+        self._owned: Dict[str, Tuple[range, Tuple[str, ...]]] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        """Get the number of dashboards in the catalog."""
+        return len(self.dashboards)
+
+    def version_of(self, uid: str) -> Optional[int]:
+        """Get the indexed version of dashboard `uid`, if present."""
+        doc = self.dashboards.get(uid)
+        return None if doc is None else doc.version
+
+    def _post(
+        self, tokens: Dict[str, None], doc_id: int, text: str, weight: float
+    ) -> None:
+        for token in tokenize(text):
+            tokens[token] = None
+            docs = self._postings.setdefault(token, {})
+            docs[doc_id] = docs.get(doc_id, 0.0) + weight
+
+    def upsert(self, doc: DashboardDoc) -> None:
+        """Add `doc`, replacing any previous version of the same dashboard."""
+        self.remove(doc.uid)
+        tokens: Dict[str, None] = {}
+        ids = range(self._next_id, self._next_id + 1 + len(doc.panels))
+        self._next_id = ids.stop
+        header = ids[0]
+        self._keys[header] = (doc.uid, -1)
+        self._post(tokens, header, doc.title, _WEIGHTS["title"])
+        self._post(tokens, header, doc.folder, _WEIGHTS["folder"])
+        for tag in doc.tags:
+            self._post(tokens, header, tag, _WEIGHTS["tag"])
+        for position, panel in enumerate(doc.panels):
+            doc_id = ids[position + 1]
+            self._keys[doc_id] = (doc.uid, position)
+            self._post(tokens, doc_id, panel.title, _WEIGHTS["panel"])
+            for query in panel.queries:
+                self._post(tokens, doc_id, query.expr, _WEIGHTS["expr"])
+            # 讓「儀表板標題 + 面板」組合的查詢也能命中面板
+            self._post(tokens, doc_id, doc.title, _WEIGHTS["title"] / 4)
+        self.dashboards[doc.uid] = doc
+        self._owned[doc.uid] = (ids, tuple(tokens))
+
+    def remove(self, uid: str) -> None:
+        """Drop dashboard `uid` from the catalog."""
+        if self.dashboards.pop(uid, None) is None:
+            return
+        ids, tokens = self._owned.pop(uid)
+        for token in tokens:
+            docs = self._postings.get(token)
+            if docs is None:
+                continue
+            for doc_id in ids:
+                docs.pop(doc_id, None)
+            if not docs:
+                del self._postings[token]
+        for doc_id in ids:
+            del self._keys[doc_id]
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Find the panels and dashboards best matching `query`.
+
+        Returns:
+            Up to `limit` results, best first. Panel results include the
+            panel's queries; dashboard results list their panel titles.
+        """
+        found = [
+            (token, self._postings[token])
+            for token in dict.fromkeys(tokenize(query))
+            if token in self._postings
+        ]
+        if not found:
+            return []
+        found.sort(key=lambda item: len(item[1]))
+        documents = len(self._keys)
+        common = max(1000, int(documents * _COMMON_TOKEN_RATIO))
+        scores: Dict[int, float] = {}
+        for position, (token, docs) in enumerate(found):
+            idf = math.log(1 + documents / len(docs))
+            if position and len(docs) > common:
+                # 常見詞（如 rate、total）只為已命中的文件加分，避免掃描大半個索引
+                for doc_id in scores:
+                    weight = docs.get(doc_id)
+                    if weight is not None:
+                        scores[doc_id] += weight * idf
+            else:
+                for doc_id, weight in docs.items():
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight * idf
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [self._result(self._keys[doc_id], score) for doc_id, score in best]
+
+    def _result(self, key: _DocKey, score: float) -> Dict[str, Any]:
+        uid, position = key
+        doc = self.dashboards[uid]
+        result: Dict[str, Any] = {
+            "dashboardUid": uid,
+            "dashboardTitle": doc.title,
+            "folder": doc.folder,
+            "url": doc.url,
+            "score": round(score, 3),
+            "verifiedSecondsAgo": (
+                round(time.time() - doc.verified_at) if doc.verified_at else None
+            ),
+        }
+        if position < 0:
+            result["tags"] = doc.tags
+            result["panels"] = [p.title for p in doc.panels]
+            return result
+        panel = doc.panels[position]
+        result.update(
+            panelId=panel.id,
+            panelTitle=panel.title,
+            panelType=panel.type,
+            queries=[
+                {"refId": q.ref_id, "expr": q.expr, "datasource": q.datasource}
+                for q in panel.queries
+            ],
+        )
+        return result
+
+
+def _as_page(result: Any) -> List[Any]:
+    if isinstance(result, dict):
+        result = result.get("dashboards") or result.get("hits") or []
+    return result if isinstance(result, list) else []
+
+
+def _as_hits(page: List[Any]) -> List[Dict[str, Any]]:
+    return [
+        hit
+        for hit in page
+        if isinstance(hit, dict)
+        and hit.get("uid")
+        and hit.get("type", "dash-db") == "dash-db"
+    ]
+
+
+@dataclass
+class _Listing:
+    title: str
+    tags: Tuple[str, ...]
+    folder: str
+    url: str = ""
+    checked_at: float = 0.0
+
+
+class DashboardCatalogSyncer(PeriodicSync):
+    """Keep a `DashboardCatalog` in sync with Grafana through the MCP tools.
+
+    Each sync lists all dashboards with `search_dashboards`, `page_size` at a
+    time until a short page (folders count towards the page). New dashboards,
+    and those whose title, tags or folder changed, are fetched with
+    `get_dashboard_by_uid`. Search hits carry no version, so an edit that
+    only changes panels or queries is invisible in the listing: unchanged
+    dashboards are revalidated in batches, least recently checked first, and
+    re-indexed only if their version changed.
+
+    The batch is sized so that every dashboard is re-checked about once per
+    `revalidate_max_age` seconds, given the time since the previous sync,
+    but holds at least `revalidate_batch` dashboards. This trades Grafana
+    load for freshness: with 10,000 dashboards synced every 900 s and a
+    6-hour max age, each sync fetches about 420 dashboards, and a panel-only
+    edit is picked up within about 6 hours. Search results carry
+    `verifiedSecondsAgo` so the model can tell how current a panel's queries
+    are.
+
+    Deleted dashboards are removed, but only when the listing was complete:
+    if a page fails or `max_pages` is reached, dashboards missing from the
+    listing are kept.
+    """
+
+    name = "儀表板目錄"
+
+    def __init__(
+        self,
+        catalog: DashboardCatalog,
+        call_tool: ToolCaller,
+        *,
+        revalidate_batch: int = 50,
+        revalidate_max_age: float = 6 * 3600.0,
+        max_concurrency: int = 4,
+        page_size: int = 1000,
+        max_pages: int = 100,
+    ) -> None:
+        """Sync into `catalog` through `call_tool(name, arguments)`.
+
+        Args:
+            catalog: The catalog to keep in sync.
+            call_tool: Calls an MCP tool by name with arguments.
+            revalidate_batch: Minimum number of unchanged dashboards whose
+                version is re-checked per sync.
+            revalidate_max_age: Seconds within which every dashboard should
+                be re-checked; 0 re-checks only `revalidate_batch` per sync.
+            max_concurrency: Maximum number of dashboard fetches in flight.
+            page_size: Dashboards per `search_dashboards` page.
+            max_pages: Maximum number of pages listed per sync.
+        """
+        super().__init__()
+        self.catalog = catalog
+        self.call_tool = call_tool
+        self.revalidate_batch = revalidate_batch
+        self.revalidate_max_age = revalidate_max_age
+        self.max_concurrency = max_concurrency
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.last_sync: float = 0.0
+        self._listings: Dict[str, _Listing] = {}
+
+    @property
+    def ready(self) -> bool:
+        """Whether a full listing has been synced at least once."""
+        return self.last_sync > 0
+
+    async def sync_once(self) -> Dict[str, Any]:
+        """Sync the catalog once.
+
+        Returns:
+            Counts of listed, added, updated, unchanged, removed and fetched
+            dashboards, whether the listing was complete and the duration in
+            seconds.
+        """
+        start = time.perf_counter()
+        listed, complete = await self._list_dashboards()
+        stats: Dict[str, Any] = {
+            "listed": len(listed),
+            "added": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "removed": 0,
+        }
+        if complete:
+            for uid in [uid for uid in self.catalog.dashboards if uid not in listed]:
+                self.catalog.remove(uid)
+                self._listings.pop(uid, None)
+                stats["removed"] += 1
+        stats["complete"] = complete
+
+        changed: List[str] = []
+        for uid, hit in listed.items():
+            listing = _Listing(
+                title=str(hit.get("title") or ""),
+                tags=tuple(hit.get("tags") or ()),
+                folder=str(hit.get("folderTitle") or ""),
+                url=str(hit.get("url") or ""),
+            )
+            previous = self._listings.get(uid)
+            if previous is None or uid not in self.catalog.dashboards:
+                changed.append(uid)
+            elif (previous.title, previous.tags, previous.folder) != (
+                listing.title,
+                listing.tags,
+                listing.folder,
+            ):
+                changed.append(uid)
+            else:
+                listing.checked_at = previous.checked_at
+            self._listings[uid] = listing
+
+        pending = set(changed)
+        stale = sorted(
+            (uid for uid in listed if uid not in pending),
+            key=lambda uid: self._listings[uid].checked_at,
+        )[: self._revalidate_count(len(listed))]
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        outcomes = await asyncio.gather(
+            *(self._fetch(uid, semaphore) for uid in [*changed, *stale]),
+            return_exceptions=True,
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                logger.warning(f"同步儀表板失敗: {outcome!r}")
+            else:
+                stats[outcome] += 1
+        stats["fetched"] = len(changed) + len(stale)
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        self.last_sync = time.time()
+        return stats
+
+    def _revalidate_count(self, listed: int) -> int:
+        """Get how many unchanged dashboards to re-check in this sync."""
+        if self.revalidate_max_age <= 0 or not self.last_sync:
+            return self.revalidate_batch
+        # 依距上次同步的時間，讓每個儀表板大約每 revalidate_max_age 秒確認一次
+        elapsed = max(time.time() - self.last_sync, 0.0)
+        return max(
+            self.revalidate_batch, math.ceil(listed * elapsed / self.revalidate_max_age)
+        )
+
+    async def _list_dashboards(self) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+        """List the dashboards page by page.
+
+        Returns:
+            The hits by UID and whether the listing is complete.
+        """
+        listed: Dict[str, Dict[str, Any]] = {}
+        seen: set[str] = set()
+        for page_number in range(1, self.max_pages + 1):
+            arguments = {"query": "", "limit": self.page_size, "page": page_number}
+            try:
+                page = _as_page(await self.call_tool("search_dashboards", arguments))
+            except Exception as e:
+                if page_number == 1:
+                    raise
+                logger.warning(
+                    f"列出儀表板第 {page_number} 頁失敗，本次不移除儀表板: {e!r}"
+                )
+                return listed, False
+            uids = {str(hit.get("uid")) for hit in page if isinstance(hit, dict)}
+            # 短頁即最後一頁；整頁都是已見過的結果表示伺服器忽略分頁、已回傳全部
+            if page and uids <= seen:
+                return listed, True
+            seen |= uids
+            listed.update((str(hit["uid"]), hit) for hit in _as_hits(page))
+            if len(page) < self.page_size:
+                return listed, True
+        logger.warning(f"儀表板超過 {self.max_pages} 頁，本次不移除儀表板")
+        return listed, False
+
+    async def _fetch(self, uid: str, semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            data = await self.call_tool("get_dashboard_by_uid", {"uid": uid})
+        if not isinstance(data, dict):
+            raise ValueError(f"Unexpected get_dashboard_by_uid result for '{uid}'")
+        doc = parse_dashboard(data)
+        doc.uid = doc.uid or uid
+        listing = self._listings.get(uid)
+        if listing is not None:
+            listing.checked_at = time.time()
+            doc.folder = doc.folder or listing.folder
+            doc.url = doc.url or listing.url
+        doc.verified_at = time.time()
+        previous = self.catalog.version_of(uid)
+        if previous is not None and previous == doc.version:
+            self.catalog.dashboards[uid].verified_at = doc.verified_at
+            return "unchanged"
+        self.catalog.upsert(doc)
+        return "added" if previous is None else "updated"
@@ -0,0 +1,245 @@
+"""Fan-out graph: one sub-investigation per target, in parallel, then one report.
+
+Operators often ask for the same health analysis across many environments
+("check checkout health for service_country: zm, ng, ke"). The main graph
+handles that as one long sequential ReAct thread. The fan-out graph instead:
+
+1. `plan_targets` parses the label selectors to investigate from the question
+   (or takes `FanOutState.targets` as given);
+2. `route_targets` sends one `investigate` task per target with LangGraph
+   `Send`, so they all run in the same super-step;
+3. each `investigate` task runs the regular ReAct loop (`build_react_graph`)
+   on the question narrowed to its target, with at most
+   `Configuration.fanout_max_concurrency` running at once;
+4. `reduce_findings` merges the findings into a single report.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+import re
+import time
+from typing import Any, Dict, List, Sequence, Tuple, TypedDict, Union
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.graph import StateGraph
+from langgraph.pregel import Pregel
+from langgraph.types import Send
+
+from react_agent import prompts
+from react_agent.configuration import Configuration
+from react_agent.scratchpad import extract_thoughts
+from react_agent.state import FanOutState, Finding, InputState
+from react_agent.utils import get_message_text, load_chat_model
+
+logger = logging.getLogger(__name__)
+
+# `react_agent.graph` 被套件匯出的同名圖物件遮蔽，直接取模組
+_graph_module = importlib.import_module("react_agent.graph")
+
+_compiled_fanout_graph: Pregel[Any, Any, Any, Any] | None = None
+
+# `label: a, b, c` / `label=a/b/c` / `label in (a, b)`，至少兩個值
+_TARGET_LIST = re.compile(
+    r"([A-Za-z_][\w.]*)\s*(?:[:=]|\bin\b)\s*\(?\s*"
+    r"([\w.-]+(?:\s*(?:,|，|、|/|\band\b|\bor\b|和|及|與)\s*[\w.-]+)+)"
+)
+_VALUE_SEPARATOR = re.compile(r"\s*(?:,|，|、|/|\band\b|\bor\b|和|及|與)\s*")
+
+
+class InvestigationTask(TypedDict):
+    """The input of one `investigate` task."""
+
+    question: str
+    target: str
+
+
+def _selector(label: str, value: str) -> str:
+    return f'{label}="' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def parse_fanout_targets(text: str) -> List[str]:
+    """Get one label selector per value listed in `text`, e.g. `service_country="zm"`.
+
+    Only lists of two or more values count, as in `service_country: zm, ng, ke`.
+    """
+    targets: List[str] = []
+    for match in _TARGET_LIST.finditer(text):
+        label = match.group(1)
+        for value in _VALUE_SEPARATOR.split(match.group(2)):
+            selector = _selector(label, value)
+            if value and selector not in targets:
+                targets.append(selector)
+    return targets
+
+
+def _last_question(state: FanOutState) -> str:
+    for message in reversed(state.messages):
+        if isinstance(message, HumanMessage):
+            return get_message_text(message)
+    return ""
+
+
+def plan_targets(state: FanOutState) -> Dict[str, List[str]]:
+    """Parse the targets from the user's question unless they were given."""
+    if state.targets:
+        return {"targets": list(state.targets)}
+    return {"targets": parse_fanout_targets(_last_question(state))}
+
+
+def route_targets(state: FanOutState) -> Union[List[Send], str]:
+    """Send one `investigate` task per target, or investigate the question as a whole."""
+    question = _last_question(state)
+    if not state.targets:
+        return "investigate_all"
+    return [
+        Send("investigate", InvestigationTask(question=question, target=target))
+        for target in state.targets
+    ]
+
+
+_slots: Dict[Tuple[asyncio.AbstractEventLoop, int], asyncio.Semaphore] = {}
+
+
+def _fanout_slots(limit: int) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    key = (loop, limit)
+    if key not in _slots:
+        # 只保留當前事件迴圈的信號量
+        for stale in [k for k in _slots if k[0] is not loop]:
+            del _slots[stale]
+        _slots[key] = asyncio.Semaphore(limit)
+    return _slots[key]
+
+
+def _report(messages: Sequence[Any]) -> Tuple[str, int]:
+    tool_calls = sum(1 for m in messages if isinstance(m, ToolMessage))
+    answer = next((m for m in reversed(messages) if isinstance(m, AIMessage)), None)
+    if answer is None:
+        return "", tool_calls
+    answer, _ = extract_thoughts(answer)
+    return get_message_text(answer), tool_calls
+
+
+def build_fanout_graph(tools: Sequence[Any]) -> StateGraph[Any, Any, Any, Any]:
+    """Build the fan-out graph around a ReAct loop over `tools`, ready to compile."""
+    investigation: Pregel[Any, Any, Any, Any] = _graph_module.build_react_graph(
+        tools
+    ).compile(name="Grafana LLM Agent (investigation)")
+
+    async def investigate(state: InvestigationTask) -> Dict[str, List[Finding]]:
+        """Investigate the question for one target with the ReAct loop."""
+        configuration = Configuration.from_context()
+        question = prompts.FANOUT_TASK_PROMPT.format(
+            question=state["question"], target=state["target"]
+        )
+        async with _fanout_slots(max(1, configuration.fanout_max_concurrency)):
+            started = time.perf_counter()
+            try:
+                result = await investigation.ainvoke(
+                    {"messages": [HumanMessage(content=question)]}
+                )
+            except Exception as e:
+                logger.warning(f"目標 {state['target']} 的調查失敗: {e!r}")
+                return {
+                    "findings": [
+                        Finding(
+                            state["target"],
+                            "",
+                            seconds=time.perf_counter() - started,
+                            error=repr(e),
+                        )
+                    ]
+                }
+        report, tool_calls = _report(result["messages"])
+        return {
+            "findings": [
+                Finding(
+                    state["target"], report, tool_calls, time.perf_counter() - started
+                )
+            ]
+        }
+
+    async def investigate_all(state: FanOutState) -> Dict[str, Any]:
+        """Investigate the question as a whole when it names no targets."""
+        result = await investigation.ainvoke({"messages": list(state.messages)})
+        return {"messages": [result["messages"][-1]]}
+
+    builder: StateGraph[Any, Any, Any, Any] = StateGraph(
+        FanOutState, Configuration, input_schema=InputState
+    )
+    builder.add_node(plan_targets)
+    builder.add_node(investigate, input_schema=InvestigationTask)
+    builder.add_node(investigate_all)
+    builder.add_node(reduce_findings)
+    builder.add_edge("__start__", "plan_targets")
+    builder.add_conditional_edges(
+        "plan_targets", route_targets, ["investigate", "investigate_all"]
+    )
+    builder.add_edge("investigate", "reduce_findings")
+    builder.add_edge("reduce_findings", "__end__")
+    builder.add_edge("investigate_all", "__end__")
+    return builder
+
+
+def format_findings(findings: Sequence[Finding]) -> str:
+    """Render `findings` as the input of the reduce step, sorted by target."""
+    sections = []
+    for finding in sorted(findings, key=lambda f: f.target):
+        body = finding.report or f"（調查失敗：{finding.error}）"
+        sections.append(f"### {finding.target}\n{body}")
+    return "\n\n".join(sections)
+
+
+async def reduce_findings(state: FanOutState) -> Dict[str, List[AIMessage]]:
+    """Merge the findings of every target into a single report."""
+    configuration = Configuration.from_context()
+    model = load_chat_model(configuration.model)
+    response = await _graph_module.invoke_model(
+        model,
+        [
+            SystemMessage(content=prompts.FANOUT_REDUCE_PROMPT),
+            HumanMessage(
+                content=f"問題：{_last_question(state)}\n\n{format_findings(state.findings)}"
+            ),
+        ],
+        configuration,
+    )
+    response, _ = extract_thoughts(response)
+    return {"messages": [response]}
+
+
+async def create_fanout_graph() -> Pregel[Any, Any, Any, Any]:
+    """Create the fan-out graph with the dynamic tools (MCP tools included)."""
+    global _compiled_fanout_graph
+    if _compiled_fanout_graph is None:
+        tools = await _graph_module.get_dynamic_tools()
+        _compiled_fanout_graph = build_fanout_graph(tools).compile(
+            name="Grafana LLM Agent (fan-out)"
+        )
+    return _compiled_fanout_graph
+
+
+def _default_fanout_graph() -> Pregel[Any, Any, Any, Any]:
+    """Build the default fan-out graph, falling back to the static tools."""
+    try:
+        return asyncio.run(create_fanout_graph())
+    except Exception as e:
+        logger.error(f"無法創建扇出圖: {e}")
+        return build_fanout_graph(_graph_module.TOOLS).compile(
+            name="Grafana LLM Agent (fan-out, fallback)"
+        )
+
+
+# 與 graph 模組相同：fanout_graph 在第一次被存取時才建立，工具取自 MCP
+fanout_graph: Pregel[Any, Any, Any, Any]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "fanout_graph":
+        global fanout_graph
+        fanout_graph = _default_fanout_graph()
+        return fanout_graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,18 +4,55 @@ Works with a chat model with tool calling support.
 """
 
 from datetime import UTC, datetime
-from typing import Dict, List, Literal, cast
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Sequence, Union, cast
 import asyncio
+import functools
 import logging
+import time
 
-from langchain_core.messages import AIMessage
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import Runnable
 from langgraph.graph import StateGraph
 from langgraph.prebuilt import ToolNode
-
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.pregel import Pregel
+from langgraph.types import Command
+
+from react_agent import prompts
+from react_agent.budget import (
+    DEADLINE,
+    RunBudget,
+    pending_tool_results,
+    run_started,
+    token_usage,
+)
 from react_agent.configuration import Configuration
+from react_agent.knowledge import capture_knowledge, recall_knowledge
+from react_agent.llm_scheduler import estimate_tokens, get_llm_scheduler
+from react_agent.offload import LOOP_LAG
+from react_agent.scratchpad import (
+    compact_history,
+    extract_thoughts,
+    scratchpad_message,
+    thinking_instruction,
+    thought_only,
+)
 from react_agent.state import InputState, State
-from react_agent.tools import get_all_tools, TOOLS, parse_messages
-from react_agent.utils import load_chat_model
+from react_agent.templates import get_system_message, resolve_system_prompt
+from react_agent.tool_compression import compress_tool_results, expand_messages
+from react_agent.traffic import get_traffic_recorder
+from react_agent.tools import (
+    get_all_tools,
+    TOOLS,
+    parse_messages,
+    preresolve_targets,
+    speculate_after_tools,
+    think,
+)
+from react_agent.transcript import get_transcript_writer
+from react_agent.utils import current_thread_id, load_chat_model
+from react_agent.visualization import save_graph_visualization  # noqa: F401
 
 # 設置日誌
 logger = logging.getLogger(__name__)
@@ -24,6 +61,9 @@ logger = logging.getLogger(__name__)
 _dynamic_tools = None
 _compiled_graph = None
 
+# 模型只輸出思考時，在同一個節點內最多重問的次數
+_MAX_THOUGHT_ONLY_RETRIES = 2
+
 
 async def get_dynamic_tools():
     """Get dynamically loaded tools including MCP tools."""
@@ -38,8 +78,60 @@ async def get_dynamic_tools():
     return _dynamic_tools
 
 
+async def invoke_model(
+    model: Any, messages: Sequence[BaseMessage], configuration: Configuration
+) -> AIMessage:
+    """Invoke `model` on `messages` through the process-wide LLM scheduler.
+
+    The scheduler enforces the provider rate limits, adapts concurrency and
+    serves interactive runs before batch ones; see `react_agent.llm_scheduler`.
+    Compressed tool results are expanded here, right before they are sent.
+    With a traffic capture enabled the call is recorded, without the time it
+    waited in the scheduler.
+    """
+    messages = expand_messages(messages)
+
+    async def send() -> AIMessage:
+        return cast(AIMessage, await model.ainvoke(messages))
+
+    call: Callable[[], Awaitable[AIMessage]] = send
+    recorder = get_traffic_recorder(configuration.traffic_capture_path)
+    if recorder is not None:
+        call = recorder.wrap_model_call(messages, send)
+    scheduler = get_llm_scheduler(
+        configuration.llm_requests_per_minute,
+        configuration.llm_tokens_per_minute,
+        configuration.llm_max_concurrency,
+        configuration.llm_rate_limit_db,
+    )
+    if scheduler is None:
+        return await call()
+    return await scheduler.run(
+        call,
+        priority=configuration.llm_priority,
+        tokens=estimate_tokens(messages),
+        usage=token_usage,
+    )
+
+
+def record_transcript(configuration: Configuration, messages: Sequence[BaseMessage]) -> None:
+    """Append the messages of the current thread not yet in the transcript, if enabled."""
+    writer = get_transcript_writer(
+        configuration.transcript_path,
+        configuration.transcript_compress,
+        configuration.transcript_max_bytes,
+        configuration.transcript_backups,
+    )
+    if writer is None:
+        return
+    try:
+        writer.write(current_thread_id(), messages)
+    except OSError as e:
+        logger.warning(f"無法寫入對話記錄: {e!r}")
+
+
 # Define the function that calls the model
-async def call_model(state: State) -> Dict[str, List[AIMessage]]:
+async def call_model(state: State) -> Dict[str, Any]:
     """Call the LLM powering our "agent".
 
     This function prepares the prompt, initializes the model, and processes the response.
@@ -48,55 +140,197 @@ async def call_model(state: State) -> Dict[str, List[AIMessage]]:
         state (State): The current state of the conversation.
 
     Returns:
-        dict: A dictionary containing the model's response message.
+        dict: A dictionary containing the model's response message and any new thoughts.
     """
     configuration = Configuration.from_context()
+    if configuration.loop_lag_interval_seconds > 0:
+        LOOP_LAG.start(configuration.loop_lag_interval_seconds)
+
+    # 新一輪執行開始時重設期限與 token 用量
+    now = time.time()
+    if run_started(state.messages):
+        budget = RunBudget.start(configuration, now)
+    else:
+        budget = RunBudget(
+            state.run_deadline, configuration.run_token_budget or None, state.tokens_used
+        )
+    update: Dict[str, Any] = {
+        "run_deadline": budget.deadline,
+        "tokens_used": budget.tokens_used,
+        "budget_exhausted": None,
+    }
+    exhausted = budget.exhausted(configuration, now)
+    if exhausted:
+        # 預算只剩保留量，直接交給最終總結
+        update["budget_exhausted"] = exhausted
+        return update
 
     # 獲取動態工具
     tools = await get_dynamic_tools()
-    
+    if configuration.scratchpad:
+        # 思考改寫在回覆中，不再經過 think 工具
+        tools = [tool for tool in tools if tool is not think]
+
     # Initialize the model with tool binding. Change the model or add more tools here.
     model = load_chat_model(configuration.model).bind_tools(tools)
 
     # Format the system prompt. Customize this to change the agent's behavior.
-    system_message = configuration.system_prompt.format(
-        system_time=datetime.now(tz=UTC).isoformat()
+    # Templates are parsed once and the message is reused within the same minute.
+    system_message = get_system_message(
+        resolve_system_prompt(configuration.system_prompt, configuration.tenant_id),
+        datetime.now(tz=UTC),
+        thinking_instruction(configuration.scratchpad),
     )
 
+    # 在等待模型回應的同時預取可能的下一步唯讀工具呼叫
+    if configuration.speculative_prefetch:
+        await speculate_after_tools(state.messages)
+
+    # 用本地元數據索引預先解析用戶提到的 key:value 目標
+    context: List[BaseMessage] = [system_message]
+    if configuration.metadata_preresolve:
+        hint = await preresolve_targets(state.messages)
+        if hint is not None:
+            context.append(hint)
+
+    # 先前調查（包括其他執行緒）得到的環境事實，省去重複的探索步驟
+    knowledge = await recall_knowledge(state.messages, configuration)
+    if knowledge is not None:
+        context.append(knowledge)
+
+    history: Sequence[BaseMessage] = state.messages
+    if configuration.scratchpad:
+        history = compact_history(state.messages)
+
     # Get the model's response
-    response = cast(
-        AIMessage,
-        await model.ainvoke(
-            [{"role": "system", "content": system_message}, *state.messages]
-        ),
-    )
+    thoughts: List[str] = []
+    for attempt in range(_MAX_THOUGHT_ONLY_RETRIES + 1):
+        if attempt:
+            # 重問前重新檢查預算：上一次呼叫可能已用到保留量
+            exhausted = budget.exhausted(configuration, time.time())
+            if exhausted:
+                update["budget_exhausted"] = exhausted
+                update["scratchpad"] = thoughts
+                return update
+        limited = model
+        remaining_tokens = budget.remaining_tokens()
+        if remaining_tokens is not None:
+            # 為最終總結保留 token
+            limited = model.bind(
+                max_tokens=remaining_tokens - configuration.budget_reserve_tokens
+            )
+        scratchpad: List[BaseMessage] = []
+        if configuration.scratchpad:
+            recorded = scratchpad_message(
+                [*state.scratchpad, *thoughts], configuration.scratchpad_max_thoughts
+            )
+            if recorded is not None:
+                scratchpad = [recorded]
+        remaining = budget.remaining_seconds(time.time())
+        timeout = None if remaining is None else remaining - configuration.budget_reserve_seconds
+        try:
+            response = await asyncio.wait_for(
+                invoke_model(limited, [*context, *scratchpad, *history], configuration),
+                timeout,
+            )
+        except TimeoutError:
+            logger.warning("模型呼叫超過執行期限，改為最終總結")
+            update["budget_exhausted"] = DEADLINE
+            if thoughts:
+                update["scratchpad"] = thoughts
+            return update
+        budget = budget.spend(token_usage(response))
+        update["tokens_used"] = budget.tokens_used
+        if not configuration.scratchpad:
+            break
+        response, new_thoughts = extract_thoughts(response)
+        thoughts.extend(new_thoughts)
+        # 只有思考、沒有回答或工具呼叫時，帶著新的思考直接再問一次
+        if not (new_thoughts and thought_only(response)):
+            break
+
+    if thoughts:
+        update["scratchpad"] = thoughts
 
     # Handle the case when it's the last step and the model still wants to use a tool
     if state.is_last_step and response.tool_calls:
-        return {
-            "messages": [
-                AIMessage(
-                    id=response.id,
-                    content="抱歉，我在指定的步驟數內無法找到答案。請提供更多信息或簡化問題。",
-                )
-            ]
-        }
+        update["messages"] = [
+            AIMessage(
+                id=response.id,
+                content="抱歉，我在指定的步驟數內無法找到答案。請提供更多信息或簡化問題。",
+            )
+        ]
+    else:
+        # Return the model's response as a list to be added to existing messages
+        update["messages"] = [response]
+    record_transcript(configuration, [*state.messages, *update["messages"]])
+    return update
 
-    # Return the model's response as a list to be added to existing messages
-    return {"messages": [response]}
 
+_BUDGET_NAMES = {"deadline": "時間", "tokens": "token 額度"}
 
-def route_model_output(state: State) -> Literal["__end__", "tools"]:
+
+async def synthesize(state: State) -> Dict[str, List[BaseMessage]]:
+    """Write the final answer from the evidence gathered so far, without tools.
+
+    Runs when the run's deadline or token budget is down to its reserve.
+
+    Args:
+        state (State): The current state of the conversation.
+
+    Returns:
+        dict: Skipped results for any pending tool calls and the final answer.
+    """
+    configuration = Configuration.from_context()
+    reason = state.budget_exhausted or DEADLINE
+    skipped = pending_tool_results(state.messages, reason)
+    system_message = get_system_message(
+        resolve_system_prompt(configuration.system_prompt, configuration.tenant_id),
+        datetime.now(tz=UTC),
+        thinking_instruction(configuration.scratchpad),
+    )
+    instruction = prompts.SYNTHESIS_PROMPT.format(reason=_BUDGET_NAMES.get(reason, reason))
+    # 部分供應商（如 Anthropic）只接受開頭的一則系統消息，總結指示併入其中
+    system_message = SystemMessage(content=f"{system_message.content}\n\n{instruction}")
+    history = [*state.messages, *skipped]
+    if configuration.scratchpad:
+        history = compact_history(history)
+
+    model: Runnable[LanguageModelInput, BaseMessage] = load_chat_model(configuration.model)
+    if configuration.run_token_budget:
+        model = model.bind(max_tokens=configuration.budget_reserve_tokens)
+    # 有期限時，總結只能使用剩下的時間；只有 token 額度用盡時不限時間
+    timeout = None
+    if state.run_deadline is not None:
+        timeout = max(state.run_deadline - time.time(), 0.0)
+    try:
+        response = await asyncio.wait_for(
+            invoke_model(model, [system_message, *history], configuration), timeout
+        )
+    except TimeoutError:
+        logger.warning("最終總結超時")
+        response = AIMessage(
+            content="抱歉，本次調查的執行預算已用盡，未能完成總結。請縮小問題範圍後重試。"
+        )
+    response, _ = extract_thoughts(response)
+    record_transcript(configuration, [*history, response])
+    return {"messages": [*skipped, response]}
+
+
+def route_model_output(state: State) -> Literal["__end__", "tools", "synthesize"]:
     """Determine the next node based on the model's output.
 
-    This function checks if the model's last message contains tool calls.
+    This function checks if the run's budget ran out and if the model's last
+    message contains tool calls.
 
     Args:
         state (State): The current state of the conversation.
 
     Returns:
-        str: The name of the next node to call ("__end__" or "tools").
+        str: The name of the next node to call ("__end__", "tools" or "synthesize").
     """
+    if state.budget_exhausted:
+        return "synthesize"
     last_message = state.messages[-1]
     if not isinstance(last_message, AIMessage):
         raise ValueError(
@@ -109,31 +343,72 @@ def route_model_output(state: State) -> Literal["__end__", "tools"]:
     return "tools"
 
 
+def route_tool_output(state: State) -> Literal["call_model", "synthesize"]:
+    """Go back to the model, or to the final synthesis if the deadline is close.
+
+    Args:
+        state (State): The current state of the conversation.
+
+    Returns:
+        str: The name of the next node to call ("call_model" or "synthesize").
+    """
+    configuration = Configuration.from_context()
+    budget = RunBudget(
+        state.run_deadline, configuration.run_token_budget or None, state.tokens_used
+    )
+    if budget.exhausted(configuration, time.time()):
+        return "synthesize"
+    return "call_model"
+
+
+async def wrap_tool_call(
+    request: ToolCallRequest,
+    execute: Callable[[ToolCallRequest], Awaitable[Union[ToolMessage, Command[Any]]]],
+) -> Union[ToolMessage, Command[Any]]:
+    """Tool-node wrapper: learn facts from the raw result, then compress it."""
+    return await compress_tool_results(
+        request, functools.partial(capture_knowledge, execute=execute)
+    )
+
+
+def build_react_graph(tools: Sequence[Any]) -> StateGraph[Any, Any, Any, Any]:
+    """Build the ReAct loop around `tools`, ready to compile.
+
+    `call_model` and `tools` alternate until the model answers, or the run's
+    budget runs out and `synthesize` writes the final answer.
+    """
+    # Define a new graph
+    builder: StateGraph[Any, Any, Any, Any] = StateGraph(
+        State, Configuration, input_schema=InputState
+    )
+
+    # Define the two nodes we will cycle between
+    builder.add_node(call_model)
+    builder.add_node("tools", ToolNode(tools, awrap_tool_call=wrap_tool_call))
+
+    # Set the entrypoint as `call_model`
+    builder.add_edge("__start__", "call_model")
+
+    # Add a conditional edge to determine the next step after `call_model`
+    builder.add_conditional_edges(
+        "call_model",
+        route_model_output,
+    )
+
+    # After the tools, go back to `call_model` unless the run is out of time
+    builder.add_node(synthesize)
+    builder.add_conditional_edges("tools", route_tool_output)
+    builder.add_edge("synthesize", "__end__")
+    return builder
+
+
 async def create_graph():
     """Create the graph with dynamic tools."""
     global _compiled_graph
     if _compiled_graph is None:
         # 獲取動態工具
         tools = await get_dynamic_tools()
-        
-        # Define a new graph
-        builder = StateGraph(State, input=InputState, config_schema=Configuration)
-
-        # Define the two nodes we will cycle between
-        builder.add_node(call_model)
-        builder.add_node("tools", ToolNode(tools))
-
-        # Set the entrypoint as `call_model`
-        builder.add_edge("__start__", "call_model")
-
-        # Add a conditional edge to determine the next step after `call_model`
-        builder.add_conditional_edges(
-            "call_model",
-            route_model_output,
-        )
-
-        # Add a normal edge from `tools` to `call_model`
-        builder.add_edge("tools", "call_model")
+        builder = build_react_graph(tools)
 
         # Compile the builder into an executable graph
         # Note: In LangGraph Platform, persistence is handled automatically
@@ -144,21 +419,6 @@ async def create_graph():
     return _compiled_graph
 
 
-def save_graph_visualization(graph, filename: str = "grafana_agent_graph.png") -> None:
-    """保存狀態圖的可視化表示。
-
-    Args:
-        graph: 狀態圖實例。
-        filename: 保存文件路徑。
-    """
-    try:
-        with open(filename, "wb") as f:
-            f.write(graph.get_graph().draw_mermaid_png())
-        logger.info(f"Grafana Agent 圖形可視化已保存為 {filename}")
-    except Exception as e:
-        logger.warning(f"保存圖形可視化失敗: {e}")
-
-
 # 為了兼容性，我們提供一個同步的 graph 對象
 # 但實際使用時應該使用 create_graph() 函數
 async def get_graph():
@@ -172,18 +432,27 @@ def create_sync_graph():
     return asyncio.run(create_graph())
 
 
+def _default_graph():
+    """Build the default graph, falling back to the static tools."""
+    try:
+        return create_sync_graph()
+    except Exception as e:
+        logger.error(f"無法創建同步圖: {e}")
+        # 回退到簡單的圖結構
+        builder = build_react_graph(TOOLS)
+        # Note: In LangGraph Platform, persistence is handled automatically
+        return builder.compile(name="Grafana LLM Agent (Fallback)")
+
+
 # 為了兼容現有的測試，我們提供一個預設的 graph 對象
 # 但在生產環境中建議使用 get_graph() 函數
-try:
-    graph = create_sync_graph()
-except Exception as e:
-    logger.error(f"無法創建同步圖: {e}")
-    # 回退到簡單的圖結構
-    builder = StateGraph(State, input=InputState, config_schema=Configuration)
-    builder.add_node(call_model)
-    builder.add_node("tools", ToolNode(TOOLS))
-    builder.add_edge("__start__", "call_model")
-    builder.add_conditional_edges("call_model", route_model_output)
-    builder.add_edge("tools", "call_model")
-    # Note: In LangGraph Platform, persistence is handled automatically
-    graph = builder.compile(name="Grafana LLM Agent (Fallback)")
+# graph 在第一次被存取時才建立（需要連線 MCP 取得工具），import 本模組不會連線
+graph: Pregel[Any, Any, Any, Any]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "graph":
+        global graph
+        graph = _default_graph()
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
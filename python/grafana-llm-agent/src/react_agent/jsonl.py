@@ -0,0 +1,77 @@
+"""Append-only JSON Lines files, optionally gzip-compressed.
+
+`JsonlAppender` opens its file on the first write and appends to it. With
+compression each open starts a new gzip member, and every write is
+sync-flushed (`Z_SYNC_FLUSH`), which byte-aligns the deflate stream without
+ending the member, so everything written so far is readable while the file
+is still being written. `read_jsonl` reads such a file back (compressed or
+not), skipping blank lines, half-written lines and the unfinished gzip tail
+of a live file.
+
+The transcript (`react_agent.transcript`) and the traffic capture
+(`react_agent.traffic`) both write through these.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from react_agent.utils import loads
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+class JsonlAppender:
+    """Append lines to a JSONL file, opened lazily; callers serialize access."""
+
+    def __init__(self, path: str | os.PathLike[str], compress: bool = False) -> None:
+        """Append to `path`, gzip-compressed if `compress`."""
+        self.path = Path(path)
+        self.compress = compress
+        self._raw: Optional[io.BufferedWriter] = None
+        self._stream: Optional[io.BufferedIOBase] = None
+
+    def write(self, data: bytes) -> int:
+        """Append `data` (whole lines), flush, and get the file's size on disk."""
+        stream, raw = self._stream, self._raw
+        if stream is None or raw is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            raw = open(self.path, "ab")
+            # 每次開檔接上一個新的 gzip 成員；flush 為 Z_SYNC_FLUSH，不會結束成員
+            stream = gzip.GzipFile(fileobj=raw, mode="ab") if self.compress else raw
+            self._stream, self._raw = stream, raw
+        stream.write(data)
+        stream.flush()
+        return raw.tell()
+
+    def close(self) -> None:
+        """Flush and close the file; the next write reopens it."""
+        if self._stream is not None and self._stream is not self._raw:
+            self._stream.close()
+        if self._raw is not None:
+            self._raw.close()
+        self._stream = self._raw = None
+
+
+def read_jsonl(path: str | os.PathLike[str]) -> Iterator[Dict[str, Any]]:
+    """Read the records of a JSONL file, compressed or not, in the order written."""
+    with open(path, "rb") as raw:
+        compressed = raw.read(2) == _GZIP_MAGIC
+        raw.seek(0)
+        stream: io.BufferedIOBase = gzip.GzipFile(fileobj=raw) if compressed else raw
+        try:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    yield loads(line)
+                except ValueError:
+                    # 寫入中斷留下的半行
+                    continue
+        except EOFError:
+            # 寫入中的 gzip 檔尾端不完整，讀到已 flush 的部分為止
+            return
@@ -0,0 +1,331 @@
+"""Environment facts learned from tool results, shared across threads.
+
+Every investigation used to start with the same discovery steps:
+`list_datasources`, `list_loki_label_names`, `search_dashboards`... whose
+answers rarely change. `capture_knowledge` (a tool-node wrapper) turns the
+results of these discovery tools into short facts ("datasource Loki Prod: type
+loki, uid abc") and keeps them in a `SqliteStore`, namespaced by kind and
+expiring after a per-kind TTL. At the start of each turn `recall_knowledge`
+gives the model the facts relevant to the user's message, so a new thread can
+go straight to the queries.
+
+A fact is dropped before its TTL when a tool reports its uid as not found.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.store.base import BaseStore, IndexConfig, PutOp, SearchItem
+from langgraph.types import Command
+
+from react_agent import prompts
+from react_agent.configuration import Configuration
+from react_agent.metrics import METRICS
+from react_agent.sqlite_store import HashingEmbeddings, SqliteStore
+from react_agent.utils import decode_tool_result, get_message_text
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "knowledge"
+
+# 各類事實的有效期（分鐘）：資料來源與儀表板很少變動，標籤值變動較快
+TTL_MINUTES = {
+    "datasource": 24 * 60,
+    "dashboard": 24 * 60,
+    "labels": 6 * 60,
+    "metrics": 6 * 60,
+    "label_values": 60,
+}
+
+_MAX_LISTED = 50
+_MAX_RECALLED = 1024
+
+
+class Fact(NamedTuple):
+    """One environment fact: its kind, its key within the kind, its text and the uid it is about."""
+
+    kind: str
+    key: str
+    text: str
+    uid: str
+
+
+def _listing(values: Sequence[Any]) -> str:
+    names = [str(v) for v in values[:_MAX_LISTED]]
+    more = f" 等 {len(values)} 個" if len(values) > _MAX_LISTED else ""
+    return ", ".join(names) + more
+
+
+def _datasource_fact(ds: Dict[str, Any]) -> Fact:
+    text = (
+        f"資料來源「{ds.get('name', '')}」：類型 {ds.get('type', '')}，uid {ds['uid']}"
+    )
+    if ds.get("isDefault"):
+        text += "（預設）"
+    return Fact("datasource", ds["uid"], text, ds["uid"])
+
+
+def extract_facts(tool_name: str, args: Dict[str, Any], result: Any) -> List[Fact]:
+    """Get the stable facts in the decoded `result` of a discovery tool call."""
+    facts: List[Fact] = []
+    uid = str(args.get("datasourceUid") or "")
+    if tool_name == "list_datasources":
+        datasources = (
+            result.get("datasources", []) if isinstance(result, dict) else result
+        )
+        for ds in datasources if isinstance(datasources, list) else []:
+            if isinstance(ds, dict) and ds.get("uid"):
+                facts.append(_datasource_fact(ds))
+    elif tool_name in ("get_datasource_by_uid", "get_datasource_by_name"):
+        if isinstance(result, dict) and result.get("uid"):
+            facts.append(_datasource_fact(result))
+    elif tool_name in ("list_loki_label_names", "list_prometheus_label_names"):
+        if uid and isinstance(result, list) and result:
+            source = tool_name.split("_")[1]
+            facts.append(
+                Fact(
+                    "labels",
+                    f"{source}:{uid}",
+                    f"{source} 資料來源 {uid} 的標籤名稱：{_listing(result)}",
+                    uid,
+                )
+            )
+    elif tool_name in ("list_loki_label_values", "list_prometheus_label_values"):
+        label = args.get("labelName")
+        # 帶有篩選條件的結果只是子集，不當作事實
+        filtered = any(args.get(k) for k in ("matches", "selector", "match"))
+        if uid and label and not filtered and isinstance(result, list) and result:
+            source = tool_name.split("_")[1]
+            facts.append(
+                Fact(
+                    "label_values",
+                    f"{source}:{uid}:{label}",
+                    f"{source} 資料來源 {uid} 的標籤 {label} 的值：{_listing(result)}",
+                    uid,
+                )
+            )
+    elif tool_name == "list_prometheus_metric_names":
+        unfiltered = not args.get("regex") and not args.get("page")
+        if uid and unfiltered and isinstance(result, list) and result:
+            facts.append(
+                Fact(
+                    "metrics",
+                    uid,
+                    f"prometheus 資料來源 {uid} 的指標：{_listing(result)}",
+                    uid,
+                )
+            )
+    elif tool_name == "search_dashboards":
+        for hit in result if isinstance(result, list) else []:
+            if not isinstance(hit, dict) or not hit.get("uid"):
+                continue
+            if hit.get("type", "dash-db") == "dash-db":
+                folder = (
+                    f"（資料夾 {hit['folderTitle']}）" if hit.get("folderTitle") else ""
+                )
+                facts.append(
+                    Fact(
+                        "dashboard",
+                        hit["uid"],
+                        f"儀表板「{hit.get('title', '')}」{folder}：uid {hit['uid']}",
+                        hit["uid"],
+                    )
+                )
+    return facts
+
+
+FACT_TOOLS = frozenset(
+    {
+        "list_datasources",
+        "get_datasource_by_uid",
+        "get_datasource_by_name",
+        "list_loki_label_names",
+        "list_prometheus_label_names",
+        "list_loki_label_values",
+        "list_prometheus_label_values",
+        "list_prometheus_metric_names",
+        "search_dashboards",
+    }
+)
+
+
+class KnowledgeBase:
+    """Environment facts in a LangGraph store, searchable by meaning."""
+
+    def __init__(self, store: BaseStore) -> None:
+        """Keep the facts in `store` (which should index the `text` field)."""
+        self.store = store
+
+    async def capture(self, tool_name: str, args: Dict[str, Any], result: Any) -> int:
+        """Store the facts found in a tool result; return how many there were."""
+        facts = extract_facts(tool_name, args, result)
+        if facts:
+            await self.store.abatch(
+                [
+                    PutOp(
+                        (NAMESPACE, fact.kind),
+                        fact.key,
+                        {"text": fact.text, "uid": fact.uid, "tool": tool_name},
+                        ttl=TTL_MINUTES[fact.kind],
+                    )
+                    for fact in facts
+                ]
+            )
+            METRICS.incr("knowledge_facts_captured", len(facts))
+        return len(facts)
+
+    async def forget(self, uid: str) -> int:
+        """Delete every fact about `uid`; return how many there were."""
+        items = await self.store.asearch((NAMESPACE,), filter={"uid": uid}, limit=1000)
+        if items:
+            await self.store.abatch(
+                [PutOp(tuple(i.namespace), i.key, None) for i in items]
+            )
+        return len(items)
+
+    async def recall(
+        self, query: str, limit: int, min_score: float
+    ) -> List[SearchItem]:
+        """Get up to `limit` facts for `query`.
+
+        Known datasources (up to half of `limit`) come first whatever the
+        query, since nearly every investigation needs them; then the facts
+        most similar to `query`.
+        """
+        datasources = await self.store.asearch(
+            (NAMESPACE, "datasource"), limit=max(1, limit // 2), refresh_ttl=False
+        )
+        similar = await self.store.asearch(
+            (NAMESPACE,), query=query, limit=limit, refresh_ttl=False
+        )
+        facts = list(datasources)
+        seen = {(tuple(i.namespace), i.key) for i in facts}
+        for item in similar:
+            if (item.score or 0.0) >= min_score and (
+                tuple(item.namespace),
+                item.key,
+            ) not in seen:
+                facts.append(item)
+        return facts[:limit]
+
+
+_knowledge_bases: Dict[Tuple[str, str], KnowledgeBase] = {}
+
+
+def get_knowledge_base(path: str = "", embed: str = "") -> KnowledgeBase:
+    """Get the process-wide knowledge base stored in `path` (in memory if empty)."""
+    key = (path, embed)
+    knowledge = _knowledge_bases.get(key)
+    if knowledge is None:
+        embeddings: Any = embed or HashingEmbeddings()
+        index: IndexConfig = {
+            "dims": getattr(embeddings, "dims", 0),
+            "embed": embeddings,
+            "fields": ["text"],
+        }
+        # 有效期從取得事實時起算，讀取不延長，過期的事實一定會被重新查詢
+        store = SqliteStore(
+            path or ":memory:", index=index, ttl={"refresh_on_read": False}
+        )
+        knowledge = _knowledge_bases[key] = KnowledgeBase(store)
+    return knowledge
+
+
+def _knowledge_base(configuration: Configuration) -> KnowledgeBase:
+    return get_knowledge_base(configuration.knowledge_db, configuration.knowledge_embed)
+
+
+def _missing_uid(message: ToolMessage, args: Dict[str, Any]) -> Optional[str]:
+    """Get the uid a failed tool call reports as not found, if any."""
+    if (
+        message.status != "error"
+        or "not found" not in get_message_text(message).lower()
+    ):
+        return None
+    uid = args.get("datasourceUid") or args.get("uid")
+    return str(uid) if uid else None
+
+
+async def capture_knowledge(
+    request: ToolCallRequest,
+    execute: Callable[[ToolCallRequest], Awaitable[Union[ToolMessage, Command[Any]]]],
+) -> Union[ToolMessage, Command[Any]]:
+    """Tool-node wrapper learning environment facts from discovery tool results."""
+    result = await execute(request)
+    configuration = Configuration.from_context()
+    if not isinstance(result, ToolMessage) or configuration.knowledge_max_facts <= 0:
+        return result
+    name = request.tool_call["name"]
+    args = request.tool_call.get("args") or {}
+    try:
+        missing = _missing_uid(result, args)
+        if missing is not None:
+            await _knowledge_base(configuration).forget(missing)
+        elif name in FACT_TOOLS and result.status != "error":
+            await _knowledge_base(configuration).capture(
+                name, args, decode_tool_result(result.content)
+            )
+    except Exception as e:
+        # 知識庫只是加速，失敗時不影響工具結果
+        logger.warning(f"無法更新知識庫: {e!r}")
+    return result
+
+
+_recalled: OrderedDict[str, Optional[SystemMessage]] = OrderedDict()
+
+
+async def recall_knowledge(
+    messages: Sequence[BaseMessage], configuration: Configuration
+) -> Optional[SystemMessage]:
+    """Get the known facts relevant to the latest user message, as a system message.
+
+    The result is remembered per message, so every step of the same turn sees
+    the same facts.
+    """
+    if configuration.knowledge_max_facts <= 0:
+        return None
+    latest = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+    if latest is None:
+        return None
+    if latest.id is not None and latest.id in _recalled:
+        return _recalled[latest.id]
+    try:
+        facts = await _knowledge_base(configuration).recall(
+            get_message_text(latest),
+            configuration.knowledge_max_facts,
+            configuration.knowledge_min_score,
+        )
+    except Exception as e:
+        logger.warning(f"無法讀取知識庫: {e!r}")
+        return None
+    hint = None
+    if facts:
+        METRICS.incr("knowledge_facts_recalled", len(facts))
+        lines = "\n".join(f"- {item.value['text']}" for item in facts)
+        hint = SystemMessage(content=prompts.KNOWLEDGE_PROMPT.format(facts=lines))
+    if latest.id is not None:
+        _recalled[latest.id] = hint
+        while len(_recalled) > _MAX_RECALLED:
+            _recalled.popitem(last=False)
+    return hint
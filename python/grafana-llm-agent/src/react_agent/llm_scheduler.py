@@ -0,0 +1,476 @@
+"""Process-wide scheduling of LLM provider calls.
+
+Without coordination every concurrent thread fires provider requests as soon
+as it is ready, the provider answers 429, and the retries make it worse.
+`LLMScheduler` sits in front of every model call:
+
+- token buckets hold requests under `requests_per_minute` and estimated
+  tokens under `tokens_per_minute`. The buckets can be shared between
+  processes through a `SqliteRateLedger` file;
+- concurrency adapts AIMD-style: the limit grows by one per window of calls
+  that finish within `target_latency`, halves on a 429 (calls are paused for
+  the provider's `retry-after`), and shrinks by a quarter on slow calls;
+- waiting calls are served by priority class, so `interactive` sessions go
+  ahead of `batch` sweeps, and batch work never takes the last
+  `interactive_reserve` slots;
+- calls rejected with a 429 are re-queued up to `max_retries` times.
+
+Metrics: summary `llm_queue_wait_seconds{priority}`, gauges
+`llm_concurrency_limit` and `llm_inflight`, counter `llm_rate_limited`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from langchain_core.messages import BaseMessage
+
+from react_agent.metrics import METRICS, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class LocalBucket:
+    """A token bucket refilling `per_minute` units a minute, in this process only."""
+
+    def __init__(
+        self, per_minute: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        """Create a full bucket."""
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.clock = clock
+        self._level = per_minute
+        self._updated = clock()
+
+    def _refill(self) -> float:
+        now = self.clock()
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        return self._level
+
+    def try_take(self, amount: float) -> float:
+        """Take `amount` if available and return 0, else return the seconds to wait."""
+        amount = min(amount, self.capacity)
+        level = self._refill()
+        if level >= amount:
+            self._level = level - amount
+            return 0.0
+        return (amount - level) / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Take `delta` more (or give back a negative `delta`), possibly going into debt."""
+        self._level = min(self.capacity, self._refill() - delta)
+
+
+class SqliteRateLedger:
+    """Bucket levels in a SQLite file, shared by every process using the same path.
+
+    Each operation is one short `BEGIN IMMEDIATE` transaction; the file lock
+    serializes processes. Levels are stored against wall-clock time.
+
+    Operations run on the calling (event loop) thread, so waiting for another
+    process's lock is capped at `busy_timeout` seconds; after that `update`
+    raises `sqlite3.OperationalError` and `SharedBucket` retries later.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 0.05) -> None:
+        """Open (or create) the ledger at `path`."""
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=busy_timeout, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated REAL)"
+        )
+
+    def update(
+        self,
+        name: str,
+        capacity: float,
+        rate: float,
+        apply: Callable[[float], Tuple[float, float]],
+    ) -> float:
+        """Refill bucket `name`, then store `apply(level)[0]` and return `apply(level)[1]`."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._db.execute(
+                    "SELECT level, updated FROM buckets WHERE name = ?", (name,)
+                ).fetchone()
+                level = (
+                    capacity
+                    if row is None
+                    else min(capacity, row[0] + (now - row[1]) * rate)
+                )
+                level, result = apply(level)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                    (name, level, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return result
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
+
+
+class SharedBucket:
+    """A token bucket whose level lives in a `SqliteRateLedger`.
+
+    When the ledger is busy, `try_take` asks the caller to wait
+    `ledger.busy_timeout` and `adjust` is deferred to the next update.
+    """
+
+    def __init__(self, ledger: SqliteRateLedger, name: str, per_minute: float) -> None:
+        """Share bucket `name` refilling `per_minute` units a minute through `ledger`."""
+        self.ledger = ledger
+        self.name = name
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        # 帳本忙碌時尚未寫入的調整量
+        self._pending = 0.0
+
+    def _update(self, apply: Callable[[float], Tuple[float, float]]) -> Optional[float]:
+        pending = self._pending
+
+        def apply_pending(level: float) -> Tuple[float, float]:
+            return apply(min(self.capacity, level - pending))
+
+        try:
+            result = self.ledger.update(
+                self.name, self.capacity, self.rate, apply_pending
+            )
+        except sqlite3.OperationalError as e:
+            logger.debug(f"速率帳本 {self.ledger.path} 忙碌: {e}")
+            return None
+        self._pending -= pending
+        return result
+
+    def try_take(self, amount: float) -> float:
+        """Take `amount` if available and return 0, else return the seconds to wait."""
+        amount = min(amount, self.capacity)
+
+        def apply(level: float) -> Tuple[float, float]:
+            if level >= amount:
+                return level - amount, 0.0
+            return level, (amount - level) / self.rate
+
+        wait = self._update(apply)
+        return max(self.ledger.busy_timeout, 0.01) if wait is None else wait
+
+    def adjust(self, delta: float) -> None:
+        """Take `delta` more (or give back a negative `delta`), possibly going into debt."""
+        self._pending += delta
+        self._update(lambda level: (level, 0.0))
+
+
+def estimate_tokens(messages: Sequence[BaseMessage], completion: int = 512) -> int:
+    """Roughly estimate the tokens of a call: ~4 characters a token plus `completion`."""
+    chars = 0
+    for message in messages:
+        content = message.content
+        chars += len(content) if isinstance(content, str) else len(str(content))
+        for call in getattr(message, "tool_calls", None) or ():
+            chars += len(str(call.get("args", "")))
+    return chars // 4 + completion
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether `error` is a provider's 429 / rate limit response."""
+    for candidate in (error, getattr(error, "response", None)):
+        if getattr(candidate, "status_code", None) == 429:
+            return True
+    return type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Get the provider's `retry-after` seconds from a rate limit error, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+Bucket = Union[LocalBucket, SharedBucket]
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+    granted: bool = field(default=False, compare=False)
+
+
+class LLMScheduler:
+    """Rate-limit, prioritize and adapt the concurrency of LLM calls."""
+
+    def __init__(
+        self,
+        *,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        target_latency: float = 30.0,
+        interactive_reserve: int = 1,
+        max_retries: int = 3,
+        ledger: Optional[SqliteRateLedger] = None,
+        metrics: MetricsRegistry = METRICS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a scheduler; 0 per-minute limits mean unlimited.
+
+        Args:
+            requests_per_minute: Provider request rate limit.
+            tokens_per_minute: Provider token rate limit (estimated before each call,
+                corrected with the reported usage after it).
+            max_concurrency: Upper bound of the adaptive concurrency limit.
+            min_concurrency: Lower bound of the adaptive concurrency limit.
+            target_latency: Calls slower than this count as congestion.
+            interactive_reserve: Slots batch calls may not take.
+            max_retries: How often a call rejected with a 429 is re-queued.
+            ledger: Share the rate buckets with other processes through this ledger.
+            metrics: Where to record scheduling metrics.
+            clock: Monotonic clock for local buckets, pauses and latency.
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.target_latency = target_latency
+        self.interactive_reserve = interactive_reserve
+        self.max_retries = max_retries
+        self.metrics = metrics
+        self.clock = clock
+        self.buckets: List[Tuple[str, Bucket]] = []
+        if requests_per_minute > 0:
+            self.buckets.append(
+                ("requests", self._bucket(ledger, "requests", requests_per_minute))
+            )
+        if tokens_per_minute > 0:
+            self.buckets.append(
+                ("tokens", self._bucket(ledger, "tokens", tokens_per_minute))
+            )
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._inflight = 0
+        self._paused_until = 0.0
+        self._last_decrease = -math.inf
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.metrics.set("llm_concurrency_limit", self.limit)
+
+    def _bucket(
+        self, ledger: Optional[SqliteRateLedger], name: str, per_minute: float
+    ) -> Bucket:
+        if ledger is not None:
+            return SharedBucket(ledger, name, per_minute)
+        return LocalBucket(per_minute, self.clock)
+
+    @property
+    def inflight(self) -> int:
+        """Calls currently running."""
+        return self._inflight
+
+    def _slots_for(self, rank: int) -> int:
+        limit = max(self.min_concurrency, int(self.limit))
+        if rank > 0 and limit > self.interactive_reserve:
+            return limit - self.interactive_reserve
+        return limit
+
+    def _take(self, tokens: int) -> float:
+        amounts = {"requests": 1, "tokens": tokens}
+        taken: List[Tuple[str, Bucket]] = []
+        for name, bucket in self.buckets:
+            wait = bucket.try_take(amounts[name])
+            if wait > 0:
+                # 任一桶不足時退回已取得的額度
+                for taken_name, taken_bucket in taken:
+                    taken_bucket.adjust(-amounts[taken_name])
+                return wait
+            taken.append((name, bucket))
+        return 0.0
+
+    def _wake_later(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._queue:
+            head = self._queue[0]
+            if head.future.done():
+                heapq.heappop(self._queue)
+                continue
+            pause = self._paused_until - self.clock()
+            if pause > 0:
+                self._wake_later(pause)
+                return
+            if self._inflight >= self._slots_for(head.rank):
+                # 等待正在執行的呼叫結束
+                return
+            wait = self._take(head.tokens)
+            if wait > 0:
+                self._wake_later(wait)
+                return
+            heapq.heappop(self._queue)
+            head.granted = True
+            self._inflight += 1
+            head.future.set_result(None)
+        self.metrics.set("llm_inflight", self._inflight)
+
+    async def _acquire(self, priority: str, tokens: int) -> None:
+        rank = PRIORITIES[priority]
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(rank, next(self._seq), tokens, future)
+        heapq.heappush(self._queue, waiter)
+        started = self.clock()
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.granted:
+                self._release()
+            raise
+        self.metrics.observe(
+            "llm_queue_wait_seconds", self.clock() - started, priority=priority
+        )
+        self.metrics.set("llm_inflight", self._inflight)
+
+    def _release(self) -> None:
+        self._inflight -= 1
+        self.metrics.set("llm_inflight", self._inflight)
+        self._dispatch()
+
+    def _decrease(self, factor: float) -> None:
+        now = self.clock()
+        # 同一批並發呼叫的壅塞訊號只減一次
+        if now - self._last_decrease < self.target_latency / 10:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+        self.metrics.set("llm_concurrency_limit", self.limit)
+
+    def _on_success(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self._decrease(0.75)
+        else:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        self.metrics.set("llm_concurrency_limit", self.limit)
+
+    def _on_rate_limited(self, error: BaseException, attempt: int) -> None:
+        self.metrics.incr("llm_rate_limited")
+        self._decrease(0.5)
+        pause = retry_after(error) or min(30.0, 2.0**attempt)
+        self._paused_until = max(self._paused_until, self.clock() + pause)
+        logger.warning(
+            f"LLM 供應商限流，{pause:.1f} 秒後重試，並發上限降為 {int(self.limit)}"
+        )
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        *,
+        priority: str = "interactive",
+        tokens: int = 0,
+        usage: Optional[Callable[[T], int]] = None,
+    ) -> T:
+        """Run `call` when the limits allow, retrying it after 429s.
+
+        Args:
+            call: Starts the provider call; called again for each retry.
+            priority: `interactive` or `batch`.
+            tokens: Estimated tokens of the call, checked against `tokens_per_minute`.
+            usage: Gets the actual tokens from the result, to correct the estimate.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(
+                f"Unknown LLM priority {priority!r}, expected one of {list(PRIORITIES)}"
+            )
+        attempt = 0
+        while True:
+            await self._acquire(priority, tokens)
+            started = self.clock()
+            try:
+                result = await call()
+            except Exception as e:
+                if is_rate_limited(e) and attempt < self.max_retries:
+                    attempt += 1
+                    self._on_rate_limited(e, attempt)
+                    continue
+                raise
+            finally:
+                self._release()
+            self._on_success(self.clock() - started)
+            actual = usage(result) if usage is not None else 0
+            if actual:
+                for name, bucket in self.buckets:
+                    if name == "tokens":
+                        bucket.adjust(actual - tokens)
+            return result
+
+
+_schedulers: Dict[Tuple[Any, ...], LLMScheduler] = {}
+
+
+def get_llm_scheduler(
+    requests_per_minute: float,
+    tokens_per_minute: float,
+    max_concurrency: int,
+    ledger_path: str = "",
+) -> Optional[LLMScheduler]:
+    """Get the process-wide scheduler for these limits; None if `max_concurrency` is 0."""
+    if max_concurrency <= 0:
+        return None
+    key = (requests_per_minute, tokens_per_minute, max_concurrency, ledger_path)
+    scheduler = _schedulers.get(key)
+    if scheduler is None:
+        ledger = SqliteRateLedger(ledger_path) if ledger_path else None
+        scheduler = LLMScheduler(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_concurrency=max_concurrency,
+            ledger=ledger,
+        )
+        _schedulers[key] = scheduler
+    return scheduler
@@ -0,0 +1,395 @@
+"""Summarize Loki log query results locally before they reach the LLM.
+
+Raw `query_loki_logs` output can be megabytes of log lines. The functions in
+this module turn it into columnar NumPy arrays and compute a compact summary:
+an error-rate timeline, the most frequent label combinations, log-pattern
+clusters (a small Drain-style template miner) and anomalous time buckets.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_ERROR_LEVELS = {"error", "err", "fatal", "critical", "crit", "panic", "emerg", "alert"}
+_LEVEL_LABELS = ("level", "detected_level", "severity", "lvl")
+_ERROR_LINE = re.compile(
+    r"\b(error|err|exception|fatal|panic|traceback|failed|failure)\b|\b5\d\d\b",
+    re.IGNORECASE,
+)
+_VARIABLE_TOKEN = re.compile(
+    r"""^(
+        [0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}  # uuid
+        | (\d{1,3}\.){3}\d{1,3}(:\d+)?                              # ip[:port]
+        | 0x[0-9a-f]+ | [0-9a-f]{12,}                                 # hex ids
+        | [-+]?\d+([.,:]\d+)*(ms|s|us|ns|b|kb|mb|%)?                 # numbers
+        | ".*" | '.*'                                                # quoted
+    )$""",
+    re.IGNORECASE | re.VERBOSE,
+)
+_TOKEN_SPLIT = re.compile(r"[\s=,;()\[\]{}]+")
+_WILDCARD = "<*>"
+_MAX_EXAMPLE = 200
+# 時間軸最多的桶數；時間跨度太大時加寬桶而不是配置巨大的陣列
+_MAX_BUCKETS = 10_000
+_MAX_NS = 2**63 - 1
+
+
+@dataclass
+class LogColumns:
+    """Columnar view of a batch of log entries."""
+
+    timestamps: np.ndarray
+    """Entry timestamps in nanoseconds since the epoch (int64)."""
+    is_error: np.ndarray
+    """Whether each entry looks like an error (bool)."""
+    label_ids: np.ndarray
+    """Index into `label_sets` for each entry (int64)."""
+    label_sets: List[Tuple[Tuple[str, str], ...]] = field(default_factory=list)
+    lines: List[str] = field(default_factory=list)
+
+
+def parse_timestamp(value: Any) -> Optional[int]:
+    """Get a nanosecond timestamp from `value`, or None if it is missing or invalid."""
+    try:
+        ns = int(value)
+    except (TypeError, ValueError):
+        return None
+    return ns if 0 < ns <= _MAX_NS else None
+
+
+def entry_key(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Get the identity of a log entry: its timestamp, line and stream labels."""
+    labels = entry.get("labels") or {}
+    return (
+        entry.get("timestamp"),
+        entry.get("line"),
+        tuple(sorted((str(k), str(v)) for k, v in labels.items())),
+    )
+
+
+def _entries_from_streams(streams: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    entries = []
+    for stream in streams:
+        labels = stream.get("stream") or stream.get("labels") or {}
+        for value in stream.get("values", []):
+            entries.append({"timestamp": value[0], "line": value[1], "labels": labels})
+    return entries
+
+
+def parse_loki_result(result: Any) -> List[Dict[str, Any]]:
+    """Normalize a `query_loki_logs` result into a list of entries.
+
+    Accepts the Grafana MCP shape (a list of `{"timestamp", "line", "labels"}`),
+    the raw Loki API shape (`{"data": {"result": [{"stream", "values"}]}}`),
+    MCP text content blocks, or any of those encoded as a JSON string.
+    """
+    if isinstance(result, (str, bytes)):
+        text = result.decode() if isinstance(result, bytes) else result
+        if not text.strip():
+            return []
+        return parse_loki_result(json.loads(text))
+    if isinstance(result, dict):
+        if "data" in result:
+            return parse_loki_result(result["data"])
+        if "result" in result:
+            return _entries_from_streams(result["result"])
+        if "text" in result:
+            return parse_loki_result(result["text"])
+        return [result] if "line" in result else []
+    if isinstance(result, list):
+        entries: List[Dict[str, Any]] = []
+        for item in result:
+            if isinstance(item, dict) and item.get("type") == "text":
+                entries.extend(parse_loki_result(item.get("text", "")))
+            elif isinstance(item, dict) and "values" in item:
+                entries.extend(_entries_from_streams([item]))
+            elif isinstance(item, dict):
+                entries.append(item)
+        return entries
+    return []
+
+
+def _is_error(labels: Dict[str, str], line: str) -> bool:
+    for key in _LEVEL_LABELS:
+        level = labels.get(key)
+        if level:
+            return level.lower() in _ERROR_LEVELS
+    return _ERROR_LINE.search(line) is not None
+
+
+def to_columns(entries: Sequence[Dict[str, Any]]) -> LogColumns:
+    """Convert log entries into NumPy columns.
+
+    Entries whose timestamp is missing or invalid are skipped.
+    """
+    n = len(entries)
+    timestamps = np.empty(n, dtype=np.int64)
+    is_error = np.empty(n, dtype=bool)
+    label_ids = np.empty(n, dtype=np.int64)
+    label_index: Dict[Tuple[Tuple[str, str], ...], int] = {}
+    lines: List[str] = []
+    i = 0
+    for entry in entries:
+        ns = parse_timestamp(entry.get("timestamp"))
+        if ns is None:
+            continue
+        labels = entry.get("labels") or {}
+        line = str(entry.get("line", ""))
+        key = tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+        label_ids[i] = label_index.setdefault(key, len(label_index))
+        timestamps[i] = ns
+        is_error[i] = _is_error(labels, line)
+        lines.append(line)
+        i += 1
+    return LogColumns(
+        timestamps=timestamps[:i],
+        is_error=is_error[:i],
+        label_ids=label_ids[:i],
+        label_sets=list(label_index),
+        lines=lines,
+    )
+
+
+def _format_ns(ns: int) -> str:
+    return datetime.fromtimestamp(ns / 1e9, tz=UTC).isoformat(timespec="seconds")
+
+
+def error_timeline(columns: LogColumns, bucket_seconds: int) -> Dict[str, np.ndarray]:
+    """Count entries and errors per time bucket.
+
+    The buckets are widened when `bucket_seconds` would need more than
+    `_MAX_BUCKETS` of them to cover the entries; the returned `bucket_seconds`
+    is the width used.
+    """
+    first, last = int(columns.timestamps.min()), int(columns.timestamps.max())
+    span_seconds = (last - first) // 1_000_000_000 + 1
+    bucket_seconds = max(bucket_seconds, 1, -(-span_seconds // _MAX_BUCKETS))
+    bucket_ns = bucket_seconds * 1_000_000_000
+    start = (first // bucket_ns) * bucket_ns
+    buckets = (columns.timestamps - start) // bucket_ns
+    totals = np.bincount(buckets)
+    errors = np.bincount(buckets, weights=columns.is_error).astype(np.int64)
+    starts = start + np.arange(len(totals), dtype=np.int64) * bucket_ns
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(totals > 0, errors / totals, 0.0)
+    return {
+        "starts": starts,
+        "totals": totals,
+        "errors": errors,
+        "error_rates": rates,
+        "bucket_seconds": np.array(bucket_seconds, dtype=np.int64),
+    }
+
+
+def top_label_sets(columns: LogColumns, top_k: int) -> List[Dict[str, Any]]:
+    """Get the most frequent label combinations with their error counts."""
+    counts = np.bincount(columns.label_ids, minlength=len(columns.label_sets))
+    errors = np.bincount(
+        columns.label_ids, weights=columns.is_error, minlength=len(columns.label_sets)
+    )
+    order = np.argsort(-counts, kind="stable")[:top_k]
+    return [
+        {
+            "labels": dict(columns.label_sets[i]),
+            "count": int(counts[i]),
+            "errors": int(errors[i]),
+        }
+        for i in order
+        if counts[i] > 0
+    ]
+
+
+def _tokenize(line: str) -> List[str]:
+    return [
+        _WILDCARD if _VARIABLE_TOKEN.match(token) else token
+        for token in _TOKEN_SPLIT.split(line.strip())
+        if token
+    ]
+
+
+class TemplateMiner:
+    """A small Drain-style log template miner.
+
+    Lines are tokenized, obvious variables (numbers, IDs, IPs, quoted strings)
+    are masked, and each line joins the most similar cluster with the same
+    token count and leading token. Differing tokens are generalized to `<*>`.
+    """
+
+    def __init__(self, similarity: float = 0.5, max_clusters: int = 1000) -> None:
+        """Create a miner merging lines at least `similarity` alike."""
+        self.similarity = similarity
+        self.max_clusters = max_clusters
+        self._groups: Dict[Tuple[int, str], List[int]] = {}
+        self.templates: List[List[str]] = []
+        self.examples: List[str] = []
+
+    def add(self, line: str) -> int:
+        """Add `line` and return the ID of the cluster it joined."""
+        tokens = _tokenize(line)
+        key = (len(tokens), tokens[0] if tokens else "")
+        group = self._groups.setdefault(key, [])
+        best, best_score = -1, -1.0
+        for cluster_id in group:
+            template = self.templates[cluster_id]
+            same = sum(1 for a, b in zip(template, tokens) if a == b or a == _WILDCARD)
+            score = same / max(len(tokens), 1)
+            if score > best_score:
+                best, best_score = cluster_id, score
+        if best >= 0 and (
+            best_score >= self.similarity or len(self.templates) >= self.max_clusters
+        ):
+            template = self.templates[best]
+            for i, (a, b) in enumerate(zip(template, tokens)):
+                if a != b:
+                    template[i] = _WILDCARD
+            return best
+        self.templates.append(tokens)
+        self.examples.append(line[:_MAX_EXAMPLE])
+        group.append(len(self.templates) - 1)
+        return len(self.templates) - 1
+
+
+def mine_patterns(columns: LogColumns, top_k: int) -> List[Dict[str, Any]]:
+    """Cluster log lines into templates and get the most frequent ones."""
+    miner = TemplateMiner()
+    cluster_ids = np.fromiter(
+        (miner.add(line) for line in columns.lines),
+        dtype=np.int64,
+        count=len(columns.lines),
+    )
+    counts = np.bincount(cluster_ids, minlength=len(miner.templates))
+    errors = np.bincount(
+        cluster_ids, weights=columns.is_error, minlength=len(miner.templates)
+    )
+    order = np.argsort(-counts, kind="stable")[:top_k]
+    return [
+        {
+            "template": " ".join(miner.templates[i])[:_MAX_EXAMPLE],
+            "count": int(counts[i]),
+            "errors": int(errors[i]),
+            "example": miner.examples[i],
+        }
+        for i in order
+        if counts[i] > 0
+    ]
+
+
+def _robust_z(values: np.ndarray) -> np.ndarray:
+    median = np.median(values)
+    mad = np.median(np.abs(values - median))
+    scale = 1.4826 * mad if mad > 0 else (np.std(values) or 1.0)
+    return np.asarray((values - median) / scale)
+
+
+def detect_anomalies(
+    timeline: Dict[str, np.ndarray], threshold: float = 3.5
+) -> List[Dict[str, Any]]:
+    """Flag buckets whose volume or error rate deviates strongly from the rest."""
+    totals = timeline["totals"].astype(np.float64)
+    if len(totals) < 4:
+        return []
+    anomalies: List[Dict[str, Any]] = []
+    for kind, z in (
+        ("volume", _robust_z(totals)),
+        ("error_rate", _robust_z(timeline["error_rates"])),
+    ):
+        for i in np.flatnonzero(np.abs(z) >= threshold):
+            anomalies.append(
+                {
+                    "bucket_start": _format_ns(int(timeline["starts"][i])),
+                    "kind": f"{kind}_{'spike' if z[i] > 0 else 'drop'}",
+                    "score": round(float(z[i]), 2),
+                    "total": int(timeline["totals"][i]),
+                    "errors": int(timeline["errors"][i]),
+                }
+            )
+    anomalies.sort(key=lambda a: -abs(a["score"]))
+    return anomalies[:20]
+
+
+def _downsample(
+    timeline: Dict[str, np.ndarray], max_points: int
+) -> List[Dict[str, Any]]:
+    n = len(timeline["totals"])
+    step = max(1, -(-n // max_points))
+    points = []
+    for i in range(0, n, step):
+        total = int(timeline["totals"][i : i + step].sum())
+        errors = int(timeline["errors"][i : i + step].sum())
+        points.append(
+            {
+                "start": _format_ns(int(timeline["starts"][i])),
+                "total": total,
+                "errors": errors,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+            }
+        )
+    return points
+
+
+def summarize_logs(
+    entries: Sequence[Dict[str, Any]],
+    *,
+    bucket_seconds: int = 60,
+    top_k: int = 10,
+    max_timeline_points: int = 60,
+) -> Dict[str, Any]:
+    """Summarize log entries into a compact, JSON-serializable report.
+
+    Entries without a valid timestamp are left out and counted in
+    `skipped_lines`.
+    """
+    columns = to_columns(entries)
+    total = len(columns.lines)
+    skipped = len(entries) - total
+    if not total:
+        summary: Dict[str, Any] = {
+            "total_lines": 0,
+            "message": "No log lines matched the query.",
+        }
+        if skipped:
+            summary["skipped_lines"] = skipped
+        return summary
+    timeline = error_timeline(columns, bucket_seconds)
+    step = max(1, -(-len(timeline["totals"]) // max_timeline_points))
+    errors = int(columns.is_error.sum())
+    summary = {
+        "total_lines": total,
+        "error_lines": errors,
+        "error_rate": round(errors / total, 4),
+        "time_range": {
+            "start": _format_ns(int(columns.timestamps.min())),
+            "end": _format_ns(int(columns.timestamps.max())),
+        },
+        "bucket_seconds": int(timeline["bucket_seconds"]) * step,
+        "timeline": _downsample(timeline, max_timeline_points),
+        "top_label_sets": top_label_sets(columns, top_k),
+        "patterns": mine_patterns(columns, top_k),
+        "anomalies": detect_anomalies(timeline),
+    }
+    if skipped:
+        summary["skipped_lines"] = skipped
+    return summary
+
+
+def oldest_timestamp(entries: Sequence[Dict[str, Any]]) -> Optional[int]:
+    """Get the oldest valid timestamp (ns) among `entries`, used to page backwards."""
+    valid = [
+        ns
+        for ns in (parse_timestamp(e.get("timestamp")) for e in entries)
+        if ns is not None
+    ]
+    return min(valid, default=None)
+
+
+def format_rfc3339_nano(ns: int) -> str:
+    """Format a nanosecond timestamp as an RFC3339 string with full precision."""
+    seconds, fraction = divmod(ns, 1_000_000_000)
+    moment = datetime.fromtimestamp(seconds, tz=UTC)
+    return f"{moment:%Y-%m-%dT%H:%M:%S}.{fraction:09d}Z"
@@ -0,0 +1,236 @@
+"""Long-lived MCP sessions shared by every tool invocation.
+
+Tools returned by `MultiServerMCPClient.get_tools()` open a new connection and
+run the MCP `initialize` handshake on every call. `MCPSessionManager` keeps one
+initialized session per server instead and routes tool calls through it:
+
+- the session is owned by a background task, so it can be used from any task
+  on the same event loop and concurrent calls are multiplexed over it;
+- a call that fails because the transport broke reconnects once and retries,
+  if the request was never sent or the tool only reads data;
+- SSE and streamable HTTP (or any other adapter transport) are supported.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence
+
+import anyio
+import httpx
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.interceptors import (
+    MCPToolCallRequest,
+    MCPToolCallResult,
+    ToolCallInterceptor,
+)
+from langchain_mcp_adapters.sessions import Connection, create_session
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp import ClientSession
+from mcp.types import CallToolResult
+
+from react_agent.prefetch import is_read_only
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[MCPToolCallRequest], Awaitable[MCPToolCallResult]]
+
+# Errors meaning the connection itself broke, as opposed to the tool failing.
+_TRANSPORT_ERRORS = (
+    ConnectionError,
+    OSError,
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    httpx.TransportError,
+)
+# 請求尚未送出就失敗（會話已關閉、連不上伺服器），重試不會讓工具執行兩次
+_NOT_SENT_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    httpx.ConnectError,
+)
+
+
+class _SessionHolder:
+    """Owns one MCP session inside a dedicated task until it is closed."""
+
+    def __init__(self, name: str, connection: Connection) -> None:
+        self.name = name
+        self.connection = connection
+        self.session: Optional[ClientSession] = None
+        self.loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task = asyncio.create_task(self._run(), name=f"mcp-session-{name}")
+
+    async def _run(self) -> None:
+        try:
+            async with create_session(self.connection) as session:
+                await session.initialize()
+                self.session = session
+                self._ready.set()
+                await self._closing.wait()
+        except BaseException as e:  # noqa: BLE001 - reported to waiting callers
+            self._error = e
+            if not isinstance(e, asyncio.CancelledError):
+                logger.warning(f"MCP 會話 {self.name} 已中斷: {e!r}")
+        finally:
+            self.session = None
+            self._ready.set()
+
+    @property
+    def alive(self) -> bool:
+        return not self._task.done() and not self._closing.is_set()
+
+    async def wait_ready(self) -> ClientSession:
+        await self._ready.wait()
+        if self.session is None:
+            raise ConnectionError(
+                f"Could not connect to MCP server '{self.name}'"
+            ) from self._error
+        return self.session
+
+    async def aclose(self) -> None:
+        self._closing.set()
+        try:
+            await self._task
+        except BaseException:  # noqa: BLE001 - the session is going away anyway
+            pass
+
+
+class MCPSessionManager:
+    """Keep one long-lived, initialized session per MCP server."""
+
+    def __init__(
+        self,
+        connections: Mapping[str, Connection],
+        *,
+        read_only: Callable[[str], bool] = is_read_only,
+    ) -> None:
+        """Manage sessions for `connections`, keyed by server name.
+
+        Args:
+            connections: The connection of each server, keyed by server name.
+            read_only: Whether a tool only reads data, so that a call whose
+                connection broke after the request was sent may be retried.
+        """
+        self.connections = dict(connections)
+        self.read_only = read_only
+        self._holders: Dict[str, _SessionHolder] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.connects = 0
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def session(self, server_name: str) -> ClientSession:
+        """Get the initialized session for `server_name`, connecting if needed."""
+        holder = self._holders.get(server_name)
+        if (
+            holder is None
+            or not holder.alive
+            or holder.loop is not asyncio.get_running_loop()
+        ):
+            async with self._get_lock():
+                holder = self._holders.get(server_name)
+                if (
+                    holder is None
+                    or not holder.alive
+                    or holder.loop is not asyncio.get_running_loop()
+                ):
+                    if server_name not in self.connections:
+                        raise ValueError(f"Unknown MCP server '{server_name}'")
+                    holder = _SessionHolder(server_name, self.connections[server_name])
+                    self._holders[server_name] = holder
+                    self.connects += 1
+        return await holder.wait_ready()
+
+    async def _drop(self, server_name: str) -> None:
+        holder = self._holders.pop(server_name, None)
+        if holder is not None and holder.loop is asyncio.get_running_loop():
+            await holder.aclose()
+
+    async def reconnect(self, server_name: str) -> ClientSession:
+        """Drop the current session of `server_name` and open a new one."""
+        await self._drop(server_name)
+        return await self.session(server_name)
+
+    async def call_tool(
+        self, server_name: str, name: str, arguments: Dict[str, Any]
+    ) -> CallToolResult:
+        """Call tool `name` over the shared session, reconnecting once on failure.
+
+        The call is retried only when the request was never sent or the tool is
+        read-only; otherwise the server may already have run it.
+        """
+        session = await self.session(server_name)
+        try:
+            return await session.call_tool(name, arguments)
+        except _TRANSPORT_ERRORS as e:
+            if not isinstance(e, _NOT_SENT_ERRORS) and not self.read_only(name):
+                # 請求可能已送達，重試會重複執行有副作用的工具；下次呼叫再重新連線
+                logger.warning(f"MCP 工具 {name} 呼叫中連線中斷 ({e!r})，不重試")
+                await self._drop(server_name)
+                raise
+            logger.info(f"MCP 工具 {name} 呼叫失敗 ({e!r})，重新連線後重試")
+            session = await self.reconnect(server_name)
+            return await session.call_tool(name, arguments)
+
+    async def interceptor(
+        self, request: MCPToolCallRequest, handler: Handler
+    ) -> MCPToolCallResult:
+        """Run the tool call over the shared session instead of a new one.
+
+        Use as the innermost `ToolCallInterceptor`; it never calls `handler`.
+        """
+        return await self.call_tool(request.server_name, request.name, request.args)
+
+    async def get_tools(
+        self,
+        server_name: Optional[str] = None,
+        *,
+        interceptors: Sequence[ToolCallInterceptor] = (),
+    ) -> List[BaseTool]:
+        """List the tools of one or all servers as LangChain tools.
+
+        `interceptors` wrap every call (first is outermost); the shared-session
+        interceptor is always appended last.
+        """
+        names = [server_name] if server_name else list(self.connections)
+        tools: List[BaseTool] = []
+        for name in names:
+            session = await self.session(name)
+            cursor: Optional[str] = None
+            while True:
+                listed = await session.list_tools(cursor=cursor)
+                tools.extend(
+                    convert_mcp_tool_to_langchain_tool(
+                        None,
+                        tool,
+                        connection=self.connections[name],
+                        server_name=name,
+                        tool_interceptors=[*interceptors, self.interceptor],
+                    )
+                    for tool in listed.tools
+                )
+                cursor = listed.nextCursor
+                if not cursor:
+                    break
+        return tools
+
+    async def aclose(self) -> None:
+        """Close every session owned by the current event loop."""
+        holders = list(self._holders.values())
+        self._holders.clear()
+        loop = asyncio.get_running_loop()
+        for holder in holders:
+            if holder.loop is loop:
+                await holder.aclose()
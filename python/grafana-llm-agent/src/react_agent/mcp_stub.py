@@ -0,0 +1,75 @@
+"""A local stand-in MCP server for tests and benchmarks.
+
+Serves plain Python callables as MCP tools over SSE or streamable HTTP from a
+background thread, so the agent's MCP plumbing can be exercised without a
+Grafana MCP server or network access.
+"""
+
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Mapping
+
+import uvicorn
+from mcp.server.fastmcp import FastMCP
+
+
+def build_stub_server(tools: Mapping[str, Callable[..., Any]]) -> FastMCP:
+    """Create a FastMCP server exposing `tools` under their mapping keys."""
+    server = FastMCP("grafana-mcp-stub", log_level="WARNING")
+    for name, fn in tools.items():
+        server.add_tool(fn, name=name)
+    return server
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+@contextmanager
+def serve_server(server: FastMCP, transport: str = "sse") -> Iterator[str]:
+    """Serve `server` on a free local port and yield its URL.
+
+    Args:
+        server: The MCP server to serve.
+        transport: `"sse"` or `"streamable_http"`.
+    """
+    if transport == "sse":
+        app, path = server.sse_app(), "/sse"
+    else:
+        app, path = server.streamable_http_app(), "/mcp"
+    port = _free_port()
+    uv = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=uv.run, name="mcp-stub", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not uv.started:
+        if time.monotonic() > deadline or not thread.is_alive():
+            raise RuntimeError("MCP stub server failed to start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}{path}"
+    finally:
+        uv.should_exit = True
+        thread.join(timeout=10)
+
+
+@contextmanager
+def serve_stub(
+    tools: Mapping[str, Callable[..., Any]], transport: str = "sse"
+) -> Iterator[str]:
+    """Serve `tools` on a free local port and yield the server URL.
+
+    Args:
+        tools: Tool callables keyed by tool name.
+        transport: `"sse"` or `"streamable_http"`.
+    """
+    with serve_server(build_stub_server(tools), transport) as url:
+        yield url
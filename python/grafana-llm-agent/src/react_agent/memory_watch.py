@@ -0,0 +1,173 @@
+"""Sample the process's memory over a long run and detect sustained growth.
+
+`MemoryWatcher` records the RSS and the `tracemalloc` total at each sample,
+keyed by how much work (e.g. finished threads) was done so far, and can
+compare the latest `tracemalloc` snapshot with the one taken at the end of
+the warm-up to find the call sites whose allocations kept growing.
+
+`detect_growth` fits memory against work done over the later half of the
+samples: growth is reported as sustained when that slope exceeds a budget
+per unit of work *and* the last samples all sit above the first ones of the
+half, so a cache that fills up to its bound (or allocator noise) is not
+reported while a per-thread leak is.
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import resource
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from react_agent.metrics import METRICS
+
+# 這些模組的配置屬於量測本身，不計入成長
+_IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<unknown>")
+
+
+def rss_bytes() -> int:
+    """Get the current resident set size of the process (the peak where unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # 非 Linux 只能取得峰值（macOS 以位元組、其他以 KiB 為單位）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+@dataclass(frozen=True)
+class MemorySample:
+    """Memory use after `work` units of work.
+
+    `rss` excludes the memory `tracemalloc` uses for its own bookkeeping.
+    """
+
+    work: int
+    seconds: float
+    rss: int
+    traced: int
+
+
+@dataclass(frozen=True)
+class Growth:
+    """The trend of one memory measure over the samples after warm-up."""
+
+    measure: str
+    # 後半段樣本的斜率
+    bytes_per_unit: float
+    # 第一個到最後一個樣本的差
+    total: int
+    sustained: bool
+
+
+def _slope(xs: Sequence[float], ys: Sequence[float]) -> float:
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if not spread:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+
+def detect_growth(
+    samples: Sequence[MemorySample],
+    measure: str,
+    budget_per_unit: float,
+    *,
+    window: int = 3,
+) -> Optional[Growth]:
+    """Get the trend of `measure` ("rss" or "traced") over `samples`.
+
+    Args:
+        samples: The samples after warm-up, in order.
+        measure: Which measure to fit.
+        budget_per_unit: Bytes per unit of work the measure may grow by.
+        window: How many samples at each end are compared.
+
+    Returns:
+        None when there are too few samples to tell.
+    """
+    if len(samples) < 2 * window:
+        return None
+    # 只看後半段的趨勢，前半段可能是快取仍在填滿
+    recent = samples[-max(2 * window, len(samples) // 2) :]
+    xs = [float(s.work) for s in recent]
+    ys = [float(getattr(s, measure)) for s in recent]
+    slope = _slope(xs, ys)
+    # 斜率超標之外，最後幾個樣本都要高於最前面的樣本，才算持續成長而不是雜訊
+    rising = min(ys[-window:]) > max(ys[:window])
+    total = getattr(samples[-1], measure) - getattr(samples[0], measure)
+    return Growth(measure, slope, total, slope > budget_per_unit and rising)
+
+
+class MemoryWatcher:
+    """Sample RSS and `tracemalloc` totals and diff allocation sites against a baseline."""
+
+    def __init__(self, frames: int = 8) -> None:
+        """Trace allocations keeping `frames` frames of each traceback."""
+        self.frames = frames
+        self.samples: List[MemorySample] = []
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started = time.monotonic()
+        self._tracing = False
+
+    def start(self) -> None:
+        """Start tracing allocations (if not already traced)."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._tracing = True
+
+    def stop(self) -> None:
+        """Stop tracing, if this watcher started it."""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def sample(self, work: int) -> MemorySample:
+        """Record the memory use after `work` units of work, after a full collection."""
+        gc.collect()
+        traced, _ = tracemalloc.get_traced_memory()
+        # tracemalloc 自己的記錄表也在 RSS 中，且隨追蹤的配置增加
+        rss = rss_bytes() - tracemalloc.get_tracemalloc_memory()
+        sample = MemorySample(work, time.monotonic() - self._started, rss, traced)
+        self.samples.append(sample)
+        METRICS.set("memory_rss_bytes", sample.rss)
+        METRICS.set("memory_traced_bytes", sample.traced)
+        return sample
+
+    def mark_baseline(self) -> None:
+        """Take the snapshot later snapshots are compared with (at the end of warm-up)."""
+        gc.collect()
+        self._baseline = self._snapshot()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, name) for name in _IGNORED_FILES]
+        )
+
+    def top_growth(self, limit: int = 10, key_type: str = "traceback") -> List[str]:
+        """Describe the call sites whose allocations grew most since the baseline.
+
+        Args:
+            limit: How many call sites to describe.
+            key_type: "traceback" groups by whole call stack, "lineno" by the
+                allocating line only.
+        """
+        if self._baseline is None:
+            raise RuntimeError("mark_baseline() must be called before top_growth()")
+        gc.collect()
+        stats = self._snapshot().compare_to(self._baseline, key_type)
+        lines = []
+        for stat in sorted(stats, key=lambda s: s.size_diff, reverse=True)[:limit]:
+            if stat.size_diff <= 0:
+                break
+            lines.append(
+                f"{stat.size_diff / 1024:+.1f} KiB in {stat.count_diff:+d} blocks, allocated at:"
+            )
+            frames = stat.traceback.format(limit=self.frames, most_recent_first=True)
+            lines.extend(f"  {line}" for line in frames)
+        return lines
@@ -0,0 +1,264 @@
+"""An incrementally indexed message channel for the agent state.
+
+`add_messages` converts the whole history and rebuilds an ID index on every
+update, so each step costs O(len(history)). `MessageLog` keeps the ID index
+alongside the list. `add_messages_fast` merges each update into a copy of
+the log, so every checkpoint and streamed snapshot keeps the history as it
+was at that step; copying the list and the index is a pointer copy, far
+cheaper than converting and re-indexing every message.
+
+A bounded variant (`bounded_add_messages`) keeps only the most recent
+messages in the state and spills older ones to a `MessageSpill`, e.g. a
+LangGraph `BaseStore`.
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+    cast,
+)
+
+from langchain_core.messages import (
+    AnyMessage,
+    BaseMessage,
+    BaseMessageChunk,
+    RemoveMessage,
+    ToolMessage,
+    convert_to_messages,
+    message_chunk_to_message,
+)
+from langgraph.graph.message import REMOVE_ALL_MESSAGES, Messages
+from langgraph.store.base import BaseStore
+
+from react_agent.utils import current_thread_id
+
+
+class MessageLog(List[AnyMessage]):
+    """A list of messages with an ID to position index maintained incrementally.
+
+    The log is a `list` subclass, so checkpoint serializers store it as a plain
+    list; the reducer turns restored lists back into a `MessageLog`.
+
+    `merge` applies an update in place, and only once the whole update is
+    known to be valid; the reducer merges into a `copy` so earlier states are
+    never changed.
+    """
+
+    __slots__ = ("_index",)
+
+    def __init__(self, messages: Iterable[AnyMessage] = ()) -> None:
+        """Create a log holding `messages`, assigning IDs to those without one."""
+        super().__init__(messages)
+        self._index: Dict[str, int] = {}
+        self._reindex()
+
+    def _reindex(self) -> None:
+        index = {}
+        for position, message in enumerate(self):
+            if message.id is None:
+                message.id = str(uuid.uuid4())
+            index[message.id] = position
+        self._index = index
+
+    def copy(self) -> MessageLog:
+        """Get a shallow copy of the log with its own ID index."""
+        log = MessageLog.__new__(MessageLog)
+        list.extend(log, self)
+        log._index = dict(self._index)
+        return log
+
+    def index_of(self, message_id: str) -> Optional[int]:
+        """Get the position of the message with `message_id`, if present."""
+        return self._index.get(message_id)
+
+    def _validate(self, updates: Sequence[AnyMessage]) -> None:
+        """Raise if `updates` removes an ID that will not exist at that point."""
+        cleared = False
+        added: Set[Optional[str]] = set()
+        removed: Set[Optional[str]] = set()
+        for message in updates:
+            if isinstance(message, RemoveMessage):
+                if message.id == REMOVE_ALL_MESSAGES:
+                    cleared, added, removed = True, set(), set()
+                    continue
+                present = message.id in added or (
+                    not cleared
+                    and message.id in self._index
+                    and message.id not in removed
+                )
+                if not present:
+                    raise ValueError(
+                        f"Attempting to delete a message with an ID that doesn't exist ('{message.id}')"
+                    )
+                added.discard(message.id)
+                removed.add(message.id)
+            else:
+                added.add(message.id)
+
+    def merge(self, updates: Sequence[AnyMessage]) -> None:
+        """Merge `updates` into the log following `add_messages` semantics.
+
+        The whole update is validated first, so an invalid one raises without
+        changing the log.
+        """
+        self._validate(updates)
+        removed = False
+        for message in updates:
+            if isinstance(message, RemoveMessage):
+                if message.id == REMOVE_ALL_MESSAGES:
+                    self.clear()
+                    self._index = {}
+                    continue
+                # Tombstone now and compact once at the end of the update.
+                position = self._index.pop(message.id)
+                list.__setitem__(self, position, cast(AnyMessage, None))
+                removed = True
+                continue
+            assert message.id is not None
+            position = self._index.get(message.id)
+            if position is None:
+                self._index[message.id] = len(self)
+                self.append(message)
+            else:
+                list.__setitem__(self, position, message)
+        if removed:
+            self[:] = [m for m in self if m is not None]
+            self._reindex()
+
+    def evict_oldest(self, count: int) -> List[AnyMessage]:
+        """Remove and return the `count` oldest messages.
+
+        Tool results are never separated from the tool call that produced them:
+        if the cut falls just before `ToolMessage`s, they are evicted too.
+        """
+        while count < len(self) and isinstance(self[count], ToolMessage):
+            count += 1
+        evicted = self[:count]
+        del self[:count]
+        self._reindex()
+        return evicted
+
+
+def _coerce(messages: Messages) -> List[AnyMessage]:
+    items = messages if isinstance(messages, list) else [messages]
+    coerced = [
+        cast(AnyMessage, message_chunk_to_message(cast(BaseMessageChunk, m)))
+        for m in convert_to_messages(items)
+    ]
+    for m in coerced:
+        if m.id is None:
+            m.id = str(uuid.uuid4())
+    return coerced
+
+
+def _as_log(left: Messages) -> MessageLog:
+    if isinstance(left, MessageLog):
+        return left.copy()
+    # A plain list restored from a checkpoint: index it once.
+    return MessageLog(_coerce(left))
+
+
+def add_messages_fast(left: Messages, right: Messages) -> MessageLog:
+    """Merge `right` into a copy of `left`, like `add_messages`.
+
+    Besides the pointer copy of the list and its index, the cost is
+    O(len(right)); `left` is left unchanged.
+
+    Args:
+        left: The current history, a `MessageLog` or any list of messages.
+        right: The messages to add, replace (same ID) or remove (`RemoveMessage`).
+    """
+    log = _as_log(left)
+    log.merge(_coerce(right))
+    return log
+
+
+class MessageSpill(Protocol):
+    """Destination for messages evicted from a bounded message log."""
+
+    def spill(self, thread_id: Optional[str], messages: Sequence[BaseMessage]) -> None:
+        """Persist `messages` evicted from the history of `thread_id`."""
+        ...
+
+
+class StoreSpill:
+    """Spill evicted messages into a LangGraph `BaseStore`.
+
+    Each message is stored under `(*namespace, thread_id)` as the dict produced
+    by `BaseMessage.model_dump()`. Keys sort in eviction order.
+    """
+
+    def __init__(
+        self, store: BaseStore, namespace: Tuple[str, ...] = ("message_spill",)
+    ) -> None:
+        """Spill into `store` under `namespace`."""
+        self.store = store
+        self.namespace = namespace
+
+    def spill(self, thread_id: Optional[str], messages: Sequence[BaseMessage]) -> None:
+        """Persist `messages` evicted from the history of `thread_id`."""
+        namespace = (*self.namespace, thread_id or "default")
+        batch = time.time_ns()
+        for position, message in enumerate(messages):
+            self.store.put(
+                namespace, f"{batch:020d}-{position:06d}", message.model_dump()
+            )
+
+
+def bounded_add_messages(
+    max_messages: int, spill: Optional[MessageSpill] = None
+) -> Callable[[Messages, Messages], MessageLog]:
+    """Create a reducer keeping at most `max_messages` messages in the state.
+
+    Once the log grows past `max_messages`, the oldest quarter of it is evicted
+    at once (keeping eviction amortized O(1) per message) and handed to `spill`.
+
+    Example:
+        ```python
+        @dataclass(slots=True)
+        class BoundedState(State):
+            messages: Annotated[
+                Sequence[AnyMessage], bounded_add_messages(200, StoreSpill(store))
+            ] = field(default_factory=list)
+        ```
+    """
+    if max_messages < 1:
+        raise ValueError("max_messages must be positive")
+    low_water = max(1, max_messages - max_messages // 4)
+
+    def reducer(left: Messages, right: Messages) -> MessageLog:
+        log = add_messages_fast(left, right)
+        if len(log) > max_messages:
+            evicted = log.evict_oldest(len(log) - low_water)
+            if spill is not None and evicted:
+                spill.spill(current_thread_id(), evicted)
+        return log
+
+    return reducer
+
+
+def history_with_spilled(
+    store: BaseStore,
+    thread_id: str,
+    messages: Sequence[AnyMessage],
+    namespace: Tuple[str, ...] = ("message_spill",),
+) -> List[Any]:
+    """Get the full history of `thread_id`: spilled messages followed by `messages`.
+
+    Spilled messages are returned as the stored dicts, oldest first.
+    """
+    items = store.search((*namespace, thread_id), limit=1_000_000)
+    spilled = sorted(items, key=lambda item: item.key)
+    return [item.value for item in spilled] + list(messages)
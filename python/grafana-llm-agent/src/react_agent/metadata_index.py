@@ -0,0 +1,461 @@
+"""A local, fuzzily searchable index of Grafana label and metric metadata.
+
+Finding the logs "closest to service_name:SportyBet Android" normally takes a
+chain of `list_datasources`, `list_*_label_names` and `list_*_label_values`
+calls, each one read back by the LLM. `MetadataIndex` keeps label names,
+label values and metric names of every Loki and Prometheus datasource in
+memory, refreshed in the background by `MetadataSyncer`, and resolves loose
+`key:value` targets to concrete selectors with trigram similarity.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from react_agent.periodic import PeriodicSync
+
+logger = logging.getLogger(__name__)
+
+ToolCaller = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+# `key:value` / `key=value` pairs; a value runs until the next key or the end
+# of the ASCII run it belongs to. `:` must touch both key and value so prose
+# such as "Note: something" is not read as a pair.
+_PAIR_KEY = re.compile(
+    r"(?<![\w/])([A-Za-z_][A-Za-z0-9_.]*)(?::(?=[^\s/:])|\s*(?:=~|!=|=)\s*(?!//))"
+)
+_PAIR_VALUE = re.compile(r"""^\s*(?:"([^"]*)"|'([^']*)'|([A-Za-z0-9 _.\-/@]*))""")
+_TRAILING_JOINERS = re.compile(r"(?:\s+(?:and|or|with|in|on))+\s*$", re.IGNORECASE)
+_MAX_VALUE_WORDS = 6
+
+
+def normalize_term(text: str) -> str:
+    """Lower-case `text` and collapse everything but letters and digits to spaces."""
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def trigrams(text: str) -> frozenset[str]:
+    """Get the set of character trigrams of the normalized `text`."""
+    padded = f"  {normalize_term(text)} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    """An inverted trigram index over a set of strings.
+
+    Similarity is the Dice coefficient of the trigram sets, so it is
+    insensitive to case, punctuation and small typos; terms whose normalized
+    forms are equal score 1.
+    """
+
+    __slots__ = ("_terms", "_normalized", "_grams", "_postings", "_ids")
+
+    def __init__(self, terms: Iterable[str] = ()) -> None:
+        """Index `terms`."""
+        self._terms: List[str] = []
+        self._normalized: List[str] = []
+        self._grams: List[frozenset[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._ids: Dict[str, int] = {}
+        for term in terms:
+            self.add(term)
+
+    def __len__(self) -> int:
+        """Get the number of indexed terms."""
+        return len(self._terms)
+
+    def __contains__(self, term: object) -> bool:
+        """Check whether `term` is indexed verbatim."""
+        return term in self._ids
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the indexed terms in insertion order."""
+        return iter(self._terms)
+
+    def add(self, term: str) -> None:
+        """Index `term` unless it is already present."""
+        if term in self._ids:
+            return
+        term_id = len(self._terms)
+        grams = trigrams(term)
+        self._ids[term] = term_id
+        self._terms.append(term)
+        self._normalized.append(normalize_term(term))
+        self._grams.append(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(term_id)
+
+    def search(
+        self, query: str, limit: int = 5, min_score: float = 0.3
+    ) -> List[Tuple[str, float]]:
+        """Find the terms most similar to `query`.
+
+        Returns:
+            Up to `limit` `(term, score)` pairs with `score >= min_score`, best first.
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        normalized = normalize_term(query)
+        shared: Counter[int] = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for term_id, count in shared.items():
+            if self._normalized[term_id] == normalized:
+                score = 1.0
+            else:
+                score = 2 * count / (len(grams) + len(self._grams[term_id]))
+            if score >= min_score:
+                scored.append((self._terms[term_id], round(score, 4)))
+        scored.sort(key=lambda item: (-item[1], len(item[0]), item[0]))
+        return scored[:limit]
+
+
+@dataclass
+class DatasourceMetadata:
+    """The label and metric metadata of one datasource."""
+
+    uid: str
+    name: str
+    type: str
+    label_names: TrigramIndex = field(default_factory=TrigramIndex)
+    label_values: Dict[str, TrigramIndex] = field(default_factory=dict)
+    metric_names: TrigramIndex = field(default_factory=TrigramIndex)
+    synced_at: float = 0.0
+
+
+@dataclass
+class PairMatch:
+    """A `key:value` target resolved against one datasource."""
+
+    datasource_uid: str
+    label: str
+    value: str
+    score: float
+
+
+def parse_selector_pairs(text: str) -> List[Tuple[str, str]]:
+    """Extract loose `key:value` / `key=value` pairs from free text.
+
+    Values may contain spaces (`service_name:SportyBet Android and ...`); they
+    end at the next key, a comma, or non-ASCII text.
+    """
+    keys = list(_PAIR_KEY.finditer(text))
+    pairs = []
+    for position, match in enumerate(keys):
+        stop = keys[position + 1].start() if position + 1 < len(keys) else len(text)
+        value_match = _PAIR_VALUE.match(text[match.end() : stop])
+        if value_match is None:
+            continue
+        value = next((g for g in value_match.groups() if g is not None), "")
+        value = _TRAILING_JOINERS.sub("", value).strip()
+        if value:
+            pairs.append((match.group(1), value))
+    return pairs
+
+
+def _value_variants(value: str) -> List[str]:
+    # A value parsed from prose may carry trailing words; try its prefixes.
+    words = value.split()
+    if len(words) <= 1:
+        return [value]
+    return [
+        " ".join(words[:n]) for n in range(min(len(words), _MAX_VALUE_WORDS), 0, -1)
+    ]
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _best_first(item: Dict[str, Any]) -> float:
+    return -float(item["score"])
+
+
+class MetadataIndex:
+    """Label names, label values and metric names of every synced datasource."""
+
+    def __init__(self) -> None:
+        """Create an empty index."""
+        self.datasources: Dict[str, DatasourceMetadata] = {}
+
+    @property
+    def ready(self) -> bool:
+        """Whether at least one datasource has been synced."""
+        return bool(self.datasources)
+
+    def update(self, metadata: DatasourceMetadata) -> None:
+        """Replace the metadata of `metadata.uid` in one step."""
+        self.datasources[metadata.uid] = metadata
+
+    def _select(self, datasource_uid: Optional[str]) -> List[DatasourceMetadata]:
+        if datasource_uid is None:
+            return list(self.datasources.values())
+        found = self.datasources.get(datasource_uid)
+        return [found] if found is not None else []
+
+    def resolve_pair(
+        self,
+        key: str,
+        value: str,
+        datasource_uid: Optional[str] = None,
+        limit: int = 5,
+    ) -> List[PairMatch]:
+        """Resolve a loose `key:value` target to concrete label/value pairs.
+
+        The score is the product of the label-name and label-value similarity.
+        """
+        matches: List[PairMatch] = []
+        for ds in self._select(datasource_uid):
+            for label, label_score in ds.label_names.search(
+                key, limit=3, min_score=0.4
+            ):
+                values = ds.label_values.get(label)
+                if not values:
+                    continue
+                best: Dict[str, float] = {}
+                for variant in _value_variants(value):
+                    for found, value_score in values.search(variant, limit=limit):
+                        best[found] = max(best.get(found, 0.0), value_score)
+                matches.extend(
+                    PairMatch(ds.uid, label, found, round(label_score * score, 4))
+                    for found, score in best.items()
+                )
+        matches.sort(key=lambda m: -m.score)
+        return matches[:limit]
+
+    def resolve_selector(
+        self,
+        pairs: Sequence[Tuple[str, str]],
+        datasource_uid: Optional[str] = None,
+        limit: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """Resolve every pair and build one label selector per datasource.
+
+        Returns:
+            Candidates best first, each with the datasource, the selector (e.g.
+            `{service_name="SportyBet Android", service_country="zm"}`), the
+            matched pairs and their mean score. A datasource must match every
+            pair to be a candidate.
+        """
+        candidates: List[Dict[str, Any]] = []
+        for ds in self._select(datasource_uid):
+            matched: List[PairMatch] = []
+            for key, value in pairs:
+                best = self.resolve_pair(key, value, ds.uid, limit=1)
+                if not best:
+                    break
+                matched.append(best[0])
+            else:
+                if not matched:
+                    continue
+                selector = ", ".join(f"{m.label}={_quote(m.value)}" for m in matched)
+                candidates.append(
+                    {
+                        "datasourceUid": ds.uid,
+                        "datasourceName": ds.name,
+                        "datasourceType": ds.type,
+                        "selector": "{" + selector + "}",
+                        "matches": [
+                            {"label": m.label, "value": m.value, "score": m.score}
+                            for m in matched
+                        ],
+                        "score": round(sum(m.score for m in matched) / len(matched), 4),
+                    }
+                )
+        candidates.sort(key=_best_first)
+        return candidates[:limit]
+
+    def search(
+        self, text: str, datasource_uid: Optional[str] = None, limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Fuzzy-search label names, label values and metric names for `text`."""
+        hits: List[Dict[str, Any]] = []
+        for ds in self._select(datasource_uid):
+            for name, score in ds.metric_names.search(text, limit=limit):
+                hits.append(
+                    {
+                        "datasourceUid": ds.uid,
+                        "kind": "metric",
+                        "name": name,
+                        "score": score,
+                    }
+                )
+            for name, score in ds.label_names.search(text, limit=limit):
+                hits.append(
+                    {
+                        "datasourceUid": ds.uid,
+                        "kind": "label",
+                        "name": name,
+                        "score": score,
+                    }
+                )
+            for label, values in ds.label_values.items():
+                for value, score in values.search(text, limit=limit):
+                    hits.append(
+                        {
+                            "datasourceUid": ds.uid,
+                            "kind": "label_value",
+                            "label": label,
+                            "value": value,
+                            "score": score,
+                        }
+                    )
+        hits.sort(key=_best_first)
+        return hits[:limit]
+
+
+# 各類型數據源的 MCP 工具名稱：(標籤名稱, 標籤值, 指標名稱)
+_SYNC_TOOLS: Mapping[str, Tuple[str, str, Optional[str]]] = {
+    "loki": ("list_loki_label_names", "list_loki_label_values", None),
+    "prometheus": (
+        "list_prometheus_label_names",
+        "list_prometheus_label_values",
+        "list_prometheus_metric_names",
+    ),
+}
+
+
+def _as_list(result: Any, *keys: str) -> List[Any]:
+    if isinstance(result, dict):
+        for key in keys:
+            value = result.get(key)
+            if isinstance(value, list):
+                return value
+        return []
+    return result if isinstance(result, list) else []
+
+
+class MetadataSyncer(PeriodicSync):
+    """Fill a `MetadataIndex` from the Grafana MCP tools, periodically.
+
+    `call_tool(name, arguments)` must call an MCP tool and return its decoded
+    result. A datasource whose sync fails keeps its previous metadata.
+    """
+
+    name = "元數據索引"
+
+    def __init__(
+        self,
+        index: MetadataIndex,
+        call_tool: ToolCaller,
+        *,
+        max_labels: int = 200,
+        max_metrics: int = 5000,
+        max_concurrency: int = 4,
+    ) -> None:
+        """Sync into `index` through `call_tool`."""
+        super().__init__()
+        self.index = index
+        self.call_tool = call_tool
+        self.max_labels = max_labels
+        self.max_metrics = max_metrics
+        self.max_concurrency = max_concurrency
+        self.last_sync: float = 0.0
+
+    async def sync_once(self) -> int:
+        """Sync every Loki and Prometheus datasource once.
+
+        Returns:
+            The number of datasources synced successfully.
+        """
+        datasources = _as_list(
+            await self.call_tool("list_datasources", {}), "datasources"
+        )
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        jobs = [
+            self._sync_datasource(ds, semaphore)
+            for ds in datasources
+            if isinstance(ds, dict) and ds.get("type") in _SYNC_TOOLS and ds.get("uid")
+        ]
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        synced = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.warning(f"同步數據源元數據失敗: {result!r}")
+            else:
+                synced += 1
+        self.last_sync = time.time()
+        return synced
+
+    async def _call(
+        self, semaphore: asyncio.Semaphore, name: str, arguments: Dict[str, Any]
+    ) -> Any:
+        async with semaphore:
+            return await self.call_tool(name, arguments)
+
+    async def _sync_datasource(
+        self, ds: Dict[str, Any], semaphore: asyncio.Semaphore
+    ) -> None:
+        uid = str(ds["uid"])
+        names_tool, values_tool, metrics_tool = _SYNC_TOOLS[ds["type"]]
+        metadata = DatasourceMetadata(
+            uid=uid, name=str(ds.get("name", uid)), type=ds["type"]
+        )
+
+        labels = _as_list(
+            await self._call(semaphore, names_tool, {"datasourceUid": uid}), "labels"
+        )
+        labels = [str(label) for label in labels[: self.max_labels]]
+        values = await asyncio.gather(
+            *(
+                self._call(
+                    semaphore, values_tool, {"datasourceUid": uid, "labelName": label}
+                )
+                for label in labels
+            )
+        )
+        for label, label_values in zip(labels, values):
+            metadata.label_names.add(label)
+            metadata.label_values[label] = TrigramIndex(
+                str(v) for v in _as_list(label_values, "values")
+            )
+        if metrics_tool is not None:
+            metrics = await self._call(
+                semaphore,
+                metrics_tool,
+                {"datasourceUid": uid, "limit": self.max_metrics},
+            )
+            for name in _as_list(metrics, "metrics", "names"):
+                metadata.metric_names.add(str(name))
+        metadata.synced_at = time.time()
+        self.index.update(metadata)
+
+    @property
+    def ready(self) -> bool:
+        """Whether at least one datasource has been synced."""
+        return self.index.ready
+
+
+def format_resolution_hint(candidates: Sequence[Dict[str, Any]]) -> str:
+    """Render resolved selectors as a short note for the model."""
+    lines = [
+        "已從本地標籤索引預先解析用戶提到的目標，可直接用於查詢，無需再逐一呼叫 list_*_label_* 工具："
+    ]
+    for candidate in candidates:
+        lines.append(
+            f"- {candidate['datasourceType']} 數據源 {candidate['datasourceName']} "
+            f"(uid: {candidate['datasourceUid']}): {candidate['selector']} "
+            f"(相似度 {candidate['score']:.2f})"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,92 @@
+"""In-process counters, gauges and summaries for the agent's runtime behavior.
+
+Components record what they did (cache hits, guard decisions, bytes avoided,
+...) into the shared `METRICS` registry; `snapshot()` returns everything as
+plain data for logging, tests or an HTTP endpoint.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry:
+    """A thread-safe registry of labelled counters, gauges and value summaries."""
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._summaries: Dict[str, Dict[LabelKey, Dict[str, float]]] = {}
+
+    def incr(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add `value` to the counter `name` with `labels`."""
+        key = _key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: Any) -> None:
+        """Set the gauge `name` with `labels` to `value`."""
+        key = _key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record one observation of `value` in the summary `name` with `labels`."""
+        key = _key(labels)
+        with self._lock:
+            series = self._summaries.setdefault(name, {})
+            summary = series.get(key)
+            if summary is None:
+                series[key] = {"count": 1, "sum": value, "min": value, "max": value}
+            else:
+                summary["count"] += 1
+                summary["sum"] += value
+                summary["min"] = min(summary["min"], value)
+                summary["max"] = max(summary["max"], value)
+
+    def counter(self, name: str, **labels: Any) -> float:
+        """Get the current value of counter `name` with exactly `labels`."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_key(labels), 0)
+
+    def gauge(self, name: str, **labels: Any) -> float:
+        """Get the current value of gauge `name` with exactly `labels`."""
+        with self._lock:
+            return self._gauges.get(name, {}).get(_key(labels), 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get all counters, gauges and summaries as `{name: [{"labels", ...values}]}`."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                for name, series in self._counters.items()
+            }
+            gauges = {
+                name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                for name, series in self._gauges.items()
+            }
+            summaries = {
+                name: [{"labels": dict(k), **v} for k, v in series.items()]
+                for name, series in self._summaries.items()
+            }
+        return {"counters": counters, "gauges": gauges, "summaries": summaries}
+
+    def reset(self) -> None:
+        """Forget every recorded value."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+
+METRICS = MetricsRegistry()
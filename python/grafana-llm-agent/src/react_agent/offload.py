@@ -0,0 +1,137 @@
+"""Keep CPU-bound tool-result processing off the event loop.
+
+Every session shares one asyncio loop, so summarizing thousands of log lines
+or decoding a multi-megabyte result stalls all other coroutines for as long
+as it takes. Two tools here:
+
+- `offload` runs a function in a process pool once its input is at least
+  `Configuration.offload_threshold_bytes`, and inline below that. Decoding
+  and parsing hold the GIL for the whole call, so a thread pool would not
+  shorten the stall; a process only pays off when the result shipped back is
+  much smaller than the input (a summary, not the decoded payload).
+- `LoopLagMonitor` measures how late the loop wakes up a sleeping task and
+  records it as `event_loop_lag_seconds`, to tell whether the loop is stalled.
+
+The pool uses the `spawn` start method, so each worker imports the package
+once when it starts.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from react_agent.configuration import Configuration
+from react_agent.metrics import METRICS, MetricsRegistry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+def _executor(max_workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != max_workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(
+            max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        _pool_workers = max_workers
+    return _pool
+
+
+async def offload(func: Callable[..., T], *args: Any, size: int, **kwargs: Any) -> T:
+    """Run `func(*args, **kwargs)` in the process pool if `size` bytes is large.
+
+    `func` must be a module-level function and its arguments and result
+    picklable. Below the threshold (or with offloading disabled) it runs inline.
+    """
+    configuration = Configuration.from_context()
+    threshold = configuration.offload_threshold_bytes
+    if threshold <= 0 or size < threshold:
+        return func(*args, **kwargs)
+    METRICS.incr("offloaded_calls", function=func.__name__)
+    loop = asyncio.get_running_loop()
+    executor = _executor(max(1, configuration.offload_max_workers))
+    return await loop.run_in_executor(
+        executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_offload_pool() -> None:
+    """Stop the worker processes of the pool, e.g. at process exit."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+class LoopLagMonitor:
+    """Measure event-loop lag: how much later than asked a sleeping task wakes up.
+
+    The task is bound to the event loop that started it, like `PeriodicSync`.
+    """
+
+    def __init__(
+        self,
+        *,
+        metrics: MetricsRegistry = METRICS,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        """Create a stopped monitor recording into `metrics`."""
+        self.metrics = metrics
+        self.clock = clock
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether the monitor runs on the current event loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return (
+            self._task is not None
+            and not self._task.done()
+            and self._task.get_loop() is loop
+        )
+
+    def start(self, interval: float) -> None:
+        """Sample the lag every `interval` seconds; does nothing if already running."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run(interval), name="loop-lag")
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            started = self.clock()
+            await asyncio.sleep(interval)
+            lag = max(0.0, self.clock() - started - interval)
+            self.max_lag = max(self.max_lag, lag)
+            self.metrics.observe("event_loop_lag_seconds", lag)
+            self.metrics.set("event_loop_lag_last_seconds", lag)
+            if lag > 1:
+                logger.warning(f"事件迴圈延遲 {lag:.2f} 秒")
+
+    async def stop(self) -> None:
+        """Cancel the monitor."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+LOOP_LAG = LoopLagMonitor()
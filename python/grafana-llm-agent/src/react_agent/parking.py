@@ -0,0 +1,299 @@
+"""Park runs that wait on `interrupt()` instead of keeping them in memory.
+
+A run that hits `interrupt()` (e.g. `incrementCounterWithConfirm`) may wait
+minutes or hours for a human. `InterruptParking` runs the graph with
+synchronous checkpoint durability, so when a run stops at an interrupt its
+state is fully persisted before the worker returns. Then it:
+
+- drops the thread's in-process caches (see `release`);
+- records the thread in a shared `BaseStore` index with its interrupts and
+  expiry time.
+
+Nothing stays in memory for the paused run: no graph task, no worker slot,
+no per-thread cache. MCP sessions are shared across threads and are not
+pinned by it. Because both the checkpointer and the index are shared, any
+worker can `resume` the thread; it rehydrates from the latest checkpoint.
+Any worker can also reap interrupts abandoned past their expiry, which
+deletes their checkpoints. The number of parked threads is kept in the store
+next to the index, so the gauge agrees across workers.
+
+With `forget_finished`, a thread's checkpoints are also deleted when its run
+ends without an interrupt, so an in-process checkpointer (`InMemorySaver`)
+only ever holds the parked threads, each until it is resumed or expires.
+
+Metrics: gauge `parked_threads`, summaries `interrupt_resume_seconds` (resume
+request to first state update) and `interrupt_parked_seconds`, counter
+`interrupt_expired`.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, cast
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.pregel import Pregel
+from langgraph.store.base import BaseStore
+from langgraph.types import Command
+
+from react_agent.configuration import Configuration
+from react_agent.metrics import METRICS, MetricsRegistry
+from react_agent.periodic import PeriodicSync
+from react_agent.serialization import drop_thread_cache
+
+logger = logging.getLogger(__name__)
+
+Releaser = Callable[[str], None]
+
+
+class InterruptExpired(LookupError):
+    """The thread's interrupt expired and its checkpoints were deleted."""
+
+
+@dataclass(frozen=True)
+class ParkedThread:
+    """A thread persisted while it waits on one or more interrupts."""
+
+    thread_id: str
+    parked_at: float
+    expires_at: float
+    interrupts: List[Dict[str, Any]]
+    """`{"id", "value"}` of each pending interrupt."""
+
+    @classmethod
+    def from_value(cls, thread_id: str, value: Dict[str, Any]) -> ParkedThread:
+        """Rebuild a parked thread from its store value."""
+        return cls(
+            thread_id, value["parked_at"], value["expires_at"], value["interrupts"]
+        )
+
+    def to_value(self) -> Dict[str, Any]:
+        """Get the store value of this parked thread."""
+        return {
+            "parked_at": self.parked_at,
+            "expires_at": self.expires_at,
+            "interrupts": self.interrupts,
+        }
+
+
+def _thread_config(thread_id: str, config: Optional[RunnableConfig]) -> RunnableConfig:
+    config = config or {}
+    configurable = {**(config.get("configurable") or {}), "thread_id": thread_id}
+    return {**config, "configurable": configurable}
+
+
+def _thread_config_id(config: RunnableConfig) -> str:
+    thread_id = (config.get("configurable") or {}).get("thread_id")
+    if thread_id is None:
+        raise ValueError("Parking interrupts requires a thread_id")
+    return str(thread_id)
+
+
+class InterruptParking(PeriodicSync):
+    """Run, park, resume and expire interrupted threads of `graph`.
+
+    The background task started by `start(interval)` reaps expired interrupts
+    and refreshes the `parked_threads` gauge.
+    """
+
+    name = "interrupt-parking"
+
+    def __init__(
+        self,
+        graph: Pregel[Any, Any, Any, Any],
+        store: BaseStore,
+        *,
+        expiry_seconds: Optional[float] = None,
+        namespace: Tuple[str, ...] = ("parked_interrupts",),
+        release: Sequence[Releaser] = (drop_thread_cache,),
+        forget_finished: bool = False,
+        metrics: MetricsRegistry = METRICS,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Park threads of `graph` (compiled with a checkpointer) in `store`.
+
+        Args:
+            graph: The compiled graph. Its checkpointer must be shared by every worker.
+            store: The index of parked threads, shared by every worker.
+            expiry_seconds: How long an interrupt may wait before it is abandoned.
+                Defaults to `Configuration.interrupt_expiry_seconds`.
+            namespace: The store namespace of the index.
+            release: Callables freeing the in-process resources of a thread ID.
+            forget_finished: Delete the checkpoints of threads whose run ends
+                without an interrupt (the conversation cannot be continued).
+            metrics: Where to record parking metrics.
+            clock: Wall clock; parked times are compared across workers.
+        """
+        super().__init__()
+        if not isinstance(graph.checkpointer, BaseCheckpointSaver):
+            raise ValueError("Parking interrupts requires a graph with a checkpointer")
+        self.graph = graph
+        self.checkpointer: BaseCheckpointSaver[Any] = graph.checkpointer
+        self.store = store
+        if expiry_seconds is None:
+            expiry_seconds = Configuration.from_context().interrupt_expiry_seconds
+        self.expiry_seconds = expiry_seconds
+        self.namespace = namespace
+        # 計數放在索引的同層命名空間，避免出現在索引的前綴搜尋中
+        self.count_namespace = (f"{namespace[0]}_count", *namespace[1:])
+        self.release = list(release)
+        self.forget_finished = forget_finished
+        self.metrics = metrics
+        self.clock = clock
+
+    @property
+    def ready(self) -> bool:
+        """Parking needs no warm-up."""
+        return True
+
+    async def run(self, input: Any, config: RunnableConfig) -> Dict[str, Any]:
+        """Run `graph` on `input` like `ainvoke`, parking the thread if it gets interrupted."""
+        thread_id = _thread_config_id(config)
+        result = await self.graph.ainvoke(input, config, durability="sync")
+        await self._after_run(thread_id, result)
+        return result
+
+    async def resume(
+        self, thread_id: str, value: Any, config: Optional[RunnableConfig] = None
+    ) -> Dict[str, Any]:
+        """Resume the parked `thread_id` with the human's `value`, on any worker.
+
+        The run's deadline (`run_timeout_seconds`) restarts, so the human's
+        wait does not count against it.
+
+        Raises:
+            InterruptExpired: The interrupt expired; the thread was deleted.
+        """
+        started = self.clock()
+        parked = await self.get(thread_id)
+        if parked is not None and parked.expires_at <= started:
+            await self.expire(thread_id)
+            raise InterruptExpired(f"Interrupt of thread {thread_id} expired")
+
+        # 等待人工確認的時間不計入執行期限，恢復時重新起算
+        configurable = (config or {}).get("configurable") or {}
+        timeout = configurable.get(
+            "run_timeout_seconds", Configuration.from_context().run_timeout_seconds
+        )
+        command: Command[Any] = Command(resume=value)
+        if timeout > 0:
+            command = Command(
+                resume=value, update={"run_deadline": time.time() + timeout}
+            )
+
+        result: Dict[str, Any] = {}
+        interrupts: List[Any] = []
+        first_update = True
+        async for mode, chunk in self.graph.astream(
+            command,
+            _thread_config(thread_id, config),
+            stream_mode=["updates", "values"],
+            durability="sync",
+        ):
+            if mode == "values":
+                result = cast(Dict[str, Any], chunk)
+                continue
+            if first_update:
+                first_update = False
+                self.metrics.observe("interrupt_resume_seconds", self.clock() - started)
+            if isinstance(chunk, dict) and "__interrupt__" in chunk:
+                interrupts.extend(chunk["__interrupt__"])
+        if interrupts:
+            result = {**result, "__interrupt__": interrupts}
+
+        if parked is not None:
+            self.metrics.observe("interrupt_parked_seconds", started - parked.parked_at)
+            await self._unindex(thread_id)
+        await self._after_run(thread_id, result)
+        return result
+
+    async def _after_run(self, thread_id: str, result: Any) -> None:
+        if isinstance(result, dict) and result.get("__interrupt__"):
+            await self.park(thread_id, result["__interrupt__"])
+            return
+        if self.forget_finished:
+            await self.checkpointer.adelete_thread(thread_id)
+        self._release(thread_id)
+        self.metrics.set("parked_threads", await self.count())
+
+    async def count(self) -> int:
+        """Get the number of parked threads, across workers."""
+        item = await self.store.aget(self.count_namespace, "parked")
+        return 0 if item is None else int(item.value["count"])
+
+    async def _set_count(self, count: int) -> None:
+        await self.store.aput(self.count_namespace, "parked", {"count": max(0, count)})
+        self.metrics.set("parked_threads", max(0, count))
+
+    async def _unindex(self, thread_id: str) -> None:
+        if await self.store.aget(self.namespace, thread_id) is not None:
+            await self.store.adelete(self.namespace, thread_id)
+            # 併發更新可能讓計數短暫偏差，`sync_once` 會以索引重新校正
+            await self._set_count(await self.count() - 1)
+
+    async def park(self, thread_id: str, interrupts: Sequence[Any]) -> ParkedThread:
+        """Record `thread_id` as waiting on `interrupts` and free its resources."""
+        now = self.clock()
+        parked = ParkedThread(
+            thread_id,
+            now,
+            now + self.expiry_seconds,
+            [
+                {"id": getattr(i, "id", None), "value": getattr(i, "value", i)}
+                for i in interrupts
+            ],
+        )
+        new = await self.store.aget(self.namespace, thread_id) is None
+        await self.store.aput(self.namespace, thread_id, parked.to_value())
+        if new:
+            await self._set_count(await self.count() + 1)
+        self._release(thread_id)
+        logger.info(f"執行緒 {thread_id} 等待人工確認，已停放並釋放資源")
+        return parked
+
+    def _release(self, thread_id: str) -> None:
+        for release in self.release:
+            try:
+                release(thread_id)
+            except Exception as e:
+                logger.warning(f"釋放執行緒 {thread_id} 的資源失敗: {e!r}")
+
+    async def get(self, thread_id: str) -> Optional[ParkedThread]:
+        """Get the parked `thread_id`, if it is parked."""
+        item = await self.store.aget(self.namespace, thread_id)
+        return None if item is None else ParkedThread.from_value(thread_id, item.value)
+
+    async def parked(self) -> List[ParkedThread]:
+        """Get every parked thread, across workers."""
+        parked: List[ParkedThread] = []
+        offset = 0
+        while True:
+            items = await self.store.asearch(self.namespace, limit=1000, offset=offset)
+            parked.extend(
+                ParkedThread.from_value(item.key, item.value) for item in items
+            )
+            if len(items) < 1000:
+                return parked
+            offset += len(items)
+
+    async def expire(self, thread_id: str) -> None:
+        """Abandon the interrupt of `thread_id`: delete its checkpoints and index entry."""
+        await self.checkpointer.adelete_thread(thread_id)
+        await self._unindex(thread_id)
+        self._release(thread_id)
+        self.metrics.incr("interrupt_expired")
+        logger.info(f"執行緒 {thread_id} 的人工確認已逾時，已刪除")
+
+    async def sync_once(self) -> Dict[str, int]:
+        """Expire abandoned interrupts and refresh the `parked_threads` gauge."""
+        now = self.clock()
+        parked = await self.parked()
+        expired = [p for p in parked if p.expires_at <= now]
+        for entry in expired:
+            await self.expire(entry.thread_id)
+        count = len(parked) - len(expired)
+        await self._set_count(count)
+        return {"parked": count, "expired": len(expired)}
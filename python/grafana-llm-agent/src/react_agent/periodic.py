@@ -0,0 +1,90 @@
+"""Background tasks that keep local indexes in sync with Grafana."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicSync(ABC):
+    """Run `sync_once` now and then every `interval` seconds in a background task.
+
+    Subclasses implement `sync_once` and `ready`. The task is bound to the
+    event loop that started it; `start` on another loop starts a new one.
+    """
+
+    name = "sync"
+
+    def __init__(self) -> None:
+        """Create a stopped syncer."""
+        self._task: Optional[asyncio.Task[None]] = None
+        self._synced: Optional[asyncio.Event] = None
+
+    @abstractmethod
+    async def sync_once(self) -> Any:
+        """Sync once and return a short result for the log."""
+
+    @property
+    @abstractmethod
+    def ready(self) -> bool:
+        """Whether the synced data is usable."""
+
+    @property
+    def running(self) -> bool:
+        """Whether the background task is running on the current event loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return (
+            self._task is not None
+            and not self._task.done()
+            and self._task.get_loop() is loop
+        )
+
+    def start(self, interval: float) -> None:
+        """Start syncing every `interval` seconds.
+
+        Does nothing if the task already runs on the current event loop.
+        """
+        if self.running:
+            return
+        self._synced = asyncio.Event()
+        self._task = asyncio.create_task(self._run(interval), name=self.name)
+
+    async def _run(self, interval: float) -> None:
+        assert self._synced is not None
+        while True:
+            try:
+                result = await self.sync_once()
+                logger.info(f"{self.name} 同步完成: {result}")
+            except Exception as e:
+                logger.warning(f"{self.name} 同步失敗: {e!r}")
+            self._synced.set()
+            await asyncio.sleep(interval)
+
+    async def wait_synced(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the first background sync to finish."""
+        if self.ready:
+            return True
+        if self._synced is None or not self.running:
+            return False
+        try:
+            await asyncio.wait_for(self._synced.wait(), timeout)
+        except TimeoutError:
+            return False
+        return self.ready
+
+    async def stop(self) -> None:
+        """Cancel the background task."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,456 @@
+"""Speculative prefetch of likely follow-up tool calls.
+
+The investigation workflow is predictable: after `list_datasources` the model
+almost always lists the label names of each Loki/Prometheus datasource. While
+`call_model` waits on the LLM, `SpeculativeExecutor` runs the most probable
+follow-up read-only calls and parks their results in a `PrefetchCache`. When
+the model then issues one of those calls, `PrefetchCache.interceptor` answers
+it from the cache (waiting for the prefetch if it is still running).
+
+Predictions come from `static_rules` and from `TransitionStats`, which learns
+tool-to-tool transition frequencies from past traces. Launches, hits and
+wasted (never used) prefetches are counted in `METRICS`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from react_agent.metrics import METRICS, MetricsRegistry
+from react_agent.range_cache import Handler
+
+if TYPE_CHECKING:
+    from langchain_mcp_adapters.interceptors import (
+        MCPToolCallRequest,
+        MCPToolCallResult,
+    )
+
+logger = logging.getLogger(__name__)
+
+# 可安全推測執行的 Grafana MCP 唯讀工具；以明確清單列出，新工具不會因為名稱前綴就被推測呼叫。
+# 查詢日誌與指標的 query_* 工具雖然唯讀，但成本高，不預取
+READ_ONLY_TOOLS = frozenset(
+    {
+        "list_datasources",
+        "get_datasource_by_uid",
+        "get_datasource_by_name",
+        "list_loki_label_names",
+        "list_loki_label_values",
+        "list_prometheus_label_names",
+        "list_prometheus_label_values",
+        "list_prometheus_metric_names",
+        "list_prometheus_metric_metadata",
+        "search_dashboards",
+        "get_dashboard_by_uid",
+        "get_dashboard_summary",
+        "get_dashboard_panel_queries",
+        "list_alert_rules",
+        "get_alert_rule_by_uid",
+        "list_contact_points",
+        "list_teams",
+        "list_incidents",
+        "get_incident",
+        "list_oncall_schedules",
+        "list_sift_investigations",
+        "get_sift_investigation",
+        "get_sift_analysis",
+    }
+)
+# 常見、值得預先展開的標籤（按優先順序）
+_INTERESTING_LABELS = (
+    "service_name",
+    "app",
+    "job",
+    "namespace",
+    "service",
+    "container",
+    "level",
+)
+
+# 是否為推測性呼叫；推測性呼叫把結果存入快取而不是交給模型
+_speculative: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "speculative_prefetch", default=False
+)
+
+
+def is_read_only(tool_name: str) -> bool:
+    """Whether `tool_name` only reads data and is therefore safe to run speculatively."""
+    return tool_name in READ_ONLY_TOOLS
+
+
+def call_key(name: str, args: Mapping[str, Any]) -> str:
+    """Get the canonical cache key of a tool call."""
+    return name + json.dumps(args, sort_keys=True, default=str)
+
+
+@dataclass(frozen=True)
+class Prediction:
+    """A tool call expected to follow, with its estimated probability."""
+
+    name: str
+    args: Tuple[Tuple[str, Any], ...]
+    probability: float
+
+    @classmethod
+    def of(cls, name: str, args: Mapping[str, Any], probability: float) -> Prediction:
+        """Create a prediction from an argument mapping."""
+        return cls(name, tuple(sorted(args.items())), probability)
+
+    @property
+    def key(self) -> str:
+        """The cache key of the predicted call."""
+        return call_key(self.name, dict(self.args))
+
+
+@dataclass
+class ToolStep:
+    """A completed tool call: its name, arguments, decoded result and call ID."""
+
+    name: str
+    args: Dict[str, Any]
+    result: Any = None
+    call_id: Optional[str] = None
+
+
+def _datasources(result: Any) -> List[Dict[str, Any]]:
+    if isinstance(result, dict):
+        result = result.get("datasources", [])
+    return [ds for ds in result or [] if isinstance(ds, dict) and ds.get("uid")]
+
+
+# `static_rules` 只讀這些工具的結果，其餘工具的結果不必解碼
+RESULT_TOOLS = frozenset(
+    {
+        "list_datasources",
+        "list_loki_label_names",
+        "list_prometheus_label_names",
+        "search_dashboards",
+    }
+)
+
+
+def static_rules(step: ToolStep) -> List[Prediction]:
+    """Predict follow-ups of `step` from hand-written rules of the usual workflow."""
+    predictions: List[Prediction] = []
+    if step.name == "list_datasources":
+        for ds in _datasources(step.result):
+            args = {"datasourceUid": ds["uid"]}
+            if ds.get("type") == "loki":
+                predictions.append(Prediction.of("list_loki_label_names", args, 0.9))
+            elif ds.get("type") == "prometheus":
+                predictions.append(
+                    Prediction.of("list_prometheus_label_names", args, 0.7)
+                )
+    elif step.name in ("list_loki_label_names", "list_prometheus_label_names"):
+        labels = step.result if isinstance(step.result, list) else []
+        values_tool = step.name.replace("_names", "_values")
+        uid = step.args.get("datasourceUid")
+        for label in [label for label in _INTERESTING_LABELS if label in labels][:2]:
+            predictions.append(
+                Prediction.of(
+                    values_tool, {"datasourceUid": uid, "labelName": label}, 0.6
+                )
+            )
+    elif step.name == "search_dashboards":
+        hits = step.result if isinstance(step.result, list) else []
+        if hits and isinstance(hits[0], dict) and hits[0].get("uid"):
+            predictions.append(
+                Prediction.of("get_dashboard_by_uid", {"uid": hits[0]["uid"]}, 0.5)
+            )
+    return predictions
+
+
+class TransitionStats:
+    """Tool-to-tool transition frequencies learned from past traces.
+
+    A learned transition `A -> B` becomes a prediction only when every
+    required argument of `B` can be copied from the arguments of `A` (e.g. a
+    shared `datasourceUid`).
+    """
+
+    def __init__(self, min_observations: int = 5) -> None:
+        """Require `min_observations` of `A` before predicting its successors."""
+        self.min_observations = min_observations
+        self.transitions: Dict[str, Counter[str]] = {}
+
+    def observe(self, previous: Iterable[str], current: Iterable[str]) -> None:
+        """Record that the tools in `current` were called right after those in `previous`."""
+        current = list(current)
+        for name in previous:
+            counts = self.transitions.setdefault(name, Counter())
+            counts.update(current)
+
+    def observe_trace(self, steps: Sequence[Sequence[str]]) -> None:
+        """Record a past trace given as the tool names called at each step."""
+        for previous, current in zip(steps, steps[1:]):
+            self.observe(previous, current)
+
+    def probability(self, current: str, following: str) -> float:
+        """Get the estimated probability that `following` is called after `current`."""
+        counts = self.transitions.get(current)
+        if not counts:
+            return 0.0
+        return counts[following] / sum(counts.values())
+
+    def predict(
+        self, step: ToolStep, required_args: Mapping[str, Sequence[str]]
+    ) -> List[Prediction]:
+        """Predict read-only follow-ups of `step` whose arguments can be inferred."""
+        counts = self.transitions.get(step.name)
+        if not counts or sum(counts.values()) < self.min_observations:
+            return []
+        total = sum(counts.values())
+        predictions = []
+        for name, count in counts.most_common():
+            required = required_args.get(name)
+            if required is None or not is_read_only(name) or name == step.name:
+                continue
+            if not all(arg in step.args for arg in required):
+                continue
+            predictions.append(
+                Prediction.of(
+                    name, {arg: step.args[arg] for arg in required}, count / total
+                )
+            )
+        return predictions
+
+    def to_dict(self) -> Dict[str, Dict[str, int]]:
+        """Export the counts, e.g. to persist them between runs."""
+        return {k: dict(v) for k, v in self.transitions.items()}
+
+    @classmethod
+    def from_dict(
+        cls, data: Mapping[str, Mapping[str, int]], **kwargs: Any
+    ) -> TransitionStats:
+        """Restore counts exported with `to_dict`."""
+        stats = cls(**kwargs)
+        stats.transitions = {k: Counter(v) for k, v in data.items()}
+        return stats
+
+
+@dataclass
+class _Entry:
+    future: asyncio.Future[MCPToolCallResult]
+    expires: float
+    used: bool = False
+
+
+class PrefetchCache:
+    """Short-lived results of speculative calls, each consumed by at most one real call."""
+
+    def __init__(
+        self,
+        ttl: float = 120.0,
+        max_entries: int = 256,
+        *,
+        metrics: MetricsRegistry = METRICS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Keep prefetched results for `ttl` seconds, at most `max_entries` of them."""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.metrics = metrics
+        self.clock = clock
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __contains__(self, key: object) -> bool:
+        """Whether a live prefetch exists for `key`."""
+        entry = self._entries.get(key)  # type: ignore[call-overload]
+        return entry is not None and entry.expires > self.clock()
+
+    def _expire(self) -> None:
+        now = self.clock()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires > now and len(self._entries) <= self.max_entries:
+                break
+            self._discard(key)
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        if not entry.used:
+            self.metrics.incr("prefetch_wasted", tool=key.split("{", 1)[0])
+        _fail(entry.future, _PrefetchAbandoned(key))
+
+    def reserve(self, key: str) -> bool:
+        """Announce a speculative call for `key` before it starts.
+
+        Real calls arriving in between wait for it instead of racing it.
+
+        Returns:
+            False if a live prefetch for `key` already exists.
+        """
+        self._expire()
+        if key in self:
+            return False
+        future: asyncio.Future[MCPToolCallResult] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._entries[key] = _Entry(future, self.clock() + self.ttl)
+        return True
+
+    def release(self, key: str, error: BaseException) -> None:
+        """Give up on the reserved prefetch of `key`; waiting real calls run normally."""
+        entry = self._entries.get(key)
+        if entry is not None and not entry.future.done():
+            self._entries.pop(key, None)
+            _fail(entry.future, error)
+
+    async def interceptor(
+        self, request: MCPToolCallRequest, handler: Handler
+    ) -> MCPToolCallResult:
+        """Store results of speculative calls; serve real calls from them."""
+        from mcp.types import CallToolResult
+
+        key = call_key(request.name, request.args)
+        if _speculative.get():
+            entry = self._entries.get(key)
+            if entry is None or entry.future.done():
+                self.reserve(key)
+                entry = self._entries[key]
+            try:
+                result = await handler(request)
+            except BaseException as e:
+                self.release(key, e)
+                raise
+            if isinstance(result, CallToolResult) and result.isError:
+                # 失敗的結果不交給真實呼叫，讓它自行執行
+                self.metrics.incr("prefetch_failed", tool=request.name)
+                self._entries.pop(key, None)
+                _fail(entry.future, _PrefetchAbandoned(key))
+                return result
+            if not entry.future.done():
+                entry.future.set_result(result)
+            return result
+
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is not None and not entry.used:
+            entry.used = True
+            try:
+                result = await asyncio.shield(entry.future)
+            except Exception:
+                # 推測呼叫失敗時改為正常執行
+                return await handler(request)
+            self.metrics.incr("prefetch_hits", tool=request.name)
+            self._entries.pop(key, None)
+            return result
+        return await handler(request)
+
+
+class _PrefetchAbandoned(Exception):
+    """The speculative call was dropped before it produced a result."""
+
+
+def _fail(future: asyncio.Future[Any], error: BaseException) -> None:
+    if future.done():
+        return
+    if not isinstance(error, Exception):
+        error = _PrefetchAbandoned(repr(error))
+    future.set_exception(error)
+    future.exception()  # 標記為已讀取，沒有真實呼叫等待時不產生警告
+
+
+ToolRunner = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass
+class SpeculativeExecutor:
+    """Launch predicted read-only calls in the background, within a budget."""
+
+    cache: PrefetchCache
+    run_tool: ToolRunner
+    """Invokes a tool through the MCP interceptor chain, e.g. `tool.ainvoke`."""
+    max_per_step: int = 4
+    max_inflight: int = 8
+    min_probability: float = 0.3
+    metrics: MetricsRegistry = METRICS
+    _inflight: Set[asyncio.Task[Any]] = field(default_factory=set)
+
+    async def _run(self, prediction: Prediction) -> None:
+        _speculative.set(True)
+        try:
+            await self.run_tool(prediction.name, dict(prediction.args))
+        except BaseException as e:
+            self.metrics.incr("prefetch_failed", tool=prediction.name)
+            logger.debug(f"推測性預取 {prediction.name} 失敗: {e!r}")
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            # 沒有走到攔截器（例如工具不存在）時釋放預留
+            self.cache.release(prediction.key, _PrefetchAbandoned(prediction.key))
+
+    def launch(self, predictions: Iterable[Prediction]) -> List[Prediction]:
+        """Start the most probable predictions that fit the budget.
+
+        Returns:
+            The predictions actually launched.
+        """
+        best: Dict[str, Prediction] = {}
+        for prediction in predictions:
+            if prediction.probability < self.min_probability or not is_read_only(
+                prediction.name
+            ):
+                continue
+            current = best.get(prediction.key)
+            if current is None or current.probability < prediction.probability:
+                best[prediction.key] = prediction
+        ranked = sorted(best.values(), key=lambda p: -p.probability)
+        launched: List[Prediction] = []
+        for prediction in ranked:
+            if (
+                len(launched) >= self.max_per_step
+                or len(self._inflight) >= self.max_inflight
+            ):
+                self.metrics.incr(
+                    "prefetch_skipped_budget", value=len(ranked) - len(launched)
+                )
+                break
+            if not self.cache.reserve(prediction.key):
+                continue
+            task = asyncio.create_task(
+                self._run(prediction), name=f"prefetch-{prediction.name}"
+            )
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            self.metrics.incr("prefetch_launched", tool=prediction.name)
+            launched.append(prediction)
+        return launched
+
+
+def prefetch_stats(metrics: MetricsRegistry = METRICS) -> Dict[str, float]:
+    """Summarize prefetch effectiveness: launched, hits, wasted and hit rate."""
+    counters = metrics.snapshot()["counters"]
+
+    def total(name: str) -> float:
+        return float(sum(series["value"] for series in counters.get(name, [])))
+
+    launched = total("prefetch_launched")
+    hits = total("prefetch_hits")
+    return {
+        "launched": launched,
+        "hits": hits,
+        "wasted": total("prefetch_wasted"),
+        "failed": total("prefetch_failed"),
+        "hit_rate": hits / launched if launched else 0.0,
+    }
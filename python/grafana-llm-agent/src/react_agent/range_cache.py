@@ -0,0 +1,363 @@
+"""A time-bucket-aligned cache for Prometheus and Loki range queries.
+
+"Last ten minutes" queries are re-issued with windows shifted by a few
+seconds, so caching whole requests never hits. `RangeQueryCache` aligns each
+window to fixed buckets and caches results per (query, step, bucket):
+
+- `query_prometheus` range queries are aligned to multiples of the step. Only
+  buckets that are missing from the cache are fetched, merged into contiguous
+  ranges, and the returned series are split back into buckets.
+- `query_loki_stats` windows are widened to bucket boundaries and each
+  missing bucket is fetched separately, at most `stats_max_concurrency` at a
+  time. `entries` and `bytes` add up across buckets. `streams` and `chunks`
+  are reported as the maximum over buckets, which is a lower bound; the
+  result lists them under `lowerBounds` when more than one bucket was merged.
+
+A bucket is cached only once it is older than `freshness_lag`, so late
+samples are not frozen out. The bucket containing "now" is always fetched.
+Buckets that will be cached are always fetched whole, even past the end of
+the requested window, and the result is trimmed to the window; otherwise a
+short query would cache a partly fetched bucket.
+It runs as a `ToolCallInterceptor` on the MCP tools.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from react_agent.loki_analysis import format_rfc3339_nano
+from react_agent.utils import decode_tool_result
+
+# mcp 的型別只在執行 MCP 呼叫時才需要，避免 import 本模組就載入整個 mcp 套件
+if TYPE_CHECKING:
+    from langchain_mcp_adapters.interceptors import (
+        MCPToolCallRequest,
+        MCPToolCallResult,
+    )
+    from mcp.types import CallToolResult
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[["MCPToolCallRequest"], Awaitable["MCPToolCallResult"]]
+
+_RELATIVE = re.compile(r"^now(?:\s*-\s*((?:\d+[smhdw])+))?$")
+_DURATION_PART = re.compile(r"(\d+)([smhdw])")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+_ADDITIVE_STATS = ("entries", "bytes")
+
+
+def parse_time(value: Any, now: float) -> Optional[float]:
+    """Parse an RFC3339 time, unix timestamp or `now[-1h30m]` to epoch seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    relative = _RELATIVE.match(text)
+    if relative:
+        offset = sum(
+            int(n) * _UNIT_SECONDS[u]
+            for n, u in _DURATION_PART.findall(relative.group(1) or "")
+        )
+        return now - offset
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(
+            _FRACTION.sub(r"\1", text.replace("Z", "+00:00"))
+        ).timestamp()
+    except ValueError:
+        return None
+
+
+def _format(seconds: float) -> str:
+    return format_rfc3339_nano(int(round(seconds * 1e9)))
+
+
+def _series_key(metric: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    return tuple(sorted(metric.items()))
+
+
+def _matrix(result: Any) -> Optional[List[Dict[str, Any]]]:
+    if isinstance(result, dict):
+        if "data" in result:
+            return _matrix(result["data"])
+        if "result" in result:
+            return _matrix(result["result"])
+        return None
+    if isinstance(result, list) and all(
+        isinstance(s, dict) and "values" in s for s in result
+    ):
+        return result
+    return None
+
+
+def _text_result(value: Any) -> CallToolResult:
+    from mcp.types import CallToolResult, TextContent
+
+    return CallToolResult(content=[TextContent(type="text", text=json.dumps(value))])
+
+
+class RangeQueryCache:
+    """Cache range query results per aligned time bucket."""
+
+    def __init__(
+        self,
+        *,
+        bucket_seconds: int = 300,
+        stats_bucket_seconds: int = 900,
+        freshness_lag: float = 60.0,
+        max_buckets: int = 20_000,
+        stats_max_concurrency: int = 4,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Create an empty cache.
+
+        Args:
+            bucket_seconds: Target bucket width for Prometheus range queries;
+                rounded up to a multiple of the query step.
+            stats_bucket_seconds: Bucket width for `query_loki_stats`. Each
+                missing bucket costs one call, so it is wider by default.
+            freshness_lag: Buckets ending less than this many seconds ago are
+                not cached.
+            max_buckets: Maximum number of cached buckets (LRU).
+            stats_max_concurrency: Maximum number of `query_loki_stats` bucket
+                calls in flight for one request.
+            clock: Source of the current time, for tests.
+        """
+        self.bucket_seconds = bucket_seconds
+        self.stats_bucket_seconds = stats_bucket_seconds
+        self.freshness_lag = freshness_lag
+        self.max_buckets = max_buckets
+        self.stats_max_concurrency = stats_max_concurrency
+        self.clock = clock
+        self._buckets: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def __len__(self) -> int:
+        """Get the number of cached buckets."""
+        return len(self._buckets)
+
+    def _get(self, key: Hashable) -> Any:
+        value = self._buckets.get(key)
+        if value is not None:
+            self._buckets.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def _put(self, key: Hashable, value: Any) -> None:
+        self._buckets[key] = value
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+
+    def _complete(self, bucket_end: float, now: float) -> bool:
+        return bucket_end <= now - self.freshness_lag
+
+    async def interceptor(
+        self, request: MCPToolCallRequest, handler: Handler
+    ) -> MCPToolCallResult:
+        """Serve range queries from cached buckets, fetching only what is missing."""
+        if request.name == "query_prometheus":
+            return await self._prometheus(request, handler)
+        if request.name == "query_loki_stats":
+            return await self._loki_stats(request, handler)
+        return await handler(request)
+
+    async def _fetch(
+        self, request: MCPToolCallRequest, handler: Handler, **args: Any
+    ) -> Any:
+        from mcp.types import CallToolResult
+
+        self.fetches += 1
+        result = await handler(request.override(args={**request.args, **args}))
+        if not isinstance(result, CallToolResult) or result.isError:
+            raise _Uncacheable(result)
+        return decode_tool_result([block.model_dump() for block in result.content])
+
+    async def _prometheus(
+        self, request: MCPToolCallRequest, handler: Handler
+    ) -> MCPToolCallResult:
+        args = request.args
+        now = self.clock()
+        step = args.get("stepSeconds")
+        start = parse_time(args.get("startTime"), now)
+        end = parse_time(args.get("endTime", "now"), now)
+        if (
+            args.get("queryType", "range") != "range"
+            or not step
+            or start is None
+            or end is None
+            or end < start
+        ):
+            return await handler(request)
+
+        step = int(step)
+        bucket = step * max(1, math.ceil(self.bucket_seconds / step))
+        start = math.floor(start / step) * step
+        end = math.floor(end / step) * step
+        prefix = ("prom", args.get("datasourceUid"), args.get("expr"), step, bucket)
+
+        first = math.floor(start / bucket) * bucket
+        plan: List[Tuple[int, Optional[Dict[Any, Any]]]] = []
+        for b in range(int(first), int(end) + 1, bucket):
+            cached = (
+                self._get((*prefix, b)) if self._complete(b + bucket, now) else None
+            )
+            plan.append((b, cached))
+
+        fetched: Dict[int, Dict[Any, Any]] = {}
+        try:
+            for run_start, run_end in _missing_runs(plan, bucket):
+                # 會被快取的桶要完整取回，只有最後一個桶仍在更新時才只取到 end
+                fetch_end = run_end - step
+                if not self._complete(run_end, now):
+                    fetch_end = min(fetch_end, end)
+                matrix = _matrix(
+                    await self._fetch(
+                        request,
+                        handler,
+                        startTime=_format(run_start),
+                        endTime=_format(fetch_end),
+                        stepSeconds=step,
+                        queryType="range",
+                    )
+                )
+                if matrix is None:
+                    return await handler(request)
+                for b in range(run_start, run_end, bucket):
+                    fetched[b] = {}
+                for series in matrix:
+                    metric = series.get("metric") or {}
+                    key = _series_key(metric)
+                    for sample in series.get("values") or []:
+                        b = int(math.floor(float(sample[0]) / bucket) * bucket)
+                        entry = fetched.setdefault(b, {}).setdefault(key, (metric, []))
+                        entry[1].append(sample)
+        except _Uncacheable as e:
+            return e.result if e.result is not None else await handler(request)
+
+        merged: Dict[Any, Tuple[Dict[str, Any], List[Any]]] = {}
+        for b, cached in plan:
+            series_by_key = cached if cached is not None else fetched.get(b, {})
+            if cached is None and self._complete(b + bucket, now):
+                self._put((*prefix, b), series_by_key)
+            for key, (metric, values) in series_by_key.items():
+                target = merged.setdefault(key, (metric, []))[1]
+                target.extend(v for v in values if start <= float(v[0]) <= end)
+        return _text_result(
+            [
+                {"metric": metric, "values": values}
+                for metric, values in merged.values()
+                if values
+            ]
+        )
+
+    async def _loki_stats(
+        self, request: MCPToolCallRequest, handler: Handler
+    ) -> MCPToolCallResult:
+        args = request.args
+        now = self.clock()
+        start = parse_time(args.get("startRfc3339"), now)
+        end = parse_time(args.get("endRfc3339") or "now", now)
+        if start is None or end is None or end <= start:
+            return await handler(request)
+
+        bucket = self.stats_bucket_seconds
+        prefix = ("loki_stats", args.get("datasourceUid"), args.get("logql"), bucket)
+        first = int(math.floor(start / bucket) * bucket)
+        # 長時間範圍會拆成很多桶，限制同時送往 Loki 的請求數
+        semaphore = asyncio.Semaphore(max(1, self.stats_max_concurrency))
+
+        async def bucket_stats(b: int) -> Any:
+            complete = self._complete(b + bucket, now)
+            if complete:
+                cached = self._get((*prefix, b))
+                if cached is not None:
+                    return cached
+            async with semaphore:
+                stats = await self._fetch(
+                    request,
+                    handler,
+                    startRfc3339=_format(b),
+                    # 會被快取的桶取完整的桶
+                    endRfc3339=_format(
+                        b + bucket if complete else min(b + bucket, end)
+                    ),
+                )
+            if not isinstance(stats, dict):
+                raise _Uncacheable(None)
+            if complete:
+                self._put((*prefix, b), stats)
+            return stats
+
+        try:
+            parts = await asyncio.gather(
+                *(bucket_stats(b) for b in range(first, int(math.ceil(end)), bucket))
+            )
+        except _Uncacheable as e:
+            return e.result if e.result is not None else await handler(request)
+
+        total: Dict[str, Any] = {}
+        lower_bounds = set()
+        for stats in parts:
+            for name, value in stats.items():
+                if not isinstance(value, (int, float)):
+                    continue
+                if name in _ADDITIVE_STATS:
+                    total[name] = total.get(name, 0) + value
+                else:
+                    total[name] = max(total.get(name, 0), value)
+                    lower_bounds.add(name)
+        if len(parts) > 1 and lower_bounds:
+            # 跨桶的串流、區塊可能重複，最大值只是下限
+            total["lowerBounds"] = sorted(lower_bounds)
+        return _text_result(total)
+
+
+class _Uncacheable(Exception):
+    """A fetch returned an error or an unexpected shape; give it to the caller as is."""
+
+    def __init__(self, result: Optional[MCPToolCallResult]) -> None:
+        super().__init__("uncacheable result")
+        self.result = result
+
+
+def _missing_runs(
+    plan: List[Tuple[int, Optional[Dict[Any, Any]]]], bucket: int
+) -> List[Tuple[int, int]]:
+    """Coalesce consecutive uncached buckets into `[start, end)` fetch ranges."""
+    runs: List[Tuple[int, int]] = []
+    for b, cached in plan:
+        if cached is not None:
+            continue
+        if runs and runs[-1][1] == b:
+            runs[-1] = (runs[-1][0], b + bucket)
+        else:
+            runs.append((b, b + bucket))
+    return runs
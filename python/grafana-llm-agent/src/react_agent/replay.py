@@ -0,0 +1,279 @@
+"""Replay captured MCP and LLM traffic without a network.
+
+`TrafficLog` indexes a capture written by `react_agent.traffic`. From it,
+
+- `ReplayServer` stands in for the Grafana MCP server: it lists the captured
+  tools and answers each call with the captured result of the same tool and
+  arguments or, when the arguments differ (relative time ranges resolved at
+  another time, say), with the next captured result of that tool;
+- `ReplayChatModel` answers each conversation with its captured responses in
+  order; `load_chat_model("replay/<capture file>")` returns one. It matches
+  requests by their conversation `key` and never needs the captured request
+  messages, which are stored as deltas (`react_agent.traffic.expand_requests`
+  rebuilds them for analysis).
+
+Both wait the captured latency divided by their speed (0: no wait), so
+`call_model` and the tool node can be profiled with the captured payloads
+on the captured timeline or a compressed one. To replay a capture against
+the agent, serve the tools and point the agent and its model at it:
+
+    python -m react_agent.replay capture.jsonl.gz --speed 10 --port 8001
+    GRAFANA_MCP_URL=http://127.0.0.1:8001/sse TRAFFIC_REPLAY_SPEED=10 ...
+    # with the configurable model="replay/capture.jsonl.gz"
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from mcp.server.fastmcp import FastMCP
+from mcp.types import CallToolResult, TextContent
+from mcp.types import Tool as MCPTool
+from pydantic import ConfigDict
+
+from react_agent.configuration import Configuration
+from react_agent.mcp_stub import serve_server
+from react_agent.metrics import METRICS
+from react_agent.traffic import conversation_key, read_traffic
+
+
+def _arguments_key(name: str, arguments: Dict[str, Any]) -> Tuple[str, str]:
+    return name, json.dumps(arguments, sort_keys=True, default=str)
+
+
+class _Replies:
+    """Captured records served in order; the last one repeats once all are served."""
+
+    def __init__(self) -> None:
+        self.records: List[Dict[str, Any]] = []
+        self.position = 0
+
+    def next(self) -> Dict[str, Any]:
+        record = self.records[min(self.position, len(self.records) - 1)]
+        self.position += 1
+        return record
+
+
+class TrafficLog:
+    """The MCP and LLM calls of a capture, indexed for replay."""
+
+    def __init__(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Index `records` (as read by `react_agent.traffic.read_traffic`)."""
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self._calls: Dict[Tuple[str, str], _Replies] = defaultdict(_Replies)
+        self._tool_calls: Dict[str, _Replies] = defaultdict(_Replies)
+        self._answers: Dict[str, _Replies] = defaultdict(_Replies)
+        self._all_answers = _Replies()
+        self._lock = threading.Lock()
+        for record in records:
+            kind = record.get("kind")
+            if kind == "tools":
+                self.tools.update((t["name"], t) for t in record["tools"])
+            elif kind == "mcp":
+                key = _arguments_key(record["name"], record["arguments"])
+                self._calls[key].records.append(record)
+                self._tool_calls[record["name"]].records.append(record)
+            elif kind == "llm":
+                # 回放只用回應與耗時，不保留請求消息
+                record = {k: v for k, v in record.items() if k != "request"}
+                self._answers[record["key"]].records.append(record)
+                self._all_answers.records.append(record)
+        # 擷取時沒列出工具時，以呼叫過的工具名稱補上（不限制參數）
+        for name in self._tool_calls:
+            self.tools.setdefault(
+                name, {"name": name, "inputSchema": {"type": "object"}}
+            )
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike[str]]) -> TrafficLog:
+        """Read and index the capture at `path`."""
+        return cls(read_traffic(path))
+
+    def tool_result(
+        self, name: str, arguments: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Get the captured record answering a call of `name` with `arguments`."""
+        with self._lock:
+            replies = self._calls.get(_arguments_key(name, arguments))
+            match = "exact"
+            if replies is None:
+                replies, match = self._tool_calls.get(name), "tool"
+            METRICS.incr(
+                "traffic_replay_calls",
+                kind="mcp",
+                match=match if replies else "missing",
+            )
+            return replies.next() if replies else None
+
+    def model_response(
+        self, messages: Sequence[BaseMessage]
+    ) -> Optional[Dict[str, Any]]:
+        """Get the captured record answering the LLM request `messages`."""
+        with self._lock:
+            replies = self._answers.get(conversation_key(messages))
+            match = "exact"
+            if replies is None:
+                # 擷取中沒有這段對話時，依擷取順序回應
+                replies, match = self._all_answers, "order"
+            if not replies.records:
+                METRICS.incr("traffic_replay_calls", kind="llm", match="missing")
+                return None
+            METRICS.incr("traffic_replay_calls", kind="llm", match=match)
+            return replies.next()
+
+
+def _delay(record: Dict[str, Any], speed: float) -> float:
+    return float(record.get("duration", 0)) / speed if speed > 0 else 0.0
+
+
+class ReplayServer(FastMCP):
+    """A stand-in MCP server answering tool calls from a capture."""
+
+    def __init__(self, log: TrafficLog, speed: float = 1.0, **settings: Any) -> None:
+        """Serve `log`, waiting the captured latency divided by `speed` (0: no wait)."""
+        super().__init__("grafana-mcp-replay", log_level="WARNING", **settings)
+        self.log = log
+        self.speed = speed
+
+    async def list_tools(self) -> List[MCPTool]:
+        """List the captured tools."""
+        return [
+            MCPTool(
+                name=name,
+                description=tool.get("description"),
+                inputSchema=tool.get("inputSchema") or {"type": "object"},
+            )
+            for name, tool in self.log.tools.items()
+        ]
+
+    async def call_tool(  # type: ignore[override]
+        self, name: str, arguments: Dict[str, Any]
+    ) -> CallToolResult:
+        """Answer a tool call with its captured result."""
+        record = self.log.tool_result(name, arguments)
+        if record is None:
+            text = f"No captured result for tool {name!r}"
+            return CallToolResult(
+                content=[TextContent(type="text", text=text)], isError=True
+            )
+        await asyncio.sleep(_delay(record, self.speed))
+        if "error" in record:
+            return CallToolResult(
+                content=[TextContent(type="text", text=record["error"])], isError=True
+            )
+        return CallToolResult.model_validate(record["result"])
+
+
+@contextmanager
+def serve_replay(
+    log: Union[TrafficLog, str, os.PathLike[str]],
+    speed: float = 1.0,
+    transport: str = "sse",
+) -> Iterator[str]:
+    """Serve a capture's tools on a free local port and yield the server URL."""
+    if not isinstance(log, TrafficLog):
+        log = TrafficLog.load(log)
+    with serve_server(ReplayServer(log, speed), transport) as url:
+        yield url
+
+
+class ReplayChatModel(BaseChatModel):
+    """A chat model answering with the responses of a capture."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    log: TrafficLog
+    speed: Optional[float] = None
+    """How many times faster than captured to answer; None uses `traffic_replay_speed`."""
+
+    @classmethod
+    def from_file(
+        cls, path: Union[str, os.PathLike[str]], speed: Optional[float] = None
+    ) -> ReplayChatModel:
+        """Replay the LLM responses of the capture at `path`."""
+        return cls(log=TrafficLog.load(path), speed=speed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> ReplayChatModel:
+        """Tools are ignored: the captured responses already contain the tool calls."""
+        return self
+
+    def _reply(self, messages: List[BaseMessage]) -> Tuple[ChatResult, float]:
+        record = self.log.model_response(messages)
+        if record is None:
+            raise ValueError("The capture has no LLM responses to replay")
+        message = messages_from_dict([record["response"]])[0]
+        # 同一回應可能重複使用，讓圖重新分配消息 ID
+        message.id = None
+        assert isinstance(message, AIMessage)
+        speed = self.speed
+        if speed is None:
+            speed = Configuration.from_context().traffic_replay_speed
+        return ChatResult(generations=[ChatGeneration(message=message)]), _delay(
+            record, speed
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, delay = self._reply(messages)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        result, delay = self._reply(messages)
+        await asyncio.sleep(delay)
+        return result
+
+
+def main() -> None:
+    """Serve the tools of a capture until interrupted."""
+    parser = argparse.ArgumentParser(
+        description="Serve a traffic capture as an MCP server."
+    )
+    parser.add_argument(
+        "capture", help="capture file written with traffic_capture_path"
+    )
+    parser.add_argument(
+        "--speed", type=float, default=float(os.getenv("TRAFFIC_REPLAY_SPEED", "1"))
+    )
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument(
+        "--transport", choices=["sse", "streamable-http"], default="sse"
+    )
+    args = parser.parse_args()
+
+    log = TrafficLog.load(args.capture)
+    sys.stdout.write(
+        f"Replaying {len(log.tools)} tools at {args.speed:g}x on port {args.port}\n"
+    )
+    ReplayServer(log, args.speed, port=args.port).run(transport=args.transport)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""A scratchpad state channel that replaces the `think` tool round-trip.
+
+With the `think` tool, every thought costs a `call_model` -> `tools` ->
+`call_model` super-step, one more LLM request and one more `ToolMessage`. In
+scratchpad mode the model writes its reasoning inline, inside
+`<thinking>...</thinking>`, next to the tool calls it actually wants to make.
+Provider reasoning fields are recorded too. `extract_thoughts` moves those
+thoughts into the `scratchpad` state field and strips them from the message.
+`compact_history` removes old `think` round-trips from the prompt. The system
+prompt's `{thinking}` field tells the model which way to think, and the
+prompt only carries the most recent thoughts, via `scratchpad_message`.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, AnyMessage, SystemMessage, ToolMessage
+
+from react_agent import prompts
+
+THINK_TOOL = "think"
+# 狀態中最多保留的思考條數
+MAX_THOUGHTS = 50
+
+# 只取出完整的思考區塊；未閉合的 <thinking> 可能是答案本身的內容，原樣保留
+_THINKING = re.compile(r"<thinking>(.*?)</thinking>", re.DOTALL | re.IGNORECASE)
+
+
+def add_thoughts(left: Sequence[str], right: Sequence[str]) -> List[str]:
+    """Append new thoughts, keeping only the most recent `MAX_THOUGHTS`."""
+    merged = [*left, *right]
+    return merged[-MAX_THOUGHTS:]
+
+
+def _strip_text(text: str, thoughts: List[str]) -> str:
+    thoughts.extend(t.strip() for t in _THINKING.findall(text) if t.strip())
+    return _THINKING.sub("", text).strip()
+
+
+def extract_thoughts(message: AIMessage) -> Tuple[AIMessage, List[str]]:
+    """Move the thoughts out of `message`.
+
+    Collects `<thinking>` sections of the text, `think` tool calls and
+    provider reasoning (`reasoning_content`). The returned message has the
+    first two removed; reasoning blocks are left alone because some
+    providers require them to be sent back.
+
+    Returns:
+        The cleaned message (the same object if nothing changed) and the thoughts.
+    """
+    thoughts: List[str] = []
+    reasoning = message.additional_kwargs.get("reasoning_content")
+    if isinstance(reasoning, str) and reasoning.strip():
+        thoughts.append(reasoning.strip())
+
+    content: Any = message.content
+    if isinstance(content, str):
+        new_content: Any = _strip_text(content, thoughts)
+    else:
+        new_content = []
+        for block in content:
+            if isinstance(block, str):
+                block = _strip_text(block, thoughts)
+            elif isinstance(block, dict) and block.get("type") == "text":
+                block = {**block, "text": _strip_text(block.get("text", ""), thoughts)}
+                if not block["text"]:
+                    continue
+            elif isinstance(block, dict) and block.get("type") in (
+                "reasoning",
+                "thinking",
+            ):
+                text = block.get("reasoning") or block.get("thinking") or ""
+                if text.strip():
+                    thoughts.append(text.strip())
+            new_content.append(block)
+
+    think_calls = [c for c in message.tool_calls if c["name"] == THINK_TOOL]
+    for call in think_calls:
+        thought = call["args"].get("thought")
+        if thought:
+            thoughts.append(str(thought).strip())
+    if not thoughts and not think_calls:
+        return message, []
+
+    update: Dict[str, Any] = {"content": new_content}
+    if think_calls:
+        dropped = {c["id"] for c in think_calls}
+        update["tool_calls"] = [
+            c for c in message.tool_calls if c["name"] != THINK_TOOL
+        ]
+        raw_calls = message.additional_kwargs.get("tool_calls")
+        if raw_calls is not None:
+            kept = [c for c in raw_calls if c.get("id") not in dropped]
+            kwargs = dict(message.additional_kwargs)
+            if kept:
+                kwargs["tool_calls"] = kept
+            else:
+                kwargs.pop("tool_calls")
+            update["additional_kwargs"] = kwargs
+    return message.model_copy(update=update), thoughts
+
+
+def compact_history(messages: Sequence[AnyMessage]) -> List[AnyMessage]:
+    """Drop `think` tool calls and their results from the prompt history.
+
+    An AI message left with neither content nor tool calls is dropped too.
+    """
+    think_ids = {
+        call["id"]
+        for message in messages
+        if isinstance(message, AIMessage)
+        for call in message.tool_calls
+        if call["name"] == THINK_TOOL
+    }
+    if not think_ids:
+        return list(messages)
+    compacted: List[AnyMessage] = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and message.tool_call_id in think_ids:
+            continue
+        if isinstance(message, AIMessage) and any(
+            c["id"] in think_ids for c in message.tool_calls
+        ):
+            message, _ = extract_thoughts(message)
+            if not message.tool_calls and not message.content:
+                continue
+        compacted.append(message)
+    return compacted
+
+
+def thinking_instruction(scratchpad: bool) -> str:
+    """Get the system prompt's `{thinking}` instruction for the thinking mode."""
+    return (
+        prompts.SCRATCHPAD_INSTRUCTION if scratchpad else prompts.THINK_TOOL_INSTRUCTION
+    )
+
+
+def scratchpad_message(thoughts: Sequence[str], limit: int) -> Optional[SystemMessage]:
+    """Build the system message with the latest `limit` thoughts, if there are any."""
+    recent = list(thoughts)[-limit:] if limit > 0 else []
+    if not recent:
+        return None
+    lines = "\n".join(f"{i}. {thought}" for i, thought in enumerate(recent, 1))
+    content = prompts.SCRATCHPAD_PROMPT.format(count=len(recent), thoughts=lines)
+    return SystemMessage(content=content)
+
+
+def thought_only(message: AIMessage) -> bool:
+    """Whether `message` has neither an answer nor a tool call left."""
+    content: Optional[Any] = message.content
+    return not message.tool_calls and not content
@@ -0,0 +1,244 @@
+"""Pooled Tavily search client shared by every `search` tool invocation.
+
+`TavilySearch` builds a new API wrapper per instance and opens a fresh
+`aiohttp.ClientSession` for every request. This module keeps one client per
+setting (`max_results`, cache TTL, concurrency), backed by a keep-alive HTTP
+session, a small TTL cache keyed by the normalized query and a semaphore that
+bounds concurrent requests. It calls the Tavily REST API directly, with the
+`TAVILY_API_KEY` that `TavilySearch` reads too.
+
+Callers get their own copy of a result, so mutating it does not affect the
+cache or other callers.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+from langchain_core.tools import ToolException
+
+TAVILY_API_URL = "https://api.tavily.com"
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a cache entry."""
+    return " ".join(query.lower().split())
+
+
+class PooledSearchClient:
+    """Tavily search client reusing one HTTP session and caching recent results."""
+
+    def __init__(
+        self,
+        max_results: int,
+        *,
+        cache_ttl: float = 300.0,
+        cache_size: int = 256,
+        max_concurrency: int = 4,
+        api_key: Optional[str] = None,
+        api_base_url: Optional[str] = None,
+    ) -> None:
+        """Create a client returning at most `max_results` results per query.
+
+        `api_key` defaults to the `TAVILY_API_KEY` environment variable.
+        """
+        api_key = api_key or os.getenv("TAVILY_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "Did not find tavily_api_key, please add an environment variable "
+                "`TAVILY_API_KEY` which contains it."
+            )
+        self.max_results = max_results
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.max_concurrency = max_concurrency
+        self.api_key = api_key
+        self.api_base_url = api_base_url or TAVILY_API_URL
+        self._cache: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future[Dict[str, Any]]] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closer: Optional[asyncio.Task[None]] = None
+
+    def _bind_loop(self) -> None:
+        # aiohttp sessions and asyncio primitives belong to one event loop; a new
+        # loop (e.g. a second `asyncio.run`) gets its own session and semaphore.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._session is not None:
+                _close_session(self._session, self._loop)
+            self._loop = loop
+            self._session = None
+            self._inflight = {}
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency, keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                    "X-Client-Source": "langchain-tavily",
+                },
+            )
+            # asyncio.run 結束前會取消所有任務，藉此在事件迴圈關閉前關閉連線
+            self._closer = asyncio.get_running_loop().create_task(
+                _close_when_cancelled(self._session), name="search-session-closer"
+            )
+        return self._session
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return result
+
+    def _cache_put(self, key: str, result: Dict[str, Any]) -> None:
+        if self.cache_ttl <= 0:
+            return
+        self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, query: str) -> Dict[str, Any]:
+        assert self._semaphore is not None
+        params = {
+            "query": query,
+            "max_results": self.max_results,
+            "search_depth": "basic",
+            "include_images": False,
+            "topic": "general",
+        }
+        async with self._semaphore:
+            async with self._get_session().post(
+                f"{self.api_base_url}/search", json=params
+            ) as res:
+                if res.status != 200:
+                    raise Exception(f"Error {res.status}: {res.reason}")
+                return dict(await res.json(content_type=None))
+
+    async def search(self, query: str) -> Dict[str, Any]:
+        """Run a search, serving repeated queries from the cache.
+
+        Concurrent calls for the same normalized query share a single request.
+        """
+        self._bind_loop()
+        key = normalize_query(query)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return copy.deepcopy(await asyncio.shield(pending))
+
+        future: asyncio.Future[Dict[str, Any]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._inflight[key] = future
+        try:
+            result = await self._fetch(query)
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it.
+            future.exception()
+            raise
+        else:
+            self._cache_put(key, result)
+            future.set_result(result)
+            return copy.deepcopy(result)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def aclose(self) -> None:
+        """Close the underlying HTTP session."""
+        if self._closer is not None:
+            self._closer.cancel()
+            self._closer = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+async def _close_when_cancelled(session: aiohttp.ClientSession) -> None:
+    """Wait until cancelled (e.g. by `asyncio.run` shutting down), then close `session`."""
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await session.close()
+
+
+def _close_session(
+    session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]
+) -> None:
+    """Close a session that belongs to another event loop, if still open."""
+    if session.closed:
+        return
+    if loop is not None and loop.is_running():
+        # 舊的事件迴圈仍在其他執行緒執行，在它上面關閉
+        asyncio.run_coroutine_threadsafe(session.close(), loop)
+        return
+    # 已結束的事件迴圈無法再 await；卸下連線器並直接關閉，連線不會留到垃圾回收
+    connector = session.connector
+    session.detach()
+    if connector is not None:
+        connector.close()
+
+
+_clients: Dict[Tuple[int, float, int], PooledSearchClient] = {}
+
+
+def get_search_client(
+    max_results: int, *, cache_ttl: float = 300.0, max_concurrency: int = 4
+) -> PooledSearchClient:
+    """Get the shared search client for these settings, creating it on first use."""
+    key = (max_results, cache_ttl, max_concurrency)
+    client = _clients.get(key)
+    if client is None:
+        client = PooledSearchClient(
+            max_results, cache_ttl=cache_ttl, max_concurrency=max_concurrency
+        )
+        _clients[key] = client
+    return client
+
+
+async def close_search_clients() -> None:
+    """Close and forget every pooled search client."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+async def pooled_search(
+    query: str, max_results: int, *, cache_ttl: float = 300.0, max_concurrency: int = 4
+) -> Dict[str, Any]:
+    """Search with the pooled client, mirroring `TavilySearch` error handling."""
+    client = get_search_client(
+        max_results, cache_ttl=cache_ttl, max_concurrency=max_concurrency
+    )
+    try:
+        results = await client.search(query)
+    except Exception as e:
+        return {"error": e}
+    if not results.get("results", []):
+        raise ToolException(
+            f"No search results found for '{query}'. Try modifying your search query."
+        )
+    return results
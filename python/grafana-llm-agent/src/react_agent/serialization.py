@@ -0,0 +1,160 @@
+"""Incremental serialization of conversation history into provider wire format.
+
+Every `call_model` step sends the whole `state.messages` history, but only the
+last one or two messages are new. Each thread keeps a cache of converted
+messages keyed by message type and ID, so a step only converts the messages
+it has not seen before. A cached entry is reused only while the message
+still holds the very same content (and tool call) objects: the check is a
+few identity comparisons, never a pass over the content, so a large history
+costs no more to look up than a short one. Edited messages, and messages
+rebuilt on every call (e.g. expanded tool results), simply miss and are
+converted like the stock model would. Messages are converted with
+langchain-core's public `convert_to_openai_messages`.
+
+`benchmarks/bench_serialization.py` compares the request build time with the
+stock `ChatOpenAI`. With current langchain-openai the two are on par, so
+`utils.load_chat_model` only uses `CachedChatOpenAI` when asked for with the
+`openai-cached/` provider prefix.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import AIMessage, BaseMessage, convert_to_openai_messages
+from langchain_openai import ChatOpenAI
+
+from react_agent.utils import current_thread_id
+
+MessageKey = Tuple[str, Union[str, int]]
+Converter = Callable[[BaseMessage], Dict[str, Any]]
+
+
+class _Entry(NamedTuple):
+    # 保留內容物件的參考，以身分比較確認訊息沒有改變（也避免 id() 被重複使用）
+    content: Any
+    tool_calls: Any
+    tool_call_id: Optional[str]
+    payload: Dict[str, Any]
+
+
+def message_key(message: BaseMessage) -> MessageKey:
+    """Get the cache key of `message`: its type and ID (its identity if it has none)."""
+    return (message.type, message.id if message.id is not None else id(message))
+
+
+def _matches(entry: _Entry, message: BaseMessage) -> bool:
+    tool_calls = message.tool_calls if isinstance(message, AIMessage) else None
+    return (
+        entry.content is message.content
+        and entry.tool_calls is tool_calls
+        and entry.tool_call_id == getattr(message, "tool_call_id", None)
+    )
+
+
+def openai_message_to_dict(message: BaseMessage) -> Dict[str, Any]:
+    """Convert `message` to an OpenAI chat completions message dict."""
+    return convert_to_openai_messages(message)
+
+
+class SerializedMessageCache:
+    """Cache of converted messages for one conversation thread."""
+
+    def __init__(self, converter: Converter = openai_message_to_dict) -> None:
+        """Create an empty cache that converts messages with `converter`."""
+        self.converter = converter
+        self._entries: Dict[MessageKey, _Entry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """Get the number of cached messages."""
+        return len(self._entries)
+
+    def encode(self, messages: Iterable[BaseMessage]) -> List[Dict[str, Any]]:
+        """Convert `messages`, converting only those missing from the cache."""
+        payloads: List[Dict[str, Any]] = []
+        live: Dict[MessageKey, _Entry] = {}
+        for message in messages:
+            key = message_key(message)
+            entry = self._entries.get(key)
+            if entry is None or not _matches(entry, message):
+                self.misses += 1
+                entry = _Entry(
+                    message.content,
+                    message.tool_calls if isinstance(message, AIMessage) else None,
+                    getattr(message, "tool_call_id", None),
+                    self.converter(message),
+                )
+            else:
+                self.hits += 1
+            live[key] = entry
+            payloads.append(entry.payload)
+        # Keep only what the current history references, so edited or removed
+        # messages do not accumulate.
+        self._entries = live
+        return payloads
+
+
+_MAX_THREADS = 1024
+_thread_caches: OrderedDict[Optional[str], SerializedMessageCache] = OrderedDict()
+
+
+def get_thread_cache(thread_id: Optional[str]) -> SerializedMessageCache:
+    """Get the serialization cache of `thread_id`, evicting the least recently used thread."""
+    cache = _thread_caches.get(thread_id)
+    if cache is None:
+        cache = SerializedMessageCache()
+        _thread_caches[thread_id] = cache
+        while len(_thread_caches) > _MAX_THREADS:
+            _thread_caches.popitem(last=False)
+    else:
+        _thread_caches.move_to_end(thread_id)
+    return cache
+
+
+def drop_thread_cache(thread_id: Optional[str]) -> None:
+    """Forget the serialization cache of `thread_id`."""
+    _thread_caches.pop(thread_id, None)
+
+
+class CachedChatOpenAI(ChatOpenAI):
+    """`ChatOpenAI` that reuses each thread's previously converted messages.
+
+    Only the chat completions API is cached; Responses API requests fall back
+    to the stock conversion.
+    """
+
+    def _get_request_payload(
+        self,
+        input_: LanguageModelInput,
+        *,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        if self._use_responses_api({**self._default_params, **kwargs}):
+            return super()._get_request_payload(input_, stop=stop, **kwargs)
+        messages = self._convert_input(input_).to_messages()
+        # Let the parent build everything except the messages themselves.
+        payload = super()._get_request_payload([], stop=stop, **kwargs)
+        encoded = get_thread_cache(current_thread_id()).encode(messages)
+        if self.model_name and re.match(r"^o\d", self.model_name):
+            encoded = [
+                {**m, "role": "developer"} if m["role"] == "system" else m
+                for m in encoded
+            ]
+        payload["messages"] = encoded
+        return payload
@@ -0,0 +1,421 @@
+"""A LangGraph `BaseStore` kept in a local SQLite file, with vector search.
+
+`SqliteStore` implements the whole store API (get/put/delete/search/
+list_namespaces, sync and async) so it can be passed anywhere LangGraph takes
+a store, e.g. `builder.compile(store=...)`. Items live in one table, their
+embeddings in another; semantic search ranks the candidates by cosine
+similarity with numpy, which is plenty for the few thousand items of a
+local knowledge base.
+
+Items can expire: a put's `ttl` (minutes) sets their expiry, expired items
+are never returned and `sweep_ttl` deletes them.
+
+`HashingEmbeddings` is a dependency-free embedding for when no embedding
+service is configured: it hashes the identifier-like tokens of a text
+(`dashboard_catalog.tokenize`) into a fixed-size vector, so texts sharing
+uids, label names or service names score close to each other.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from datetime import UTC, datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    IndexConfig,
+    Item,
+    ListNamespacesOp,
+    MatchCondition,
+    NotProvided,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+    TTLConfig,
+    ensure_embeddings,
+    get_text_at_path,
+    tokenize_path,
+)
+
+from react_agent.dashboard_catalog import tokenize
+from react_agent.utils import dumps, loads
+
+# 命名空間各層以 \x1f 連接並以它結尾，前綴比對不會把 ("a",) 當成 ("ab",) 的前綴
+_SEP = "\x1f"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL,
+    ttl_minutes REAL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS items_expires_at ON items (expires_at);
+CREATE TABLE IF NOT EXISTS vectors (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    field TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    PRIMARY KEY (ns, key, field)
+);
+"""
+
+_COMPARISONS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+
+class HashingEmbeddings(Embeddings):
+    """Embed texts by hashing their tokens into `dims` buckets (no model needed)."""
+
+    def __init__(self, dims: int = 256) -> None:
+        """Produce L2-normalized vectors of `dims` floats."""
+        self.dims = dims
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dims] += 1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed each of `texts`."""
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a search query."""
+        return self._embed(text)
+
+
+def _ns(namespace: Tuple[str, ...]) -> str:
+    return "".join(label + _SEP for label in namespace)
+
+
+def _namespace(ns: str) -> Tuple[str, ...]:
+    return tuple(ns.split(_SEP)[:-1])
+
+
+def _timestamp(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, tz=UTC)
+
+
+def _matches_filter(
+    value: Dict[str, Any], conditions: Optional[Dict[str, Any]]
+) -> bool:
+    for field, expected in (conditions or {}).items():
+        actual = value.get(field)
+        if (
+            isinstance(expected, dict)
+            and expected
+            and all(k in _COMPARISONS for k in expected)
+        ):
+            try:
+                if not all(
+                    _COMPARISONS[op](actual, operand)
+                    for op, operand in expected.items()
+                ):
+                    return False
+            except TypeError:
+                return False
+        elif actual != expected:
+            return False
+    return True
+
+
+def _matches_condition(namespace: Tuple[str, ...], condition: MatchCondition) -> bool:
+    path = tuple(condition.path)
+    if len(path) > len(namespace):
+        return False
+    labels = (
+        namespace[: len(path)]
+        if condition.match_type == "prefix"
+        else namespace[-len(path) :]
+    )
+    return all(p == "*" or p == label for p, label in zip(path, labels))
+
+
+class SqliteStore(BaseStore):
+    """A persistent LangGraph store backed by SQLite, with optional semantic search.
+
+    Operations of one `batch` run in one transaction; a lock serializes them,
+    and `abatch` runs them in a worker thread so the event loop never waits
+    on the disk or on the embeddings.
+    """
+
+    supports_ttl = True
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        *,
+        index: Optional[IndexConfig] = None,
+        ttl: Optional[TTLConfig] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """Open (or create) the store at `path`.
+
+        Args:
+            path: The SQLite file; ":memory:" keeps the store in this process.
+            index: Semantic search settings (`embed` and `fields`). `dims` is
+                not needed: vectors are stored as the embeddings return them.
+            ttl: Default TTL settings (`default_ttl` minutes, `refresh_on_read`).
+            clock: Wall-clock time in seconds; replaceable in tests.
+        """
+        self.path = path
+        self.ttl_config = ttl
+        self.index_config = index
+        self.embeddings: Optional[Embeddings] = None
+        self._fields: List[Tuple[str, Any]] = []
+        if index:
+            self.embeddings = ensure_embeddings(index.get("embed"))
+            self._fields = [
+                (field, tokenize_path(field) if field != "$" else field)
+                for field in (index.get("fields") or ["$"])
+            ]
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def _texts(self, op: PutOp) -> List[Tuple[str, str]]:
+        """Get the (field, text) pairs of `op` to embed."""
+        if self.embeddings is None or op.value is None or op.index is False:
+            return []
+        fields = (
+            self._fields
+            if op.index is None
+            else [(p, tokenize_path(p)) for p in op.index]
+        )
+        texts = []
+        for path, tokens in fields:
+            found = get_text_at_path(op.value, tokens)
+            if len(found) == 1:
+                texts.append((path, found[0]))
+            else:
+                texts.extend((f"{path}.{i}", text) for i, text in enumerate(found))
+        return texts
+
+    def _embed(self, ops: Sequence[Op]) -> Dict[int, Any]:
+        """Compute the embeddings the operations need, outside of the lock."""
+        embedded: Dict[int, Any] = {}
+        if self.embeddings is None:
+            return embedded
+        for position, op in enumerate(ops):
+            if isinstance(op, PutOp):
+                texts = self._texts(op)
+                if texts:
+                    vectors = self.embeddings.embed_documents(
+                        [text for _, text in texts]
+                    )
+                    embedded[position] = [(f, v) for (f, _), v in zip(texts, vectors)]
+            elif isinstance(op, SearchOp) and op.query:
+                embedded[position] = self.embeddings.embed_query(op.query)
+        return embedded
+
+    def batch(self, ops: Iterable[Op]) -> List[Result]:
+        """Execute `ops` in order in one transaction and return their results."""
+        ops = list(ops)
+        embedded = self._embed(ops)
+        results: List[Result] = []
+        with self._lock:
+            now = self._clock()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for position, op in enumerate(ops):
+                    if isinstance(op, GetOp):
+                        results.append(self._get(op, now))
+                    elif isinstance(op, PutOp):
+                        self._put(op, now, embedded.get(position, []))
+                        results.append(None)
+                    elif isinstance(op, SearchOp):
+                        results.append(self._search(op, now, embedded.get(position)))
+                    elif isinstance(op, ListNamespacesOp):
+                        results.append(self._list_namespaces(op, now))
+                    else:
+                        raise ValueError(f"Unknown store operation {op!r}")
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return results
+
+    async def abatch(self, ops: Iterable[Op]) -> List[Result]:
+        """Execute `ops` in a worker thread."""
+        return await asyncio.to_thread(self.batch, list(ops))
+
+    def _refresh(
+        self, rows: Sequence[Tuple[str, str, Optional[float]]], now: float
+    ) -> None:
+        self._db.executemany(
+            "UPDATE items SET expires_at = ? WHERE ns = ? AND key = ?",
+            [(now + ttl * 60, ns, key) for ns, key, ttl in rows if ttl],
+        )
+
+    def _get(self, op: GetOp, now: float) -> Optional[Item]:
+        ns = _ns(op.namespace)
+        row = self._db.execute(
+            "SELECT value, created_at, updated_at, ttl_minutes FROM items "
+            "WHERE ns = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (ns, op.key, now),
+        ).fetchone()
+        if row is None:
+            return None
+        if op.refresh_ttl:
+            self._refresh([(ns, op.key, row[3])], now)
+        return Item(
+            value=loads(row[0]),
+            key=op.key,
+            namespace=op.namespace,
+            created_at=_timestamp(row[1]),
+            updated_at=_timestamp(row[2]),
+        )
+
+    def _put(
+        self, op: PutOp, now: float, vectors: List[Tuple[str, List[float]]]
+    ) -> None:
+        ns = _ns(op.namespace)
+        self._db.execute("DELETE FROM vectors WHERE ns = ? AND key = ?", (ns, op.key))
+        if op.value is None:
+            self._db.execute("DELETE FROM items WHERE ns = ? AND key = ?", (ns, op.key))
+            return
+        ttl = op.ttl
+        if isinstance(ttl, NotProvided):
+            ttl = (self.ttl_config or {}).get("default_ttl")
+        self._db.execute(
+            "INSERT INTO items (ns, key, value, created_at, updated_at, expires_at, ttl_minutes) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (ns, key) DO UPDATE SET "
+            "value = excluded.value, updated_at = excluded.updated_at, "
+            "expires_at = excluded.expires_at, ttl_minutes = excluded.ttl_minutes",
+            (
+                ns,
+                op.key,
+                dumps(op.value).decode(),
+                now,
+                now,
+                now + ttl * 60 if ttl else None,
+                ttl,
+            ),
+        )
+        self._db.executemany(
+            "INSERT INTO vectors (ns, key, field, embedding) VALUES (?, ?, ?, ?)",
+            [
+                (ns, op.key, field, np.asarray(vector, dtype=np.float32).tobytes())
+                for field, vector in vectors
+            ],
+        )
+
+    def _search(
+        self, op: SearchOp, now: float, query: Optional[List[float]]
+    ) -> List[SearchItem]:
+        prefix = _ns(op.namespace_prefix)
+        rows = self._db.execute(
+            "SELECT ns, key, value, created_at, updated_at, ttl_minutes FROM items "
+            "WHERE substr(ns, 1, ?) = ? AND (expires_at IS NULL OR expires_at > ?) "
+            "ORDER BY updated_at DESC",
+            (len(prefix), prefix, now),
+        ).fetchall()
+        candidates = []
+        for ns, key, value, created_at, updated_at, ttl in rows:
+            value = loads(value)
+            if _matches_filter(value, op.filter):
+                candidates.append((ns, key, value, created_at, updated_at, ttl))
+
+        scores: Dict[Tuple[str, str], float] = {}
+        if query is not None and candidates:
+            vectors = self._db.execute(
+                "SELECT ns, key, embedding FROM vectors WHERE substr(ns, 1, ?) = ?",
+                (len(prefix), prefix),
+            ).fetchall()
+            if vectors:
+                matrix = np.stack(
+                    [np.frombuffer(blob, dtype=np.float32) for _, _, blob in vectors]
+                )
+                target = np.asarray(query, dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(target) or 1.0)
+                similarities = matrix @ target / np.where(norms == 0, 1.0, norms)
+                # 一個項目有多個欄位時取最相似的那個
+                for (ns, key, _), similarity in zip(vectors, similarities.tolist()):
+                    scores[ns, key] = max(similarity, scores.get((ns, key), -1.0))
+            # 有向量的依相似度排序，沒有向量的排在後面
+            candidates.sort(
+                key=lambda c: scores.get((c[0], c[1]), float("-inf")), reverse=True
+            )
+
+        page = candidates[op.offset : op.offset + op.limit]
+        if op.refresh_ttl:
+            self._refresh([(ns, key, ttl) for ns, key, _, _, _, ttl in page], now)
+        return [
+            SearchItem(
+                namespace=_namespace(ns),
+                key=key,
+                value=value,
+                created_at=_timestamp(created_at),
+                updated_at=_timestamp(updated_at),
+                score=scores.get((ns, key)),
+            )
+            for ns, key, value, created_at, updated_at, _ in page
+        ]
+
+    def _list_namespaces(
+        self, op: ListNamespacesOp, now: float
+    ) -> List[Tuple[str, ...]]:
+        rows = self._db.execute(
+            "SELECT DISTINCT ns FROM items WHERE expires_at IS NULL OR expires_at > ?",
+            (now,),
+        ).fetchall()
+        namespaces = set()
+        for (ns,) in rows:
+            namespace = _namespace(ns)
+            if all(_matches_condition(namespace, c) for c in op.match_conditions or ()):
+                namespaces.add(namespace[: op.max_depth] if op.max_depth else namespace)
+        return sorted(namespaces)[op.offset : op.offset + op.limit]
+
+    def sweep_ttl(self) -> int:
+        """Delete the expired items and get how many there were."""
+        with self._lock:
+            now = self._clock()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "DELETE FROM vectors WHERE (ns, key) IN "
+                    "(SELECT ns, key FROM items WHERE expires_at <= ?)",
+                    (now,),
+                )
+                deleted = self._db.execute(
+                    "DELETE FROM items WHERE expires_at <= ?", (now,)
+                ).rowcount
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return deleted
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
@@ -2,23 +2,26 @@
 
 from __future__ import annotations
 
+import operator
 from dataclasses import dataclass, field
-from typing import Sequence
+from typing import List, Optional, Sequence
 
 from langchain_core.messages import AnyMessage
-from langgraph.graph import add_messages
 from langgraph.managed import IsLastStep
 from typing_extensions import Annotated
 
+from react_agent.message_log import add_messages_fast
+from react_agent.scratchpad import add_thoughts
 
-@dataclass
+
+@dataclass(slots=True)
 class InputState:
     """Defines the input state for the agent, representing a narrower interface to the outside world.
 
     This class is used to define the initial state and structure of incoming data.
     """
 
-    messages: Annotated[Sequence[AnyMessage], add_messages] = field(
+    messages: Annotated[Sequence[AnyMessage], add_messages_fast] = field(
         default_factory=list
     )
     """
@@ -33,12 +36,14 @@ class InputState:
 
     Steps 2-5 may repeat as needed.
 
-    The `add_messages` annotation ensures that new messages are merged with existing ones,
+    The `add_messages_fast` annotation ensures that new messages are merged with existing ones,
     updating by ID to maintain an "append-only" state unless a message with the same ID is provided.
+    It behaves like `add_messages` but keeps an incremental ID index, so appending is O(1).
+    Use `bounded_add_messages` from `react_agent.message_log` to cap the history length.
     """
 
 
-@dataclass
+@dataclass(slots=True)
 class State(InputState):
     """Represents the complete state of the agent, extending InputState with additional attributes.
 
@@ -53,8 +58,62 @@ class State(InputState):
     It is set to 'True' when the step count reaches recursion_limit - 1.
     """
 
+    scratchpad: Annotated[List[str], add_thoughts] = field(default_factory=list)
+    """
+    The agent's recorded thoughts, most recent last.
+
+    Filled from `<thinking>` sections, provider reasoning and stray `think` tool
+    calls of the model's replies instead of routing them through the tools node.
+    Only the latest `Configuration.scratchpad_max_thoughts` are shown to the model.
+    """
+
+    run_deadline: Optional[float] = None
+    """
+    Epoch seconds the current run must finish by, set when the run starts.
+    None means the run has no deadline (`Configuration.run_timeout_seconds` is 0).
+    """
+
+    tokens_used: int = 0
+    """Tokens used by the model calls of the current run, reset when a run starts."""
+
+    budget_exhausted: Optional[str] = None
+    """
+    Which run budget ("deadline" or "tokens") ran out, routing the run to the
+    final synthesis step. None while the run is within budget.
+    """
+
     # Additional attributes can be added here as needed.
     # Common examples include:
     # retrieved_documents: List[Document] = field(default_factory=list)
     # extracted_entities: Dict[str, Any] = field(default_factory=dict)
     # api_connections: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Finding:
+    """The outcome of one target's sub-investigation in a fan-out run."""
+
+    target: str
+    """The label selector investigated, e.g. `service_country="zm"`."""
+    report: str
+    """The sub-investigation's final answer."""
+    tool_calls: int = 0
+    """How many tools the sub-investigation called."""
+    seconds: float = 0.0
+    """Wall time of the sub-investigation."""
+    error: Optional[str] = None
+    """Why the sub-investigation failed, if it did."""
+
+
+@dataclass(slots=True)
+class FanOutState(InputState):
+    """State of the fan-out graph, which investigates several targets in parallel."""
+
+    targets: List[str] = field(default_factory=list)
+    """
+    Label selectors to investigate, one sub-investigation each. Parsed from
+    the user's message (e.g. "service_country: zm, ng, ke") unless given.
+    """
+
+    findings: Annotated[List[Finding], operator.add] = field(default_factory=list)
+    """Findings of the finished sub-investigations, in completion order."""
@@ -0,0 +1,143 @@
+"""Pre-parsed system prompt templates and cached system messages.
+
+The Grafana system prompt is large and `str.format` re-scans all of it on
+every `call_model` step. Templates are parsed once per distinct prompt
+string; rendering only substitutes the volatile fields. The resulting
+`SystemMessage` is rendered once per (prompt, minute) and every step gets its
+own copy of it.
+
+Only plain keyword fields (`{name}`, with an optional conversion and a
+literal format spec) are substituted directly. Templates using attribute or
+index lookups (`{a.b}`, `{a[0]}`) or nested format specs (`{a:{width}}`) are
+rendered with `str.format`; positional fields (`{}`, `{0}`) can never be
+filled from keyword values and are rejected when the template is parsed.
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import datetime
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from langchain_core.messages import SystemMessage
+
+from react_agent import prompts
+
+# (literal_text, field_name, format_spec, conversion)
+_Chunk = Tuple[str, Optional[str], str, Optional[str]]
+# 欄位名稱中屬性（.）或索引（[）查找的開頭
+_LOOKUP = re.compile(r"[.\[]")
+
+
+class PromptTemplate:
+    """A `str.format` style template parsed once and rendered many times."""
+
+    __slots__ = ("source", "fields", "_chunks", "_plain")
+
+    def __init__(self, source: str) -> None:
+        """Parse `source` into literal chunks and replacement fields.
+
+        Raises:
+            ValueError: If `source` is not a valid format string or has
+                positional fields.
+        """
+        self.source = source
+        self._chunks: List[_Chunk] = [
+            (literal, field, spec or "", conversion)
+            for literal, field, spec, conversion in Formatter().parse(source)
+        ]
+        self._plain = True
+        fields = set()
+        for _, field, spec, _ in self._chunks:
+            if field is None:
+                continue
+            name = _LOOKUP.split(field, 1)[0]
+            if not name or name.isdigit():
+                raise ValueError(f"Positional field {{{field}}} in prompt template")
+            fields.add(name)
+            # 屬性或索引查找、巢狀格式規格交給 str.format 處理
+            if name != field or "{" in spec:
+                self._plain = False
+        self.fields: FrozenSet[str] = frozenset(fields)
+
+    def render(self, **values: Any) -> str:
+        """Substitute `values` into the template, like `source.format(**values)`."""
+        if not self._plain:
+            return self.source.format(**values)
+        if not self.fields:
+            return "".join(literal for literal, _, _, _ in self._chunks)
+        parts: List[str] = []
+        for literal, field, spec, conversion in self._chunks:
+            parts.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            parts.append(format(value, spec))
+        return "".join(parts)
+
+
+@lru_cache(maxsize=64)
+def get_template(source: str) -> PromptTemplate:
+    """Get the parsed template for `source`, parsing it on first use."""
+    return PromptTemplate(source)
+
+
+def format_system_time(now: datetime) -> str:
+    """Format `now` at minute granularity, the resolution the prompt needs."""
+    return now.replace(second=0, microsecond=0).isoformat()
+
+
+@lru_cache(maxsize=256)
+def _system_message(source: str, system_time: str, thinking: str) -> SystemMessage:
+    return SystemMessage(
+        content=get_template(source).render(system_time=system_time, thinking=thinking)
+    )
+
+
+def get_system_message(
+    source: str, now: datetime, thinking: str = prompts.THINK_TOOL_INSTRUCTION
+) -> SystemMessage:
+    """Get the rendered system message for `source` at `now`.
+
+    Args:
+        source: The prompt template.
+        now: The current time, filled into `{system_time}` at minute granularity.
+        thinking: How the model should think, filled into `{thinking}`; prompts
+            without that field ignore it.
+
+    The message is rendered once per minute; every call gets its own copy, so
+    callers may modify it without affecting later steps.
+    """
+    return _system_message(source, format_system_time(now), thinking).model_copy()
+
+
+_tenant_prompts: Dict[str, str] = {}
+
+
+def register_tenant_prompt(tenant_id: str, system_prompt: str) -> None:
+    """Override the system prompt for `tenant_id`.
+
+    The template is parsed at registration time so requests never pay for it.
+    """
+    get_template(system_prompt)
+    _tenant_prompts[tenant_id] = system_prompt
+
+
+def unregister_tenant_prompt(tenant_id: str) -> None:
+    """Remove the prompt override for `tenant_id`, if any."""
+    _tenant_prompts.pop(tenant_id, None)
+
+
+def resolve_system_prompt(system_prompt: str, tenant_id: Optional[str] = None) -> str:
+    """Get the tenant's prompt override, falling back to `system_prompt`."""
+    if tenant_id is None:
+        return system_prompt
+    return _tenant_prompts.get(tenant_id, system_prompt)
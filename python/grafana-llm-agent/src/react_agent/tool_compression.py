@@ -0,0 +1,245 @@
+"""Compressed storage of large tool results in the message history.
+
+A `query_loki_logs` result can be megabytes of JSON, and the whole history is
+kept in `State.messages` and in every checkpoint of every thread. Once a tool
+result reaches `Configuration.tool_result_compress_bytes`, the
+`compress_tool_results` tool-node wrapper stores it compressed:
+
+- the `ToolMessage` stays a plain `ToolMessage` (checkpoints need no new
+  type); its content becomes a short placeholder and the compressed bytes go
+  to `additional_kwargs["compressed_content"]`;
+- the codec is zstd when `zstandard` is installed (the `zstd` extra), zlib
+  otherwise, both primed with a shared dictionary of Grafana JSON (the
+  built-in one, or one trained with `train_dictionary` and loaded with
+  `load_dictionary`);
+- `expand_messages` restores the content only where it is needed: right
+  before the model call and when a transcript is rendered.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import zlib
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+from langchain_core.messages import BaseMessage, ToolMessage
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.types import Command
+
+from react_agent.configuration import Configuration
+from react_agent.metrics import METRICS
+from react_agent.utils import dumps, loads
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None  # type: ignore[assignment]
+
+COMPRESSED_KEY = "compressed_content"
+ZSTD = "zstd"
+ZLIB = "zlib"
+
+_ZSTD_LEVEL = 3
+_ZLIB_LEVEL = 6
+
+# 內建字典：Grafana MCP 回傳 JSON 中常見的片段（越常見的放越後面）
+_GRAFANA_SNIPPETS = (
+    '{"status":"success","data":{"resultType":"vector","result":[',
+    '{"status":"success","data":{"resultType":"streams","result":[{"stream":{',
+    '"datasourceUid":"","dashboardUid":"","panelId":',
+    '{"uid":"","title":"","type":"dash-db","tags":[],"folderTitle":"","url":"/d/',
+    '{"id":1,"uid":"","name":"","type":"loki","url":"","isDefault":false}',
+    '{"id":2,"uid":"","name":"","type":"prometheus","url":"","isDefault":true}',
+    '"namespace":"","pod":"","container":"","instance":"","job":"","cluster":"',
+    '"service_country":"","environment":"prod","app":"","component":"',
+    '"detected_level":"info","service_name":"","level":"info","msg":"',
+    'level=error msg="request failed" err="context deadline exceeded" status=500 ',
+    'level=warn msg="slow request" duration=1.234s method=GET path=/api/ ',
+    'level=info msg="request completed" duration=12ms status=200 method=POST ',
+    '{"metric":{"__name__":"","job":"","instance":""},"values":[[1700000000,"0"],[',
+    '{"metric":{"__name__":"","job":"","instance":""},"value":[1700000000.000,"',
+    '{"timestamp":"1700000000000000000","line":"level=error msg=\\"',
+    '","labels":{"service_name":"","detected_level":"error","level":"error"}}',
+    '{"timestamp":"1700000000000000000","line":"level=info msg=\\"',
+    '","labels":{"service_name":"","detected_level":"info","level":"info"}},',
+)
+BUILTIN_DICTIONARY = "".join(_GRAFANA_SNIPPETS).encode()
+
+_dictionaries: Dict[str, bytes] = {}
+
+
+def register_dictionary(data: bytes) -> str:
+    """Register a compression dictionary and get its ID (stored in each message)."""
+    dictionary_id = hashlib.blake2b(data, digest_size=8).hexdigest()
+    _dictionaries[dictionary_id] = data
+    return dictionary_id
+
+
+BUILTIN_DICTIONARY_ID = register_dictionary(BUILTIN_DICTIONARY)
+
+
+def load_dictionary(path: Union[str, Path]) -> str:
+    """Register the dictionary stored in `path` and get its ID."""
+    return register_dictionary(Path(path).read_bytes())
+
+
+def train_dictionary(
+    samples: Sequence[Union[str, bytes]], size: int = 16 * 1024
+) -> bytes:
+    """Train a zstd dictionary of about `size` bytes on sample tool results.
+
+    Needs `zstandard`; save the result and point `tool_result_dictionary_path` to it.
+    """
+    if zstandard is None:
+        raise RuntimeError("Training a dictionary needs the zstandard package")
+    encoded: List[Union[bytes, bytearray, memoryview]] = [
+        s.encode() if isinstance(s, str) else s for s in samples
+    ]
+    return zstandard.train_dictionary(size, encoded).as_bytes()
+
+
+def default_codec() -> str:
+    """Get the best available codec: zstd if installed, otherwise zlib."""
+    return ZSTD if zstandard is not None else ZLIB
+
+
+def compress(data: bytes, codec: str, dictionary_id: Optional[str]) -> bytes:
+    """Compress `data` with `codec`, primed with the registered dictionary."""
+    dictionary = _dictionaries[dictionary_id] if dictionary_id else None
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("The zstd codec needs the zstandard package")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        compressed = zstandard.ZstdCompressor(
+            level=_ZSTD_LEVEL, dict_data=dict_data
+        ).compress(data)
+        # zstandard 的結果仍佔著按原始大小分配的緩衝區，複製一份才真正釋放
+        return bytes(memoryview(compressed))
+    if codec == ZLIB:
+        compressor = (
+            zlib.compressobj(_ZLIB_LEVEL, zdict=dictionary)
+            if dictionary
+            else zlib.compressobj(_ZLIB_LEVEL)
+        )
+        return compressor.compress(data) + compressor.flush()
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+def decompress(data: bytes, codec: str, dictionary_id: Optional[str]) -> bytes:
+    """Reverse `compress`."""
+    if dictionary_id and dictionary_id not in _dictionaries:
+        raise LookupError(f"Compression dictionary {dictionary_id} is not loaded")
+    dictionary = _dictionaries[dictionary_id] if dictionary_id else None
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("The zstd codec needs the zstandard package")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(data)
+    if codec == ZLIB:
+        decompressor = (
+            zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        )
+        return decompressor.decompress(data) + decompressor.flush()
+    raise ValueError(f"Unknown codec {codec!r}")
+
+
+def _content_size(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content)
+    return sum(
+        len(b) if isinstance(b, str) else len(str(b.get("text") or "")) for b in content
+    )
+
+
+def is_compressed(message: BaseMessage) -> bool:
+    """Whether `message` holds its content compressed."""
+    return COMPRESSED_KEY in message.additional_kwargs
+
+
+def compress_message(
+    message: ToolMessage,
+    *,
+    min_size: int,
+    codec: Optional[str] = None,
+    dictionary_id: Optional[str] = BUILTIN_DICTIONARY_ID,
+) -> ToolMessage:
+    """Get `message` with its content compressed if it has at least `min_size` characters."""
+    size = _content_size(message.content)
+    if min_size <= 0 or size < min_size or is_compressed(message):
+        return message
+    codec = codec or default_codec()
+    content = message.content
+    raw = content.encode() if isinstance(content, str) else dumps(content)
+    data = compress(raw, codec, dictionary_id)
+    METRICS.incr("tool_result_compressed_bytes", len(raw) - len(data), codec=codec)
+    return message.model_copy(
+        update={
+            "content": f"[已壓縮的工具結果：{size} 字元]",
+            "additional_kwargs": {
+                **message.additional_kwargs,
+                COMPRESSED_KEY: {
+                    "codec": codec,
+                    "dictionary": dictionary_id,
+                    "json": not isinstance(content, str),
+                    "size": size,
+                    "data": data,
+                },
+            },
+        }
+    )
+
+
+def message_content(message: BaseMessage) -> Any:
+    """Get the content of `message`, decompressing it if needed."""
+    packed = message.additional_kwargs.get(COMPRESSED_KEY)
+    if packed is None:
+        return message.content
+    raw = decompress(packed["data"], packed["codec"], packed["dictionary"])
+    return loads(raw) if packed["json"] else raw.decode()
+
+
+def expand_message(message: BaseMessage) -> BaseMessage:
+    """Get `message` with its original content, as the model must see it."""
+    if not is_compressed(message):
+        return message
+    kwargs = {k: v for k, v in message.additional_kwargs.items() if k != COMPRESSED_KEY}
+    return message.model_copy(
+        update={"content": message_content(message), "additional_kwargs": kwargs}
+    )
+
+
+def expand_messages(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Expand every compressed message of `messages`."""
+    return [expand_message(m) for m in messages]
+
+
+_configured: Dict[str, str] = {}
+
+
+def _dictionary_id(configuration: Configuration) -> str:
+    path = configuration.tool_result_dictionary_path
+    if not path:
+        return BUILTIN_DICTIONARY_ID
+    if path not in _configured:
+        _configured[path] = load_dictionary(path)
+    return _configured[path]
+
+
+async def compress_tool_results(
+    request: ToolCallRequest,
+    execute: Callable[[ToolCallRequest], Awaitable[Union[ToolMessage, Command[Any]]]],
+) -> Union[ToolMessage, Command[Any]]:
+    """Tool-node wrapper storing large tool results compressed."""
+    result = await execute(request)
+    configuration = Configuration.from_context()
+    if (
+        not isinstance(result, ToolMessage)
+        or configuration.tool_result_compress_bytes <= 0
+    ):
+        return result
+    return compress_message(
+        result,
+        min_size=configuration.tool_result_compress_bytes,
+        dictionary_id=_dictionary_id(configuration),
+    )
@@ -2,26 +2,179 @@
 
 It includes both Tavily search (as backup) and comprehensive Grafana MCP tools
 for observability diagnostics.
+
+The MCP adapters and the search client are imported on first use, so
+importing this module (and building the graph) does not load them.
 """
 
-from typing import Any, Callable, List, Optional, cast
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    Annotated,
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
 import asyncio
 import logging
 
-from langgraph.types import Command, interrupt
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
 
-from langchain_tavily import TavilySearch  # type: ignore[import-not-found]
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_core.tools import InjectedToolCallId
+from langgraph.types import Command, interrupt
 
+from react_agent.budget import enforce_deadline
 from react_agent.configuration import Configuration
+from react_agent.dashboard_catalog import DashboardCatalog, DashboardCatalogSyncer
+from react_agent.metadata_index import (
+    MetadataIndex,
+    MetadataSyncer,
+    format_resolution_hint,
+    parse_selector_pairs,
+)
+from react_agent.loki_analysis import (
+    entry_key,
+    format_rfc3339_nano,
+    oldest_timestamp,
+    parse_loki_result,
+    summarize_logs,
+)
+from react_agent.offload import offload
+from react_agent.periodic import PeriodicSync
+from react_agent.prefetch import (
+    RESULT_TOOLS,
+    PrefetchCache,
+    SpeculativeExecutor,
+    ToolStep,
+    TransitionStats,
+    static_rules,
+)
+from react_agent.range_cache import Handler, RangeQueryCache
+from react_agent.tool_compression import message_content
+from react_agent.traffic import get_traffic_recorder
+from react_agent.transcript import format_records, message_record
+from react_agent.utils import decode_tool_result, get_message_text
+
+if TYPE_CHECKING:
+    from langchain_mcp_adapters.client import MultiServerMCPClient
+    from langchain_mcp_adapters.interceptors import (
+        MCPToolCallRequest,
+        MCPToolCallResult,
+        ToolCallInterceptor,
+    )
+
+    from react_agent.cost_guard import LokiCostGuard
+    from react_agent.mcp_sessions import MCPSessionManager
 
 # 設置日誌
 logger = logging.getLogger(__name__)
 
 # 全局 MCP 客戶端和工具緩存
 _mcp_client: Optional[MultiServerMCPClient] = None
+_mcp_sessions: Optional[MCPSessionManager] = None
 _mcp_tools: Optional[List[Callable[..., Any]]] = None
 
+# 全局標籤/指標元數據索引，由背景任務定期同步
+_metadata_index = MetadataIndex()
+_metadata_syncer: Optional[MetadataSyncer] = None
+# 全局儀表板目錄，按儀表板版本增量同步
+_dashboard_catalog = DashboardCatalog()
+_dashboard_syncer: Optional[DashboardCatalogSyncer] = None
+# 每條用戶消息的預解析結果（以消息 ID 為鍵）
+_preresolved: OrderedDict[str, Optional[SystemMessage]] = OrderedDict()
+_MAX_PRERESOLVED = 1024
+
+# Prometheus/Loki 範圍查詢的時間桶快取，所有線程共用
+_range_cache = RangeQueryCache()
+
+
+async def range_cache_interceptor(
+    request: MCPToolCallRequest, handler: Handler
+) -> MCPToolCallResult:
+    """Serve `query_prometheus` / `query_loki_stats` from the shared range cache."""
+    if not Configuration.from_context().range_query_cache:
+        return await handler(request)
+    return await _range_cache.interceptor(request, handler)
+
+
+# query_loki_logs 執行前的成本守衛（第一次使用時建立，cost_guard 模組會載入 mcp）
+_cost_guard: Optional[LokiCostGuard] = None
+
+
+async def cost_guard_interceptor(
+    request: MCPToolCallRequest, handler: Handler
+) -> MCPToolCallResult:
+    """Estimate `query_loki_logs` volume first and narrow or refuse expensive queries."""
+    global _cost_guard
+    configuration = Configuration.from_context()
+    if configuration.loki_guard_max_bytes <= 0:
+        return await handler(request)
+    from react_agent.cost_guard import CostLimits, LokiCostGuard
+
+    if _cost_guard is None:
+        _cost_guard = LokiCostGuard()
+    limits = CostLimits(
+        max_bytes=configuration.loki_guard_max_bytes,
+        max_streams=configuration.loki_guard_max_streams,
+        min_window_seconds=configuration.loki_guard_min_window_seconds,
+    )
+    return await _cost_guard.guard(request, handler, limits)
+
+
+# 推測性預取：預取結果快取、從過往軌跡學到的工具轉移統計、以及執行器
+_prefetch_cache = PrefetchCache()
+_transition_stats = TransitionStats()
+_prefetch_executor: Optional[SpeculativeExecutor] = None
+_required_args: Optional[Dict[str, Tuple[str, ...]]] = None
+# 已計入轉移統計的工具步驟（以其第一個 tool_call_id 識別），同一步驟只計一次
+_observed_steps: OrderedDict[str, None] = OrderedDict()
+_MAX_OBSERVED_STEPS = 4096
+
+
+async def prefetch_interceptor(
+    request: MCPToolCallRequest, handler: Handler
+) -> MCPToolCallResult:
+    """Serve real calls from speculatively prefetched results."""
+    return await _prefetch_cache.interceptor(request, handler)
+
+
+async def traffic_capture_interceptor(
+    request: MCPToolCallRequest, handler: Handler
+) -> MCPToolCallResult:
+    """Record the calls that reach the MCP server, for offline replay."""
+    recorder = get_traffic_recorder(Configuration.from_context().traffic_capture_path)
+    if recorder is None:
+        return await handler(request)
+    return await recorder.record_tool_call(request, handler)
+
+
+# 套用在每個 MCP 工具呼叫上的攔截器（第一個在最外層），共享會話攔截器永遠在最內層。
+# 執行期限在最外層，涵蓋守衛發出的額外呼叫；預取在其內，推測呼叫也會經過守衛與快取；
+# 成本守衛在範圍快取內層，它發出的 query_loki_stats 以一次呼叫查詢確切的時間窗，
+# 不會被快取拆成多個時間桶；
+# 流量擷取在最內層，只記錄真正送到 MCP Server 的呼叫。
+MCP_TOOL_INTERCEPTORS: List[ToolCallInterceptor] = [
+    enforce_deadline,
+    prefetch_interceptor,
+    range_cache_interceptor,
+    cost_guard_interceptor,
+    traffic_capture_interceptor,
+]
+
 
 async def search(query: str) -> Optional[dict[str, Any]]:
     """Search for general web results using Tavily.
@@ -30,9 +183,15 @@ async def search(query: str) -> Optional[dict[str, Any]]:
     to provide comprehensive, accurate, and trusted results. It's particularly useful
     for answering questions about current events.
     """
+    from react_agent.search_client import pooled_search
+
     configuration = Configuration.from_context()
-    wrapped = TavilySearch(max_results=configuration.max_search_results)
-    return cast(dict[str, Any], await wrapped.ainvoke({"query": query}))
+    return await pooled_search(
+        query,
+        configuration.max_search_results,
+        cache_ttl=configuration.search_cache_ttl,
+        max_concurrency=configuration.search_max_concurrency,
+    )
 
 def think(thought: str) -> Optional[dict[str, Any]]:
     """Use the tool to think about something.
@@ -99,27 +258,47 @@ async def get_mcp_client() -> MultiServerMCPClient:
     """Get or create the MCP client."""
     global _mcp_client
     if _mcp_client is None:
+        from langchain_mcp_adapters.client import MultiServerMCPClient
+        from langchain_mcp_adapters.sessions import Connection
+
         configuration = Configuration.from_context()
-        _mcp_client = MultiServerMCPClient({
-            "grafana-mcp": {
+        # 傳輸方式來自設定（'sse' 或 'streamable_http'），型別上無法對應到單一種連線
+        connection = cast(
+            Connection,
+            {
                 "url": configuration.grafana_mcp_url,
-                "transport": "sse",
-            }
-        })
+                "transport": configuration.grafana_mcp_transport,
+            },
+        )
+        _mcp_client = MultiServerMCPClient({"grafana-mcp": connection})
     return _mcp_client
 
 
+async def get_mcp_session_manager() -> MCPSessionManager:
+    """Get or create the manager of long-lived MCP sessions."""
+    global _mcp_sessions
+    if _mcp_sessions is None:
+        from react_agent.mcp_sessions import MCPSessionManager
+
+        client = await get_mcp_client()
+        _mcp_sessions = MCPSessionManager(client.connections)
+    return _mcp_sessions
+
+
 async def get_mcp_tools() -> List[Callable[..., Any]]:
     """Get the filtered MCP tools."""
     global _mcp_tools
     if _mcp_tools is None:
         try:
             configuration = Configuration.from_context()
-            client = await get_mcp_client()
-            
-            # 從 MCP Server 中獲取所有工具
-            all_tools = await client.get_tools()
+            manager = await get_mcp_session_manager()
+
+            # 從 MCP Server 中獲取所有工具，之後的呼叫都共用同一個會話
+            all_tools = await manager.get_tools(interceptors=MCP_TOOL_INTERCEPTORS)
             logger.info(f"所有可用的 Grafana 工具: {[tool.name for tool in all_tools]}")
+            recorder = get_traffic_recorder(configuration.traffic_capture_path)
+            if recorder is not None:
+                recorder.record_tools(all_tools)
             
             # 過濾工具，只保留配置中指定的工具
             _mcp_tools = [tool for tool in all_tools if tool.name in configuration.grafana_tools]
@@ -133,80 +312,374 @@ async def get_mcp_tools() -> List[Callable[..., Any]]:
     return _mcp_tools
 
 
+async def get_mcp_tool(name: str) -> Optional[Any]:
+    """Get a single MCP tool by name, if the server provides it."""
+    for tool in await get_mcp_tools():
+        if getattr(tool, "name", None) == name:
+            return tool
+    return None
+
+
+# Grafana MCP 的 query_loki_logs 單次最多回傳 100 行
+_LOKI_PAGE_SIZE = 100
+
+
+async def analyze_loki_logs(
+    datasourceUid: str,
+    logql: str,
+    startRfc3339: Optional[str] = None,
+    endRfc3339: Optional[str] = None,
+    max_lines: int = 2000,
+    bucket_seconds: int = 60,
+    tool_call_id: Annotated[Optional[str], InjectedToolCallId] = None,
+) -> Union[dict[str, Any], ToolMessage]:
+    """Fetch Loki logs and return a compact statistical summary instead of raw lines.
+
+    Prefer this over query_loki_logs when analyzing the health of a service or
+    environment. It pages through up to `max_lines` log lines and returns the
+    error-rate timeline, top label combinations, clustered log patterns with
+    examples, and anomalous time buckets.
+
+    :param datasourceUid: The UID of the Loki datasource.
+    :param logql: The LogQL log query, e.g. {service_name="api"} |= "error".
+    :param startRfc3339: Start of the time range (RFC3339), defaults to one hour ago.
+    :param endRfc3339: End of the time range (RFC3339), defaults to now.
+    :param max_lines: Maximum number of log lines to analyze.
+    :param bucket_seconds: Width of the timeline buckets in seconds.
+    :return: The summary of the matching logs.
+    """
+    try:
+        return await _analyze_loki_logs(
+            datasourceUid, logql, startRfc3339, endRfc3339, max_lines, bucket_seconds
+        )
+    except Exception as e:
+        # 查詢或解析失敗時回報錯誤給模型，不中斷整個執行
+        logger.warning(f"日誌分析失敗: {e!r}")
+        return ToolMessage(
+            content=f"日誌分析失敗: {e!r}",
+            tool_call_id=tool_call_id or "",
+            name="analyze_loki_logs",
+            status="error",
+        )
+
+
+async def _analyze_loki_logs(
+    datasourceUid: str,
+    logql: str,
+    startRfc3339: Optional[str],
+    endRfc3339: Optional[str],
+    max_lines: int,
+    bucket_seconds: int,
+) -> dict[str, Any]:
+    query_tool = await get_mcp_tool("query_loki_logs")
+    if query_tool is None:
+        raise LookupError("query_loki_logs 工具不可用，無法分析日誌")
+    from react_agent.cost_guard import guard_rejection
+
+    entries: List[dict[str, Any]] = []
+    seen: set[tuple[Any, ...]] = set()
+    end = endRfc3339
+    overlap = 0
+    while len(entries) < max_lines:
+        # 翻頁時邊界那一行會重複出現，多取一行補上
+        limit = min(_LOKI_PAGE_SIZE, max_lines - len(entries) + overlap)
+        args: dict[str, Any] = {
+            "datasourceUid": datasourceUid,
+            "logql": logql,
+            "limit": limit,
+            "direction": "backward",
+        }
+        if startRfc3339:
+            args["startRfc3339"] = startRfc3339
+        if end:
+            args["endRfc3339"] = end
+        # 每頁只解碼一次
+        decoded = decode_tool_result(await query_tool.ainvoke(args))
+        rejection = guard_rejection(decoded)
+        if rejection is not None:
+            return rejection
+        page = parse_loki_result(decoded)
+        # 不同串流可能在同一時間記下相同的行，標籤也算在身分內
+        new = [e for e in page if entry_key(e) not in seen]
+        if not new:
+            break
+        seen.update(entry_key(e) for e in new)
+        entries.extend(new)
+        oldest = oldest_timestamp(page)
+        if len(page) < limit or oldest is None:
+            break
+        # 往更早的時間翻頁
+        end = format_rfc3339_nano(oldest)
+        overlap = 1
+
+    size = sum(len(str(e.get("line", ""))) for e in entries)
+    summary = await offload(summarize_logs, entries, size=size, bucket_seconds=bucket_seconds)
+    summary["truncated"] = len(entries) >= max_lines
+    return summary
+
+
+async def _call_mcp_tool(name: str, arguments: Dict[str, Any]) -> Any:
+    tool = await get_mcp_tool(name)
+    if tool is None:
+        raise LookupError(f"MCP 工具 {name} 不可用")
+    return decode_tool_result(await tool.ainvoke(arguments))
+
+
+def get_metadata_syncer() -> MetadataSyncer:
+    """Get the syncer of the global metadata index, starting it if needed.
+
+    Must be called from a running event loop; the background sync is bound to it.
+    """
+    global _metadata_syncer
+    configuration = Configuration.from_context()
+    if _metadata_syncer is None:
+        _metadata_syncer = MetadataSyncer(_metadata_index, _call_mcp_tool)
+    if configuration.metadata_sync_interval > 0:
+        _metadata_syncer.start(configuration.metadata_sync_interval)
+    return _metadata_syncer
+
+
+async def _ensure_synced(syncer: PeriodicSync) -> Optional[dict[str, Any]]:
+    """Wait for the first sync of a local index; return an error dict on timeout."""
+    if syncer.ready:
+        return None
+    configuration = Configuration.from_context()
+    if not syncer.running:
+        # 未啟用背景同步時按需同步一次
+        await syncer.sync_once()
+    elif not await syncer.wait_synced(configuration.local_index_sync_timeout):
+        return {"error": f"{syncer.name}尚未同步完成，請稍後再試或改用對應的 Grafana 工具"}
+    return None
+
+
+def get_dashboard_syncer() -> DashboardCatalogSyncer:
+    """Get the syncer of the global dashboard catalog, starting it if needed."""
+    global _dashboard_syncer
+    configuration = Configuration.from_context()
+    if _dashboard_syncer is None:
+        _dashboard_syncer = DashboardCatalogSyncer(_dashboard_catalog, _call_mcp_tool)
+    _dashboard_syncer.revalidate_batch = configuration.dashboard_revalidate_batch
+    _dashboard_syncer.revalidate_max_age = configuration.dashboard_revalidate_max_age
+    if configuration.dashboard_sync_interval > 0:
+        _dashboard_syncer.start(configuration.dashboard_sync_interval)
+    return _dashboard_syncer
+
+
+async def search_dashboard_catalog(query: str, limit: int = 10) -> dict[str, Any]:
+    """Search all Grafana dashboards locally and return matching panels with their queries.
+
+    Prefer this over search_dashboards / get_dashboard_by_uid /
+    get_dashboard_panel_queries when looking for a dashboard or panel: it
+    searches dashboard titles, tags, folders, panel titles and PromQL/LogQL
+    expressions in a locally synced catalog and returns the panel queries
+    directly, without fetching whole dashboard JSONs. Each result's
+    verifiedSecondsAgo says when its dashboard was last checked against
+    Grafana; if the exact current query matters and that is long ago, confirm
+    with get_dashboard_panel_queries.
+
+    :param query: Words to look for, e.g. "checkout latency p99" or a metric name.
+    :param limit: Maximum number of results.
+    :return: Matching panels (with queries) and dashboards, best first.
+    """
+    error = await _ensure_synced(get_dashboard_syncer())
+    if error is not None:
+        return error
+    return {
+        "results": _dashboard_catalog.search(query, limit=limit),
+        "catalog_size": len(_dashboard_catalog),
+    }
+
+
+async def resolve_grafana_targets(
+    query: str, datasourceUid: Optional[str] = None, limit: int = 5
+) -> dict[str, Any]:
+    """Resolve loosely written targets to exact Loki/Prometheus label selectors.
+
+    Use this first whenever the user names a service, environment or metric
+    loosely (e.g. "service_name:SportyBet Android and service_country:zm").
+    It searches a locally synced index of label names, label values and
+    metric names, so it replaces many list_*_label_names / list_*_label_values
+    / list_prometheus_metric_names calls with one fast lookup.
+
+    :param query: `key:value` pairs and/or free text to look up.
+    :param datasourceUid: Restrict the lookup to one datasource.
+    :param limit: Maximum number of candidates to return.
+    :return: Ready-to-use selectors per datasource and the closest matches.
+    """
+    error = await _ensure_synced(get_metadata_syncer())
+    if error is not None:
+        return error
+
+    pairs = parse_selector_pairs(query)
+    result: dict[str, Any] = {"pairs": [list(p) for p in pairs]}
+    if pairs:
+        result["selectors"] = _metadata_index.resolve_selector(
+            pairs, datasourceUid, limit=limit
+        )
+    result["matches"] = _metadata_index.search(query, datasourceUid, limit=limit)
+    return result
+
+
+async def preresolve_targets(messages: Sequence[BaseMessage]) -> Optional[SystemMessage]:
+    """Resolve `key:value` targets in the latest user message against the local index.
+
+    Never waits for the index; returns `None` until it has been synced or when
+    nothing in the message resolves. The result is remembered per message, so
+    every step of the same turn sees the same hint.
+    """
+    latest = next((m for m in reversed(messages) if isinstance(m, HumanMessage)), None)
+    if latest is None:
+        return None
+    if latest.id is not None and latest.id in _preresolved:
+        return _preresolved[latest.id]
+    pairs = parse_selector_pairs(get_message_text(latest))
+    if not pairs:
+        return None
+    get_metadata_syncer()
+    if not _metadata_index.ready:
+        return None
+    candidates = _metadata_index.resolve_selector(pairs)
+    hint = SystemMessage(content=format_resolution_hint(candidates)) if candidates else None
+    if latest.id is not None:
+        _preresolved[latest.id] = hint
+        while len(_preresolved) > _MAX_PRERESOLVED:
+            _preresolved.popitem(last=False)
+    return hint
+
+
+def recent_tool_steps(messages: Sequence[BaseMessage]) -> List[ToolStep]:
+    """Get the tool calls of the latest tool step with their decoded results.
+
+    Only the results the prefetch rules read are decoded (`RESULT_TOOLS`); large
+    log and metric results are left as None instead of being parsed every step.
+    """
+    results: Dict[str, ToolMessage] = {}
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage):
+            results[message.tool_call_id] = message
+        elif isinstance(message, AIMessage):
+            return [
+                ToolStep(
+                    call["name"],
+                    dict(call["args"]),
+                    decode_tool_result(message_content(results[call_id]))
+                    if call["name"] in RESULT_TOOLS
+                    else None,
+                    call_id,
+                )
+                for call in message.tool_calls
+                if (call_id := call.get("id")) is not None and call_id in results
+            ]
+        else:
+            break
+    return []
+
+
+def _previous_tool_names(messages: Sequence[BaseMessage]) -> List[str]:
+    # 最近一次工具步驟之前的那一次工具步驟
+    seen_latest = False
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and message.tool_calls:
+            if seen_latest:
+                return [call["name"] for call in message.tool_calls]
+            seen_latest = True
+        elif isinstance(message, HumanMessage):
+            break
+    return []
+
+
+async def _required_tool_args() -> Dict[str, Tuple[str, ...]]:
+    global _required_args
+    if _required_args is None:
+        required: Dict[str, Tuple[str, ...]] = {}
+        for tool in await get_mcp_tools():
+            name = getattr(tool, "name", None)
+            schema = getattr(tool, "args_schema", None)
+            if name and isinstance(schema, dict):
+                required[name] = tuple(schema.get("required", ()))
+        if not required:
+            # MCP 工具尚未載入（例如伺服器暫時無法連線），下次再試，不快取空結果
+            return required
+        _required_args = required
+    return _required_args
+
+
+def _observe_step(messages: Sequence[BaseMessage], steps: Sequence[ToolStep]) -> None:
+    # 同一工具步驟之後可能多次呼叫模型（重試、中斷後恢復），只計入一次
+    step_id = steps[0].call_id
+    if step_id is None or step_id in _observed_steps:
+        return
+    _observed_steps[step_id] = None
+    while len(_observed_steps) > _MAX_OBSERVED_STEPS:
+        _observed_steps.popitem(last=False)
+    _transition_stats.observe(_previous_tool_names(messages), [s.name for s in steps])
+
+
+async def speculate_after_tools(messages: Sequence[BaseMessage]) -> int:
+    """Prefetch the likely follow-ups of the latest tool step in the background.
+
+    Also feeds the step into the learned transition statistics.
+
+    Returns:
+        The number of speculative calls launched.
+    """
+    global _prefetch_executor
+    steps = recent_tool_steps(messages)
+    if not steps:
+        return 0
+    _observe_step(messages, steps)
+
+    configuration = Configuration.from_context()
+    if _prefetch_executor is None:
+        _prefetch_executor = SpeculativeExecutor(_prefetch_cache, _call_mcp_tool)
+    _prefetch_executor.max_per_step = configuration.prefetch_max_calls
+    required = await _required_tool_args()
+    predictions = [
+        prediction
+        for step in steps
+        for prediction in [
+            *static_rules(step),
+            *_transition_stats.predict(step, required),
+        ]
+        if prediction.name in required
+    ]
+    return len(_prefetch_executor.launch(predictions))
+
+
 async def get_all_tools() -> List[Callable[..., Any]]:
     """Get all available tools (both MCP and search)."""
     mcp_tools = await get_mcp_tools()
-    return [search, think, incrementCounterWithConfirm] + mcp_tools
+    return [
+        search,
+        think,
+        incrementCounterWithConfirm,
+        analyze_loki_logs,
+        resolve_grafana_targets,
+        search_dashboard_catalog,
+    ] + mcp_tools
 
 
 def parse_messages(messages: List[Any]) -> None:
     """
     解析消息列表，打印 HumanMessage、AIMessage 和 ToolMessage 的詳細信息
 
+    內容只顯示有界的預覽，工具結果不做 JSON 解析；格式與 transcript 相同。
+
     Args:
         messages: 包含消息的列表，每個消息是一個對象
     """
     print("\n🔍 === 詳細消息解析 ===")
-    for idx, msg in enumerate(messages, 1):
-        print(f"\n📝 消息 {idx}: {msg.__class__.__name__}")
-        print("-" * 40)
-        
-        # 獲取消息類型
-        msg_type = msg.__class__.__name__
-        
-        # 提取消息內容
-        content = getattr(msg, 'content', '')
-        if content:
-            print(f"💬 內容: {content}")
-        
-        # 處理 HumanMessage
-        if msg_type == 'HumanMessage':
-            print("👤 用戶輸入")
-            
-        # 處理 AIMessage 的工具調用
-        elif msg_type == 'AIMessage':
-            print("🤖 AI 回應")
-            tool_calls = getattr(msg, 'tool_calls', [])
-            if tool_calls:
-                print("🔧 工具調用:")
-                for i, tool_call in enumerate(tool_calls, 1):
-                    print(f"  {i}. 工具名稱: {tool_call.get('name', 'Unknown')}")
-                    print(f"     工具參數: {tool_call.get('args', {})}")
-                    print(f"     調用 ID: {tool_call.get('id', 'Unknown')}")
-            
-            # 處理 additional_kwargs 中的工具調用（舊格式）
-            additional_kwargs = getattr(msg, 'additional_kwargs', {})
-            if additional_kwargs.get('tool_calls'):
-                print("🔧 工具調用 (舊格式):")
-                for i, tool_call in enumerate(additional_kwargs['tool_calls'], 1):
-                    print(f"  {i}. 函數名稱: {tool_call.get('function', {}).get('name', 'Unknown')}")
-                    print(f"     函數參數: {tool_call.get('function', {}).get('arguments', '{}')}")
-                    print(f"     調用 ID: {tool_call.get('id', 'Unknown')}")
-        
-        # 處理 ToolMessage
-        elif msg_type == 'ToolMessage':
-            print("🛠️ 工具執行結果")
-            tool_name = getattr(msg, 'name', 'Unknown')
-            tool_call_id = getattr(msg, 'tool_call_id', 'Unknown')
-            print(f"🔧 工具名稱: {tool_name}")
-            print(f"🆔 工具調用 ID: {tool_call_id}")
-            
-            # 嘗試解析 JSON 格式的工具結果
-            try:
-                import json
-                if content:
-                    parsed_content = json.loads(content)
-                    if isinstance(parsed_content, list) and len(parsed_content) > 0:
-                        print(f"📊 結果數量: {len(parsed_content)} 項")
-                        print(f"📋 結果預覽: {str(parsed_content)[:200]}...")
-                    else:
-                        print(f"📊 結果: {str(parsed_content)[:200]}...")
-            except:
-                print(f"📊 原始結果: {content[:200]}...")
-        
-        print()  # 空行分隔
+    print(format_records(message_record(msg) for msg in messages))
+    print()
 
 
 # 為了兼容性，我們需要在模組級別提供 TOOLS
 # 但由於 MCP 工具需要異步初始化，我們提供一個空列表作為佔位符
-TOOLS: List[Callable[..., Any]] = [search, think, incrementCounterWithConfirm]
+TOOLS: List[Callable[..., Any]] = [
+    search,
+    think,
+    incrementCounterWithConfirm,
+    analyze_loki_logs,
+    resolve_grafana_targets,
+    search_dashboard_catalog,
+]
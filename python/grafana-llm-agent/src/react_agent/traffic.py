@@ -0,0 +1,250 @@
+"""Capture the agent's MCP and LLM traffic for offline replay.
+
+With `traffic_capture_path` set (or `TRAFFIC_CAPTURE_PATH`), every MCP tool
+call that reaches the server and every LLM call is appended to a JSON Lines
+file, gzip-compressed when its name ends in `.gz`. Each record has the wall
+time `ts`, the offset `t` from the start of the capture, the `duration` of
+the call and the `thread_id` of the run:
+
+- `{"kind": "tools", "tools": [...]}`: the tools the MCP server listed, with
+  their input schemas;
+- `{"kind": "mcp", "name", "arguments", "result" | "error"}`: a tool call
+  and the `CallToolResult` (or the exception) it returned;
+- `{"kind": "llm", "id", "parent", "offset", "key", "request", "response"}`:
+  a model call and its response as LangChain message dicts. `request` holds
+  only the messages that are new since the thread's previous call: the full
+  request is the first `offset` messages of the `parent` record's request
+  followed by `request` (`expand_requests` rebuilds it). `key` identifies
+  the conversation by its last user message.
+
+`react_agent.replay` serves a capture back without a network.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    message_to_dict,
+    messages_to_dict,
+)
+
+from react_agent.jsonl import JsonlAppender, read_jsonl
+from react_agent.utils import current_thread_id, dumps, get_message_text
+
+if TYPE_CHECKING:
+    from langchain_mcp_adapters.interceptors import (
+        MCPToolCallRequest,
+        MCPToolCallResult,
+    )
+
+    from react_agent.range_cache import Handler
+
+_MAX_TRACKED_THREADS = 4096
+
+
+def conversation_key(messages: Sequence[BaseMessage]) -> str:
+    """Identify the conversation of an LLM request by its last user message."""
+    question = next((m for m in reversed(messages) if m.type == "human"), None)
+    text = get_message_text(question) if question is not None else ""
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _message_key(message: BaseMessage) -> Hashable:
+    # 每次呼叫重建、沒有 ID 的消息（如系統提示）以內容辨識
+    if message.id is not None:
+        return message.type, message.id
+    return message.type, get_message_text(message)
+
+
+def tool_definition(tool: Any) -> Dict[str, Any]:
+    """Get the MCP definition (name, description, input schema) of a LangChain tool."""
+    schema = tool.args_schema
+    if not isinstance(schema, dict):
+        schema = tool.get_input_jsonschema()
+    return {"name": tool.name, "description": tool.description, "inputSchema": schema}
+
+
+class TrafficRecorder:
+    """Append MCP tool calls and LLM calls to a JSONL capture file."""
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        """Write to `path`, gzip-compressed if it ends in `.gz`."""
+        self.path = Path(path)
+        self.compress = self.path.suffix == ".gz"
+        self._lock = threading.Lock()
+        self._file = JsonlAppender(self.path, self.compress)
+        self._started = time.monotonic()
+        # 每個執行緒上一次模型呼叫的記錄 ID 與其請求中各消息的識別
+        self._requests: OrderedDict[str, Tuple[str, List[Hashable]]] = OrderedDict()
+
+    def _line(self, record: Dict[str, Any]) -> bytes:
+        record = {
+            "ts": time.time(),
+            "t": round(time.monotonic() - self._started, 6),
+            **record,
+        }
+        return dumps(record) + b"\n"
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Append `record`, stamped with `ts` and (unless it has one) `t`."""
+        line = self._line(record)
+        with self._lock:
+            self._file.write(line)
+
+    def _write_request(
+        self, record: Dict[str, Any], messages: Sequence[BaseMessage]
+    ) -> None:
+        keys = [_message_key(m) for m in messages]
+        thread = record.get("thread_id") or ""
+        with self._lock:
+            # 記錄與其父記錄在同一把鎖內決定並寫入，檔案中父記錄一定在前
+            parent, previous = self._requests.get(thread, (None, []))
+            shared = 0
+            for old, new in zip(previous, keys):
+                if old != new:
+                    break
+                shared += 1
+            record_id = uuid.uuid4().hex
+            record = {
+                **record,
+                "id": record_id,
+                "parent": parent if shared else None,
+                "offset": shared,
+                "request": messages_to_dict(messages[shared:]),
+            }
+            self._file.write(self._line(record))
+            self._requests[thread] = (record_id, keys)
+            self._requests.move_to_end(thread)
+            while len(self._requests) > _MAX_TRACKED_THREADS:
+                self._requests.popitem(last=False)
+
+    def _timing(self, started: float) -> Dict[str, float]:
+        return {
+            "t": round(started - self._started, 6),
+            "duration": round(time.monotonic() - started, 6),
+        }
+
+    def record_tools(self, tools: Sequence[Any]) -> None:
+        """Record the definitions of the MCP server's tools."""
+        self.write({"kind": "tools", "tools": [tool_definition(t) for t in tools]})
+
+    async def record_tool_call(
+        self, request: MCPToolCallRequest, handler: Handler
+    ) -> MCPToolCallResult:
+        """Call `handler` and record the request, its result and latency."""
+        from mcp.types import CallToolResult
+
+        record: Dict[str, Any] = {
+            "kind": "mcp",
+            "thread_id": current_thread_id(),
+            "name": request.name,
+            "arguments": request.args,
+        }
+        started = time.monotonic()
+        try:
+            result = await handler(request)
+        except Exception as e:
+            self.write({**record, **self._timing(started), "error": repr(e)})
+            raise
+        if isinstance(result, CallToolResult):
+            record["result"] = result.model_dump(
+                mode="json", by_alias=True, exclude_none=True
+            )
+            self.write({**record, **self._timing(started)})
+        return result
+
+    def wrap_model_call(
+        self, messages: Sequence[BaseMessage], call: Callable[[], Awaitable[AIMessage]]
+    ) -> Callable[[], Awaitable[AIMessage]]:
+        """Wrap the model call `call` on `messages` so it is recorded when it returns.
+
+        Only the messages new since the thread's previous recorded call are
+        written, with a reference to that call's record.
+        """
+        thread_id = current_thread_id()
+
+        async def recorded() -> AIMessage:
+            started = time.monotonic()
+            response = await call()
+            record = {
+                "kind": "llm",
+                **self._timing(started),
+                "thread_id": thread_id,
+                "key": conversation_key(messages),
+                "response": message_to_dict(response),
+            }
+            self._write_request(record, messages)
+            return response
+
+        return recorded
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        with self._lock:
+            self._file.close()
+
+
+_recorders: Dict[str, TrafficRecorder] = {}
+
+
+def get_traffic_recorder(path: str) -> Optional[TrafficRecorder]:
+    """Get the process-wide recorder for `path`; None if `path` is empty."""
+    if not path:
+        return None
+    recorder = _recorders.get(path)
+    if recorder is None:
+        recorder = _recorders[path] = TrafficRecorder(path)
+    return recorder
+
+
+def read_traffic(path: str | os.PathLike[str]) -> Iterator[Dict[str, Any]]:
+    """Read the records of a capture in the order they were written."""
+    return read_jsonl(path)
+
+
+def expand_requests(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield `records` with the `request` of each LLM record rebuilt in full.
+
+    Only the latest request of each thread is kept to rebuild the next one.
+    A record whose parent is not among `records` (e.g. the capture was cut)
+    keeps just its own messages and is marked `"partial": True`.
+    """
+    latest: Dict[Any, Tuple[str, List[Dict[str, Any]]]] = {}
+    for record in records:
+        if record.get("kind") != "llm" or "id" not in record:
+            yield record
+            continue
+        thread = record.get("thread_id") or ""
+        parent_id, parent_request = latest.get(thread, (None, []))
+        offset = record.get("offset", 0)
+        request = list(record.get("request", []))
+        if offset:
+            if record.get("parent") == parent_id:
+                request = parent_request[:offset] + request
+            else:
+                record = {**record, "partial": True}
+        latest[thread] = (record["id"], request)
+        yield {**record, "request": request}
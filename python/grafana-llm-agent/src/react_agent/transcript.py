@@ -0,0 +1,291 @@
+"""Structured conversation transcripts as JSON Lines.
+
+`TranscriptWriter` appends one JSON record per message to a `.jsonl` file,
+writing only the messages it has not written for that thread yet, so each
+step costs O(new messages) however long the thread is. Records keep the
+full content plus a bounded `preview` cut from the raw text (tool results
+are not JSON-decoded for it). Files can be gzip-compressed and are rotated
+by size like `logging.handlers.RotatingFileHandler` (`path.1`, `path.2`, ...).
+
+`read_transcript` reads the records back (rotated files first) and
+`format_records` renders them for humans:
+
+    python -m react_agent.transcript transcript.jsonl --thread 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from react_agent.jsonl import JsonlAppender, read_jsonl
+from react_agent.tool_compression import message_content
+from react_agent.utils import dumps
+
+logger = logging.getLogger(__name__)
+
+_MAX_TRACKED_THREADS = 4096
+
+
+def preview(content: Any, limit: int = 200) -> str:
+    """Get at most `limit` characters of `content` on one line, without decoding JSON."""
+    if isinstance(content, list):
+        parts: List[str] = []
+        length = 0
+        for block in content:
+            text = block if isinstance(block, str) else str(block.get("text") or "")
+            parts.append(text)
+            length += len(text)
+            if length > limit:
+                break
+        content = "".join(parts)
+    elif not isinstance(content, str):
+        content = str(content)
+    # 多取一些再壓縮空白，仍然只處理開頭一小段
+    text = " ".join(content[: limit * 2].split())
+    return text[:limit] + "…" if len(text) > limit or len(content) > limit * 2 else text
+
+
+def _size(content: Any) -> int:
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, list):
+        return sum(
+            len(b) if isinstance(b, str) else len(str(b.get("text") or ""))
+            for b in content
+        )
+    return len(str(content))
+
+
+def message_record(
+    message: BaseMessage, *, thread_id: Optional[str] = None, preview_chars: int = 200
+) -> Dict[str, Any]:
+    """Convert `message` into a transcript record, expanding compressed content."""
+    content = message_content(message)
+    record: Dict[str, Any] = {
+        "ts": time.time(),
+        "thread_id": thread_id,
+        "id": message.id,
+        "type": message.type,
+        "content": content,
+        "size": _size(content),
+        "preview": preview(content, preview_chars),
+    }
+    if message.name:
+        record["name"] = message.name
+    if isinstance(message, AIMessage):
+        if message.tool_calls:
+            record["tool_calls"] = [
+                {"name": c["name"], "args": c["args"], "id": c.get("id")}
+                for c in message.tool_calls
+            ]
+        if message.usage_metadata:
+            record["usage"] = dict(message.usage_metadata)
+    elif isinstance(message, ToolMessage):
+        record["tool_call_id"] = message.tool_call_id
+        record["status"] = message.status
+    return record
+
+
+def _rotated(path: Path, number: int) -> Path:
+    return path.with_name(f"{path.name}.{number}")
+
+
+class TranscriptWriter:
+    """Append conversation messages to a JSONL transcript, incrementally per thread."""
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        compress: bool = False,
+        max_bytes: int = 64 * 1024 * 1024,
+        backup_count: int = 5,
+        preview_chars: int = 200,
+    ) -> None:
+        """Write to `path`, rotating it once it reaches `max_bytes` (0: never).
+
+        Args:
+            path: The transcript file.
+            compress: Write gzip-compressed JSONL.
+            max_bytes: Rotate the file once it is this large on disk.
+            backup_count: How many rotated files to keep.
+            preview_chars: Length of the `preview` of each record.
+        """
+        self.path = Path(path)
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.preview_chars = preview_chars
+        self._lock = threading.Lock()
+        self._file = JsonlAppender(self.path, compress)
+        # 每個執行緒最後寫入的消息 ID 與已寫入的數量
+        self._written: OrderedDict[str, Tuple[str, int]] = OrderedDict()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self.backup_count <= 0:
+            self.path.unlink(missing_ok=True)
+            return
+        for number in range(self.backup_count - 1, 0, -1):
+            source = _rotated(self.path, number)
+            if source.exists():
+                source.replace(_rotated(self.path, number + 1))
+        self.path.replace(_rotated(self.path, 1))
+
+    def _unwritten(
+        self, thread_id: str, messages: Sequence[BaseMessage]
+    ) -> Tuple[int, Sequence[BaseMessage]]:
+        last_id, count = self._written.get(thread_id, ("", 0))
+        if last_id:
+            # 新消息都在尾端，從後往前找上次寫到的位置
+            for position in range(len(messages) - 1, -1, -1):
+                if messages[position].id == last_id:
+                    return count, messages[position + 1 :]
+        return count, messages
+
+    def write(self, thread_id: Optional[str], messages: Sequence[BaseMessage]) -> int:
+        """Append the messages of `thread_id` not written yet; return how many were written.
+
+        Messages are recognized by ID; those without one get one. After a restart
+        (or if the last written message was removed from the history) the whole
+        history given is written again.
+        """
+        thread = thread_id or "default"
+        with self._lock:
+            start, new = self._unwritten(thread, messages)
+            if not new:
+                return 0
+            lines = []
+            for index, message in enumerate(new, start):
+                if message.id is None:
+                    message.id = str(uuid.uuid4())
+                record = message_record(
+                    message, thread_id=thread, preview_chars=self.preview_chars
+                )
+                record["index"] = index
+                lines.append(dumps(record) + b"\n")
+            size = self._file.write(b"".join(lines))
+            self._written[thread] = (str(new[-1].id), start + len(new))
+            self._written.move_to_end(thread)
+            while len(self._written) > _MAX_TRACKED_THREADS:
+                self._written.popitem(last=False)
+            if self.max_bytes and size >= self.max_bytes:
+                self._rotate()
+            return len(new)
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        with self._lock:
+            self._file.close()
+
+
+_writers: Dict[Tuple[Any, ...], TranscriptWriter] = {}
+
+
+def get_transcript_writer(
+    path: str,
+    compress: bool = False,
+    max_bytes: int = 64 * 1024 * 1024,
+    backup_count: int = 5,
+) -> Optional[TranscriptWriter]:
+    """Get the process-wide writer for `path`; None if `path` is empty."""
+    if not path:
+        return None
+    key = (path, compress, max_bytes, backup_count)
+    writer = _writers.get(key)
+    if writer is None:
+        writer = TranscriptWriter(
+            path, compress=compress, max_bytes=max_bytes, backup_count=backup_count
+        )
+        _writers[key] = writer
+    return writer
+
+
+def read_transcript(
+    path: str | os.PathLike[str],
+    *,
+    thread_id: Optional[str] = None,
+    rotated: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """Read the records of a transcript, oldest first, optionally of one thread only.
+
+    With `rotated`, the rotated files (`path.N` ... `path.1`) are read first.
+    """
+    path = Path(path)
+    files = []
+    if rotated:
+        numbered = path.parent.glob(f"{path.name}.*")
+        backups = [p for p in numbered if p.suffix[1:].isdigit()]
+        files = sorted(backups, key=lambda p: int(p.suffix[1:]), reverse=True)
+    if path.exists():
+        files.append(path)
+    for file in files:
+        for record in read_jsonl(file):
+            if thread_id is None or record.get("thread_id") == thread_id:
+                yield record
+
+
+_TITLES = {
+    "human": "👤 用戶輸入",
+    "ai": "🤖 AI 回應",
+    "tool": "🛠️ 工具執行結果",
+    "system": "⚙️ 系統消息",
+}
+
+
+def format_record(record: Dict[str, Any], number: int) -> str:
+    """Render one record for reading, using its bounded preview."""
+    kind = record.get("type", "")
+    lines = [f"📝 消息 {number}: {kind}", "-" * 40, _TITLES.get(kind, kind)]
+    if kind == "tool":
+        lines.append(f"🔧 工具名稱: {record.get('name', 'Unknown')}")
+        lines.append(f"🆔 工具調用 ID: {record.get('tool_call_id', 'Unknown')}")
+        status = " ❌" if record.get("status") == "error" else ""
+        lines.append(
+            f"📊 結果{status} ({record.get('size', 0)} 字元): {record.get('preview', '')}"
+        )
+    elif record.get("preview"):
+        lines.append(f"💬 內容: {record['preview']}")
+    for i, call in enumerate(record.get("tool_calls", ()), 1):
+        if i == 1:
+            lines.append("🔧 工具調用:")
+        lines.append(f"  {i}. 工具名稱: {call.get('name', 'Unknown')}")
+        lines.append(
+            f"     工具參數: {preview(dumps(call.get('args', {})).decode(), 200)}"
+        )
+        lines.append(f"     調用 ID: {call.get('id', 'Unknown')}")
+    return "\n".join(lines)
+
+
+def format_records(records: Iterable[Dict[str, Any]]) -> str:
+    """Render transcript records for reading."""
+    return "\n\n".join(format_record(r, n) for n, r in enumerate(records, 1))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Pretty-print a transcript file."""
+    parser = argparse.ArgumentParser(description="Pretty-print a JSONL transcript.")
+    parser.add_argument("path")
+    parser.add_argument("--thread", default=None, help="Only show this thread_id.")
+    parser.add_argument("--no-rotated", action="store_true", help="Skip rotated files.")
+    args = parser.parse_args(argv)
+    records = read_transcript(
+        args.path, thread_id=args.thread, rotated=not args.no_rotated
+    )
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, format="%(message)s")
+    logger.info(format_records(records))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 """Utility & helper functions."""
 
-from langchain.chat_models import init_chat_model
+import asyncio
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage
+from langgraph.config import get_config
 
 
 def get_message_text(msg: BaseMessage) -> str:
@@ -17,11 +22,96 @@ def get_message_text(msg: BaseMessage) -> str:
         return "".join(txts).strip()
 
 
+def current_thread_id() -> Optional[str]:
+    """Get the `thread_id` of the run executing the caller, if any."""
+    try:
+        configurable = get_config().get("configurable") or {}
+    except RuntimeError:
+        return None
+    thread_id = configurable.get("thread_id")
+    return None if thread_id is None else str(thread_id)
+
+
+_MAX_CACHED_MODELS = 32
+_model_cache: Dict[Tuple[str, Optional[asyncio.AbstractEventLoop]], BaseChatModel] = {}
+
+
 def load_chat_model(fully_specified_name: str) -> BaseChatModel:
     """Load a chat model from a fully specified name.
 
+    Models are cached per event loop, so their HTTP clients (and connection
+    pools) stay warm across calls instead of being rebuilt every step.
+
     Args:
-        fully_specified_name (str): String in the format 'provider/model'.
+        fully_specified_name (str): String in the format 'provider/model',
+            'replay/<capture file>' to replay a traffic capture, or
+            'openai-cached/<model>' for `ChatOpenAI` reusing each thread's
+            serialized history (`react_agent.serialization`).
     """
+    try:
+        loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    key = (fully_specified_name, loop)
+    cached = _model_cache.get(key)
+    if cached is not None:
+        return cached
     provider, model = fully_specified_name.split("/", maxsplit=1)
-    return init_chat_model(model, model_provider=provider)
+    if provider == "replay":
+        # 'replay/<擷取檔>'：依序回放擷取到的 LLM 回應，不連網
+        from react_agent.replay import ReplayChatModel
+
+        chat_model: BaseChatModel = ReplayChatModel.from_file(model)
+    elif provider == "openai-cached":
+        # Reuse each thread's already-serialized history between steps.
+        from react_agent.serialization import CachedChatOpenAI
+
+        chat_model = CachedChatOpenAI(model=model)
+    else:
+        # 其他供應商的 SDK 只在第一次用到時才載入
+        from langchain.chat_models import init_chat_model
+
+        chat_model = init_chat_model(model, model_provider=provider)
+    # 客戶端綁定在事件迴圈上，丟棄已關閉迴圈的模型
+    for stale in [k for k in _model_cache if k[1] is not None and k[1].is_closed()]:
+        del _model_cache[stale]
+    if len(_model_cache) >= _MAX_CACHED_MODELS:
+        _model_cache.pop(next(iter(_model_cache)))
+    _model_cache[key] = chat_model
+    return chat_model
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON text or bytes with orjson."""
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        # orjson 拒絕 NaN/Infinity 等 json 模組接受的寫法
+        return json.loads(data)
+
+
+def dumps(value: Any) -> bytes:
+    """Serialize `value` as compact UTF-8 JSON with orjson."""
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def decode_tool_result(result: Any) -> Any:
+    """Decode the output of an MCP tool into plain Python data.
+
+    MCP tools return text content blocks; their text is joined and parsed as
+    JSON when possible, otherwise returned as a string.
+    """
+    if (
+        isinstance(result, list)
+        and result
+        and all(
+            isinstance(block, dict) and block.get("type") == "text" for block in result
+        )
+    ):
+        result = "".join(block.get("text", "") for block in result)
+    if isinstance(result, (str, bytes)):
+        try:
+            return loads(result)
+        except ValueError:
+            return result.decode() if isinstance(result, bytes) else result
+    return result
@@ -0,0 +1,268 @@
+"""Cached, offline-capable rendering of the agent graph.
+
+`draw_mermaid_png()` sends the graph to a remote rendering service: it adds
+seconds to every start and fails offline. `save_graph_visualization` instead
+
+- keys each picture by a hash of the graph's topology (its Mermaid text) and
+  the output format, kept next to the file in `<file>.hash`, and skips
+  rendering when the file on disk already matches;
+- picks a renderer from the file extension: `.mmd` (Mermaid text), `.dot`
+  (Graphviz text) and `.svg` are rendered locally (with the `dot` binary if
+  installed, otherwise a built-in layered layout); `.png` uses `dot` if
+  installed, otherwise the remote service, and falls back to a local `.svg`
+  when the service cannot be reached. The fallback is recorded in the hash
+  file, so the service is not tried again until the topology changes.
+
+`start_graph_visualization` runs it in a daemon thread so it never delays
+the first query (nor the exit of the process).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from collections import defaultdict
+from html import escape
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.runnables.graph import Graph
+
+logger = logging.getLogger(__name__)
+
+# 版面配置變動時改這個版本號，讓舊的快取失效
+_RENDERER_VERSION = "1"
+
+_FONT_WIDTH = 8
+_NODE_HEIGHT = 36
+_ROW_GAP = 60
+_COLUMN_GAP = 40
+_MARGIN = 20
+# 右側留給往回連的邊
+_LOOP_ROOM = 60
+
+
+def topology_key(drawable: Graph, fmt: str) -> str:
+    """Get the cache key of a picture of `drawable` in format `fmt`."""
+    graphviz = shutil.which("dot") is not None
+    text = f"{_RENDERER_VERSION}\0{fmt}\0{graphviz}\0{drawable.draw_mermaid()}"
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def render_dot(drawable: Graph) -> str:
+    """Render `drawable` as Graphviz DOT text."""
+    lines = [
+        "digraph agent {",
+        '  node [shape=box, style="rounded,filled", fillcolor="#f2f0ff"];',
+    ]
+    for node in drawable.nodes.values():
+        shape = (
+            ', shape=oval, fillcolor="#bfb6fc"'
+            if node.id in ("__start__", "__end__")
+            else ""
+        )
+        lines.append(f'  "{node.id}" [label="{node.name}"{shape}];')
+    for edge in drawable.edges:
+        style = " [style=dashed]" if edge.conditional else ""
+        lines.append(f'  "{edge.source}" -> "{edge.target}"{style};')
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _layers(drawable: Graph) -> Dict[str, int]:
+    """Assign each node a row: the longest path to it, ignoring edges that close a loop."""
+    successors: Dict[str, List[str]] = defaultdict(list)
+    for edge in drawable.edges:
+        successors[edge.source].append(edge.target)
+    order: List[str] = []
+    state: Dict[str, int] = {}  # 1: 正在走訪, 2: 走訪完成
+    back_edges = set()
+
+    def visit(node: str) -> None:
+        state[node] = 1
+        for target in successors[node]:
+            if state.get(target) == 1:
+                back_edges.add((node, target))
+            elif target not in state:
+                visit(target)
+        state[node] = 2
+        order.append(node)
+
+    for node in drawable.nodes:
+        if node not in state:
+            visit(node)
+    layer = {node: 0 for node in drawable.nodes}
+    for node in reversed(order):
+        for target in successors[node]:
+            if (node, target) not in back_edges:
+                layer[target] = max(layer[target], layer[node] + 1)
+    return layer
+
+
+def render_svg(drawable: Graph) -> str:
+    """Render `drawable` as SVG with a simple top-down layered layout (no external tools)."""
+    layer = _layers(drawable)
+    rows: Dict[int, List[str]] = defaultdict(list)
+    for node in drawable.nodes:
+        rows[layer[node]].append(node)
+    widths = {
+        n: len(node.name) * _FONT_WIDTH + 24 for n, node in drawable.nodes.items()
+    }
+    row_widths = {
+        row: sum(widths[n] for n in nodes) + _COLUMN_GAP * (len(nodes) - 1)
+        for row, nodes in rows.items()
+    }
+    canvas_width = max(row_widths.values(), default=0) + 2 * _MARGIN + _LOOP_ROOM
+    boxes: Dict[str, Tuple[float, float, float]] = {}  # 中心 x、上緣 y、寬度
+    for row, nodes in rows.items():
+        x = (canvas_width - _LOOP_ROOM - row_widths[row]) / 2
+        for node in nodes:
+            top = _MARGIN + row * (_NODE_HEIGHT + _ROW_GAP)
+            boxes[node] = (x + widths[node] / 2, top, widths[node])
+            x += widths[node] + _COLUMN_GAP
+    row_count = max(rows, default=0) + 1
+    canvas_height = _MARGIN * 2 + row_count * (_NODE_HEIGHT + _ROW_GAP) - _ROW_GAP
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{canvas_width:.0f}" '
+        f'height="{canvas_height:.0f}" font-family="sans-serif" font-size="14">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" '
+        'markerHeight="8" orient="auto-start-reverse"><path d="M0,0 L10,5 L0,10 z" fill="#333"/>'
+        "</marker></defs>",
+    ]
+    for edge in drawable.edges:
+        sx, sy, sw = boxes[edge.source]
+        tx, ty, tw = boxes[edge.target]
+        dash = ' stroke-dasharray="5,4"' if edge.conditional else ""
+        if layer[edge.target] > layer[edge.source]:
+            path = f"M{sx:.0f},{sy + _NODE_HEIGHT:.0f} L{tx:.0f},{ty:.0f}"
+        else:
+            # 回到上層的邊從右側繞回去
+            x1, x2 = sx + sw / 2, tx + tw / 2
+            bend = max(x1, x2) + 50
+            mid_s, mid_t = sy + _NODE_HEIGHT / 2, ty + _NODE_HEIGHT / 2
+            path = (
+                f"M{x1:.0f},{mid_s:.0f} "
+                f"C{bend:.0f},{mid_s:.0f} {bend:.0f},{mid_t:.0f} {x2:.0f},{mid_t:.0f}"
+            )
+        parts.append(
+            f'<path d="{path}" fill="none" stroke="#333"{dash} marker-end="url(#arrow)"/>'
+        )
+    for node_id, graph_node in drawable.nodes.items():
+        cx, y, width = boxes[node_id]
+        terminal = node_id in ("__start__", "__end__")
+        fill = "#bfb6fc" if terminal else "#f2f0ff"
+        radius = _NODE_HEIGHT / 2 if terminal else 6
+        parts.append(
+            f'<rect x="{cx - width / 2:.0f}" y="{y:.0f}" width="{width:.0f}" '
+            f'height="{_NODE_HEIGHT}" rx="{radius:.0f}" fill="{fill}" stroke="#9185e8"/>'
+        )
+        parts.append(
+            f'<text x="{cx:.0f}" y="{y + _NODE_HEIGHT / 2 + 5:.0f}" '
+            f'text-anchor="middle">{escape(graph_node.name)}</text>'
+        )
+    parts.append("</svg>")
+    return "\n".join(parts) + "\n"
+
+
+def render(drawable: Graph, fmt: str) -> bytes:
+    """Render `drawable` in `fmt` ("mmd", "dot", "svg" or "png")."""
+    if fmt in ("mmd", "mermaid"):
+        return drawable.draw_mermaid().encode()
+    if fmt in ("dot", "gv"):
+        return render_dot(drawable).encode()
+    dot = shutil.which("dot")
+    if dot is not None and fmt in ("svg", "png"):
+        source = render_dot(drawable).encode()
+        completed = subprocess.run(
+            [dot, f"-T{fmt}"], input=source, capture_output=True, check=True
+        )
+        return completed.stdout
+    if fmt == "svg":
+        return render_svg(drawable).encode()
+    if fmt == "png":
+        # 沒有本地 Graphviz 時才使用遠端渲染服務
+        return drawable.draw_mermaid_png()
+    raise ValueError(f"Unsupported graph picture format {fmt!r}")
+
+
+def _is_current(path: Path, hash_path: Path, key: str) -> bool:
+    """Whether the picture saved for `key` (or its recorded fallback) is on disk."""
+    if not hash_path.exists():
+        return False
+    # 第一行是圖結構的雜湊，第二行（若有）是改存的替代文件名
+    recorded, _, fallback = hash_path.read_text().partition("\n")
+    if recorded.strip() != key:
+        return False
+    return (
+        path.with_name(fallback.strip()).exists() if fallback.strip() else path.exists()
+    )
+
+
+def _write(path: Path, data: bytes) -> None:
+    temporary = path.with_name(f".{path.name}.tmp")
+    temporary.write_bytes(data)
+    os.replace(temporary, path)
+
+
+def save_graph_visualization(
+    graph: Any, filename: str = "grafana_agent_graph.png"
+) -> bool:
+    """Save a picture of the graph, reusing the saved file if the graph is unchanged.
+
+    保存狀態圖的可視化表示，圖結構沒有改變時直接沿用已保存的文件。
+
+    Args:
+        graph: 狀態圖實例（或已經取得的 `Graph`）。
+        filename: 保存文件路徑，副檔名決定格式（.png、.svg、.mmd、.dot）。
+
+    Returns:
+        是否重新渲染並寫入了文件。
+    """
+    path = Path(filename)
+    try:
+        drawable = graph if isinstance(graph, Graph) else graph.get_graph()
+        fmt = path.suffix.lstrip(".").lower()
+        key = topology_key(drawable, fmt)
+        hash_path = path.with_name(f"{path.name}.hash")
+        if _is_current(path, hash_path, key):
+            logger.debug(f"圖結構未變更，沿用 {filename}")
+            return False
+        try:
+            data = render(drawable, fmt)
+        except Exception as e:
+            if fmt != "png":
+                raise
+            # 離線時遠端渲染失敗，改為在本地輸出 SVG
+            fallback = path.with_suffix(".svg")
+            logger.warning(f"遠端渲染失敗（{e!r}），改為保存本地 SVG: {fallback}")
+            saved = save_graph_visualization(drawable, str(fallback))
+            if fallback.exists():
+                # 記下改存的文件，圖結構不變時下次啟動不再嘗試遠端服務
+                _write(hash_path, f"{key}\n{fallback.name}".encode())
+            return saved
+        _write(path, data)
+        _write(hash_path, key.encode())
+        logger.info(f"Grafana Agent 圖形可視化已保存為 {filename}")
+        return True
+    except Exception as e:
+        logger.warning(f"保存圖形可視化失敗: {e}")
+        return False
+
+
+def start_graph_visualization(
+    graph: Any, filename: str = "grafana_agent_graph.png"
+) -> threading.Thread:
+    """Save the picture of `graph` in a daemon thread and return the thread."""
+    thread = threading.Thread(
+        target=save_graph_visualization,
+        args=(graph, filename),
+        name="graph-visualization",
+        daemon=True,
+    )
+    thread.start()
+    return thread
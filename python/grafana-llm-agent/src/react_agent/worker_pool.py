@@ -0,0 +1,363 @@
+"""Run graphs in a pool of worker processes, sharded by `thread_id`.
+
+In one process every session shares one asyncio loop, so CPU-bound work
+(parsing big MCP results, serializing long histories) of one session stalls
+all others. `WorkerPool` spreads threads over N processes:
+
+- a consistent hash ring maps each `thread_id` to one worker, so a thread's
+  checkpoints, serialization cache and prefetch state stay in one process,
+  and adding or removing a worker moves only ~1/N of the threads;
+- each worker builds its graph once and keeps it warm together with its own
+  model clients and MCP sessions (they are process globals);
+- the dispatcher streams each run's chunks back as the worker produces them.
+
+Each worker sends its results through its own pipe, so a worker that dies
+halfway through a write cannot block the others. The dispatcher waits on the
+pipes and the worker process sentinels together: when a worker dies, its
+in-flight runs fail with `WorkerCrashed` right away, and the worker is
+restarted on the next request routed to it. A chunk that cannot be pickled
+fails its run with `RemoteError`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import hashlib
+import importlib
+import inspect
+import itertools
+import logging
+import multiprocessing
+import threading
+from dataclasses import dataclass
+from multiprocessing.connection import Connection, wait
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_DONE = "done"
+_CHUNK = "chunk"
+_ERROR = "error"
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker running a request exited before finishing it."""
+
+
+class RemoteError(RuntimeError):
+    """A run failed inside a worker; the message carries the original error."""
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """A consistent hash ring with `replicas` virtual nodes per node."""
+
+    def __init__(self, nodes: Sequence[str] = (), replicas: int = 64) -> None:
+        """Create a ring holding `nodes`."""
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        """Add `node` to the ring."""
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            if point not in self._owners:
+                self._owners[point] = node
+                bisect.insort(self._points, point)
+
+    def remove(self, node: str) -> None:
+        """Remove `node` from the ring."""
+        self._points = [p for p in self._points if self._owners[p] != node]
+        self._owners = {p: n for p, n in self._owners.items() if n != node}
+
+    def node_for(self, key: str) -> str:
+        """Get the node owning `key`."""
+        if not self._points:
+            raise LookupError("The hash ring is empty")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+def _load_target(target: str) -> Any:
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "graph")
+
+
+async def _build_graph(target: str) -> Any:
+    graph = _load_target(target)
+    if callable(graph) and not hasattr(graph, "astream"):
+        graph = graph()
+    if inspect.isawaitable(graph):
+        graph = await graph
+    return graph
+
+
+def _worker_main(target: str, requests: Any, results: Connection) -> None:
+    """Entry point of a worker process: serve runs of `target` until told to stop."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    graph = loop.run_until_complete(_build_graph(target))
+
+    async def serve(
+        request_id: int, input: Any, config: Dict[str, Any], kwargs: Dict[str, Any]
+    ) -> None:
+        try:
+            async for chunk in graph.astream(input, config, **kwargs):
+                # send 先序列化再寫入，無法序列化的區塊會在這裡報錯
+                results.send((request_id, _CHUNK, chunk))
+        except BaseException as e:  # noqa: BLE001 - reported to the dispatcher
+            results.send((request_id, _ERROR, f"{type(e).__name__}: {e}"))
+        else:
+            results.send((request_id, _DONE, None))
+
+    def read_requests() -> None:
+        while True:
+            request = requests.get()
+            if request is None:
+                loop.call_soon_threadsafe(loop.stop)
+                return
+            asyncio.run_coroutine_threadsafe(serve(*request), loop)
+
+    threading.Thread(target=read_requests, name="worker-requests", daemon=True).start()
+    try:
+        loop.run_forever()
+    finally:
+        loop.close()
+
+
+@dataclass(eq=False)
+class _Worker:
+    name: str
+    process: Any
+    requests: Any
+    results: Connection
+    exited: bool = False
+
+
+class WorkerPool:
+    """Dispatch graph runs to worker processes by `thread_id`."""
+
+    def __init__(
+        self,
+        target: str = "react_agent.graph:get_graph",
+        processes: int = 2,
+        *,
+        start_method: str = "spawn",
+    ) -> None:
+        """Prepare a pool of `processes` workers serving `target`.
+
+        Args:
+            target: `module:attribute` of the graph in the worker: a compiled graph,
+                or a (sync or async) function building one.
+            processes: How many worker processes to run.
+            start_method: The multiprocessing start method; `spawn` avoids
+                inheriting the dispatcher's event loop and connections.
+        """
+        if processes < 1:
+            raise ValueError("A worker pool needs at least one process")
+        self.target = target
+        # 型別上 BaseContext 沒有宣告 Process，實際回傳的各種 context 都有
+        self._context: Any = multiprocessing.get_context(start_method)
+        self._names = [f"worker-{i}" for i in range(processes)]
+        self.ring = HashRing(self._names)
+        self._workers: Dict[str, _Worker] = {}
+        self._streams: Dict[
+            int, Tuple[asyncio.AbstractEventLoop, asyncio.Queue[Any], _Worker]
+        ] = {}
+        self._ids = itertools.count()
+        self._reader: Optional[threading.Thread] = None
+        # 喚醒結果讀取執行緒：有新的工作進程要等待，或要停止
+        self._wake: Optional[Tuple[Connection, Connection]] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the worker processes."""
+        if self._reader is not None:
+            return
+        self._wake = self._context.Pipe(duplex=False)
+        for name in self._names:
+            self._spawn(name)
+        self._reader = threading.Thread(
+            target=self._read_results, name="pool-results", daemon=True
+        )
+        self._reader.start()
+
+    def _spawn(self, name: str) -> _Worker:
+        requests = self._context.Queue()
+        results, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.target, requests, sender),
+            name=name,
+            daemon=True,
+        )
+        process.start()
+        # 只留子進程持有寫入端，子進程退出後讀取端才會讀到 EOF
+        sender.close()
+        worker = _Worker(name, process, requests, results)
+        with self._lock:
+            self._workers[name] = worker
+        if self._wake is not None:
+            self._wake[1].send(True)
+        return worker
+
+    def _worker(self, name: str) -> _Worker:
+        worker = self._workers[name]
+        # 管道先關閉、進程才結束，兩者之一即視為已退出
+        if worker.exited or not worker.process.is_alive():
+            logger.warning(f"工作進程 {name} 已退出，重新啟動")
+            self._fail_streams(worker)
+            worker = self._spawn(name)
+        return worker
+
+    def _read_results(self) -> None:
+        assert self._wake is not None
+        wake = self._wake[0]
+        watched: List[_Worker] = []
+        while True:
+            with self._lock:
+                current = list(self._workers.values())
+            # 管道只在這個執行緒關閉，不會關到正在等待的管道
+            for worker in watched:
+                if worker not in current:
+                    worker.results.close()
+            watched = current
+            sources: Dict[Any, _Worker] = {}
+            for worker in current:
+                if not worker.exited:
+                    sources[worker.results] = worker
+                    sources[worker.process.sentinel] = worker
+            for ready in wait([wake, *sources], timeout=1):
+                if ready is wake:
+                    if not wake.recv():
+                        return
+                    continue
+                worker = sources[ready]
+                if ready is worker.results:
+                    self._receive(worker)
+                elif not worker.exited:
+                    # 先轉送退出前已送出的結果，再讓未完成的請求失敗
+                    while not worker.exited and worker.results.poll():
+                        self._receive(worker)
+                    self._exited(worker)
+
+    def _receive(self, worker: _Worker) -> None:
+        if worker.exited:
+            return
+        try:
+            item = worker.results.recv()
+        except (EOFError, OSError):
+            self._exited(worker)
+            return
+        with self._lock:
+            stream = self._streams.get(item[0])
+        if stream is not None:
+            loop, chunks, _ = stream
+            loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+    def _exited(self, worker: _Worker) -> None:
+        worker.exited = True
+        worker.results.close()
+        self._fail_streams(worker)
+
+    def _fail_streams(self, worker: _Worker) -> None:
+        # 移出串流表，每個請求只失敗一次，之後的結果也不再轉送
+        with self._lock:
+            failed = [(i, s) for i, s in self._streams.items() if s[2] is worker]
+            for request_id, _ in failed:
+                del self._streams[request_id]
+        for request_id, (loop, chunks, _) in failed:
+            item = (request_id, _ERROR, WorkerCrashed(f"{worker.name} exited"))
+            loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+    def worker_for(self, thread_id: str) -> str:
+        """Get the name of the worker owning `thread_id`."""
+        return self.ring.node_for(thread_id)
+
+    async def astream(
+        self, input: Any, config: Dict[str, Any], **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """Stream the run of `input` on the worker owning the config's `thread_id`.
+
+        `kwargs` (e.g. `stream_mode`) are passed to the worker graph's `astream`;
+        input, config and chunks must be picklable.
+        """
+        self.start()
+        thread_id = str((config.get("configurable") or {}).get("thread_id", ""))
+        name = self.worker_for(thread_id)
+        request_id = next(self._ids)
+        worker = self._worker(name)
+        chunks: asyncio.Queue[Any] = asyncio.Queue()
+        with self._lock:
+            self._streams[request_id] = (asyncio.get_running_loop(), chunks, worker)
+        if worker.exited:
+            # 登記前讀取執行緒已處理完它的退出，不會再讓這個請求失敗
+            self._fail_streams(worker)
+        try:
+            worker.requests.put((request_id, input, config, kwargs))
+            while True:
+                _, kind, payload = await chunks.get()
+                if kind == _CHUNK:
+                    yield payload
+                elif kind == _DONE:
+                    return
+                elif isinstance(payload, BaseException):
+                    raise payload
+                else:
+                    raise RemoteError(payload)
+        finally:
+            with self._lock:
+                self._streams.pop(request_id, None)
+
+    async def ainvoke(self, input: Any, config: Dict[str, Any], **kwargs: Any) -> Any:
+        """Run `input` to completion on its worker and return the final state.
+
+        Raises:
+            ValueError: `stream_mode` is not "values"; use `astream` for other modes.
+        """
+        stream_mode = kwargs.pop("stream_mode", "values")
+        if stream_mode != "values":
+            raise ValueError(
+                f"ainvoke returns the final state; use astream for {stream_mode!r}"
+            )
+        final = None
+        async for chunk in self.astream(input, config, stream_mode="values", **kwargs):
+            final = chunk
+        return final
+
+    def close(self, timeout: float = 10) -> None:
+        """Stop the workers and the result reader."""
+        if self._reader is None:
+            return
+        for worker in self._workers.values():
+            if worker.process.is_alive():
+                worker.requests.put(None)
+        for worker in self._workers.values():
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        assert self._wake is not None
+        self._wake[1].send(False)
+        self._reader.join(timeout)
+        for worker in self._workers.values():
+            worker.results.close()
+        for end in self._wake:
+            end.close()
+        self._workers.clear()
+        self._reader = self._wake = None
+
+    def __enter__(self) -> WorkerPool:
+        """Start the pool."""
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        """Stop the pool."""
+        self.close()
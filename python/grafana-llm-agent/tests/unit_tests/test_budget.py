@@ -0,0 +1,161 @@
+import asyncio
+import importlib
+import time
+from types import SimpleNamespace
+from typing import Any, List, Sequence
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest
+from mcp.types import CallToolResult, TextContent
+
+from react_agent.budget import DEADLINE, TOKENS, RunBudget, enforce_deadline
+from react_agent.configuration import Configuration
+from react_agent.state import State
+
+graph = importlib.import_module("react_agent.graph")
+
+
+def test_budget_reserve() -> None:
+    configuration = Configuration(
+        run_timeout_seconds=60, run_token_budget=10_000, budget_reserve_tokens=1000
+    )
+    budget = RunBudget.start(configuration, now=0)
+    assert budget.exhausted(configuration, now=30) is None
+    assert budget.exhausted(configuration, now=45) == DEADLINE
+    assert budget.spend(9500).exhausted(configuration, now=0) == TOKENS
+    assert RunBudget.start(Configuration(), now=0) == RunBudget()
+
+
+def _request(deadline: Any) -> MCPToolCallRequest:
+    runtime = SimpleNamespace(state={"run_deadline": deadline})
+    return MCPToolCallRequest("query_prometheus", {}, "grafana-mcp", runtime=runtime)
+
+
+@pytest.mark.asyncio
+async def test_mcp_calls_stop_at_the_deadline() -> None:
+    async def slow(request: MCPToolCallRequest) -> CallToolResult:
+        await asyncio.sleep(1)
+        return CallToolResult(content=[TextContent(type="text", text="ok")])
+
+    result = await enforce_deadline(_request(time.time() + 0.05), slow)
+    assert result.isError and "deadline_exceeded" in result.content[0].text
+    result = await enforce_deadline(_request(time.time() - 1), slow)
+    assert result.isError
+
+    async def fast(request: MCPToolCallRequest) -> CallToolResult:
+        return CallToolResult(content=[TextContent(type="text", text="ok")])
+
+    assert not (await enforce_deadline(_request(None), fast)).isError
+
+
+class ScriptedModel:
+    def __init__(self, replies: List[AIMessage]) -> None:
+        self.replies = replies
+        self.prompts: List[Sequence[BaseMessage]] = []
+        self.kwargs: List[dict] = []
+
+    def bind_tools(self, tools: Sequence[Any]) -> "ScriptedModel":
+        return self
+
+    def bind(self, **kwargs: Any) -> "ScriptedModel":
+        self.kwargs.append(kwargs)
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        self.prompts.append(messages)
+        return self.replies.pop(0)
+
+
+@pytest.mark.asyncio
+async def test_token_budget_short_circuits_to_synthesis(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    usage = {"input_tokens": 900, "output_tokens": 100, "total_tokens": 1000}
+    call = {"name": "query_prometheus", "args": {"expr": "up"}, "id": "c1"}
+    model = ScriptedModel(
+        [
+            AIMessage(content="", tool_calls=[call], usage_metadata=usage),
+            AIMessage(content="根據已取得的證據，checkout 延遲升高。"),
+        ]
+    )
+    monkeypatch.setattr(graph, "load_chat_model", lambda _name: model)
+    monkeypatch.setattr(graph, "_dynamic_tools", [])
+    config = {
+        "configurable": {
+            "run_token_budget": 2500,
+            "budget_reserve_tokens": 1000,
+            "metadata_preresolve": False,
+        }
+    }
+    state = State(messages=[HumanMessage(content="checkout 為什麼變慢？")])
+    update = await RunnableLambda(graph.call_model).ainvoke(state, config=config)
+    assert update["tokens_used"] == 1000 and model.kwargs == [{"max_tokens": 1500}]
+
+    # The next model call would eat into the reserve.
+    state.messages = [*state.messages, *update["messages"]]
+    state.tokens_used = 1600
+    update = await RunnableLambda(graph.call_model).ainvoke(state, config=config)
+    assert update["budget_exhausted"] == TOKENS and "messages" not in update
+    state.budget_exhausted = update["budget_exhausted"]
+    assert graph.route_model_output(state) == "synthesize"
+
+    update = await RunnableLambda(graph.synthesize).ainvoke(state, config=config)
+    skipped, answer = update["messages"]
+    assert skipped.tool_call_id == "c1" and skipped.status == "error"
+    assert answer.content.startswith("根據已取得的證據")
+    # 總結指示併入唯一一則、位於開頭的系統消息
+    prompt = model.prompts[-1]
+    assert [m.type for m in prompt].count("system") == 1
+    assert prompt[0].type == "system" and "token 額度" in str(prompt[0].content)
+
+
+@pytest.mark.asyncio
+async def test_thought_only_retry_checks_the_budget(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    usage = {"input_tokens": 1500, "output_tokens": 100, "total_tokens": 1600}
+    model = ScriptedModel(
+        [
+            AIMessage(content="<thinking>先查 Loki</thinking>", usage_metadata=usage),
+            AIMessage(content="不該再呼叫模型"),
+        ]
+    )
+    monkeypatch.setattr(graph, "load_chat_model", lambda _name: model)
+    monkeypatch.setattr(graph, "_dynamic_tools", [])
+    config = {
+        "configurable": {
+            "run_token_budget": 2500,
+            "budget_reserve_tokens": 1000,
+            "metadata_preresolve": False,
+            "scratchpad": True,
+        }
+    }
+    state = State(messages=[HumanMessage(content="checkout 為什麼變慢？")])
+    update = await RunnableLambda(graph.call_model).ainvoke(state, config=config)
+    # 只有思考的回覆已用到保留量，不再重問，直接交給最終總結
+    assert len(model.prompts) == 1
+    assert update["budget_exhausted"] == TOKENS and "messages" not in update
+    assert update["scratchpad"] == ["先查 Loki"] and update["tokens_used"] == 1600
+
+
+@pytest.mark.asyncio
+async def test_synthesis_is_bounded_by_the_time_left(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    class SlowModel(ScriptedModel):
+        async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+            await asyncio.sleep(5)
+            return AIMessage(content="太慢")
+
+    monkeypatch.setattr(graph, "load_chat_model", lambda _name: SlowModel([]))
+    config = {
+        "configurable": {"metadata_preresolve": False, "budget_reserve_seconds": 30}
+    }
+    state = State(messages=[HumanMessage(content="checkout 為什麼變慢？")])
+    state.run_deadline = time.time() + 0.1
+    started = time.perf_counter()
+    update = await RunnableLambda(graph.synthesize).ainvoke(state, config=config)
+    assert time.perf_counter() - started < 1
+    assert update["messages"][-1].content.startswith("抱歉")
@@ -0,0 +1,139 @@
+import functools
+import json
+from typing import Any, Dict, List
+
+import pytest
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest
+from mcp.types import CallToolResult, TextContent
+
+from react_agent.cost_guard import (
+    CostLimits,
+    LokiCostGuard,
+    guard_rejection,
+    stream_selector,
+)
+from react_agent.metrics import MetricsRegistry
+from react_agent.range_cache import parse_time
+
+_NOW = 1_700_000_000.0
+_BYTES_PER_SECOND = 1_000_000
+
+
+class FakeLoki:
+    def __init__(self) -> None:
+        self.calls: List[MCPToolCallRequest] = []
+
+    async def __call__(self, request: MCPToolCallRequest) -> CallToolResult:
+        self.calls.append(request)
+        if request.name == "query_loki_stats":
+            start = parse_time(request.args["startRfc3339"], _NOW)
+            end = parse_time(request.args["endRfc3339"], _NOW)
+            assert start is not None and end is not None
+            payload: Any = {
+                "streams": 10,
+                "chunks": 5,
+                "entries": 100,
+                "bytes": (end - start) * _BYTES_PER_SECOND,
+            }
+        else:
+            payload = [{"timestamp": "1", "line": "ok", "labels": {}}]
+        return CallToolResult(
+            content=[TextContent(type="text", text=json.dumps(payload))]
+        )
+
+
+def _logs(**args: Any) -> MCPToolCallRequest:
+    return MCPToolCallRequest(
+        name="query_loki_logs",
+        args={
+            "datasourceUid": "loki",
+            "logql": '{app="x"} |= "error"',
+            "limit": 100,
+            **args,
+        },
+        server_name="grafana-mcp",
+    )
+
+
+def _guard(metrics: MetricsRegistry) -> LokiCostGuard:
+    limits = CostLimits(max_bytes=600 * _BYTES_PER_SECOND, min_window_seconds=60)
+    return LokiCostGuard(limits, metrics=metrics, clock=lambda: _NOW)
+
+
+def test_stream_selector() -> None:
+    assert (
+        stream_selector('{app="a}b", env=~"p.*"} |= "x"') == '{app="a}b", env=~"p.*"}'
+    )
+    assert stream_selector('sum(rate({app="x"}[5m]))') is None
+
+
+@pytest.mark.asyncio
+async def test_cheap_queries_pass_unchanged() -> None:
+    metrics = MetricsRegistry()
+    loki = FakeLoki()
+    request = _logs(startRfc3339="now-5m")
+    await _guard(metrics).interceptor(request, loki)
+
+    assert loki.calls[0].args["logql"] == '{app="x"}'
+    assert loki.calls[-1] is request
+    assert metrics.counter("loki_guard_decisions", decision="allowed") == 1
+
+
+@pytest.mark.asyncio
+async def test_expensive_queries_are_narrowed() -> None:
+    metrics = MetricsRegistry()
+    loki = FakeLoki()
+    result = await _guard(metrics).interceptor(_logs(startRfc3339="now-1h"), loki)
+
+    narrowed = loki.calls[-1].args
+    assert parse_time(narrowed["startRfc3339"], _NOW) == pytest.approx(
+        _NOW - 600, abs=1
+    )
+    note = json.loads(result.content[0].text)
+    assert note["cost_guard"]["status"] == "narrowed"
+    assert metrics.counter("loki_guard_decisions", decision="narrowed") == 1
+    assert metrics.counter("loki_guard_bytes_avoided") == pytest.approx(
+        3000 * _BYTES_PER_SECOND
+    )
+
+
+@pytest.mark.asyncio
+async def test_hopeless_queries_are_refused() -> None:
+    metrics = MetricsRegistry()
+    loki = FakeLoki()
+    guard = _guard(metrics)
+    guard.limits.max_bytes = 10 * _BYTES_PER_SECOND
+    result = await guard.interceptor(_logs(startRfc3339="now-1h"), loki)
+
+    assert [c.name for c in loki.calls] == ["query_loki_stats"]
+    rejection = guard_rejection([block.model_dump() for block in result.content])
+    assert rejection is not None and rejection["suggestions"]
+    assert metrics.counter("loki_guard_decisions", decision="rejected") == 1
+
+
+def test_metrics_snapshot() -> None:
+    metrics = MetricsRegistry()
+    metrics.incr("calls", tool="a")
+    metrics.observe("latency", 2.0)
+    metrics.observe("latency", 4.0)
+    snapshot: Dict[str, Any] = metrics.snapshot()
+    assert snapshot["counters"]["calls"] == [{"labels": {"tool": "a"}, "value": 1}]
+    assert snapshot["summaries"]["latency"][0]["sum"] == 6.0
+
+
+@pytest.mark.asyncio
+async def test_estimate_is_one_exact_call_below_the_range_cache() -> None:
+    from react_agent import tools as agent_tools
+
+    loki = FakeLoki()
+    handler: Any = loki
+    # 依正式的攔截器順序組合（第一個在最外層）
+    for interceptor in reversed(agent_tools.MCP_TOOL_INTERCEPTORS):
+        handler = functools.partial(interceptor, handler=handler)
+    start, end = "2023-11-14T10:00:00Z", "2023-11-14T20:00:00Z"
+    await handler(_logs(startRfc3339=start, endRfc3339=end))
+
+    stats = [c for c in loki.calls if c.name == "query_loki_stats"]
+    assert [(c.args["startRfc3339"], c.args["endRfc3339"]) for c in stats] == [
+        ("2023-11-14T10:00:00.000000000Z", "2023-11-14T20:00:00.000000000Z")
+    ]
@@ -0,0 +1,175 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from react_agent.dashboard_catalog import (
+    DashboardCatalog,
+    DashboardCatalogSyncer,
+    parse_dashboard,
+    tokenize,
+)
+
+
+def _dashboard(uid: str, title: str, version: int = 1) -> Dict[str, Any]:
+    return {
+        "dashboard": {
+            "uid": uid,
+            "title": title,
+            "version": version,
+            "tags": ["payments"],
+            "panels": [
+                {
+                    "id": 1,
+                    "type": "timeseries",
+                    "title": "Request rate",
+                    "datasource": {"type": "prometheus", "uid": "prom-1"},
+                    "targets": [
+                        {
+                            "refId": "A",
+                            "expr": 'sum(rate(http_requests_total{job="checkout"}[5m]))',
+                        }
+                    ],
+                },
+                {
+                    "id": 2,
+                    "type": "row",
+                    "title": "Logs",
+                    "collapsed": True,
+                    "panels": [
+                        {
+                            "id": 3,
+                            "type": "logs",
+                            "title": "Checkout errors",
+                            "targets": [
+                                {
+                                    "refId": "A",
+                                    "expr": '{service_name="checkout"} |= "error"',
+                                    "datasource": {"uid": "loki-1"},
+                                }
+                            ],
+                        }
+                    ],
+                },
+            ],
+        },
+        "meta": {"folderTitle": "Shop", "url": f"/d/{uid}"},
+    }
+
+
+def test_tokenize_splits_identifiers() -> None:
+    assert tokenize("rate(http_requests_total[5m])") == [
+        "rate",
+        "http_requests_total",
+        "http",
+        "requests",
+        "total",
+        "5m",
+    ]
+
+
+def test_parse_and_search() -> None:
+    doc = parse_dashboard(_dashboard("d1", "Checkout overview"))
+    assert [p.title for p in doc.panels] == ["Request rate", "Checkout errors"]
+    assert doc.panels[1].queries[0].datasource == "loki-1"
+
+    catalog = DashboardCatalog()
+    catalog.upsert(doc)
+    catalog.upsert(parse_dashboard(_dashboard("d2", "Node exporter")))
+
+    best = catalog.search("checkout errors")[0]
+    assert (best["dashboardUid"], best["panelTitle"]) == ("d1", "Checkout errors")
+    assert best["queries"][0]["expr"].startswith('{service_name="checkout"}')
+    assert catalog.search("node exporter")[0]["dashboardUid"] == "d2"
+    assert catalog.search("http_requests_total")[0]["panelTitle"] == "Request rate"
+
+    catalog.remove("d1")
+    assert all(r["dashboardUid"] == "d2" for r in catalog.search("checkout"))
+
+
+@pytest.mark.asyncio
+async def test_sync_is_incremental_by_version() -> None:
+    versions = {"d1": 1, "d2": 1, "d3": 1}
+    fetched: List[str] = []
+
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> Any:
+        if name == "search_dashboards":
+            hits = [
+                {"uid": uid, "title": f"Dash {uid}", "type": "dash-db"}
+                for uid in versions
+            ]
+            start = (arguments["page"] - 1) * arguments["limit"]
+            return hits[start : start + arguments["limit"]]
+        fetched.append(arguments["uid"])
+        uid = arguments["uid"]
+        return _dashboard(uid, f"Dash {uid}", versions[uid])
+
+    catalog = DashboardCatalog()
+    syncer = DashboardCatalogSyncer(catalog, call_tool, revalidate_batch=1, page_size=2)
+
+    stats = await syncer.sync_once()
+    assert stats["added"] == 3 and len(catalog) == 3
+
+    versions["d2"] = 2
+    del versions["d3"]
+    fetched.clear()
+    stats = await syncer.sync_once()
+    assert stats["removed"] == 1 and "d3" not in catalog.dashboards
+    # Only one unchanged dashboard is revalidated per sync.
+    assert len(fetched) == 1
+
+    # Least recently checked first, so d2 is revalidated within two syncs.
+    updated = stats["updated"]
+    for _ in range(2):
+        updated += (await syncer.sync_once())["updated"]
+    assert updated == 1 and catalog.version_of("d2") == 2
+
+
+@pytest.mark.asyncio
+async def test_sync_keeps_dashboards_when_the_listing_is_incomplete() -> None:
+    pages: List[Any] = [
+        [{"uid": "d1", "type": "dash-db"}, {"uid": "f1", "type": "dash-folder"}],
+        [{"uid": "d2", "type": "dash-db"}, {"uid": "d3", "type": "dash-db"}],
+        [],
+    ]
+    fail = False
+
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> Any:
+        if name == "search_dashboards":
+            if fail and arguments["page"] == 2:
+                raise RuntimeError("timeout")
+            return pages[arguments["page"] - 1]
+        return _dashboard(arguments["uid"], f"Dash {arguments['uid']}")
+
+    catalog = DashboardCatalog()
+    syncer = DashboardCatalogSyncer(catalog, call_tool, page_size=2)
+    stats = await syncer.sync_once()
+    assert stats["complete"] and sorted(catalog.dashboards) == ["d1", "d2", "d3"]
+
+    # 第二頁失敗：d2、d3 不在列表中，但不能當成已刪除
+    fail = True
+    stats = await syncer.sync_once()
+    assert not stats["complete"] and stats["removed"] == 0 and len(catalog) == 3
+
+
+@pytest.mark.asyncio
+async def test_revalidation_scales_with_catalog_size() -> None:
+    fetched: List[str] = []
+
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> Any:
+        if name == "search_dashboards":
+            return [{"uid": f"d{i}", "title": f"Dash {i}"} for i in range(10)]
+        fetched.append(arguments["uid"])
+        return _dashboard(arguments["uid"], f"Dash {arguments['uid']}")
+
+    catalog = DashboardCatalog()
+    syncer = DashboardCatalogSyncer(
+        catalog, call_tool, revalidate_batch=1, revalidate_max_age=900
+    )
+    await syncer.sync_once()
+    assert catalog.search("request rate")[0]["verifiedSecondsAgo"] == 0
+
+    # 距上次同步將近半個 max age：約一半的儀表板要重新確認
+    syncer.last_sync -= 440
+    fetched.clear()
+    await syncer.sync_once()
+    assert len(fetched) == 5
@@ -0,0 +1,106 @@
+import asyncio
+import importlib
+from typing import Any, Dict, Sequence
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from react_agent import fanout, prompts
+from react_agent.fanout import build_fanout_graph, parse_fanout_targets
+
+graph = importlib.import_module("react_agent.graph")
+
+
+def test_parse_fanout_targets() -> None:
+    assert parse_fanout_targets(
+        "checkout health for service_country: zm, ng and ke"
+    ) == [
+        'service_country="zm"',
+        'service_country="ng"',
+        'service_country="ke"',
+    ]
+    assert parse_fanout_targets("env in (prod/staging)") == [
+        'env="prod"',
+        'env="staging"',
+    ]
+    assert parse_fanout_targets("service_name:checkout") == []
+
+
+class ScriptedModel:
+    def __init__(self) -> None:
+        self.reduce_input = ""
+
+    def bind_tools(self, tools: Sequence[Any]) -> "ScriptedModel":
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        if messages[0].content == prompts.FANOUT_REDUCE_PROMPT:
+            self.reduce_input = str(messages[1].content)
+            return AIMessage(content="合併報告")
+        if any(isinstance(m, ToolMessage) for m in messages):
+            return AIMessage(content="正常")
+        call = {"name": "query_prometheus", "args": {"expr": "up"}, "id": "c1"}
+        return AIMessage(content="", tool_calls=[call])
+
+
+@pytest.mark.asyncio
+async def test_fanout_investigates_targets_in_parallel(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    running: Dict[str, int] = {"now": 0, "max": 0}
+
+    @tool
+    async def query_prometheus(expr: str) -> str:
+        """Run a PromQL query."""
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return "[]"
+
+    model = ScriptedModel()
+    monkeypatch.setattr(graph, "load_chat_model", lambda _name: model)
+    monkeypatch.setattr(fanout, "load_chat_model", lambda _name: model)
+    monkeypatch.setattr(graph, "_dynamic_tools", [query_prometheus])
+    compiled = build_fanout_graph([query_prometheus]).compile()
+    question = "檢查 service_country: zm, ng, ke, gh 的健康狀況"
+    result = await compiled.ainvoke(
+        {"messages": [HumanMessage(content=question)]},
+        {"configurable": {"metadata_preresolve": False, "fanout_max_concurrency": 2}},
+    )
+
+    assert result["messages"][-1].content == "合併報告"
+    assert sorted(f.target for f in result["findings"]) == sorted(
+        parse_fanout_targets(question)
+    )
+    assert all(f.report == "正常" and f.tool_calls == 1 for f in result["findings"])
+    assert running["max"] == 2
+    assert model.reduce_input.index('"gh"') < model.reduce_input.index('"zm"')
+
+
+@pytest.mark.asyncio
+async def test_fanout_graph_uses_the_mcp_tools(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    @tool
+    async def query_prometheus(expr: str) -> str:
+        """Run a PromQL query."""
+        calls.append(expr)
+        return "[]"
+
+    model = ScriptedModel()
+    monkeypatch.setattr(graph, "load_chat_model", lambda _name: model)
+    monkeypatch.setattr(fanout, "load_chat_model", lambda _name: model)
+    # 模擬已從 MCP 載入的工具；扇出圖要在第一次使用時才取工具
+    monkeypatch.setattr(graph, "_dynamic_tools", [query_prometheus])
+    monkeypatch.setattr(fanout, "_compiled_fanout_graph", None)
+    compiled = await fanout.create_fanout_graph()
+    result = await compiled.ainvoke(
+        {"messages": [HumanMessage(content="檢查 env: prod, staging 的健康狀況")]},
+        {"configurable": {"metadata_preresolve": False}},
+    )
+
+    assert calls == ["up", "up"]
+    assert all(f.tool_calls == 1 and not f.error for f in result["findings"])
+    assert await fanout.create_fanout_graph() is compiled
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+_CHECK = """
+import sys
+import react_agent
+assert "react_agent.graph" not in sys.modules
+import react_agent.graph
+import react_agent.fanout
+deferred = ("mcp", "langchain_mcp_adapters", "langchain_tavily", "langchain.chat_models")
+print(sorted(m for m in deferred if m in sys.modules))
+print(
+    type(react_agent.graph).__name__,
+    sys.modules["react_agent.graph"]._compiled_graph is None,
+    react_agent.fanout._compiled_fanout_graph is None,
+)
+"""
+
+
+def test_importing_the_graph_defers_mcp_and_providers() -> None:
+    completed = subprocess.run(
+        [sys.executable, "-c", _CHECK], capture_output=True, text=True, check=True
+    )
+    deferred, graph_state = completed.stdout.splitlines()
+    assert deferred == "[]"
+    # 只 import 不會建立圖（也就不會連線 MCP）
+    assert graph_state == "module True True"
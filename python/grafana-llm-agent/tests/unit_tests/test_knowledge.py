@@ -0,0 +1,143 @@
+import importlib
+import json
+from pathlib import Path
+from typing import Any, List, Sequence
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.knowledge import extract_facts, get_knowledge_base
+from react_agent.sqlite_store import HashingEmbeddings, SqliteStore
+
+graph = importlib.import_module("react_agent.graph")
+
+_DATASOURCES = [
+    {
+        "id": 1,
+        "uid": "loki-prod",
+        "name": "Loki Prod",
+        "type": "loki",
+        "isDefault": False,
+    },
+    {
+        "id": 2,
+        "uid": "prom-prod",
+        "name": "Prometheus",
+        "type": "prometheus",
+        "isDefault": True,
+    },
+]
+
+
+def test_store_search_filter_and_ttl(tmp_path: Path) -> None:
+    now = [1000.0]
+    index = {"dims": 64, "embed": HashingEmbeddings(64), "fields": ["text"]}
+    store = SqliteStore(str(tmp_path / "store.db"), index=index, clock=lambda: now[0])
+    store.put(
+        ("facts", "ds"), "a", {"text": "loki datasource loki-prod", "n": 1}, ttl=1
+    )
+    store.put(("facts", "ds"), "b", {"text": "prometheus datasource prom-prod", "n": 2})
+    store.put(("facts", "dash"), "c", {"text": "checkout latency dashboard", "n": 3})
+
+    assert store.get(("facts", "ds"), "a").value["n"] == 1
+    assert [i.key for i in store.search(("facts",), query="checkout dashboard")][
+        0
+    ] == "c"
+    assert {i.key for i in store.search(("facts",), filter={"n": {"$gte": 2}})} == {
+        "b",
+        "c",
+    }
+    assert store.list_namespaces(suffix=("dash",)) == [("facts", "dash")]
+
+    now[0] += 90
+    assert store.get(("facts", "ds"), "a") is None
+    assert store.sweep_ttl() == 1
+    store.delete(("facts", "ds"), "b")
+    reopened = SqliteStore(
+        str(tmp_path / "store.db"), index=index, clock=lambda: now[0]
+    )
+    assert [i.key for i in reopened.search(("facts",))] == ["c"]
+
+
+@pytest.mark.asyncio
+async def test_capture_recall_and_forget(tmp_path: Path) -> None:
+    knowledge = get_knowledge_base(str(tmp_path / "k.db"))
+    assert await knowledge.capture("list_datasources", {}, _DATASOURCES) == 2
+    labels = ["app", "service_name", "level"]
+    await knowledge.capture(
+        "list_loki_label_names", {"datasourceUid": "loki-prod"}, labels
+    )
+    # 有篩選條件的標籤值只是子集，不記錄
+    assert not extract_facts(
+        "list_prometheus_label_values",
+        {"datasourceUid": "prom-prod", "labelName": "job", "matches": ["up"]},
+        ["api"],
+    )
+
+    facts = await knowledge.recall(
+        "service_name 在 loki 的標籤", limit=4, min_score=0.1
+    )
+    texts = [f.value["text"] for f in facts]
+    assert any("Loki Prod" in t for t in texts) and any(
+        "service_name" in t for t in texts
+    )
+
+    assert await knowledge.forget("loki-prod") == 2
+    facts = await knowledge.recall("loki", limit=4, min_score=0.1)
+    assert [f.key for f in facts] == ["prom-prod"]
+
+
+class DiscoveringModel:
+    """Lists the datasources first unless they are already in its context."""
+
+    def __init__(self) -> None:
+        self.prompts: List[Sequence[BaseMessage]] = []
+
+    def bind_tools(self, tools: Sequence[Any]) -> "DiscoveringModel":
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        self.prompts.append(messages)
+        known = any(
+            isinstance(m, SystemMessage) and "loki-prod" in m.content for m in messages
+        )
+        listed = any(m.type == "tool" for m in messages)
+        if known or listed:
+            return AIMessage(content="完成")
+        call = {"name": "list_datasources", "args": {}, "id": f"c{len(self.prompts)}"}
+        return AIMessage(content="", tool_calls=[call])
+
+
+@pytest.mark.asyncio
+async def test_second_thread_skips_discovery(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    @tool
+    def list_datasources() -> str:
+        """List datasources."""
+        return json.dumps(_DATASOURCES)
+
+    model = DiscoveringModel()
+    monkeypatch.setattr(graph, "load_chat_model", lambda _name: model)
+    monkeypatch.setattr(graph, "_dynamic_tools", [list_datasources])
+    compiled = graph.build_react_graph([list_datasources]).compile(
+        checkpointer=InMemorySaver()
+    )
+
+    steps = []
+    for thread in ("first", "second"):
+        config = {
+            "configurable": {
+                "thread_id": thread,
+                "metadata_preresolve": False,
+                "knowledge_db": str(tmp_path / "graph.db"),
+            }
+        }
+        before = len(model.prompts)
+        await compiled.ainvoke(
+            {"messages": [HumanMessage(content="checkout 有錯誤嗎")]}, config
+        )
+        steps.append(len(model.prompts) - before)
+    assert steps == [2, 1]
@@ -0,0 +1,115 @@
+import asyncio
+import sqlite3
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from react_agent.llm_scheduler import (
+    LLMScheduler,
+    LocalBucket,
+    SharedBucket,
+    SqliteRateLedger,
+    is_rate_limited,
+)
+from react_agent.metrics import MetricsRegistry
+
+
+def test_local_bucket_refills_per_minute() -> None:
+    clock = {"now": 0.0}
+    bucket = LocalBucket(60, clock=lambda: clock["now"])
+    assert bucket.try_take(60) == 0
+    assert bucket.try_take(2) == pytest.approx(2.0)
+    clock["now"] = 2
+    assert bucket.try_take(2) == 0
+    bucket.adjust(-10)
+    assert bucket.try_take(10) == 0
+
+
+def test_sqlite_ledger_is_shared(tmp_path: Path) -> None:
+    path = str(tmp_path / "limits.db")
+    first = SharedBucket(SqliteRateLedger(path), "tokens", 6000)
+    second = SharedBucket(SqliteRateLedger(path), "tokens", 6000)
+    assert first.try_take(5000) == 0
+    assert second.try_take(5000) > 0
+    assert second.try_take(900) == 0
+
+
+def test_busy_ledger_does_not_block(tmp_path: Path) -> None:
+    path = str(tmp_path / "limits.db")
+    bucket = SharedBucket(SqliteRateLedger(path, busy_timeout=0.05), "tokens", 6000)
+    assert bucket.try_take(1000) == 0
+    # 另一個進程持有寫入鎖
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    assert bucket.try_take(1000) == pytest.approx(0.05)
+    bucket.adjust(-1000)
+    assert time.monotonic() - started < 1
+    other.execute("ROLLBACK")
+    other.close()
+    # 延後的退還在下一次更新時寫入
+    assert bucket.try_take(6000) == 0
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_go_first() -> None:
+    metrics = MetricsRegistry()
+    scheduler = LLMScheduler(max_concurrency=1, metrics=metrics)
+    gate = asyncio.Event()
+    order: List[str] = []
+
+    async def call(name: str) -> str:
+        order.append(name)
+        await gate.wait()
+        return name
+
+    running = asyncio.create_task(scheduler.run(lambda: call("first")))
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.create_task(scheduler.run(lambda n=n: call(n), priority=p))
+        for n, p in (
+            ("batch-1", "batch"),
+            ("batch-2", "batch"),
+            ("interactive", "interactive"),
+        )
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.inflight == 1 and order == ["first"]
+    gate.set()
+    await asyncio.gather(running, *queued)
+
+    assert order == ["first", "interactive", "batch-1", "batch-2"]
+    summaries = metrics.snapshot()["summaries"]["llm_queue_wait_seconds"]
+    waits = {s["labels"]["priority"]: s["count"] for s in summaries}
+    assert waits == {"interactive": 2, "batch": 2}
+
+
+class RateLimitError(Exception):
+    def __init__(self) -> None:
+        super().__init__("429")
+        self.response = SimpleNamespace(
+            status_code=429, headers={"retry-after": "0.01"}
+        )
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_halve_concurrency_and_retry() -> None:
+    metrics = MetricsRegistry()
+    scheduler = LLMScheduler(max_concurrency=8, metrics=metrics)
+    attempts: List[int] = []
+
+    async def flaky() -> str:
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RateLimitError()
+        return "ok"
+
+    assert is_rate_limited(RateLimitError())
+    assert await scheduler.run(flaky) == "ok"
+    assert len(attempts) == 2
+    assert metrics.counter("llm_rate_limited") == 1
+    assert scheduler.limit == pytest.approx(4 + 1 / 4)
+    assert metrics.gauge("llm_concurrency_limit") == scheduler.limit
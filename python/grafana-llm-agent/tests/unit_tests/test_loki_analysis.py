@@ -0,0 +1,156 @@
+import json
+from typing import Any, Dict, List
+
+import pytest
+from langchain_core.tools import tool
+
+from react_agent import tools
+from react_agent.loki_analysis import (
+    TemplateMiner,
+    format_rfc3339_nano,
+    parse_loki_result,
+    summarize_logs,
+)
+
+_T0 = 1_700_000_000_000_000_000  # ns, aligned to a minute
+
+
+def _entries() -> List[Dict[str, Any]]:
+    entries = []
+    for minute in range(30):
+        burst = 40 if minute == 20 else 0
+        for i in range(10 + burst):
+            error = minute == 20 or i == 0
+            entries.append(
+                {
+                    "timestamp": str(_T0 + minute * 60_000_000_000 + i * 1_000_000),
+                    "line": f"request {i} failed with status 503"
+                    if error
+                    else f"user {1000 + i} logged in from 10.0.0.{i}",
+                    "labels": {
+                        "service_name": "SportyBet Android",
+                        "service_country": "zm" if i % 2 else "ng",
+                    },
+                }
+            )
+    return entries
+
+
+def test_parse_result_shapes() -> None:
+    entry = {"timestamp": "1", "line": "x", "labels": {"a": "b"}}
+    raw = {"data": {"result": [{"stream": {"a": "b"}, "values": [["1", "x"]]}]}}
+    assert parse_loki_result(json.dumps([entry])) == [entry]
+    assert parse_loki_result(raw) == [entry]
+    assert parse_loki_result([{"type": "text", "text": json.dumps([entry])}]) == [entry]
+    assert parse_loki_result("") == []
+
+
+def test_template_miner_generalizes_variables() -> None:
+    miner = TemplateMiner()
+    first = miner.add("user alice logged in after 35ms")
+    second = miner.add("user bob logged in after 12ms")
+    other = miner.add("connection reset by peer")
+    assert first == second != other
+    assert " ".join(miner.templates[first]) == "user <*> logged in after <*>"
+
+
+def test_summarize_logs() -> None:
+    summary = summarize_logs(_entries(), bucket_seconds=60, top_k=3)
+
+    assert summary["total_lines"] == 340
+    assert summary["error_lines"] == 29 + 50
+    assert len(summary["timeline"]) == 30
+    assert summary["timeline"][20]["error_rate"] == 1.0
+    assert {s["labels"]["service_country"] for s in summary["top_label_sets"]} == {
+        "zm",
+        "ng",
+    }
+    assert [p["count"] for p in summary["patterns"]] == [261, 79]
+    assert summary["anomalies"][0]["bucket_start"] == summary["timeline"][20]["start"]
+    assert len(json.dumps(summary)) < 8_000
+
+
+def test_format_rfc3339_nano() -> None:
+    assert format_rfc3339_nano(_T0 + 5) == "2023-11-14T22:13:20.000000005Z"
+
+
+@pytest.mark.asyncio
+async def test_analyze_loki_logs_pages_backwards(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    entries = sorted(_entries(), key=lambda e: -int(e["timestamp"]))
+    calls: List[Dict[str, Any]] = []
+
+    class FakeQueryTool:
+        async def ainvoke(self, args: Dict[str, Any]) -> str:
+            calls.append(args)
+            end = args.get("endRfc3339")
+            page = [
+                e
+                for e in entries
+                if end is None or format_rfc3339_nano(int(e["timestamp"])) <= end
+            ][: args["limit"]]
+            return json.dumps(page)
+
+    async def fake_get_mcp_tool(name: str) -> Any:
+        return FakeQueryTool() if name == "query_loki_logs" else None
+
+    monkeypatch.setattr(tools, "get_mcp_tool", fake_get_mcp_tool)
+    summary = await tools.analyze_loki_logs(
+        "loki-uid", '{service_name="x"}', max_lines=250
+    )
+
+    assert calls[0]["limit"] == 100 and "endRfc3339" not in calls[0]
+    assert all(c["direction"] == "backward" and c["endRfc3339"] for c in calls[1:])
+    assert summary["total_lines"] == 250
+    assert summary["truncated"] is True
+
+
+def test_bad_timestamps_are_skipped_and_wide_spans_widen_buckets() -> None:
+    entries = _entries()[:10] + [
+        {"timestamp": "", "line": "no time"},
+        {"line": "missing time"},
+        {"timestamp": "soon", "line": "bad time"},
+        {"timestamp": str(2**70), "line": "overflow"},
+        # 一個遠古的時間戳不該配置上億個桶
+        {"timestamp": "1", "line": "epoch"},
+    ]
+    summary = summarize_logs(entries, bucket_seconds=60)
+
+    assert summary["total_lines"] == 11 and summary["skipped_lines"] == 4
+    assert summary["bucket_seconds"] >= 1_700_000_000 // 10_000
+    assert summarize_logs([{"line": "x"}])["skipped_lines"] == 1
+
+
+@pytest.mark.asyncio
+async def test_analyze_loki_logs_reports_failures_as_tool_errors(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    same = {"timestamp": str(_T0), "line": "request failed"}
+    pages = [
+        [{**same, "labels": {"pod": "a"}}, {**same, "labels": {"pod": "b"}}],
+        "upstream returned HTML, not JSON",
+    ]
+
+    class FakeQueryTool:
+        async def ainvoke(self, args: Dict[str, Any]) -> Any:
+            page = pages.pop(0)
+            return page if isinstance(page, str) else json.dumps(page)
+
+    async def fake_get_mcp_tool(name: str) -> Any:
+        return FakeQueryTool()
+
+    monkeypatch.setattr(tools, "get_mcp_tool", fake_get_mcp_tool)
+    # 同一時間、同一行但不同串流的兩筆都要保留
+    summary = await tools.analyze_loki_logs("loki-uid", "{}", max_lines=2)
+    assert summary["total_lines"] == 2
+
+    # 工具節點就是這樣呼叫函式工具的
+    call = {
+        "name": "analyze_loki_logs",
+        "args": {"datasourceUid": "u", "logql": "{}"},
+        "id": "c1",
+    }
+    message = await tool(tools.analyze_loki_logs).ainvoke({**call, "type": "tool_call"})
+    assert message.status == "error" and message.tool_call_id == "c1"
+    assert "日誌分析失敗" in message.content
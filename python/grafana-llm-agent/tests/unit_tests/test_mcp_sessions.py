@@ -0,0 +1,102 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import anyio
+import httpx
+import pytest
+
+from react_agent.mcp_sessions import MCPSessionManager
+from react_agent.mcp_stub import serve_stub
+
+
+def list_datasources() -> List[Dict[str, Any]]:
+    return [{"uid": "loki-1", "type": "loki"}, {"uid": "prom-1", "type": "prometheus"}]
+
+
+async def slow_echo(text: str) -> str:
+    await asyncio.sleep(0.2)
+    return text
+
+
+_TOOLS = {"list_datasources": list_datasources, "slow_echo": slow_echo}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("transport", ["sse", "streamable_http"])
+async def test_tools_share_one_session(transport: str) -> None:
+    with serve_stub(_TOOLS, transport) as url:
+        manager = MCPSessionManager(
+            {"grafana-mcp": {"url": url, "transport": transport}}
+        )
+        tools = {t.name: t for t in await manager.get_tools()}
+        for _ in range(5):
+            result = await tools["list_datasources"].ainvoke({})
+            assert "loki-1" in str(result)
+
+        start = asyncio.get_running_loop().time()
+        echoes = await asyncio.gather(
+            *(tools["slow_echo"].ainvoke({"text": str(i)}) for i in range(5))
+        )
+        elapsed = asyncio.get_running_loop().time() - start
+        await manager.aclose()
+
+    assert all(f"'text': '{i}'" in str(e) for i, e in enumerate(echoes))
+    assert manager.connects == 1
+    # The five calls were multiplexed over the same session, not serialized.
+    assert elapsed < 0.8
+
+
+@pytest.mark.asyncio
+async def test_reconnects_after_session_loss() -> None:
+    with serve_stub(_TOOLS) as url:
+        manager = MCPSessionManager({"grafana-mcp": {"url": url, "transport": "sse"}})
+        await manager.call_tool("grafana-mcp", "list_datasources", {})
+        await manager._holders["grafana-mcp"].aclose()
+        result = await manager.call_tool("grafana-mcp", "list_datasources", {})
+        await manager.aclose()
+
+    assert not result.isError
+    assert manager.connects == 2
+
+
+class FlakySession:
+    def __init__(self, error: Exception) -> None:
+        self.error: Optional[Exception] = error
+        self.calls: List[str] = []
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> str:
+        self.calls.append(name)
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+        return "ok"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("tool", "error", "retried"),
+    [
+        ("list_datasources", httpx.ReadError("reset"), True),
+        ("update_dashboard", httpx.ReadError("reset"), False),
+        ("update_dashboard", anyio.ClosedResourceError(), True),
+    ],
+)
+async def test_retries_only_unsent_or_read_only_calls(
+    tool: str, error: Exception, retried: bool
+) -> None:
+    manager = MCPSessionManager(
+        {"grafana-mcp": {"url": "http://unused", "transport": "sse"}}
+    )
+    session = FlakySession(error)
+
+    async def get_session(server_name: str) -> FlakySession:
+        return session
+
+    manager.session = get_session  # type: ignore[method-assign]
+    if retried:
+        assert await manager.call_tool("grafana-mcp", tool, {}) == "ok"
+        assert session.calls == [tool, tool]
+    else:
+        with pytest.raises(httpx.ReadError):
+            await manager.call_tool("grafana-mcp", tool, {})
+        assert session.calls == [tool]
@@ -0,0 +1,44 @@
+from typing import List
+
+from react_agent.memory_watch import MemorySample, MemoryWatcher, detect_growth
+
+_leaked: List[bytes] = []
+
+
+def _samples(traced: List[int]) -> List[MemorySample]:
+    return [
+        MemorySample(work=100 * i, seconds=i, rss=0, traced=t)
+        for i, t in enumerate(traced)
+    ]
+
+
+def test_detects_steady_growth_but_not_a_filled_cache() -> None:
+    leak = detect_growth(
+        _samples([1000 + 100 * 1024 * i for i in range(8)]), "traced", 512
+    )
+    assert leak is not None and leak.sustained
+    assert round(leak.bytes_per_unit) == 1024
+
+    # 快取填滿到上限後持平，加上一點雜訊
+    bounded = [0, 60_000, 90_000, 100_000, 100_500, 99_800, 100_200, 100_100]
+    growth = detect_growth(_samples(bounded), "traced", 64)
+    assert growth is not None and not growth.sustained
+    assert detect_growth(_samples([0, 1, 2]), "traced", 64) is None
+
+
+def test_top_growth_points_at_the_leaking_line() -> None:
+    watcher = MemoryWatcher(frames=4)
+    watcher.start()
+    try:
+        watcher.mark_baseline()
+        for i in range(5):
+            _leaked.extend(bytes(1024) for _ in range(200))
+            watcher.sample(i)
+        report = watcher.top_growth(limit=1, key_type="lineno")
+    finally:
+        watcher.stop()
+        _leaked.clear()
+
+    assert report[0].startswith("+") and "KiB" in report[0]
+    assert "test_memory_watch.py" in report[1]
+    assert watcher.samples[-1].traced > watcher.samples[0].traced
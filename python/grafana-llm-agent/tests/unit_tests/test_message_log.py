@@ -0,0 +1,152 @@
+from typing import Any, Dict, List, Sequence
+
+import pytest
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    HumanMessage,
+    RemoveMessage,
+    ToolMessage,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import StateGraph, add_messages
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langgraph.store.memory import InMemoryStore
+
+from react_agent.message_log import (
+    MessageLog,
+    StoreSpill,
+    add_messages_fast,
+    bounded_add_messages,
+    history_with_spilled,
+)
+from react_agent.state import State
+
+
+def _ids(messages: Sequence[Any]) -> List[str]:
+    return [m.id for m in messages]
+
+
+def test_matches_add_messages() -> None:
+    base = [HumanMessage(content="q", id="1"), AIMessage(content="a", id="2")]
+    updates = [
+        [AIMessage(content="edited", id="2"), ("user", "next")],
+        [RemoveMessage(id="1")],
+        [HumanMessage(content="x", id="3"), HumanMessage(content="y", id="4")],
+    ]
+    expected: Any = list(base)
+    actual: Any = list(base)
+    for update in updates:
+        expected = add_messages(expected, update)
+        actual = add_messages_fast(actual, update)
+        assert [m.content for m in actual] == [m.content for m in expected]
+    assert isinstance(actual, MessageLog)
+    assert actual.index_of("4") == 3
+
+
+def test_remove_all_and_unknown_id() -> None:
+    log = add_messages_fast([], [HumanMessage(content="q", id="1")])
+    with pytest.raises(ValueError):
+        add_messages_fast(log, [RemoveMessage(id="missing")])
+    log = add_messages_fast(
+        log, [RemoveMessage(id=REMOVE_ALL_MESSAGES), HumanMessage(content="z", id="9")]
+    )
+    assert _ids(log) == ["9"]
+
+
+def test_invalid_update_leaves_the_log_unchanged() -> None:
+    log = add_messages_fast(
+        [], [HumanMessage(content="q", id="1"), AIMessage(content="a", id="2")]
+    )
+    invalid = [
+        [HumanMessage(content="new", id="3"), RemoveMessage(id="missing")],
+        [RemoveMessage(id="1"), RemoveMessage(id="1")],
+        [RemoveMessage(id=REMOVE_ALL_MESSAGES), RemoveMessage(id="2")],
+    ]
+    for update in invalid:
+        with pytest.raises(ValueError):
+            add_messages_fast(log, update)
+        assert _ids(log) == ["1", "2"] and log.index_of("2") == 1
+    # 同一次更新中先加入再刪除是合法的
+    log = add_messages_fast(
+        log, [HumanMessage(content="t", id="4"), RemoveMessage(id="4")]
+    )
+    assert _ids(log) == ["1", "2"]
+
+
+def test_updates_leave_the_previous_log_unchanged() -> None:
+    log = add_messages_fast([], [HumanMessage(content="q", id="1")])
+    appended = add_messages_fast(log, [AIMessage(content="a", id="2")])
+    assert appended is not log
+    assert _ids(log) == ["1"] and log.index_of("2") is None
+    assert _ids(appended) == ["1", "2"] and appended.index_of("2") == 1
+
+
+def test_streamed_values_keep_each_step() -> None:
+    def respond(state: State) -> Dict[str, List[AnyMessage]]:
+        return {"messages": [AIMessage(content=f"seen {len(state.messages)}")]}
+
+    builder = StateGraph(State)
+    builder.add_node("first", respond)
+    builder.add_node("second", respond)
+    builder.add_edge("__start__", "first")
+    builder.add_edge("first", "second")
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "t"}}
+    snapshots = list(
+        graph.stream({"messages": [("user", "hi")]}, config, stream_mode="values")
+    )
+
+    assert [len(s["messages"]) for s in snapshots] == [1, 2, 3]
+    history = [len(s.values["messages"]) for s in graph.get_state_history(config)]
+    assert history == [3, 2, 1, 0]
+
+
+def test_bounded_log_spills_without_orphaning_tool_results() -> None:
+    store = InMemoryStore()
+    reducer = bounded_add_messages(4, StoreSpill(store))
+    log: Any = []
+    log = reducer(log, [HumanMessage(content="q", id="h")])
+    log = reducer(
+        log,
+        [
+            AIMessage(
+                content="", id="a", tool_calls=[{"name": "t", "args": {}, "id": "c1"}]
+            )
+        ],
+    )
+    log = reducer(log, [ToolMessage(content="r", tool_call_id="c1", id="t1")])
+    log = reducer(log, [AIMessage(content="b", id="b")])
+    log = reducer(log, [HumanMessage(content="q2", id="h2")])
+
+    assert _ids(log) == ["b", "h2"]
+    full = history_with_spilled(store, "default", log)
+    assert [m["id"] if isinstance(m, dict) else m.id for m in full] == [
+        "h",
+        "a",
+        "t1",
+        "b",
+        "h2",
+    ]
+
+
+def test_state_is_slotted_and_survives_checkpoints() -> None:
+    assert not hasattr(State(), "__dict__")
+
+    def respond(state: State) -> Dict[str, List[AnyMessage]]:
+        return {"messages": [AIMessage(content=f"seen {len(state.messages)}")]}
+
+    builder = StateGraph(State)
+    builder.add_node(respond)
+    builder.add_edge("__start__", "respond")
+    graph = builder.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "t"}}
+    graph.invoke({"messages": [("user", "hi")]}, config)
+    result = graph.invoke({"messages": [("user", "again")]}, config)
+
+    assert [m.content for m in result["messages"]] == [
+        "hi",
+        "seen 1",
+        "again",
+        "seen 3",
+    ]
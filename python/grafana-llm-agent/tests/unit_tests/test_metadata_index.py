@@ -0,0 +1,104 @@
+from typing import Any, Dict, List
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from react_agent import tools
+from react_agent.metadata_index import (
+    MetadataIndex,
+    MetadataSyncer,
+    TrigramIndex,
+    parse_selector_pairs,
+)
+
+_LABEL_VALUES = {
+    "service_name": ["SportyBet Android", "SportyBet iOS", "payments-api", "gateway"],
+    "service_country": ["zm", "ng", "gh", "ke"],
+    "env": ["production", "staging"],
+}
+
+
+def _fake_caller(calls: List[str]):
+    async def call_tool(name: str, arguments: Dict[str, Any]) -> Any:
+        calls.append(name)
+        if name == "list_datasources":
+            return [
+                {"uid": "loki-1", "name": "Loki", "type": "loki"},
+                {"uid": "prom-1", "name": "Prometheus", "type": "prometheus"},
+                {"uid": "tempo-1", "name": "Tempo", "type": "tempo"},
+            ]
+        if name.endswith("_label_names"):
+            return list(_LABEL_VALUES)
+        if name.endswith("_label_values"):
+            return _LABEL_VALUES[arguments["labelName"]]
+        if name == "list_prometheus_metric_names":
+            return ["http_requests_total", "http_request_duration_seconds_bucket"]
+        raise AssertionError(name)
+
+    return call_tool
+
+
+def test_trigram_search_is_fuzzy() -> None:
+    index = TrigramIndex(["SportyBet Android", "SportyBet iOS", "payments-api"])
+    assert index.search("sportybet-android")[0] == ("SportyBet Android", 1.0)
+    assert index.search("sporty andriod")[0][0] == "SportyBet Android"
+    assert index.search("zzz") == []
+
+
+def test_parse_selector_pairs() -> None:
+    text = "找出最接近 service_name:SportyBet Android and service_country:zm 的日誌"
+    assert parse_selector_pairs(text) == [
+        ("service_name", "SportyBet Android"),
+        ("service_country", "zm"),
+    ]
+    assert parse_selector_pairs('env="production", job=api') == [
+        ("env", "production"),
+        ("job", "api"),
+    ]
+    assert parse_selector_pairs("see http://grafana:3000/d/abc") == []
+    assert parse_selector_pairs("Note: the checkout errors started at 10:30") == []
+    assert parse_selector_pairs("Summary: job=api is down") == [("job", "api is down")]
+
+
+@pytest.mark.asyncio
+async def test_sync_and_resolve_selector() -> None:
+    calls: List[str] = []
+    index = MetadataIndex()
+    synced = await MetadataSyncer(index, _fake_caller(calls)).sync_once()
+
+    assert synced == 2
+    assert "list_prometheus_metric_names" in calls
+    candidates = index.resolve_selector(
+        parse_selector_pairs("service_name:sportybet android and country:ZM please"),
+        datasource_uid="loki-1",
+    )
+    assert (
+        candidates[0]["selector"]
+        == '{service_name="SportyBet Android", service_country="zm"}'
+    )
+    hits = index.search("http requests", datasource_uid="prom-1")
+    assert hits[0]["kind"] == "metric" and hits[0]["name"] == "http_requests_total"
+
+
+@pytest.mark.asyncio
+async def test_preresolve_hint_is_cached_per_message(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    index = MetadataIndex()
+    await MetadataSyncer(index, _fake_caller([])).sync_once()
+    monkeypatch.setattr(tools, "_metadata_index", index)
+    monkeypatch.setattr(
+        tools, "_metadata_syncer", MetadataSyncer(index, _fake_caller([]))
+    )
+    monkeypatch.setattr(tools.MetadataSyncer, "start", lambda self, interval: None)
+
+    message = HumanMessage(
+        content="logs closest to service_name:SportyBet Android and service_country:zm",
+        id="m1",
+    )
+    hint = await tools.preresolve_targets([message])
+    assert hint is not None
+    assert '{service_name="SportyBet Android", service_country="zm"}' in str(
+        hint.content
+    )
+    assert await tools.preresolve_targets([message]) is hint
@@ -0,0 +1,44 @@
+import asyncio
+import os
+import time
+from typing import Any
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from react_agent.metrics import MetricsRegistry
+from react_agent.offload import LoopLagMonitor, offload, shutdown_offload_pool
+
+
+async def _pids(_: Any) -> tuple:
+    small = await offload(os.getpid, size=10)
+    large = await offload(os.getpid, size=1000)
+    return small, large
+
+
+@pytest.mark.asyncio
+async def test_offload_moves_large_inputs_to_a_worker_process() -> None:
+    config = {
+        "configurable": {"offload_threshold_bytes": 100, "offload_max_workers": 1}
+    }
+    try:
+        small, large = await RunnableLambda(_pids).ainvoke(None, config=config)
+    finally:
+        shutdown_offload_pool()
+    assert small == os.getpid()
+    assert large != os.getpid()
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_records_a_stall() -> None:
+    metrics = MetricsRegistry()
+    monitor = LoopLagMonitor(metrics=metrics)
+    monitor.start(0.01)
+    await asyncio.sleep(0.05)
+    time.sleep(0.2)  # 阻塞事件迴圈
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    [summary] = metrics.snapshot()["summaries"]["event_loop_lag_seconds"]
+    assert monitor.max_lag >= 0.15
+    assert summary["max"] == monitor.max_lag
+    assert summary["count"] >= 5
@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import StateGraph
+from langgraph.store.memory import InMemoryStore
+from langgraph.types import interrupt
+from typing_extensions import TypedDict
+
+from react_agent.metrics import MetricsRegistry
+from react_agent.parking import InterruptExpired, InterruptParking
+
+
+class CounterState(TypedDict):
+    count: int
+
+
+def _confirm(state: CounterState) -> Dict[str, Any]:
+    approved = interrupt({"message": "confirm?"})
+    return {"count": state["count"] + (1 if approved else 0)}
+
+
+def _graph(checkpointer: InMemorySaver) -> Any:
+    builder = StateGraph(CounterState)
+    builder.add_node("confirm", _confirm)
+    builder.add_edge("__start__", "confirm")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _parking(
+    checkpointer: InMemorySaver,
+    store: InMemoryStore,
+    clock: Dict[str, float],
+    metrics: MetricsRegistry,
+    released: Optional[List[str]] = None,
+) -> InterruptParking:
+    return InterruptParking(
+        _graph(checkpointer),
+        store,
+        expiry_seconds=60,
+        release=[] if released is None else [released.append],
+        metrics=metrics,
+        clock=lambda: clock["now"],
+    )
+
+
+@pytest.mark.asyncio
+async def test_parked_thread_resumes_on_another_worker() -> None:
+    checkpointer, store, clock = InMemorySaver(), InMemoryStore(), {"now": 0.0}
+    metrics = MetricsRegistry()
+    released: List[str] = []
+    first = _parking(checkpointer, store, clock, metrics, released)
+    result = await first.run({"count": 0}, {"configurable": {"thread_id": "t1"}})
+
+    assert result["__interrupt__"][0].value == {"message": "confirm?"}
+    assert released == ["t1"]
+    [parked] = await first.parked()
+    assert (parked.thread_id, parked.expires_at) == ("t1", 60)
+    assert metrics.gauge("parked_threads") == 1
+
+    # A fresh worker sharing only the checkpointer and the store resumes it.
+    clock["now"] = 30
+    second = _parking(checkpointer, store, clock, metrics)
+    result = await second.resume("t1", True)
+    assert result == {"count": 1}
+    assert await second.parked() == []
+    assert await first.count() == await second.count() == 0
+    summaries = metrics.snapshot()["summaries"]
+    assert summaries["interrupt_parked_seconds"][0]["sum"] == 30
+    assert summaries["interrupt_resume_seconds"][0]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_abandoned_interrupts_expire() -> None:
+    checkpointer, store, clock = InMemorySaver(), InMemoryStore(), {"now": 0.0}
+    metrics = MetricsRegistry()
+    parking = _parking(checkpointer, store, clock, metrics)
+    for thread_id in ("t1", "t2"):
+        await parking.run({"count": 0}, {"configurable": {"thread_id": thread_id}})
+
+    clock["now"] = 61
+    with pytest.raises(InterruptExpired):
+        await parking.resume("t1", True)
+    assert await parking.sync_once() == {"parked": 0, "expired": 1}
+    assert metrics.counter("interrupt_expired") == 2
+    assert metrics.gauge("parked_threads") == 0
+    state = await parking.graph.aget_state({"configurable": {"thread_id": "t2"}})
+    assert state.values == {}
+
+
+@pytest.mark.asyncio
+async def test_count_is_shared_and_finished_threads_can_be_forgotten() -> None:
+    checkpointer, store, clock = InMemorySaver(), InMemoryStore(), {"now": 0.0}
+    workers = [
+        InterruptParking(
+            _graph(checkpointer),
+            store,
+            expiry_seconds=60,
+            release=[],
+            forget_finished=True,
+            metrics=MetricsRegistry(),
+            clock=lambda: clock["now"],
+        )
+        for _ in range(2)
+    ]
+    await workers[0].run({"count": 0}, {"configurable": {"thread_id": "t1"}})
+    await workers[1].run({"count": 0}, {"configurable": {"thread_id": "t2"}})
+    assert await workers[0].count() == await workers[1].count() == 2
+    # 計數不會出現在停放索引中
+    assert sorted(p.thread_id for p in await workers[0].parked()) == ["t1", "t2"]
+
+    await workers[1].resume("t1", True)
+    assert await workers[0].count() == 1
+    assert workers[1].metrics.gauge("parked_threads") == 1
+    # 結束的執行緒不再保留檢查點
+    assert [
+        c async for c in checkpointer.alist({"configurable": {"thread_id": "t1"}})
+    ] == []
@@ -0,0 +1,206 @@
+import asyncio
+import json
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest
+from mcp.types import CallToolResult, TextContent
+
+from react_agent import tools
+from react_agent.metrics import MetricsRegistry
+from react_agent.prefetch import (
+    Prediction,
+    PrefetchCache,
+    SpeculativeExecutor,
+    ToolStep,
+    TransitionStats,
+    prefetch_stats,
+    static_rules,
+)
+from react_agent.tools import recent_tool_steps
+
+
+def test_static_rules_follow_list_datasources() -> None:
+    step = ToolStep(
+        "list_datasources",
+        {},
+        [
+            {"uid": "l1", "type": "loki"},
+            {"uid": "p1", "type": "prometheus"},
+            {"uid": "t", "type": "tempo"},
+        ],
+    )
+    assert [(p.name, dict(p.args)) for p in static_rules(step)] == [
+        ("list_loki_label_names", {"datasourceUid": "l1"}),
+        ("list_prometheus_label_names", {"datasourceUid": "p1"}),
+    ]
+
+
+def test_transition_stats_infer_arguments() -> None:
+    stats = TransitionStats(min_observations=2)
+    stats.observe_trace(
+        [["list_loki_label_names"], ["query_loki_stats"], ["query_loki_logs"]]
+    )
+    for _ in range(3):
+        stats.observe(["list_loki_label_names"], ["list_loki_label_values"])
+
+    step = ToolStep("list_loki_label_names", {"datasourceUid": "l1"})
+    required = {
+        "list_loki_label_values": ("datasourceUid",),
+        "query_loki_stats": ("datasourceUid", "logql"),
+    }
+    predictions = stats.predict(step, required)
+    assert [(p.name, dict(p.args), p.probability) for p in predictions] == [
+        ("list_loki_label_values", {"datasourceUid": "l1"}, 0.75)
+    ]
+    assert (
+        TransitionStats.from_dict(stats.to_dict()).probability(
+            "list_loki_label_names", "query_loki_stats"
+        )
+        == 0.25
+    )
+
+
+def test_recent_tool_steps() -> None:
+    messages = [
+        HumanMessage(content="hi"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "list_datasources", "args": {}, "id": "c1"}],
+        ),
+        ToolMessage(
+            content=json.dumps([{"uid": "l1", "type": "loki"}]), tool_call_id="c1"
+        ),
+    ]
+    [step] = recent_tool_steps(messages)
+    assert step.name == "list_datasources" and step.result == [
+        {"uid": "l1", "type": "loki"}
+    ]
+    assert recent_tool_steps(messages[:2]) == []
+
+
+@pytest.mark.asyncio
+async def test_prefetched_results_serve_real_calls() -> None:
+    metrics = MetricsRegistry()
+    clock = {"now": 0.0}
+    cache = PrefetchCache(ttl=10, metrics=metrics, clock=lambda: clock["now"])
+    calls: List[Dict[str, Any]] = []
+
+    async def grafana(request: MCPToolCallRequest) -> CallToolResult:
+        calls.append(request.args)
+        await asyncio.sleep(0.01)
+        return CallToolResult(
+            content=[TextContent(type="text", text=json.dumps(request.args))]
+        )
+
+    async def run_tool(name: str, args: Dict[str, Any]) -> Any:
+        return await cache.interceptor(
+            MCPToolCallRequest(name, args, "grafana-mcp"), grafana
+        )
+
+    executor = SpeculativeExecutor(cache, run_tool, max_per_step=2, metrics=metrics)
+    launched = executor.launch(
+        [
+            Prediction.of("list_loki_label_names", {"datasourceUid": "l1"}, 0.9),
+            Prediction.of("list_loki_label_names", {"datasourceUid": "l2"}, 0.8),
+            Prediction.of("list_loki_label_names", {"datasourceUid": "l3"}, 0.7),
+            Prediction.of("update_dashboard", {"uid": "x"}, 0.99),
+        ]
+    )
+    assert [dict(p.args)["datasourceUid"] for p in launched] == ["l1", "l2"]
+
+    # The real call joins the prefetch that is still in flight.
+    real = MCPToolCallRequest(
+        "list_loki_label_names", {"datasourceUid": "l1"}, "grafana-mcp"
+    )
+    result = await cache.interceptor(real, grafana)
+    assert json.loads(result.content[0].text) == {"datasourceUid": "l1"}
+    await asyncio.sleep(0.05)
+    assert len(calls) == 2
+
+    clock["now"] = 60
+    await cache.interceptor(
+        MCPToolCallRequest("list_datasources", {}, "grafana-mcp"), grafana
+    )
+    stats = prefetch_stats(metrics)
+    assert (stats["launched"], stats["hits"], stats["wasted"]) == (2, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_failed_prefetch_is_not_served() -> None:
+    metrics = MetricsRegistry()
+    cache = PrefetchCache(ttl=10, metrics=metrics)
+    calls: List[bool] = []
+
+    async def grafana(request: MCPToolCallRequest) -> CallToolResult:
+        # 推測呼叫遇到暫時性錯誤，真實呼叫成功
+        calls.append(True)
+        await asyncio.sleep(0.01)
+        failed = len(calls) == 1
+        text = "upstream timeout" if failed else "service_name"
+        return CallToolResult(
+            content=[TextContent(type="text", text=text)], isError=failed
+        )
+
+    async def run_tool(name: str, args: Dict[str, Any]) -> Any:
+        return await cache.interceptor(
+            MCPToolCallRequest(name, args, "grafana-mcp"), grafana
+        )
+
+    executor = SpeculativeExecutor(cache, run_tool, metrics=metrics)
+    executor.launch(
+        [Prediction.of("list_loki_label_names", {"datasourceUid": "l1"}, 0.9)]
+    )
+
+    # The real call waits on the prefetch, sees it failed and runs itself.
+    real = MCPToolCallRequest(
+        "list_loki_label_names", {"datasourceUid": "l1"}, "grafana-mcp"
+    )
+    result = await cache.interceptor(real, grafana)
+    assert not result.isError and result.content[0].text == "service_name"
+    assert len(calls) == 2
+    stats = prefetch_stats(metrics)
+    assert (stats["hits"], stats["failed"]) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_speculate_observes_each_step_once(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    stats = TransitionStats()
+    loaded: List[Any] = []
+
+    async def get_mcp_tools() -> List[Any]:
+        return loaded
+
+    monkeypatch.setattr(tools, "_transition_stats", stats)
+    monkeypatch.setattr(tools, "_observed_steps", OrderedDict())
+    monkeypatch.setattr(tools, "_required_args", None)
+    monkeypatch.setattr(tools, "get_mcp_tools", get_mcp_tools)
+    messages = [
+        HumanMessage(content="hi"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "list_datasources", "args": {}, "id": "c1"}],
+        ),
+        ToolMessage(content="[]", tool_call_id="c1"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "search_dashboards", "args": {}, "id": "c2"}],
+        ),
+        ToolMessage(content="[]", tool_call_id="c2"),
+    ]
+    await tools.speculate_after_tools(messages)
+    await tools.speculate_after_tools(messages)
+    assert stats.to_dict() == {"list_datasources": {"search_dashboards": 1}}
+    # MCP 工具還沒載入時不快取空的參數表
+    assert tools._required_args is None
+    loaded.append(
+        SimpleNamespace(name="list_datasources", args_schema={"required": []})
+    )
+    await tools.speculate_after_tools(messages)
+    assert tools._required_args == {"list_datasources": ()}
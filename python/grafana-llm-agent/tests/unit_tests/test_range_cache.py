@@ -0,0 +1,215 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import pytest
+from langchain_mcp_adapters.interceptors import MCPToolCallRequest
+from mcp.types import CallToolResult, TextContent
+
+from react_agent.range_cache import RangeQueryCache, parse_time
+
+_NOW = 1_700_000_000.0
+
+
+class FakeGrafana:
+    def __init__(self) -> None:
+        self.calls: List[Dict[str, Any]] = []
+
+    async def __call__(self, request: MCPToolCallRequest) -> CallToolResult:
+        self.calls.append(request.args)
+        args = request.args
+        if request.name == "query_loki_stats":
+            start = parse_time(args["startRfc3339"], _NOW)
+            end = parse_time(args["endRfc3339"], _NOW)
+            assert start is not None and end is not None
+            payload: Any = {
+                "streams": 3,
+                "chunks": 2,
+                "entries": int(end - start),
+                "bytes": 10,
+            }
+        else:
+            step = args["stepSeconds"]
+            start = parse_time(args["startTime"], _NOW)
+            end = parse_time(args["endTime"], _NOW)
+            assert start is not None and end is not None
+            payload = [
+                {
+                    "metric": {"job": job},
+                    "values": [
+                        [t, str(t % 7)] for t in range(int(start), int(end) + 1, step)
+                    ],
+                }
+                for job in ("api", "db")
+            ]
+        return CallToolResult(
+            content=[TextContent(type="text", text=json.dumps(payload))]
+        )
+
+
+def _request(name: str, **args: Any) -> MCPToolCallRequest:
+    return MCPToolCallRequest(name=name, args=args, server_name="grafana-mcp")
+
+
+def _payload(result: Any) -> Any:
+    return json.loads(result.content[0].text)
+
+
+def test_parse_time() -> None:
+    assert parse_time("now", _NOW) == _NOW
+    assert parse_time("now-1h30m", _NOW) == _NOW - 5400
+    assert parse_time("2023-11-14T22:13:20.000000005Z", _NOW) == _NOW
+    assert parse_time("1700000000", _NOW) == _NOW
+    assert parse_time("yesterday", _NOW) is None
+
+
+@pytest.mark.asyncio
+async def test_prometheus_fetches_only_the_missing_tail() -> None:
+    clock = {"now": _NOW}
+    cache = RangeQueryCache(
+        bucket_seconds=60, freshness_lag=30, clock=lambda: clock["now"]
+    )
+    grafana = FakeGrafana()
+    args = {
+        "datasourceUid": "prom",
+        "expr": "up",
+        "startTime": "now-10m",
+        "endTime": "now",
+        "stepSeconds": 15,
+    }
+
+    first = _payload(
+        await cache.interceptor(_request("query_prometheus", **args), grafana)
+    )
+    assert [len(s["values"]) for s in first] == [41, 41]
+
+    clock["now"] += 37
+    grafana.calls.clear()
+    second = _payload(
+        await cache.interceptor(_request("query_prometheus", **args), grafana)
+    )
+    assert len(grafana.calls) == 1
+    # Only the buckets that were still fresh (within bucket + lag of now) are refetched.
+    fetched_from = parse_time(grafana.calls[0]["startTime"], clock["now"])
+    assert fetched_from is not None and fetched_from >= _NOW - 60 - 30
+
+    start, end = int(_NOW + 37 - 600) // 15 * 15, int(_NOW + 37) // 15 * 15
+    for series in second:
+        assert series["values"] == [[t, str(t % 7)] for t in range(start, end + 1, 15)]
+    assert cache.hits > 0
+
+
+@pytest.mark.asyncio
+async def test_short_query_does_not_cache_a_partial_bucket() -> None:
+    cache = RangeQueryCache(
+        bucket_seconds=300, stats_bucket_seconds=600, clock=lambda: _NOW
+    )
+    grafana = FakeGrafana()
+    args = {
+        "datasourceUid": "prom",
+        "expr": "up",
+        "startTime": "90000",
+        "stepSeconds": 60,
+    }
+
+    short = _payload(
+        await cache.interceptor(
+            _request("query_prometheus", **args, endTime="90120"), grafana
+        )
+    )
+    assert [len(s["values"]) for s in short] == [3, 3]
+    longer = _payload(
+        await cache.interceptor(
+            _request("query_prometheus", **args, endTime="90600"), grafana
+        )
+    )
+    assert [len(s["values"]) for s in longer] == [11, 11]
+    assert cache.hits == 1
+
+    stats_args = {
+        "datasourceUid": "loki",
+        "logql": '{app="x"}',
+        "startRfc3339": "90000",
+    }
+    await cache.interceptor(
+        _request("query_loki_stats", **stats_args, endRfc3339="90120"), grafana
+    )
+    stats = _payload(
+        await cache.interceptor(
+            _request("query_loki_stats", **stats_args, endRfc3339="90600"), grafana
+        )
+    )
+    assert stats["entries"] == 600
+
+
+@pytest.mark.asyncio
+async def test_loki_stats_are_summed_per_bucket() -> None:
+    cache = RangeQueryCache(
+        stats_bucket_seconds=600, freshness_lag=0, clock=lambda: _NOW
+    )
+    grafana = FakeGrafana()
+    args = {
+        "datasourceUid": "loki",
+        "logql": '{app="x"}',
+        "startRfc3339": "now-1h",
+        "endRfc3339": "now",
+    }
+
+    stats = _payload(
+        await cache.interceptor(_request("query_loki_stats", **args), grafana)
+    )
+    assert stats["bytes"] == 10 * len(grafana.calls) and stats["streams"] == 3
+    assert stats["lowerBounds"] == ["chunks", "streams"]
+
+    calls = len(grafana.calls)
+    await cache.interceptor(_request("query_loki_stats", **args), grafana)
+    # Only the bucket containing "now" is fetched again.
+    assert len(grafana.calls) == calls + 1
+
+
+@pytest.mark.asyncio
+async def test_loki_stats_fan_out_is_bounded() -> None:
+    cache = RangeQueryCache(
+        stats_bucket_seconds=600,
+        freshness_lag=0,
+        stats_max_concurrency=2,
+        clock=lambda: _NOW,
+    )
+    running = {"now": 0, "max": 0}
+    grafana = FakeGrafana()
+
+    async def slow(request: MCPToolCallRequest) -> CallToolResult:
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return await grafana(request)
+
+    args = {
+        "datasourceUid": "loki",
+        "logql": '{app="x"}',
+        "startRfc3339": "now-24h",
+        "endRfc3339": "now",
+    }
+    await cache.interceptor(_request("query_loki_stats", **args), slow)
+    assert len(grafana.calls) >= 144 and running["max"] == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_pass_through_uncached() -> None:
+    cache = RangeQueryCache(clock=lambda: _NOW)
+
+    async def failing(request: MCPToolCallRequest) -> CallToolResult:
+        return CallToolResult(
+            content=[TextContent(type="text", text="boom")], isError=True
+        )
+
+    args = {
+        "datasourceUid": "prom",
+        "expr": "up",
+        "startTime": "now-1h",
+        "endTime": "now",
+        "stepSeconds": 60,
+    }
+    result = await cache.interceptor(_request("query_prometheus", **args), failing)
+    assert isinstance(result, CallToolResult) and result.isError and len(cache) == 0
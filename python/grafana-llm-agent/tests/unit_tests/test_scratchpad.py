@@ -0,0 +1,113 @@
+import importlib
+from typing import Any, List, Sequence
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableLambda
+
+from react_agent import prompts
+from react_agent.scratchpad import (
+    MAX_THOUGHTS,
+    add_thoughts,
+    compact_history,
+    extract_thoughts,
+    scratchpad_message,
+)
+from react_agent.state import State
+from react_agent.tools import think
+
+graph = importlib.import_module("react_agent.graph")
+
+
+def test_extract_thoughts_from_text_and_think_calls() -> None:
+    message = AIMessage(
+        content="<thinking>先看錯誤率</thinking>正在查詢。",
+        tool_calls=[
+            {"name": "think", "args": {"thought": "再看延遲"}, "id": "t1"},
+            {"name": "query_prometheus", "args": {"expr": "up"}, "id": "q1"},
+        ],
+    )
+    cleaned, thoughts = extract_thoughts(message)
+    assert thoughts == ["先看錯誤率", "再看延遲"]
+    assert cleaned.content == "正在查詢。"
+    assert [c["name"] for c in cleaned.tool_calls] == ["query_prometheus"]
+
+    plain = AIMessage(content="答案")
+    assert extract_thoughts(plain) == (plain, [])
+    # 未閉合的標籤不是思考區塊，答案原樣保留
+    unclosed = AIMessage(content="範例：<thinking> 標籤之後的內容仍是答案")
+    assert extract_thoughts(unclosed) == (unclosed, [])
+
+
+def test_compact_history_drops_think_round_trips() -> None:
+    messages = [
+        HumanMessage(content="hi"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "think", "args": {"thought": "x"}, "id": "t1"}],
+        ),
+        ToolMessage(content="x", tool_call_id="t1"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "list_datasources", "args": {}, "id": "c1"}],
+        ),
+        ToolMessage(content="[]", tool_call_id="c1"),
+    ]
+    compacted = compact_history(messages)
+    assert compacted == [messages[0], messages[3], messages[4]]
+
+
+def test_scratchpad_keeps_recent_thoughts() -> None:
+    thoughts = add_thoughts([str(i) for i in range(MAX_THOUGHTS)], ["new"])
+    assert len(thoughts) == MAX_THOUGHTS and thoughts[-1] == "new"
+    content = str(scratchpad_message(thoughts, 2).content)
+    assert f"1. {MAX_THOUGHTS - 1}" in content and "2. new" in content
+    assert scratchpad_message([], 2) is None
+
+
+class ScriptedModel:
+    def __init__(self, replies: List[AIMessage]) -> None:
+        self.replies = replies
+        self.prompts: List[Sequence[BaseMessage]] = []
+        self.bound: List[Any] = []
+
+    def bind_tools(self, tools: Sequence[Any]) -> "ScriptedModel":
+        self.bound = list(tools)
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        self.prompts.append(messages)
+        return self.replies.pop(0)
+
+
+@pytest.mark.asyncio
+async def test_call_model_records_thoughts(monkeypatch: pytest.MonkeyPatch) -> None:
+    model = ScriptedModel(
+        [
+            AIMessage(content="<thinking>先確認資料源</thinking>"),
+            AIMessage(
+                content="<thinking>查 Loki</thinking>",
+                tool_calls=[{"name": "list_datasources", "args": {}, "id": "c1"}],
+            ),
+        ]
+    )
+    monkeypatch.setattr(graph, "load_chat_model", lambda _name: model)
+    monkeypatch.setattr(graph, "_dynamic_tools", [think])
+    state = State(messages=[HumanMessage(content="checkout 為什麼變慢？")])
+    update = await RunnableLambda(graph.call_model).ainvoke(
+        state, config={"configurable": {"metadata_preresolve": False}}
+    )
+
+    assert model.bound == []
+    assert update["scratchpad"] == ["先確認資料源", "查 Loki"]
+    [response] = update["messages"]
+    assert (
+        response.content == "" and response.tool_calls[0]["name"] == "list_datasources"
+    )
+    # 系統提示改為要求在回覆中思考，第一次呼叫時還沒有思考記錄
+    system = str(model.prompts[0][0].content)
+    assert prompts.SCRATCHPAD_INSTRUCTION in system
+    assert prompts.THINK_TOOL_INSTRUCTION not in system
+    assert model.prompts[0][1].type == "human"
+    # The retry after a thought-only reply sees that thought.
+    assert "先確認資料源" in str(model.prompts[1][1].content)
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, Iterator, List
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from react_agent import search_client
+from react_agent.search_client import PooledSearchClient, normalize_query
+
+
+@pytest_asyncio.fixture
+async def tavily_stub() -> AsyncIterator[Dict[str, Any]]:
+    """Serve a fake Tavily `/search` endpoint and record what it receives."""
+    seen: Dict[str, Any] = {"queries": [], "peers": set()}
+
+    async def handle(request: web.Request) -> web.Response:
+        body = await request.json()
+        seen["queries"].append(body["query"])
+        seen["peers"].add(request.transport.get_extra_info("peername"))
+        await asyncio.sleep(0.01)
+        return web.json_response(
+            {
+                "query": body["query"],
+                "results": [{"title": "hit"}] * body["max_results"],
+            }
+        )
+
+    app = web.Application()
+    app.router.add_post("/search", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore[union-attr]
+    seen["url"] = f"http://127.0.0.1:{port}"
+    yield seen
+    await runner.cleanup()
+
+
+@pytest.fixture
+def tavily_stub_url() -> Iterator[str]:
+    """Serve a fake Tavily `/search` endpoint outside any event loop."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self) -> None:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            payload = json.dumps(
+                {"query": body["query"], "results": [{"title": "hit"}]}
+            )
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload.encode())
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _client(url: str, **kwargs: Any) -> PooledSearchClient:
+    return PooledSearchClient(3, api_key="test", api_base_url=url, **kwargs)
+
+
+def test_normalize_query() -> None:
+    assert normalize_query("  Who  founded\tLangChain ") == "who founded langchain"
+
+
+@pytest.mark.asyncio
+async def test_search_reuses_connection_and_caches(tavily_stub: Dict[str, Any]) -> None:
+    client = _client(tavily_stub["url"])
+    first = await client.search("grafana loki")
+    second = await client.search("grafana loki")
+    third = await client.search("prometheus")
+    # 快取命中回傳副本，呼叫端修改結果不影響快取
+    first["results"].clear()
+    fourth = await client.search("grafana loki")
+    await client.aclose()
+
+    assert (
+        second is not fourth and len(second["results"]) == len(fourth["results"]) == 3
+    )
+    assert len(third["results"]) == 3
+    assert tavily_stub["queries"] == ["grafana loki", "prometheus"]
+    assert len(tavily_stub["peers"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_queries_share_request(
+    tavily_stub: Dict[str, Any],
+) -> None:
+    client = _client(tavily_stub["url"], cache_ttl=0)
+    results: List[Dict[str, Any]] = await asyncio.gather(
+        *(client.search("Same  Query") for _ in range(5)),
+        *(client.search(f"other {i}") for i in range(4)),
+    )
+    await client.aclose()
+
+    assert len(results) == 9
+    assert tavily_stub["queries"].count("Same  Query") == 1
+    # Connections are capped by max_concurrency.
+    assert len(tavily_stub["peers"]) <= client.max_concurrency
+
+
+def test_new_event_loop_closes_the_old_session(tavily_stub_url: str) -> None:
+    client = _client(tavily_stub_url)
+    asyncio.run(client.search("first loop"))
+    old = client._session
+    asyncio.run(client.search("second loop"))
+    assert old is not None and old.closed
+    assert client._session is not old
+    asyncio.run(client.aclose())
+
+
+def test_clients_are_shared_per_setting(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("TAVILY_API_KEY", "test")
+    monkeypatch.setattr(search_client, "_clients", {})
+    client = search_client.get_search_client(3, cache_ttl=60, max_concurrency=2)
+    assert search_client.get_search_client(3, cache_ttl=60, max_concurrency=2) is client
+    other = search_client.get_search_client(3, cache_ttl=0, max_concurrency=8)
+    assert other is not client and (other.cache_ttl, other.max_concurrency) == (0, 8)
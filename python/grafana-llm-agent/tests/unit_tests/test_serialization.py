@@ -0,0 +1,58 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from react_agent.serialization import (
+    CachedChatOpenAI,
+    SerializedMessageCache,
+    openai_message_to_dict,
+)
+
+
+def _history() -> list:
+    return [
+        SystemMessage(content="system"),
+        HumanMessage(content="hi", id="h1"),
+        AIMessage(
+            content="",
+            id="a1",
+            tool_calls=[{"name": "list_datasources", "args": {}, "id": "call-1"}],
+        ),
+        ToolMessage(
+            content="[" + '{"uid": "x"},' * 1000 + "{}]", tool_call_id="call-1", id="t1"
+        ),
+    ]
+
+
+def test_encode_only_converts_new_messages() -> None:
+    cache = SerializedMessageCache()
+    history = _history()
+    first = cache.encode(history)
+    assert cache.misses == 4
+
+    history.append(AIMessage(content="done", id="a2"))
+    second = cache.encode(history)
+    assert cache.misses == 5
+    assert second[:4] == first
+    assert all(a is b for a, b in zip(first, second))
+    assert second == [openai_message_to_dict(m) for m in history]
+
+
+def test_edited_message_is_reencoded() -> None:
+    cache = SerializedMessageCache()
+    cache.encode([HumanMessage(content="v1", id="h1")])
+    (payload,) = cache.encode([HumanMessage(content="v2", id="h1")])
+    assert payload["content"] == "v2"
+    assert len(cache) == 1
+
+
+def test_cached_payload_matches_stock(monkeypatch) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    model = CachedChatOpenAI(model="gpt-4o-mini")
+    history = _history()
+    stock = super(CachedChatOpenAI, model)._get_request_payload(history)
+    cached = model._get_request_payload(history)
+    assert {k: v for k, v in cached.items() if k != "messages"} == {
+        k: v for k, v in stock.items() if k != "messages"
+    }
+    # Same as ChatOpenAI's own conversion, except "" instead of None next to tool calls.
+    for ours, theirs in zip(cached["messages"], stock["messages"]):
+        assert ours == {**theirs, "content": theirs["content"] or ours["content"]}
@@ -0,0 +1,82 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from react_agent import prompts
+from react_agent.templates import (
+    PromptTemplate,
+    get_system_message,
+    get_template,
+    register_tenant_prompt,
+    resolve_system_prompt,
+    unregister_tenant_prompt,
+)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        prompts.SYSTEM_PROMPT,
+        "no fields {{escaped}}",
+        "{system_time!r:>40} and {other}",
+        "{system_time.upper} {system_time[0]} {other:{width}}",
+    ],
+)
+def test_render_matches_str_format(source: str) -> None:
+    values = {
+        "system_time": "2024-01-01T00:00:00+00:00",
+        "thinking": prompts.THINK_TOOL_INSTRUCTION,
+        "other": 3,
+        "width": 5,
+    }
+    assert PromptTemplate(source).render(**values) == source.format(**values)
+
+
+@pytest.mark.parametrize("source", ["time: {}", "time: {0}", "time: {0.year}"])
+def test_positional_fields_are_rejected(source: str) -> None:
+    with pytest.raises(ValueError):
+        PromptTemplate(source)
+
+
+def test_template_parsed_once() -> None:
+    assert get_template(prompts.SYSTEM_PROMPT) is get_template(prompts.SYSTEM_PROMPT)
+
+
+def test_system_message_reused_within_minute() -> None:
+    first = get_system_message(
+        prompts.SYSTEM_PROMPT, datetime(2024, 1, 1, 8, 30, 5, tzinfo=UTC)
+    )
+    second = get_system_message(
+        prompts.SYSTEM_PROMPT, datetime(2024, 1, 1, 8, 30, 59, tzinfo=UTC)
+    )
+    third = get_system_message(
+        prompts.SYSTEM_PROMPT, datetime(2024, 1, 1, 8, 31, tzinfo=UTC)
+    )
+
+    # 每次取得各自的副本，修改其中一個不影響之後的步驟
+    assert first == second and first is not second
+    first.content = "changed"
+    assert second.content != "changed"
+    assert str(third.content).endswith("System time: 2024-01-01T08:31:00+00:00")
+    assert str(second.content).endswith("System time: 2024-01-01T08:30:00+00:00")
+    assert prompts.THINK_TOOL_INSTRUCTION in str(second.content)
+    scratchpad = get_system_message(
+        prompts.SYSTEM_PROMPT,
+        datetime(2024, 1, 1, 8, 30, tzinfo=UTC),
+        prompts.SCRATCHPAD_INSTRUCTION,
+    )
+    assert prompts.SCRATCHPAD_INSTRUCTION in str(scratchpad.content)
+    assert prompts.THINK_TOOL_INSTRUCTION not in str(scratchpad.content)
+
+
+def test_tenant_prompt_override() -> None:
+    register_tenant_prompt("acme", "Acme assistant. {system_time}")
+    try:
+        assert resolve_system_prompt(prompts.SYSTEM_PROMPT, "acme").startswith("Acme")
+        assert (
+            resolve_system_prompt(prompts.SYSTEM_PROMPT, "other")
+            is prompts.SYSTEM_PROMPT
+        )
+        assert resolve_system_prompt(prompts.SYSTEM_PROMPT) is prompts.SYSTEM_PROMPT
+    finally:
+        unregister_tenant_prompt("acme")
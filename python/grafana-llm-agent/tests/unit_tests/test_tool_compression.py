@@ -0,0 +1,96 @@
+import importlib
+import json
+from typing import Any, List, Sequence
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent.tool_compression import (
+    ZLIB,
+    ZSTD,
+    compress_message,
+    expand_message,
+    is_compressed,
+    message_content,
+)
+
+graph = importlib.import_module("react_agent.graph")
+
+_LOGS = json.dumps(
+    [
+        {
+            "timestamp": str(1_700_000_000_000_000_000 + i),
+            "line": f"level=error msg=timeout id={i}",
+            "labels": {"service_name": "checkout", "level": "error"},
+        }
+        for i in range(2000)
+    ]
+)
+
+
+@pytest.mark.parametrize("codec", [ZSTD, ZLIB])
+@pytest.mark.parametrize("content", [_LOGS, [{"type": "text", "text": _LOGS}]])
+def test_round_trip(codec: str, content: Any) -> None:
+    message = ToolMessage(content=content, tool_call_id="c1", id="t1")
+    packed = compress_message(message, min_size=1000, codec=codec)
+    assert (
+        is_compressed(packed)
+        and len(packed.additional_kwargs["compressed_content"]["data"]) < len(_LOGS) / 5
+    )
+    assert message_content(packed) == content
+    assert expand_message(packed) == message
+    assert compress_message(message, min_size=10**9) is message
+
+
+class ScriptedModel:
+    def __init__(self, replies: List[AIMessage]) -> None:
+        self.replies = replies
+        self.prompts: List[Sequence[BaseMessage]] = []
+
+    def bind_tools(self, tools: Sequence[Any]) -> "ScriptedModel":
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        self.prompts.append(messages)
+        return self.replies.pop(0)
+
+
+@pytest.mark.asyncio
+async def test_state_keeps_large_results_compressed(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    @tool
+    def query_loki_logs(logql: str) -> str:
+        """Query Loki."""
+        return _LOGS
+
+    call = {
+        "name": "query_loki_logs",
+        "args": {"logql": '{app="checkout"}'},
+        "id": "c1",
+    }
+    model = ScriptedModel(
+        [AIMessage(content="", tool_calls=[call]), AIMessage(content="完成")]
+    )
+    monkeypatch.setattr(graph, "load_chat_model", lambda _name: model)
+    monkeypatch.setattr(graph, "_dynamic_tools", [query_loki_logs])
+    compiled = graph.build_react_graph([query_loki_logs]).compile(
+        checkpointer=InMemorySaver()
+    )
+    config = {
+        "configurable": {
+            "thread_id": "t",
+            "metadata_preresolve": False,
+            "tool_result_compress_bytes": 1000,
+        }
+    }
+    result = await compiled.ainvoke(
+        {"messages": [HumanMessage(content="查 checkout")]}, config
+    )
+
+    [stored] = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+    assert is_compressed(stored) and len(stored.content) < 100
+    [sent] = [m for m in model.prompts[-1] if isinstance(m, ToolMessage)]
+    assert sent.content == _LOGS and not is_compressed(sent)
@@ -0,0 +1,150 @@
+import asyncio
+import importlib
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from react_agent import tools as agent_tools
+from react_agent.mcp_sessions import MCPSessionManager
+from react_agent.mcp_stub import serve_stub
+from react_agent.replay import ReplayChatModel, TrafficLog, serve_replay
+from react_agent.traffic import expand_requests, read_traffic
+from react_agent.utils import get_message_text
+
+graph = importlib.import_module("react_agent.graph")
+
+
+async def list_datasources() -> List[Dict[str, Any]]:
+    await asyncio.sleep(0.05)
+    return [{"uid": "loki-1", "type": "loki"}]
+
+
+def query_loki_logs(datasourceUid: str, logql: str) -> List[Dict[str, Any]]:
+    return [{"line": f"level=error msg=timeout n={i}"} for i in range(500)]
+
+
+class ScriptedModel:
+    """Lists the datasources, queries the logs, then answers."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def bind_tools(self, tools: Sequence[Any]) -> "ScriptedModel":
+        return self
+
+    async def ainvoke(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        steps = [
+            ("list_datasources", {}),
+            (
+                "query_loki_logs",
+                {"datasourceUid": "loki-1", "logql": '{app="checkout"}'},
+            ),
+        ]
+        if self.calls > len(steps):
+            return AIMessage(content="checkout 有 500 筆逾時錯誤")
+        name, args = steps[self.calls - 1]
+        call = {"name": name, "args": args, "id": f"c{self.calls}"}
+        return AIMessage(content="", tool_calls=[call])
+
+
+async def _run(
+    monkeypatch: pytest.MonkeyPatch, url: str, model: Any, configurable: Dict[str, Any]
+) -> List[BaseMessage]:
+    manager = MCPSessionManager({"grafana-mcp": {"url": url, "transport": "sse"}})
+    try:
+        interceptors = [agent_tools.traffic_capture_interceptor]
+        mcp_tools = await manager.get_tools(interceptors=interceptors)
+        monkeypatch.setattr(graph, "load_chat_model", lambda _name: model)
+        monkeypatch.setattr(graph, "_dynamic_tools", mcp_tools)
+        compiled = graph.build_react_graph(mcp_tools).compile(
+            checkpointer=InMemorySaver()
+        )
+        config = {"configurable": {"metadata_preresolve": False, **configurable}}
+        question = HumanMessage(content="checkout 最近有錯誤嗎？")
+        result = await compiled.ainvoke({"messages": [question]}, config)
+        return result["messages"]
+    finally:
+        await manager.aclose()
+
+
+@pytest.mark.asyncio
+async def test_capture_then_replay_without_the_server(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    capture = tmp_path / "capture.jsonl.gz"
+    stub_tools = {
+        "list_datasources": list_datasources,
+        "query_loki_logs": query_loki_logs,
+    }
+    with serve_stub(stub_tools) as url:
+        configurable = {"thread_id": "live", "traffic_capture_path": str(capture)}
+        captured = await _run(monkeypatch, url, ScriptedModel(), configurable)
+
+    records = list(read_traffic(capture))
+    assert [r["kind"] for r in records] == ["llm", "mcp", "llm", "mcp", "llm"]
+    assert records[1]["duration"] >= 0.05
+    # 每次呼叫只記錄新增的消息，並指向同一執行緒上一次呼叫的記錄
+    llm = [r for r in records if r["kind"] == "llm"]
+    assert [r["parent"] for r in llm] == [None, llm[0]["id"], llm[1]["id"]]
+    assert [m["type"] for m in llm[-1]["request"]] == ["ai", "tool"]
+    assert llm[-1]["offset"] == len(llm[1]["request"]) + llm[1]["offset"]
+    # 展開後是完整的請求，包含問題與大型工具結果
+    full = [r for r in expand_requests(records) if r["kind"] == "llm"][-1]["request"]
+    assert full[0]["type"] == "system"
+    assert [m["type"] for m in full if m["type"] != "system"] == [
+        "human",
+        "ai",
+        "tool",
+        "ai",
+        "tool",
+    ]
+    assert any("n=499" in str(m["data"]["content"]) for m in full)
+    assert sum(len(r["request"]) for r in llm) == len(full)
+
+    started = time.perf_counter()
+    with serve_replay(capture, speed=0) as url:
+        model = ReplayChatModel.from_file(capture, speed=0)
+        replayed = await _run(monkeypatch, url, model, {"thread_id": "replay"})
+    assert time.perf_counter() - started < 3
+
+    assert [m.type for m in replayed] == [m.type for m in captured]
+    assert [get_message_text(m) for m in replayed] == [
+        get_message_text(m) for m in captured
+    ]
+
+
+@pytest.mark.asyncio
+async def test_replay_speed_and_fallbacks() -> None:
+    question = HumanMessage(content="checkout 有錯誤嗎")
+    result = {"content": [{"type": "text", "text": "[]"}], "isError": False}
+    response = {"type": "ai", "data": {"content": "完成", "id": "run-1"}}
+    records = [
+        {
+            "kind": "mcp",
+            "name": "list_datasources",
+            "arguments": {"limit": 5},
+            "duration": 0.4,
+            "result": result,
+        },
+        {"kind": "llm", "key": "unknown", "duration": 0.4, "response": response},
+    ]
+    log = TrafficLog(records)
+    # 參數不同時仍回應同一工具的擷取結果；沒有擷取的工具則沒有結果
+    assert log.tool_result("list_datasources", {"limit": 10})["duration"] == 0.4
+    assert log.tool_result("search_dashboards", {}) is None
+    assert log.tools["list_datasources"]["inputSchema"] == {"type": "object"}
+
+    model = ReplayChatModel(log=log, speed=10)
+    started = time.perf_counter()
+    first = await model.ainvoke([question])
+    second = await model.ainvoke([question])
+    elapsed = time.perf_counter() - started
+    assert first.content == second.content == "完成"
+    assert first.id != second.id
+    assert 0.08 <= elapsed < 0.4
@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from react_agent.transcript import (
+    TranscriptWriter,
+    format_records,
+    preview,
+    read_transcript,
+)
+
+
+def _messages() -> list:
+    big = json.dumps([{"line": f"level=error id={i}"} for i in range(10_000)])
+    return [
+        HumanMessage(content="檢查 checkout", id="h1"),
+        AIMessage(
+            content="",
+            id="a1",
+            tool_calls=[
+                {"name": "query_loki_logs", "args": {"logql": '{app="x"}'}, "id": "c1"}
+            ],
+        ),
+        ToolMessage(content=big, tool_call_id="c1", name="query_loki_logs", id="t1"),
+        AIMessage(content="一切正常", id="a2"),
+    ]
+
+
+def test_writes_only_new_messages(tmp_path: Path) -> None:
+    path = tmp_path / "transcript.jsonl"
+    messages = _messages()
+    writer = TranscriptWriter(path)
+    assert writer.write("t", messages[:2]) == 2
+    assert writer.write("t", messages[:2]) == 0
+    assert writer.write("t", messages) == 2
+    writer.close()
+
+    records = list(read_transcript(path))
+    assert [r["id"] for r in records] == ["h1", "a1", "t1", "a2"]
+    assert [r["index"] for r in records] == [0, 1, 2, 3]
+    tool = records[2]
+    assert tool["size"] == len(messages[2].content) and len(tool["preview"]) <= 201
+    assert tool["content"] == messages[2].content
+
+
+def test_compressed_transcript_rotates_and_reads_back_in_order(tmp_path: Path) -> None:
+    path = tmp_path / "transcript.jsonl.gz"
+    writer = TranscriptWriter(path, compress=True, max_bytes=200, backup_count=10)
+    for i in range(6):
+        thread = "a" if i % 2 else "b"
+        writer.write(thread, [HumanMessage(content=f"問題 {i}", id=f"m{i}")])
+    writer.close()
+
+    assert (tmp_path / "transcript.jsonl.gz.1").exists()
+    assert [r["id"] for r in read_transcript(path)] == [f"m{i}" for i in range(6)]
+    assert [r["id"] for r in read_transcript(path, thread_id="a")] == ["m1", "m3", "m5"]
+
+
+def test_format_records_uses_bounded_previews() -> None:
+    records = [
+        {"type": "human", "preview": "檢查 checkout"},
+        {
+            "type": "ai",
+            "preview": "",
+            "tool_calls": [{"name": "query_loki_logs", "args": {}, "id": "c1"}],
+        },
+        {
+            "type": "tool",
+            "name": "query_loki_logs",
+            "tool_call_id": "c1",
+            "size": 9,
+            "preview": "[1, 2]",
+        },
+    ]
+    text = format_records(records)
+    assert (
+        "👤 用戶輸入" in text and "🔧 工具調用:" in text and "(9 字元): [1, 2]" in text
+    )
+    assert preview("a  b\n" * 100, 10) == "a b a b a …"
@@ -0,0 +1,58 @@
+import importlib
+from pathlib import Path
+
+import pytest
+from langchain_core.runnables.graph import Graph
+
+from react_agent import visualization
+from react_agent.visualization import render_svg, save_graph_visualization
+
+graph = importlib.import_module("react_agent.graph")
+
+
+def test_renders_once_per_topology(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(visualization.shutil, "which", lambda _name: None)
+    picture = tmp_path / "agent.svg"
+    compiled = graph.build_react_graph(graph.TOOLS).compile()
+
+    assert save_graph_visualization(compiled, str(picture))
+    svg = picture.read_text()
+    assert all(f">{node}<" in svg for node in ("call_model", "tools", "synthesize"))
+    assert not save_graph_visualization(compiled, str(picture))
+
+    builder = graph.build_react_graph(graph.TOOLS)
+    builder.add_node("extra", lambda state: {})
+    builder.add_edge("synthesize", "extra")
+    assert save_graph_visualization(builder.compile(), str(picture))
+
+
+def test_png_falls_back_to_local_svg_offline(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def offline(self: Graph) -> bytes:
+        raise ConnectionError("mermaid.ink unreachable")
+
+    monkeypatch.setattr(visualization.shutil, "which", lambda _name: None)
+    monkeypatch.setattr(Graph, "draw_mermaid_png", offline)
+    compiled = graph.build_react_graph(graph.TOOLS).compile()
+
+    assert save_graph_visualization(compiled, str(tmp_path / "agent.png"))
+    assert not (tmp_path / "agent.png").exists()
+    assert (tmp_path / "agent.svg").read_text().startswith("<svg")
+
+    # 圖結構沒變時沿用替代的 SVG，不再嘗試遠端服務
+    attempts = []
+    monkeypatch.setattr(
+        Graph, "draw_mermaid_png", lambda self: attempts.append(self) or offline(self)
+    )
+    assert not save_graph_visualization(compiled, str(tmp_path / "agent.png"))
+    assert attempts == []
+
+
+def test_loops_are_drawn_back_to_earlier_rows() -> None:
+    drawable = graph.build_react_graph(graph.TOOLS).compile().get_graph()
+    svg = render_svg(drawable)
+    # tools -> call_model 是往回的邊，以曲線繪製
+    assert svg.count(" C") == 1
@@ -0,0 +1,88 @@
+import operator
+import os
+import threading
+from typing import Any, Dict, List
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.config import get_stream_writer
+from langgraph.graph import StateGraph
+from typing_extensions import Annotated, TypedDict
+
+from react_agent.worker_pool import HashRing, RemoteError, WorkerCrashed, WorkerPool
+
+
+class EchoState(TypedDict, total=False):
+    calls: Annotated[List[int], operator.add]
+    fail: bool
+    crash: bool
+    unpicklable: bool
+
+
+def _echo(state: EchoState) -> Dict[str, Any]:
+    if state.get("fail"):
+        raise ValueError("boom")
+    if state.get("crash"):
+        os._exit(1)
+    if state.get("unpicklable"):
+        get_stream_writer()(threading.Lock())
+    return {"calls": [os.getpid()]}
+
+
+def build_graph() -> Any:
+    builder = StateGraph(EchoState)
+    builder.add_node("echo", _echo)
+    builder.add_edge("__start__", "echo")
+    return builder.compile(checkpointer=InMemorySaver())
+
+
+def test_hash_ring_moves_few_keys() -> None:
+    keys = [f"thread-{i}" for i in range(2000)]
+    ring = HashRing(["a", "b", "c"])
+    before = {key: ring.node_for(key) for key in keys}
+    assert set(before.values()) == {"a", "b", "c"}
+    ring.add("d")
+    moved = [key for key in keys if ring.node_for(key) != before[key]]
+    assert all(ring.node_for(key) == "d" for key in moved)
+    assert 0.1 < len(moved) / len(keys) < 0.4
+
+
+@pytest.mark.asyncio
+async def test_threads_stick_to_their_worker() -> None:
+    with WorkerPool(f"{__name__}:build_graph", processes=2) as pool:
+        for _ in range(2):
+            for thread_id in ("t1", "t2", "t3"):
+                config = {"configurable": {"thread_id": thread_id}}
+                final = await pool.ainvoke({"calls": []}, config)
+        # Each thread's checkpoints live in one worker, which served both runs.
+        assert len(final["calls"]) == 2 and len(set(final["calls"])) == 1
+        assert final["calls"][0] != os.getpid()
+
+        with pytest.raises(RemoteError, match="boom"):
+            await pool.ainvoke(
+                {"calls": [], "fail": True}, {"configurable": {"thread_id": "t4"}}
+            )
+
+        # ainvoke always streams values; a caller's stream_mode must not clash with it.
+        config = {"configurable": {"thread_id": "t5"}}
+        final = await pool.ainvoke({"calls": []}, config, stream_mode="values")
+        assert len(final["calls"]) == 1
+        with pytest.raises(ValueError, match="astream"):
+            await pool.ainvoke({"calls": []}, config, stream_mode="updates")
+
+
+@pytest.mark.asyncio
+async def test_crashes_and_unpicklable_chunks_fail_the_run() -> None:
+    config = {"configurable": {"thread_id": "t1"}}
+    with WorkerPool(f"{__name__}:build_graph", processes=1) as pool:
+        with pytest.raises(RemoteError, match="pickle"):
+            stream = pool.astream(
+                {"calls": [], "unpicklable": True}, config, stream_mode="custom"
+            )
+            async for _ in stream:
+                pass
+        with pytest.raises(WorkerCrashed):
+            await pool.ainvoke({"calls": [], "crash": True}, config)
+        # 下一個請求會重新啟動工作進程
+        final = await pool.ainvoke({"calls": []}, {"configurable": {"thread_id": "t2"}})
+        assert len(final["calls"]) == 1
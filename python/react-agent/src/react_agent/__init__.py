@@ -2,8 +2,22 @@
 
 This module defines a custom reasoning and action agent graph.
 It invokes tools in a simple loop.
+
+`graph` is imported on first access, so importing the package (or any of its
+modules) does not build the graph.
 """
 
-from react_agent.graph import graph
+from typing import Any
 
 __all__ = ["graph"]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "graph":
+        import importlib
+
+        # Importing the submodule binds `react_agent.graph` to the module; rebind it.
+        compiled = importlib.import_module("react_agent.graph").graph
+        globals()["graph"] = compiled
+        return compiled
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
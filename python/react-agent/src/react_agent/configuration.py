@@ -38,6 +38,21 @@ class Configuration:
         },
     )
 
+    search_cache_ttl: float = field(
+        default=300.0,
+        metadata={
+            "description": "Seconds to keep search results cached per normalized query. "
+            "Set to 0 to disable caching."
+        },
+    )
+
+    search_max_concurrency: int = field(
+        default=4,
+        metadata={
+            "description": "The maximum number of concurrent requests to the search API."
+        },
+    )
+
     @classmethod
     def from_context(cls) -> Configuration:
         """Create a Configuration instance from a RunnableConfig object."""
@@ -6,9 +6,8 @@ These tools are intended as free examples to get started. For production use,
 consider implementing more robust and specialized tools tailored to your needs.
 """
 
-from typing import Any, Callable, List, Optional, cast
+from typing import Any, Callable, List, Optional
 
-from langchain_tavily import TavilySearch  # type: ignore[import-not-found]
 
 from react_agent.configuration import Configuration
 
@@ -20,9 +19,16 @@ async def search(query: str) -> Optional[dict[str, Any]]:
     to provide comprehensive, accurate, and trusted results. It's particularly useful
     for answering questions about current events.
     """
+    # The Tavily client is imported on first search, not at startup.
+    from react_agent.search_client import pooled_search
+
     configuration = Configuration.from_context()
-    wrapped = TavilySearch(max_results=configuration.max_search_results)
-    return cast(dict[str, Any], await wrapped.ainvoke({"query": query}))
+    return await pooled_search(
+        query,
+        configuration.max_search_results,
+        cache_ttl=configuration.search_cache_ttl,
+        max_concurrency=configuration.search_max_concurrency,
+    )
 
 
 TOOLS: List[Callable[..., Any]] = [search]
@@ -1,6 +1,5 @@
 """Utility & helper functions."""
 
-from langchain.chat_models import init_chat_model
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import BaseMessage
 
@@ -23,5 +22,8 @@ def load_chat_model(fully_specified_name: str) -> BaseChatModel:
     Args:
         fully_specified_name (str): String in the format 'provider/model'.
     """
+    # Provider SDKs are resolved (and imported) on first use, not at startup.
+    from langchain.chat_models import init_chat_model
+
     provider, model = fully_specified_name.split("/", maxsplit=1)
     return init_chat_model(model, model_provider=provider)